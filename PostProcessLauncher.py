@@ -1,21 +1,36 @@
-#Launcher version 1.15
+#Launcher version 1.16
 
 from vcCommand import *
-import sys, os, importlib, re
+import sys, os
 
 app = getApplication()
 cmd = getCommand()
 other_cmd = app.findCommand('interactiveTranslateTCP')
+LAUNCHER_VERSION = '1.16'
 TRANSLATORS_DIR_NAME = 'Translators'
+EA_EXTENSIONS_PROP = 'Remove EA from'
+EA_EXTENSIONS = '.ls, .src, .dat, .JBI' # file types processed in addition to main output
+MULTI_VENDOR_PROP = 'Multi-vendor export'
+MULTI_VENDOR_PREFIX = 'Also export to '
+OUTPUT_CACHE_PROP = 'Use output cache'
+INCREMENTAL_PROP = 'Incremental output' # retranslate only changed routines, see RoutineManifest
+PATH_TOLERANCE_PROP = 'Path tolerance (mm)' # path point reduction, 0 is off, see PathReduction
+PATH_ANGLE_TOLERANCE_PROP = 'Path angle tolerance (deg)'
+CACHE_IGNORED_PROPS = ['Output', 'Select Output', 'Post Process', 'Progress', 'Cancel', OUTPUT_CACHE_PROP, INCREMENTAL_PROP,
+  'CallingCommandName']
+monitor = None # progress of running post process
+process_events = getattr(app, 'processEvents', None) # VC event loop, run between routines while translating
 cmd_uri = getCommandPath() # this command's uri
 cmd_uri = cmd_uri[8:].decode('utf8') # remove "file:///" header
 cmdfolder, cmdfilename = os.path.split(cmd_uri)
 sys.path.append(cmdfolder)
+from PostProcessTools import TranslatorManifest, ExternalAxis, Manufacturer, BatchPostProcess, Timing, Progress, OutputCache
+from PostProcessTools import RoutineManifest, PathReduction, StatementIndex
 
 
 def OnStart():
   #Entry point  
-  global post_processors, file_filters, program
+  global post_processors, file_filters, program, timer, output_cache
 
 
   #Basic handles
@@ -24,41 +39,14 @@ def OnStart():
     app.messageBox("No program selected, aborting.","Warning",VC_MESSAGE_TYPE_WARNING,VC_MESSAGE_BUTTONS_OK)
     return    
   controller = program.Executor.Controller
+  timer = Timing.PhaseTimer()
   
-  #Get translators
-  file_filters = {}
-  post_processors = {}
-  translators_folder = os.path.join(cmdfolder, TRANSLATORS_DIR_NAME)
-
-  for root, folder, filenames in os.walk( translators_folder ):
-    for filename in filenames:
-      filename = str(filename)
-      filebasename, extension = os.path.splitext(filename)
-
-      if extension != '.py':
-        continue # skip non python files
-
-      if '__init__' in filename:
-        continue # skip the __init__.py file
-
-      post_uri = os.path.join(cmdfolder, filename) 
-      tokens = filebasename.split('_')
-      
-      if len(tokens) < 2:
-        #Post processor name example:  test.py => "test Robot Program file (*.test)|*.test"
-        manufacturer, filetype = tokens[0], tokens[0]
-      else:
-        #Post processor name example:  ACME_obd.py => "ACME Robot Program file (*.obd)|*.obd"
-        manufacturer, filetype = tokens[-2], tokens[-1]
-
-      #Import postprocessor module (and reload to allow easy editing)
-      module_name = TRANSLATORS_DIR_NAME + '.' + filebasename
-      post_processor_module = importlib.import_module( module_name )
-      post_processor_module = reload(post_processor_module)
-      #Dictionary of post processors per manufacturer
-      post_processors[manufacturer] = post_processor_module
-      #File filter for this post processor
-      file_filters[manufacturer] = "%s Robot Program file (*.%s)|*.%s" % (manufacturer, filetype, filetype)
+  #Get translators. Modules are imported lazily, only the selected one is loaded.
+  with timer.phase('discovery'):
+    translators_folder = os.path.join(cmdfolder, TRANSLATORS_DIR_NAME)
+    post_processors = TranslatorManifest.TranslatorRegistry(translators_folder, TRANSLATORS_DIR_NAME)
+    file_filters = post_processors.file_filters
+  output_cache = OutputCache.OutputCache(os.path.join(cmdfolder, OutputCache.CACHE_DIR_NAME))
 
   if not post_processors:
     print 'No post processors found! Please add a post processor file to "%s"' % (cmdfolder)
@@ -67,13 +55,13 @@ def OnStart():
     
   #Try to figure out manufacturer and correct post-processor
   manufacturer = getManufacturer(controller)
-  createProperties(manufacturer)
+  with timer.phase('properties'):
+    createProperties(manufacturer)
   
   if manufacturer and manufacturer in file_filters:
     #Matching post processor for this robot was found, allow using only that one
-    post_processor = post_processors[manufacturer]
     #Check if pp has properties that need to be shown in action panel
-    if 'getProperties' in dir(post_processor):
+    if post_processors.defines(manufacturer, 'getProperties'):
       #There are props, open action panel
       executeInActionPanel()
       return
@@ -101,63 +89,27 @@ def getProgram():
 
 def getManufacturer(controller):
   #Try to figure out robot manufacturer based on the model
-  comp = controller.Component
-  keys = post_processors.keys()
-  manufacturer = ''
-  model = controller.Component.Name
-  
-  #Try model stamp
-  prop = comp.getProperty('RobotModelID')
-  if prop:
-    words = prop.Value.replace(' ','').split('|')
-    if words and words[0] in keys:
-      manufacturer = words[0]
-    if words and len(words) >= 2:
-      model = words[1]
-  
-  
-  if not manufacturer:
-    #Try from BOM description
-    bom = comp.BOMdescription.replace(' ', '')
-    for key in keys:
-      if key in bom:
-        return key
-  
-  if not manufacturer:
-    #Try controller names for big brands
-    ctr_name = controller.Name
-    if ctr_name in ['IRC5']:
-      return 'ABB'
-    elif ctr_name in ['KRC2', 'KRC3', 'KRC4']:
-      return 'KUKA'
-    elif ctr_name in ['R30iA', 'R-30iA Mate', 'R-30iB']:
-      return 'Fanuc'
-    elif ctr_name in ['DX100', 'DX200']:
-      return 'Yaskawa'
-    elif ctr_name in ['URControl', 'CB3']:
-      return 'UniversalRobots'
-  
-  #Alternative languages
-  if manufacturer == 'KUKA' and 'LBR' in model:
-    manufacturer += '-Sunrise'
-  
-  
-  return manufacturer
+  return Manufacturer.getManufacturer(controller, post_processors.keys())
 
 
 def postProcessorChanged(arg = None):
   #Rebuild action panel with new properties
-  createProperties('')
+  if isRunning():
+    return
+  with timer.phase('properties'):
+    createProperties('')
   executeInActionPanel()
 
 
 def selectOutput(arg = None):
   #Open save file dialog with correct file filter
+  if isRunning():
+    return
   manufacturer = prop_sel_pp.Value
   ok = True
   post_processor = post_processors[manufacturer]
   file_filter = file_filters[manufacturer]
-  if 'getFileFilter' in dir(post_processor):
+  if post_processors.defines(manufacturer, 'getFileFilter'):
     file_filter = post_processor.getFileFilter()
   
   savecmd = app.findCommand("dialogSaveFile")
@@ -168,8 +120,7 @@ def selectOutput(arg = None):
     folder, file_old = uri.split()
   except:
     pass
-  post_processor = post_processors[manufacturer]
-  if 'getDefaultJobName' in dir(post_processor):
+  if post_processors.defines(manufacturer, 'getDefaultJobName'):
     file = post_processor.getDefaultJobName()
   uri = os.path.join(folder, file)
   
@@ -193,24 +144,83 @@ def callPostProcessor(arg = None):
   global all_props
 
   #Call selected post processor
+  if isRunning():
+    print 'Post processing is already running.'
+    return
   manufacturer = prop_sel_pp.Value
   fileuri = prop_output.Value
+  if getMultiVendorSelection():
+    callMultiVendorPostProcessors(arg)
+    return
   filebase, filetype = os.path.splitext(fileuri)
   #Call the post processor that matches with the manufacturer chosen by the user
-  result = post_processors[manufacturer].postProcess(app, program, fileuri.decode('utf8'))
+  timer.clear(['fingerprint', 'cacheRestore', 'postProcess', 'removeExternalAxis', 'clearTargets'])
+  output_folder = os.path.dirname(fileuri.decode('utf8'))
+  cache_key = getCacheKey(manufacturer, fileuri.decode('utf8'))
+  entry = None
+  if cache_key:
+    entry = output_cache.lookup(cache_key)
+  if entry:
+    #Unchanged program and settings, reuse earlier output
+    with timer.phase('cacheRestore'):
+      created_filenamelist, reused, copied = output_cache.restore(cache_key, entry, output_folder)
+    saved = entry['seconds'] - timer.getWall('fingerprint') - timer.getWall('cacheRestore')
+    print 'Output cache hit: %i files reused, %i copied, %.2f s saved.' % (reused, copied, saved)
+    for f in created_filenamelist:
+      print '- %s' % f
+    finishProgress('Cache hit')
+    reportTiming(manufacturer, fileuri.decode('utf8'), created_filenamelist, 'hit')
+    if arg:
+      other_cmd.execute()
+    all_props = None
+    return
+  files_before = Progress.listFiles(output_folder)
+  startProgress()
+  prop = cmd.getProperty(INCREMENTAL_PROP)
+  if prop and prop.Value:
+    #Translators with routine manifests skip routines unchanged since last run
+    RoutineManifest.begin(post_processors.getSourceFile(manufacturer), getCacheSettings(fileuri.decode('utf8')))
+  beginPathReduction()
+  try:
+    with timer.phase('postProcess'):
+      result = post_processors[manufacturer].postProcess(app, Progress.track(program, monitor), fileuri.decode('utf8'))
+  except Progress.PostProcessCancelled:
+    result = None
+  except:
+    stopPostProcess(output_folder, files_before, 'Failed')
+    raise
+  finally:
+    RoutineManifest.end()
+    PathReduction.end()
+  if monitor.cancelled:
+    #Translator may also have caught the cancel, clean up in both cases
+    stopPostProcess(output_folder, files_before, 'Cancelled')
+    return
+  monitor.finish()
+  finishProgress('Done')
   if not result or len(result) < 2:
     #PP utilizes action panel and does ending actions inside its own code.
     return
   succesful, created_filenamelist = result
   if succesful:
-    removeExternalAxis(fileuri, fileuri)
+    with timer.phase('removeExternalAxis'):
+      removeExternalAxis([fileuri.decode('utf8')] + created_filenamelist)
     print 'Succesfully saved files:'
     for f in created_filenamelist:
       print '- %s' % f
   else:
     print 'File writing failed'
   #Cleanups
-  program.Executor.Controller.clearTargets()
+  with timer.phase('clearTargets'):
+    program.Executor.Controller.clearTargets()
+  if succesful:
+    cache_status = 'off'
+    if cache_key:
+      seconds = timer.getWall('postProcess') + timer.getWall('removeExternalAxis')
+      cache_status = 'miss'
+      if not output_cache.store(cache_key, output_folder, [fileuri.decode('utf8')] + created_filenamelist, seconds):
+        cache_status = 'not stored'
+    reportTiming(manufacturer, fileuri.decode('utf8'), created_filenamelist, cache_status)
   
   if arg:
     #Called from action panel, call jog cmd to close action panel
@@ -220,16 +230,165 @@ def callPostProcessor(arg = None):
   all_props = None
 
 
+def startProgress():
+  #Create progress monitor for current program and show cancel button
+  global monitor
+  monitor = Progress.ProgressMonitor(StatementIndex.ProgramIndex(program), showProgress, idle = yieldToVc)
+  prop = cmd.getProperty('Cancel')
+  if prop:
+    prop.IsVisible = True
+  showProgress(monitor)
+
+
+def yieldToVc():
+  #Called by progress monitor between routines. VC redraws the action panel and
+  #delivers its events, e.g. Cancel, while the translator waits on the command thread.
+  if process_events:
+    process_events()
+
+
+def isRunning():
+  #True while a translator runs, action panel events arrive in yieldToVc
+  return monitor is not None and not monitor.finished
+
+
+def showProgress(monitor):
+  #Progress callback, shown on action panel and console
+  text = monitor.getText()
+  prop = cmd.getProperty('Progress')
+  if prop:
+    prop.Value = text
+  print text
+
+
+def finishProgress(text):
+  prop = cmd.getProperty('Progress')
+  if prop:
+    prop.Value = text
+  prop = cmd.getProperty('Cancel')
+  if prop:
+    prop.IsVisible = False
+
+
+def cancelPostProcess(arg = None):
+  #Stop running translator at next statement, callPostProcessor then calls stopPostProcess
+  if isRunning() and not monitor.cancelled:
+    print 'Cancelling post processing...'
+    monitor.cancel()
+
+
+def OnAbort():
+  cancelPostProcess()
+
+
+def stopPostProcess(output_folder, files_before, text):
+  #Translator failed or was cancelled, remove files it created. Overwritten files are left as they are.
+  monitor.stop()
+  removed = Progress.removePartialFiles(output_folder, files_before)
+  program.Executor.Controller.clearTargets()
+  print 'Post processing %s, removed %i partially written files.' % (text.lower(), len(removed))
+  finishProgress(text)
+
+
+def beginPathReduction():
+  #Translators write fewer path points within tolerances of action panel
+  linear = cmd.getProperty(PATH_TOLERANCE_PROP)
+  angular = cmd.getProperty(PATH_ANGLE_TOLERANCE_PROP)
+  PathReduction.begin(linear.Value if linear else 0.0, angular.Value if angular else 0.0)
+
+
+def getCacheSettings(fileuri):
+  #Settings that affect translator output, list of (name, value)
+  settings = [('launcher', LAUNCHER_VERSION), ('output name', os.path.basename(fileuri))]
+  for prop in cmd.Properties:
+    if not prop.Name in CACHE_IGNORED_PROPS:
+      settings.append((prop.Name, prop.Value))
+  return settings
+
+
+def getCacheKey(manufacturer, fileuri):
+  #Fingerprint of program and settings for output cache, None if cache is not used
+  prop = cmd.getProperty(OUTPUT_CACHE_PROP)
+  if prop and not prop.Value:
+    return None
+  settings = getCacheSettings(fileuri)
+  try:
+    with timer.phase('fingerprint'):
+      return OutputCache.fingerprint(program, post_processors.getSourceFile(manufacturer), settings)
+  except Exception, e:
+    print 'WARNING: Output cache skipped, cannot fingerprint program: %s' % (e)
+    return None
+
+
+def reportTiming(manufacturer, fileuri, filenames, cache_status = 'off'):
+  #Print phase timing table and write it as JSON next to the output
+  files = []
+  for f in [fileuri] + filenames:
+    if not f in files:
+      files.append(f)
+  info = {'launcher':LAUNCHER_VERSION, 'translator':manufacturer, 'program':program.Executor.Component.Name, 'cache':cache_status}
+  report = Timing.createReport(timer, Timing.countStatements(program), files, info = info)
+  Timing.printReport(report)
+  Timing.writeSidecar(fileuri, report)
+
+
 def propChanged(*args):
   prop = cmd.getProperty('Post Processor')
-  if not prop:
+  if not prop or isRunning():
     return
+  updateMultiVendorProperties()
   manufacturer = prop.Value
   if not manufacturer in post_processors:
     return
-  post_processor = post_processors[manufacturer]
-  if 'updateActionPanel' in dir(post_processor):
-    post_processor.updateActionPanel()
+  if post_processors.defines(manufacturer, 'updateActionPanel'):
+    post_processors[manufacturer].updateActionPanel()
+
+
+def getMultiVendorSelection():
+  #Manufacturers ticked for multi-vendor export, empty if mode is off. Selected post processor comes first.
+  prop = cmd.getProperty(MULTI_VENDOR_PROP)
+  if not prop or not prop.Value:
+    return []
+  selection = [prop_sel_pp.Value]
+  for key in post_processors.keys():
+    prop = cmd.getProperty(MULTI_VENDOR_PREFIX + key)
+    if prop and prop.Value and not key in selection:
+      selection.append(key)
+  return selection
+
+
+def updateMultiVendorProperties():
+  #Show post processor ticks only in multi-vendor mode
+  prop = cmd.getProperty(MULTI_VENDOR_PROP)
+  if not prop:
+    return
+  for key in post_processors.keys():
+    tick = cmd.getProperty(MULTI_VENDOR_PREFIX + key)
+    if tick:
+      tick.IsVisible = prop.Value
+
+
+def callMultiVendorPostProcessors(arg = None):
+  #Export program with every ticked post processor into <output folder>/<manufacturer>/
+  global all_props
+  fileuri = prop_output.Value.decode('utf8')
+  folder, filename = os.path.split(fileuri)
+  job_name = os.path.splitext(filename)[0]
+  beginPathReduction()
+  try:
+    summaries = BatchPostProcess.postProcessProgram(app, program, post_processors, getMultiVendorSelection(), folder, job_name)
+  finally:
+    PathReduction.end()
+  for summary in summaries:
+    if summary['ok'] and summary['files']:
+      removeExternalAxis(summary['files'])
+  
+  if arg:
+    #Called from action panel, call jog cmd to close action panel
+    other_cmd.execute()
+  
+  # Clear all_props handle to clear property on changed event handlers
+  all_props = None
 
 
 def createProperties(lock_manufacturer = ''):
@@ -248,14 +407,14 @@ def createProperties(lock_manufacturer = ''):
     manufacturer = lock_manufacturer
   post_processor = post_processors[manufacturer]
   manufacturer_properties = []
-  if 'getProperties' in dir(post_processor):
+  if post_processors.defines(manufacturer, 'getProperties'):
     manufacturer_properties = post_processor.getProperties()
   filter = file_filters[manufacturer]
-  if 'getFileFilter' in dir(post_processor):
+  if post_processors.defines(manufacturer, 'getFileFilter'):
     filter = post_processor.getFileFilter()
   filetype = filter[filter.rfind('.'):]
   uri = r'C:\temp%s' % (filetype)
-  if 'getDefaultJobName' in dir(post_processor):
+  if post_processors.defines(manufacturer, 'getDefaultJobName'):
     uri = r'C:\%s' % (post_processor.getDefaultJobName())
   prop = cmd.getProperty('Output')
   if prop:
@@ -264,8 +423,18 @@ def createProperties(lock_manufacturer = ''):
   properties.append((VC_STRING, 'Post Processor', manufacturer, VC_PROPERTY_STEP, post_processors.keys(), 0, 0))
   properties.append((VC_STRING, 'Output', uri, None, None, 0, 0))
   properties.append((VC_BUTTON, 'Select Output', None, None, None, 0, 0))
+  properties.append((VC_STRING, EA_EXTENSIONS_PROP, EA_EXTENSIONS, None, None, 0, 0))
+  properties.append((VC_BOOLEAN, OUTPUT_CACHE_PROP, True, None, None, 0, 0))
+  properties.append((VC_BOOLEAN, INCREMENTAL_PROP, True, None, None, 0, 0))
+  properties.append((VC_REAL, PATH_TOLERANCE_PROP, 0.0, None, None, 0, 0))
+  properties.append((VC_REAL, PATH_ANGLE_TOLERANCE_PROP, 1.0, None, None, 0, 0))
+  properties.append((VC_BOOLEAN, MULTI_VENDOR_PROP, False, None, None, 0, 0))
+  for key in post_processors.keys():
+    properties.append((VC_BOOLEAN, MULTI_VENDOR_PREFIX + key, False, None, None, 0, 0))
   properties.extend(manufacturer_properties)
   properties.append((VC_BUTTON, 'Post Process', None, None, None, 0, 0))
+  properties.append((VC_STRING, 'Progress', '', None, None, 0, 0))
+  properties.append((VC_BUTTON, 'Cancel', None, None, None, 0, 0))
   
   
   #Check if properties already match
@@ -313,6 +482,13 @@ def createProperties(lock_manufacturer = ''):
       elif prop_name == 'Post Process':
         prop_btn_pp = prop
         prop.OnChanged = callPostProcessor
+      elif prop_name == 'Progress':
+        prop.WritableWhenConnected = False
+        prop.WritableWhenDisconnected = False
+        prop.WritableWhenSimulating = False
+      elif prop_name == 'Cancel':
+        prop.IsVisible = False
+        prop.OnChanged = cancelPostProcess
   
   
   #Confirm some values
@@ -330,26 +506,19 @@ def createProperties(lock_manufacturer = ''):
     prop.OnChanged = propChanged
   propChanged()
 
-def removeExternalAxis(input_file, output_file):
-  with open(input_file, 'r') as infile, open (output_file, 'w+') as outfile:
-    previous_line = ""
-
-    for line in infile:
-            # Check if the line contains "E1" followed by a value
-            match = re.search(r'E1\s*=\s*[\d.]+\s*mm', line)
-
-            if match and previous_line.strip().endswith(','):
-                for line in outfile:
-                    if line == previous_line:
-                        line.replace('')
-                previous_line = previous_line.rstrip(',\n')
-                outfile.write(previous_line)
-                
-
-            if match:
-                # Replace the matched part with an empty string
-                line = line.replace(match.group(0), '')
-
-            # Write the modified line to the output file
-            outfile.write(line)
-            previous_line = line
\ No newline at end of file
+def removeExternalAxis(filenames):
+  #Strip external axis values from generated files in place.
+  #Main output (first in list) is always processed, other files if their type is listed in action panel.
+  file_pairs = [(f, f) for f in getExternalAxisFiles(filenames)]
+  results = ExternalAxis.stripExternalAxisFromFiles(file_pairs)
+  for output_file, line_count, byte_count, seconds in results:
+    print 'External axes removed: %s (%s)' % (os.path.basename(output_file), ExternalAxis.formatRate(line_count, byte_count, seconds))
+  return [r[0] for r in results]
+
+
+def getExternalAxisFiles(filenames):
+  #Files to be processed by removeExternalAxis
+  prop = cmd.getProperty(EA_EXTENSIONS_PROP)
+  extensions = ExternalAxis.parseExtensions(prop.Value if prop else EA_EXTENSIONS)
+  extensions.append(os.path.splitext(filenames[0])[1].lower())
+  return ExternalAxis.selectFiles(filenames, extensions)
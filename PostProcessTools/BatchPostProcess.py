@@ -0,0 +1,205 @@
+#-------------------------------------------------------------------------------
+# Headless batch post-processing of every robot in the layout.
+#
+# Usage from a VC python script (no action panel needed):
+#
+#   import sys
+#   sys.path.append(r'<add-on folder>')
+#   from PostProcessTools import BatchPostProcess
+#   BatchPostProcess.postProcessLayout(getApplication(), r'C:\temp\cell')
+#
+# Each robot is written into its own sub folder of the output folder. Translator
+# settings come from existing command properties or translator defaults.
+#
+# postProcessProgram() exports one program with several translators (multi-vendor
+# export in the launcher). Program data is read once into a ProgramSnapshot.
+#
+# Translators keep module level state and use the VC API, which is only safe on
+# the thread running the command. Translation therefore runs robot by robot.
+# File statistics are read in a thread pool, external axis stripping uses
+# worker processes where they can be started (see ExternalAxis).
+#-------------------------------------------------------------------------------
+from vcCommand import *
+import os, sys, time
+import TranslatorManifest, Manufacturer, ExternalAxis, ProgramSnapshot, Workers
+
+TRANSLATORS_DIR_NAME = 'Translators'
+ADDON_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if not ADDON_FOLDER in sys.path:
+  sys.path.append(ADDON_FOLDER)
+
+
+def getRobotExecutors(app):
+  # All robot executors in the layout, child components included
+  executors = []
+  comps = list(app.Simulation.Components)
+  while comps:
+    comp = comps.pop(0)
+    executors.extend(comp.findBehavioursByType(VC_ROBOTEXECUTOR))
+    comps.extend(comp.ChildComponents)
+  return executors
+
+
+def ensureProperties(cmd, properties):
+  # Create translator properties that don't exist yet on the command, using their default values
+  for p in properties:
+    prop_type, prop_name, prop_def_value, prop_constraints, prop_step_values, prop_min_value, prop_max_value = p
+    if cmd.getProperty(prop_name):
+      continue
+    if not prop_constraints:
+      prop = cmd.createProperty(prop_type, prop_name)
+    else:
+      prop = cmd.createProperty(prop_type, prop_name, prop_constraints)
+      if prop_constraints == VC_PROPERTY_STEP:
+        prop.StepValues = prop_step_values
+      elif prop_constraints == VC_PROPERTY_LIMIT:
+        prop.MinValue = prop_min_value
+        prop.MaxValue = prop_max_value
+    if prop_def_value:
+      prop.Value = prop_def_value
+
+
+def getSafeName(name):
+  # Component name usable as a folder name
+  for c in '<>:"/\\|?*':
+    name = name.replace(c, '_')
+  return name.strip() or 'Robot'
+
+
+def getOutputUri(registry, manufacturer, folder, job_name):
+  # Output uri in folder using translator default job name or job_name with translator file type
+  if registry.defines(manufacturer, 'getDefaultJobName'):
+    filename = registry[manufacturer].getDefaultJobName()
+  else:
+    filter = registry.file_filters[manufacturer]
+    if registry.defines(manufacturer, 'getFileFilter'):
+      filter = registry[manufacturer].getFileFilter()
+    filename = getSafeName(job_name) + filter[filter.rfind('.'):]
+  return os.path.join(folder, filename)
+
+
+def getFileStats(filename):
+  # (file, bytes) of one created file, missing files count as zero
+  try:
+    return filename, os.path.getsize(filename)
+  except OSError:
+    return filename, 0
+
+
+def runTranslator(app, registry, manufacturer, program, uri, summary):
+  # Run one translator into uri and fill summary. program can be a live program or a snapshot proxy.
+  folder = os.path.dirname(uri)
+  if not os.path.isdir(folder):
+    os.makedirs(folder)
+  translator = registry[manufacturer]
+  if registry.defines(manufacturer, 'getProperties'):
+    ensureProperties(getCommand(), translator.getProperties())
+
+  start = time.time()
+  try:
+    result = translator.postProcess(app, program, uri)
+  finally:
+    program.Executor.Controller.clearTargets()
+  summary['seconds'] = time.time() - start
+  if not result or len(result) < 2:
+    print 'WARNING: %s post processor needs the action panel, %s skipped.' % (manufacturer, summary['robot'])
+    return summary
+  summary['ok'], summary['files'] = result[0], list(result[1])
+  return summary
+
+
+def postProcessRobot(app, registry, executor, output_folder, manufacturer = None):
+  # Post-process one robot program. Returns summary dictionary.
+  controller = executor.Controller
+  robot_name = executor.Component.Name
+  if not manufacturer:
+    manufacturer = Manufacturer.getManufacturer(controller, registry.keys())
+  summary = {'robot':robot_name, 'translator':manufacturer, 'ok':False, 'seconds':0.0, 'files':[], 'bytes':0}
+  if not manufacturer in registry:
+    print 'WARNING: No post processor found for %s, skipped.' % (robot_name)
+    return summary
+
+  folder = os.path.join(output_folder, getSafeName(robot_name))
+  uri = getOutputUri(registry, manufacturer, folder, robot_name)
+  return runTranslator(app, registry, manufacturer, executor.Program, uri, summary)
+
+
+def postProcessProgram(app, program, registry, manufacturers, output_folder, job_name, max_workers = Workers.MAX_WORKERS):
+  # Post-process one program with several translators into output_folder/<manufacturer>/.
+  # Program data is read once into a shared snapshot that feeds all translators.
+  # Returns list of per translator summaries, also printed as a table.
+  snapshot = ProgramSnapshot.ProgramSnapshot(program)
+  robot_name = program.Executor.Component.Name
+  summaries = []
+  for manufacturer in manufacturers:
+    summary = {'robot':robot_name, 'translator':manufacturer, 'ok':False, 'seconds':0.0, 'files':[], 'bytes':0}
+    folder = os.path.join(output_folder, getSafeName(manufacturer))
+    uri = getOutputUri(registry, manufacturer, folder, job_name)
+    try:
+      summaries.append(runTranslator(app, registry, manufacturer, snapshot.program, uri, summary))
+    except Exception, e:
+      print 'ERROR: %s post processor failed: %s' % (manufacturer, e)
+      summaries.append(summary)
+  print 'INFO: %s' % (snapshot.statistics())
+
+  collectFileSizes(summaries, max_workers)
+  printSummary(summaries)
+  return summaries
+
+
+def collectFileSizes(summaries, max_workers = Workers.MAX_WORKERS):
+  # Fill byte counts of summaries, file stats are read in worker pool
+  all_files = []
+  for summary in summaries:
+    all_files.extend(summary['files'])
+  sizes = dict(Workers.runInThreads(getFileStats, all_files, max_workers))
+  for summary in summaries:
+    summary['bytes'] = sum([sizes.get(f, 0) for f in summary['files']])
+
+
+def postProcessLayout(app, output_folder, strip_extensions = None, max_workers = Workers.MAX_WORKERS):
+  # Post-process all robots in the layout into output_folder/<robot name>/.
+  # strip_extensions: optional list of file types (e.g. ['.ls']) whose external axis values are removed in place.
+  # Returns list of per robot summaries, also printed as a table.
+  translators_folder = os.path.join(ADDON_FOLDER, TRANSLATORS_DIR_NAME)
+  registry = TranslatorManifest.TranslatorRegistry(translators_folder, TRANSLATORS_DIR_NAME)
+  if not os.path.isdir(output_folder):
+    os.makedirs(output_folder)
+
+  summaries = []
+  for executor in getRobotExecutors(app):
+    try:
+      summaries.append(postProcessRobot(app, registry, executor, output_folder))
+    except Exception, e:
+      print 'ERROR: Post processing %s failed: %s' % (executor.Component.Name, e)
+      summaries.append({'robot':executor.Component.Name, 'translator':'', 'ok':False, 'seconds':0.0, 'files':[], 'bytes':0})
+
+  # File level post-passes
+  if strip_extensions:
+    all_files = []
+    for summary in summaries:
+      all_files.extend(summary['files'])
+    extensions = ExternalAxis.parseExtensions(' '.join(strip_extensions))
+    pairs = [(f, f) for f in ExternalAxis.selectFiles(all_files, extensions)]
+    ExternalAxis.stripExternalAxisFromFiles(pairs, max_workers)
+  collectFileSizes(summaries, max_workers)
+
+  printSummary(summaries)
+  return summaries
+
+
+def printSummary(summaries):
+  # Compact per robot table on console
+  print '%-24s %-16s %-6s %9s %6s %12s' % ('Robot', 'Translator', 'Status', 'Time (s)', 'Files', 'Bytes')
+  total_time = 0.0
+  total_files = 0
+  total_bytes = 0
+  for s in summaries:
+    status = 'OK'
+    if not s['ok']:
+      status = 'FAILED'
+    print '%-24s %-16s %-6s %9.2f %6i %12i' % (s['robot'][:24], s['translator'][:16], status, s['seconds'], len(s['files']), s['bytes'])
+    total_time += s['seconds']
+    total_files += len(s['files'])
+    total_bytes += s['bytes']
+  print '%-24s %-16s %-6s %9.2f %6i %12i' % ('Total', '', '', total_time, total_files, total_bytes)
@@ -0,0 +1,288 @@
+#-------------------------------------------------------------------------------
+# Translator benchmark on generated programs, runs without VC.
+#
+#   python PostProcessTools/Benchmark.py [-s 1000,10000,100000,1000000] [-t ABB,KUKA]
+#                                        [-b baseline.json] [--save]
+#
+# Each translator and program size runs in its own Python 2.7 process with the
+# Offline stand-ins (see Offline\SyntheticProgram.py for the statement mix).
+# Reported per run: statements/s of postProcess, peak RSS, output bytes and
+# lines, path schema reads (getSchemaValue calls, one VC API call each) and per
+# translator the scaling exponent k of time ~ statements^k (1.0 is linear).
+# Results are compared to the stored baseline, runs slower than REGRESSION_LIMIT
+# or with more output lines than the baseline (e.g. modal parameters written
+# again, see ModalState) are flagged. --save replaces the baseline with this run.
+# Sizes whose projected time exceeds MAX_RUN_SECONDS or whose projected peak RSS
+# exceeds MAX_RUN_MEMORY of the physical memory are skipped and listed as such.
+#-------------------------------------------------------------------------------
+import os, sys, json, math, time, shutil, tempfile, subprocess, optparse
+
+TOOLS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(TOOLS_FOLDER, 'Offline', 'BenchmarkBaseline.json')
+BASELINE_VERSION = 1
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000] # the generated program takes about 4 kB per motion statement
+EXTERNAL_AXES = 2
+ROBOT_JOINTS = {'Kassow':7}
+REGRESSION_LIMIT = 0.8 # statements/s below this share of baseline is a regression
+MAX_RUN_SECONDS = 600.0 # larger sizes are skipped when their projected time is above this
+MAX_RUN_MEMORY = 0.8 # share of physical memory, larger sizes are skipped when their projected peak RSS is above
+RESULT_PREFIX = 'BENCHMARK_RESULT '
+
+
+def getPeakRss():
+  # Peak resident set size of this process in bytes, None if unknown (Windows)
+  try:
+    import resource
+  except ImportError:
+    return None
+  rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  if sys.platform == 'darwin':
+    return rss
+  return rss * 1024
+
+
+def getPhysicalMemory():
+  # Physical memory in bytes, None if unknown (Windows)
+  try:
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+  except (AttributeError, ValueError, OSError):
+    return None
+
+
+def countSchemaReads():
+  # Count getSchemaValue calls of the stand-in statements
+  import VcModel
+  counter = {'calls':0}
+  get = VcModel.Statement.getSchemaValue
+  def getSchemaValue(self, index, name):
+    counter['calls'] += 1
+    return get(self, index, name)
+  VcModel.Statement.getSchemaValue = getSchemaValue
+  return counter
+
+
+def runOne(manufacturer, size, folder):
+  # Generate program and run one translator into folder/job/. Returns result dictionary.
+  import Replay
+  Replay.installStandIns()
+  import SyntheticProgram, BatchPostProcess, Timing
+  start = time.time()
+  session = SyntheticProgram.generateProgram(size, external_axes = EXTERNAL_AXES,
+    robot_joints = ROBOT_JOINTS.get(manufacturer, 6))
+  result = {'translator':manufacturer, 'size':size, 'statements':Timing.countStatements(session.program),
+    'generate_seconds':time.time() - start, 'generate_rss':getPeakRss()}
+  registry = Replay.getRegistry()
+  schema_reads = countSchemaReads()
+  uri = BatchPostProcess.getOutputUri(registry, manufacturer, os.path.join(folder, 'job'), 'job')
+  summary = {'robot':'', 'translator':manufacturer, 'ok':False, 'seconds':0.0, 'files':[], 'bytes':0}
+  stdout = sys.stdout
+  sys.stdout = open(os.devnull, 'w')
+  try:
+    BatchPostProcess.runTranslator(session.app, registry, manufacturer, session.program, uri, summary)
+  finally:
+    sys.stdout.close()
+    sys.stdout = stdout
+  # Translators may write files they don't report, some with Windows separators
+  # into the parent folder on other platforms. Count everything under folder.
+  files = [os.path.join(root, f) for root, dirs, names in os.walk(folder) for f in names]
+  result['ok'] = summary['ok']
+  result['seconds'] = summary['seconds']
+  result['rate'] = result['statements'] / max(summary['seconds'], 1e-6)
+  result['peak_rss'] = getPeakRss()
+  result['files'] = len(files)
+  result['schema_reads'] = schema_reads['calls']
+  result['bytes'] = sum([n for f, n in Timing.getFileSizes(files)])
+  result['lines'] = countLines(files)
+  return result
+
+
+def countLines(files):
+  # Lines of output files, generated programs are the same in every run
+  count = 0
+  for uri in files:
+    with open(uri, 'rb') as f:
+      for block in iter(lambda: f.read(1048576), ''):
+        count += block.count('\n')
+  return count
+
+
+def runChild(manufacturer, size):
+  # Run one benchmark in a child process, keeps RSS and translator globals separate
+  folder = tempfile.mkdtemp(prefix = 'benchmark_')
+  try:
+    args = [sys.executable, os.path.abspath(__file__), '--child', manufacturer, str(size), folder]
+    process = subprocess.Popen(args, stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+    out, err = process.communicate()
+  finally:
+    shutil.rmtree(folder, True)
+  for line in out.splitlines():
+    if line.startswith(RESULT_PREFIX):
+      return json.loads(line[len(RESULT_PREFIX):])
+  lines = err.strip().splitlines()
+  print 'ERROR: %s with %i statements failed: %s' % (manufacturer, size, lines[-1] if lines else 'no result')
+  return {'translator':manufacturer, 'size':size, 'ok':False}
+
+
+def getScalingExponent(results):
+  # Least squares slope of log(seconds) over log(statements)
+  points = [(math.log(r['statements']), math.log(r['seconds'])) for r in results
+    if r.get('ok') and r['statements'] > 0 and r['seconds'] > 0]
+  if len(points) < 2:
+    return None
+  mean_x = sum([x for x, y in points]) / len(points)
+  mean_y = sum([y for x, y in points]) / len(points)
+  dx = sum([(x - mean_x) ** 2 for x, y in points])
+  if dx == 0:
+    return None
+  return sum([(x - mean_x) * (y - mean_y) for x, y in points]) / dx
+
+
+def getProjectedSeconds(results, size):
+  # Time of the last successful run scaled to size, at least linearly
+  runs = [r for r in results if r.get('ok')]
+  if not runs:
+    return 0.0
+  k = max(getScalingExponent(runs) or 1.0, 1.0)
+  return runs[-1]['seconds'] * (float(size) / runs[-1]['size']) ** k
+
+
+def getProjectedRss(results, size):
+  # Peak RSS of the last successful run scaled linearly to size, None if unknown
+  runs = [r for r in results if r.get('ok') and r.get('peak_rss')]
+  if not runs:
+    return None
+  return runs[-1]['peak_rss'] * float(size) / runs[-1]['size']
+
+
+def getSkipReason(results, size, memory):
+  # Why a size is not run, None to run it
+  seconds = getProjectedSeconds(results, size)
+  if seconds > MAX_RUN_SECONDS:
+    return 'projected %.0f s' % seconds
+  rss = getProjectedRss(results, size)
+  if memory and rss and rss > memory * MAX_RUN_MEMORY:
+    return 'projected %s MB of %s MB memory' % (formatMegabytes(rss), formatMegabytes(memory))
+  return None
+
+
+def loadBaseline(uri):
+  if not os.path.exists(uri):
+    return None
+  with open(uri) as f:
+    data = json.load(f)
+  if data.get('version') != BASELINE_VERSION:
+    return None
+  return data
+
+
+def saveBaseline(uri, results, exponents):
+  data = {'version':BASELINE_VERSION, 'time':time.strftime('%Y-%m-%dT%H:%M:%S'), 'python':sys.version.split()[0],
+    'platform':sys.platform, 'results':results, 'exponents':exponents}
+  with open(uri, 'w') as f:
+    json.dump(data, f, indent = 1, sort_keys = True)
+
+
+def findBaselineResult(baseline, result):
+  if not baseline:
+    return None
+  for r in baseline['results']:
+    if r['translator'] == result['translator'] and r['size'] == result['size']:
+      return r
+  return None
+
+
+def formatMegabytes(value):
+  if value is None:
+    return '-'
+  return '%.1f' % (value / 1048576.0)
+
+
+def printResults(results, exponents, baseline):
+  # Table of runs and scaling exponents, returns list of regressed runs
+  regressions = []
+  more_lines = []
+  print '%-16s %9s %10s %12s %9s %12s %10s %12s %10s %10s' % ('Translator', 'Size', 'Statements', 'Stmts/s', 'RSS (MB)',
+    'Bytes', 'Lines', 'Schema reads', 'Baseline', 'Lines')
+  for r in results:
+    if r.get('skipped'):
+      print '%-16s %9i %10s %s' % (r['translator'], r['size'], 'SKIPPED', r['skipped'])
+      continue
+    if not r.get('ok'):
+      print '%-16s %9i %10s' % (r['translator'], r['size'], 'FAILED')
+      continue
+    change = '-'
+    line_change = '-'
+    base = findBaselineResult(baseline, r)
+    if base and base.get('ok'):
+      ratio = r['rate'] / base['rate']
+      change = '%+.0f%%' % ((ratio - 1.0) * 100.0)
+      if ratio < REGRESSION_LIMIT:
+        change += ' !'
+        regressions.append(r)
+      if 'lines' in base and 'lines' in r:
+        line_change = '%+i' % (r['lines'] - base['lines'])
+        if r['lines'] > base['lines']:
+          line_change += ' !'
+          more_lines.append(r)
+    print '%-16s %9i %10i %12.0f %9s %12i %10s %12s %10s %10s' % (r['translator'], r['size'], r['statements'], r['rate'],
+      formatMegabytes(r['peak_rss']), r['bytes'], r.get('lines', '-'), r.get('schema_reads', '-'), change, line_change)
+  print
+  print '%-16s %9s %10s' % ('Translator', 'Exponent', 'Baseline')
+  for manufacturer in sorted(exponents):
+    k = exponents[manufacturer]
+    base = baseline['exponents'].get(manufacturer) if baseline else None
+    print '%-16s %9s %10s' % (manufacturer, '%.2f' % k if k is not None else '-', '%.2f' % base if base is not None else '-')
+  if regressions:
+    print
+    print 'REGRESSION: %i runs below %i%% of baseline statements/s.' % (len(regressions), REGRESSION_LIMIT * 100)
+  if more_lines:
+    print
+    print 'REGRESSION: %i runs write more lines than baseline.' % (len(more_lines))
+  return regressions + more_lines
+
+
+def benchmark(sizes, manufacturers = None, baseline_uri = BASELINE_FILE, save = False):
+  import Replay
+  registry = Replay.getRegistry()
+  if not manufacturers:
+    manufacturers = registry.keys()
+  results = []
+  exponents = {}
+  memory = getPhysicalMemory()
+  for manufacturer in manufacturers:
+    runs = []
+    for size in sizes:
+      reason = getSkipReason(runs, size, memory)
+      if reason:
+        print 'Skipping %s with %i motion statements, %s.' % (manufacturer, size, reason)
+        runs.append({'translator':manufacturer, 'size':size, 'ok':False, 'skipped':reason})
+        continue
+      print 'Running %s with %i motion statements...' % (manufacturer, size)
+      runs.append(runChild(manufacturer, size))
+    results.extend(runs)
+    exponents[manufacturer] = getScalingExponent(runs)
+  print
+  regressions = printResults(results, exponents, loadBaseline(baseline_uri))
+  if save:
+    saveBaseline(baseline_uri, results, exponents)
+    print 'Baseline saved to "%s".' % (baseline_uri)
+  return results, regressions
+
+
+if __name__ == '__main__':
+  if len(sys.argv) == 5 and sys.argv[1] == '--child':
+    result = runOne(sys.argv[2], int(sys.argv[3]), sys.argv[4])
+    print RESULT_PREFIX + json.dumps(result)
+    sys.exit(0)
+  parser = optparse.OptionParser(usage = 'Benchmark.py [options]')
+  parser.add_option('-s', '--sizes', default = ','.join([str(s) for s in DEFAULT_SIZES]),
+    help = 'comma separated motion statement counts')
+  parser.add_option('-t', '--translators', default = '', help = 'comma separated translators, default all')
+  parser.add_option('-b', '--baseline', default = BASELINE_FILE, help = 'baseline file')
+  parser.add_option('--save', action = 'store_true', default = False, help = 'store results as new baseline')
+  options, args = parser.parse_args()
+  sizes = [int(s) for s in options.sizes.split(',') if s]
+  manufacturers = [t for t in options.translators.split(',') if t]
+  results, regressions = benchmark(sizes, manufacturers, options.baseline, options.save)
+  failed = [r for r in results if not r.get('ok') and not r.get('skipped')]
+  sys.exit(int(bool(regressions or failed)))
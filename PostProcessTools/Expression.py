@@ -0,0 +1,202 @@
+#-------------------------------------------------------------------------------
+# VC expression translation shared by translators.
+#
+# parse() splits a VC condition or value expression into nodes once: names,
+# indexed names (IN[1], R[2]), calls, numbers, string literals, operators and
+# whitespace. A Dialect emits the nodes in vendor syntax: operator and name
+# tables, signal templates for IN[n]/OUT[n] and an optional hook for program
+# variables. Only whole tokens are replaced, so identifiers like POINT or
+# INPUT_OK and text inside string literals are left as they are.
+#
+# ExpressionTranslator keeps translated expressions in an LRU cache keyed by
+# source text and a context (e.g. routine name) for hooks whose result depends
+# on it. Hooks that allocate names (registers, global variables) must give the
+# same result for a name for the rest of the run, cached text is reused
+# without calling them again.
+#
+#   ABB = Dialect(operators = {'==':'=', '!=':'<>', '&&':' AND '}, names = {'True':'TRUE'})
+#   translator = ExpressionTranslator(ABB)
+#   translator.translate('IN[1]==True && Counter != 2')
+#-------------------------------------------------------------------------------
+import re
+from collections import OrderedDict
+
+CACHE_SIZE = 4096
+
+TOKEN = re.compile(r'''
+  (?P<string>"[^"]*"|'[^']*')|
+  (?P<number>\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+)|
+  (?P<name>[A-Za-z_]\w*)|
+  (?P<op>==|!=|<>|<=|>=|&&|\|\||[-+*/%<>=!&|()\[\],])|
+  (?P<space>\s+)|
+  (?P<other>.)''', re.S | re.X)
+
+INDEX = re.compile(r'\s*-?\d+\Z')
+COMPARISONS = ['=', '==', '!=', '<>', '<=', '>=']
+
+
+def tokenize(source):
+  # List of (kind, text), kind is string, number, name, op, space or other
+  return [(match.lastgroup, match.group(0)) for match in TOKEN.finditer(source)]
+
+
+def parse(source):
+  # Nodes of expression. Same as tokens, except that name[integer] is
+  # ('indexed', name, index text) and a name followed by ( is ('call', name).
+  tokens = tokenize(source)
+  nodes = []
+  i = 0
+  count = len(tokens)
+  while i < count:
+    kind, text = tokens[i]
+    if kind == 'name' and i + 1 < count:
+      next_text = tokens[i + 1][1]
+      if next_text == '[':
+        # Index is the text up to ], RE.INT of the translators: spaces, sign and digits
+        end = i + 2
+        while end < count and tokens[end][1] != ']' and end - i < 6:
+          end += 1
+        if end < count and tokens[end][1] == ']':
+          index = ''.join([t[1] for t in tokens[i + 2:end]])
+          if INDEX.match(index):
+            nodes.append(('indexed', text, index))
+            i = end + 1
+            continue
+      elif next_text == '(':
+        nodes.append(('call', text))
+        i += 1
+        continue
+    nodes.append((kind, text))
+    i += 1
+  return nodes
+
+
+class Dialect(object):
+  # Emitter of parsed expressions in one vendor syntax.
+  #   operators       {VC operator: text}, others are copied
+  #   names           {name: text} for literals and keywords (True, False...)
+  #   signals         {signal name: template with %s for index}, e.g. {'IN':'$IN[%s]'}
+  #   signal_names    {name: text} applied when expression uses signals, replaces names
+  #   signal_numbers  {number: text} applied to numbers compared with a signal,
+  #                   e.g. IN[1]==1 -> IN[1]=ON
+  #   strings         function(literal) -> text of string literal
+  #   strip_input, strip_output, collapse  whitespace handling, collapse
+  #                   replaces double spaces once like the replace chains did
+  #   ignore_case     signal names are matched case insensitively
+
+  def __init__(self, operators = None, names = None, signals = None, signal_names = None, signal_numbers = None,
+               strings = None, strip_input = False, strip_output = False, collapse = True, ignore_case = False):
+    self.operators = operators or {}
+    self.names = names or {}
+    self.signals = {}
+    for name, template in (signals or {}).items():
+      self.signals[self.getSignalKey(name, ignore_case)] = template
+    self.signal_names = signal_names or {}
+    self.signal_numbers = signal_numbers or {}
+    self.strings = strings
+    self.strip_input = strip_input
+    self.strip_output = strip_output
+    self.collapse = collapse
+    self.ignore_case = ignore_case
+
+  def getSignalKey(self, name, ignore_case = None):
+    if ignore_case is None:
+      ignore_case = self.ignore_case
+    if ignore_case:
+      return name.upper()
+    return name
+
+  def isSignal(self, node):
+    return node[0] == 'indexed' and self.getSignalKey(node[1]) in self.signals
+
+  def emitNodes(self, nodes, hook = None):
+    # Translated text of nodes. hook(name) translates program variable names and
+    # indexed names that are not signals ('R[1]'), without hook they are kept.
+    names = self.names
+    if self.signal_names and [node for node in nodes if self.isSignal(node)]:
+      names = dict(names)
+      names.update(self.signal_names)
+    numbers = self.signal_numbers
+    operators = self.operators
+    out = []
+    previous = None # previous node that is not whitespace
+    signal_comparison = False
+    for node in nodes:
+      kind = node[0]
+      if kind == 'op' and node[1] in COMPARISONS:
+        signal_comparison = previous is not None and self.isSignal(previous)
+      if kind == 'number' and signal_comparison and previous[-1] in COMPARISONS and node[1] in numbers:
+        out.append(numbers[node[1]])
+      elif kind == 'op':
+        out.append(operators.get(node[1], node[1]))
+      elif kind == 'name':
+        text = node[1]
+        if text in names:
+          out.append(names[text])
+        elif hook:
+          out.append(hook(text))
+        else:
+          out.append(text)
+      elif kind == 'indexed':
+        key = self.getSignalKey(node[1])
+        if key in self.signals:
+          out.append(self.signals[key] % (node[2]))
+        elif hook:
+          out.append(hook('%s[%s]' % (node[1], node[2])))
+        else:
+          out.append('%s[%s]' % (node[1], node[2]))
+      elif kind == 'string' and self.strings:
+        out.append(self.strings(node[1]))
+      else:
+        out.append(node[1])
+      if kind != 'space':
+        previous = node
+    return ''.join(out)
+
+  def emit(self, source, hook = None):
+    if self.strip_input:
+      source = source.strip()
+    text = self.emitNodes(parse(source), hook)
+    if self.collapse:
+      text = text.replace('  ', ' ')
+    if self.strip_output:
+      text = text.strip()
+    return text
+
+
+class LRUCache(object):
+
+  def __init__(self, size = CACHE_SIZE):
+    self.size = size
+    self.values = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+
+  def get(self, key, compute):
+    values = self.values
+    if key in values:
+      self.hits += 1
+      value = values.pop(key)
+    else:
+      self.misses += 1
+      value = compute()
+      if len(values) >= self.size:
+        values.popitem(last = False)
+    values[key] = value
+    return value
+
+
+class ExpressionTranslator(object):
+  # Dialect with cache, create one per post-process run when hooks use run state
+
+  def __init__(self, dialect, cache_size = CACHE_SIZE):
+    self.dialect = dialect
+    self.cache = LRUCache(cache_size)
+
+  def translate(self, source, hook = None, context = None):
+    # Translated source. context is part of the cache key, use it when hook
+    # results depend on more than the name.
+    return self.cache.get((context, source), lambda: self.dialect.emit(source, hook))
+
+  def getStatistics(self):
+    return {'hits':self.cache.hits, 'misses':self.cache.misses, 'entries':len(self.cache.values)}
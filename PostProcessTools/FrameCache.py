@@ -0,0 +1,98 @@
+#-------------------------------------------------------------------------------
+# Base and tool frame values computed once per post-process run.
+#
+# FrameCache(controller) keeps values per (kind, key), where key is a frame
+# name or a tuple of names. Frames don't move during post-processing, so world
+# matrices, node chain walks and external TCP checks that translators did for
+# every motion are done once per frame. Matrices are returned as copies,
+# callers may modify them.
+#
+# Create one cache per postProcess call. hits and misses count lookups.
+#-------------------------------------------------------------------------------
+import vcMatrix
+
+
+def getFrameKey(frame):
+  # Frames are identified by name, None for Null frame
+  if not frame:
+    return None
+  return frame.Name
+
+
+def isMatrix(value):
+  return hasattr(value, 'invert') and hasattr(value, 'getWPR')
+
+
+class FrameCache(object):
+
+  def __init__(self, controller, motiontarget = None):
+    # motiontarget gives SimWorldToRobotWorld, a new one is created if not given
+    self.controller = controller
+    self.motiontarget = motiontarget
+    self.values = {}
+    self.hits = 0
+    self.misses = 0
+
+  def get(self, kind, key, compute):
+    # Cached value of compute() for kind and key
+    cache_key = (kind, key)
+    if cache_key in self.values:
+      self.hits += 1
+      value = self.values[cache_key]
+    else:
+      self.misses += 1
+      value = compute()
+      self.values[cache_key] = value
+    if isMatrix(value):
+      return vcMatrix.new(value)
+    return value
+
+  def getBaseInRobotWorld(self, base):
+    # Base matrix in robot world coordinates
+    def compute():
+      if not base:
+        return vcMatrix.new()
+      if not base.Node:
+        return base.PositionMatrix
+      if not self.motiontarget:
+        self.motiontarget = self.controller.createTarget()
+      ref_m = self.motiontarget.getSimWorldToRobotWorld()
+      ref_m.invert()
+      return ref_m * base.Node.WorldPositionMatrix * base.PositionMatrix
+    return self.get('base_in_robot_world', getFrameKey(base), compute)
+
+  def getToolInFlange(self, tool):
+    # Tool matrix in robot flange coordinates
+    def compute():
+      if not tool:
+        return vcMatrix.new()
+      flange = self.controller.FlangeNode
+      if tool.Node and tool.Node != flange:
+        ref_m = flange.WorldPositionMatrix
+        ref_m.invert()
+        return ref_m * tool.Node.WorldPositionMatrix * tool.PositionMatrix
+      return tool.PositionMatrix
+    return self.get('tool_in_flange', getFrameKey(tool), compute)
+
+  def isOnFlange(self, frame):
+    # True if frame node is robot flange node or below it. False for Null frame
+    # and frames without node.
+    def compute():
+      flange = self.controller.FlangeNode
+      node = frame.Node if frame else None
+      while node:
+        if node == flange:
+          return True
+        node = node.Parent
+      return False
+    return self.get('on_flange', getFrameKey(frame), compute)
+
+  def isExternalTCP(self, base, tool):
+    # Base frame is moved by robot and tool is not: external TCP
+    def compute():
+      tool_on_robot = not tool or not tool.Node or self.isOnFlange(tool)
+      return self.isOnFlange(base) and not tool_on_robot
+    return self.get('external_tcp', (getFrameKey(base), getFrameKey(tool)), compute)
+
+  def getStatistics(self):
+    return {'hits':self.hits, 'misses':self.misses, 'entries':len(self.values)}
@@ -0,0 +1,141 @@
+#-------------------------------------------------------------------------------
+# Robot manufacturer resolution shared by the launchers and batch processing.
+#
+# Lookup order: model stamp (RobotModelID) => BOM description tokens =>
+# controller name. Indexes are built once per set of translator keys from the
+# data file Manufacturers.json next to this module:
+#
+#   "controllers": controller name => manufacturer
+#   "bom_tokens":  extra BOM description token => manufacturer, checked after
+#                  the translator keys (spaces are ignored like in the BOM)
+#   "variants":    model stamp manufacturer + model token => other translator,
+#                  e.g. KUKA LBR models use KUKA-Sunrise
+#
+# Results are memoized per component (name, model stamp, BOM description,
+# controller name).
+#-------------------------------------------------------------------------------
+import os, json
+
+DATA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Manufacturers.json')
+
+# ManufacturerIndex per (translator keys, data file mtime), kept for the whole VC session
+indexes = {}
+
+
+def loadData(path = DATA_FILE):
+  try:
+    with open(path, 'r') as data_file:
+      data = json.load(data_file)
+  except (IOError, ValueError):
+    print 'WARNING: Cannot read manufacturer data "%s".' % (path)
+    data = {}
+  return {
+    'controllers':data.get('controllers', {}),
+    'bom_tokens':data.get('bom_tokens', {}),
+    'variants':data.get('variants', []) }
+
+
+class TokenTrie(object):
+  # Character trie of tokens. find() returns the value of the highest priority token found anywhere in text.
+
+  def __init__(self):
+    self.root = {}
+
+  def add(self, token, value, priority):
+    node = self.root
+    for c in token:
+      node = node.setdefault(c, {})
+    if not None in node:
+      node[None] = (priority, value)
+
+  def find(self, text):
+    best = None
+    for start in range(len(text)):
+      node = self.root
+      for c in text[start:]:
+        node = node.get(c)
+        if node is None:
+          break
+        if None in node and (best is None or node[None][0] < best[0]):
+          best = node[None]
+    if best:
+      return best[1]
+    return None
+
+
+class ManufacturerIndex(object):
+  # Indexed lookup tables for one set of translator keys
+
+  def __init__(self, keys, data):
+    self.keys = set(keys)
+    self.controllers = dict(data['controllers'])
+    self.variants = {}
+    for v in data['variants']:
+      self.variants.setdefault(v['manufacturer'], []).append((v['model_token'], v['translator']))
+    # Translator keys are matched in given order before extra tokens, as the launcher always did
+    self.bom = TokenTrie()
+    priority = 0
+    for key in keys:
+      self.bom.add(key, key, priority)
+      priority += 1
+    for token, manufacturer in sorted(data['bom_tokens'].items()):
+      self.bom.add(token.replace(' ', ''), manufacturer, priority)
+      priority += 1
+    self.resolved = {}
+
+  def resolve(self, controller):
+    comp = controller.Component
+    model_id = ''
+    prop = comp.getProperty('RobotModelID')
+    if prop:
+      model_id = prop.Value
+    bom = comp.BOMdescription
+    memo_key = (comp.Name, model_id, bom, controller.Name)
+    if not memo_key in self.resolved:
+      self.resolved[memo_key] = self.lookup(controller, model_id, bom)
+    return self.resolved[memo_key]
+
+  def lookup(self, controller, model_id, bom):
+    comp = controller.Component
+    manufacturer = ''
+    model = comp.Name
+
+    #Try model stamp
+    if model_id:
+      words = model_id.replace(' ','').split('|')
+      if words and words[0] in self.keys:
+        manufacturer = words[0]
+      if words and len(words) >= 2:
+        model = words[1]
+
+    if not manufacturer:
+      #Try from BOM description
+      key = self.bom.find(bom.replace(' ', ''))
+      if key:
+        return key
+      #Try controller names for big brands
+      return self.controllers.get(controller.Name, '')
+
+    #Alternative languages
+    for token, translator in self.variants.get(manufacturer, []):
+      if token in model:
+        return translator
+    return manufacturer
+
+
+def getIndex(keys):
+  # Shared index for translator keys, rebuilt if data file has changed
+  try:
+    stamp = os.path.getmtime(DATA_FILE)
+  except OSError:
+    stamp = None
+  index_key = (tuple(keys), stamp)
+  if not index_key in indexes:
+    indexes[index_key] = ManufacturerIndex(keys, loadData())
+  return indexes[index_key]
+
+
+def getManufacturer(controller, keys):
+  #Try to figure out robot manufacturer based on the model.
+  #keys are the manufacturers of available translators.
+  return getIndex(keys).resolve(controller)
@@ -0,0 +1,213 @@
+#-------------------------------------------------------------------------------
+# Modal motion parameters shared by translators.
+#
+# Most controllers keep tool, base, speed, acceleration, zone, interpolation
+# mode and payload set until they are set again, so a translator needs to write
+# a parameter only when its value changes. ModalState remembers the values
+# written so far and changed() tells whether a parameter line is needed. Which
+# parameters are modal is a per-vendor policy: parameters that are not in the
+# policy (e.g. one-shot speeds) are reported changed every time.
+#
+# A value is known only while the written program is sure to have set it:
+#
+#   -invalidate() at the start of a routine, it may be called from anywhere.
+#   -Branches of If and Switch start from the values before the statement.
+#    After it only the values that are the same at the end of every branch
+#    are kept, see Branches.
+#   -Loop bodies and called routines keep() a value only if every value they
+#    may set is the same, see Effects. A loop body may run after itself and
+#    the loop may end at a break, so after the loop the values are those the
+#    body started with.
+#   -forget() parameters changed outside the tracker, e.g. tool data redefined
+#    while the controller holds a copy of it.
+#
+#   modal = ModalState.ModalState([ModalState.TOOL, ModalState.SPEED])
+#   if modal.changed(ModalState.TOOL, toolno):
+#     write('$TOOL=TOOL_DATA[%i]' % toolno)
+#-------------------------------------------------------------------------------
+from vcCommand import *
+import StatementIndex, Progress
+
+TOOL = 'Tool'
+BASE = 'Base'
+SPEED = 'Speed'                # Cartesian speed
+JOINT_SPEED = 'JointSpeed'
+ACCEL = 'Accel'                # Cartesian acceleration
+JOINT_ACCEL = 'JointAccel'
+ZONE = 'Zone'
+IPO_MODE = 'IpoMode'
+PAYLOAD = 'Payload'
+
+PARAMETERS = [TOOL, BASE, SPEED, JOINT_SPEED, ACCEL, JOINT_ACCEL, ZONE, IPO_MODE, PAYLOAD]
+
+UNKNOWN = object() # value that can't be told before translation
+
+
+class ModalState(object):
+
+  def __init__(self, modal = PARAMETERS):
+    self.modal = set(modal)
+    self.values = {}
+    self.written = 0
+    self.suppressed = 0
+
+  def isModal(self, name):
+    return name in self.modal
+
+  def isKnown(self, name):
+    return name in self.values
+
+  def get(self, name, default = None):
+    return self.values.get(name, default)
+
+  def changed(self, name, value):
+    # True if parameter must be written, value is then remembered as written
+    if name in self.modal and name in self.values and self.values[name] == value:
+      self.suppressed += 1
+      return False
+    self.values[name] = value
+    self.written += 1
+    return True
+
+  def set(self, name, value):
+    # Parameter was written without changed(), e.g. in routine init
+    self.values[name] = value
+
+  def forget(self, *names):
+    for name in names:
+      self.values.pop(name, None)
+
+  def invalidate(self):
+    self.values = {}
+
+  def keep(self, effects):
+    # Forget values that effects, {name:value} of Effects, may change
+    for name, value in effects.iteritems():
+      if name in self.values and (value is UNKNOWN or value != self.values[name]):
+        del self.values[name]
+
+  def snapshot(self):
+    return dict(self.values)
+
+  def restore(self, values):
+    self.values = dict(values)
+
+  def merge(self, snapshots):
+    # Keep values that are the same in all snapshots
+    values = {}
+    if snapshots:
+      values = dict(snapshots[0])
+      for snapshot in snapshots[1:]:
+        for name in values.keys():
+          if name not in snapshot or snapshot[name] != values[name]:
+            del values[name]
+    self.values = values
+
+  def branches(self):
+    return Branches(self)
+
+  def getStatistics(self):
+    return {'written':self.written, 'suppressed':self.suppressed}
+
+
+class Branches(object):
+  # Values of If/Switch branches. Call enter() before and leave() after each
+  # branch, join() after the statement. complete is False when no branch is
+  # taken on some condition (Switch without default).
+  #
+  #   branches = modal.branches()
+  #   for scope in scopes:
+  #     branches.enter()
+  #     ...
+  #     branches.leave()
+  #   branches.join()
+
+  def __init__(self, state):
+    self.state = state
+    self.entry = state.snapshot()
+    self.exits = []
+
+  def enter(self):
+    self.state.restore(self.entry)
+
+  def leave(self):
+    self.exits.append(self.state.snapshot())
+
+  def join(self, complete = True):
+    exits = list(self.exits)
+    if not complete or not exits:
+      exits.append(self.entry)
+    self.state.merge(exits)
+
+
+def addEffect(effects, name, value):
+  # One value per parameter, UNKNOWN once two values differ
+  if not name in effects:
+    effects[name] = value
+  elif effects[name] is not UNKNOWN and (value is UNKNOWN or value != effects[name]):
+    effects[name] = UNKNOWN
+
+
+class Effects(object):
+  # Values that a loop body or a called routine may set, for ModalState.keep().
+  # statement_values(statement) gives [(name, value)] that the translator
+  # writes or set()s for a statement, UNKNOWN for forget(). Statements of
+  # called routines are included, routine_values are set by every routine.
+  # getScope() and getRoutine() give {name:value}, UNKNOWN where the values
+  # differ. Routines are read once per run.
+  #
+  #   effects = ModalState.Effects(getModalValues)
+  #   modal.keep(effects.getScope(statement.Scope.Statements))
+  #   values = modal.snapshot()
+  #   ...loop body
+  #   modal.restore(values)
+  #
+  # walk(statements) and getCalled(statement) can be given for statements that
+  # aren't VC statements, e.g. ProgramIR records. getCalled gives
+  # (routine name, statements) of a call, None for other statements.
+
+  def __init__(self, statement_values, routine_values = (), walk = None, getCalled = None):
+    self.statement_values = statement_values
+    self.routine_values = list(routine_values)
+    if walk:
+      self.walk = walk
+    if getCalled:
+      self.getCalled = getCalled
+    self.routines = {}
+
+  def walk(self, statements):
+    return StatementIndex.walk([Progress.unwrap(s) for s in statements])
+
+  def getCalled(self, statement):
+    if statement.Type != VC_STATEMENT_CALL:
+      return None
+    routine = StatementIndex.getAttribute(statement, 'Routine')
+    if not routine:
+      return ('', [])
+    return (routine.Name, routine.Statements)
+
+  def getScope(self, statements):
+    effects = {}
+    for statement in self.walk(statements):
+      called = self.getCalled(statement)
+      if called is None:
+        for name, value in self.statement_values(statement):
+          addEffect(effects, name, value)
+      else:
+        for name, value in self.getRoutine(*called).iteritems():
+          addEffect(effects, name, value)
+    return effects
+
+  def getRoutine(self, name, statements):
+    if name in self.routines:
+      effects = self.routines[name]
+      if effects is None:
+        # Recursive call, any value
+        effects = dict([(x, UNKNOWN) for x in PARAMETERS])
+      return effects
+    self.routines[name] = None
+    effects = self.getScope(statements)
+    for x, value in self.routine_values:
+      addEffect(effects, x, value)
+    self.routines[name] = effects
+    return effects
@@ -0,0 +1,189 @@
+#-------------------------------------------------------------------------------
+# Loads a program recording (see Recorder.py) into VcModel stand-ins.
+#
+# load() sets the VC constants of the recording into the vcCommand stand-in,
+# so it has to be called before translators are imported.
+#-------------------------------------------------------------------------------
+import vcMatrix, vcVector, vcCommand
+import VcModel
+import RecordingFormat
+
+
+class NamedObject(object):
+  # VC object of a type that isn't recorded, only its name is known
+  def __init__(self, name):
+    self.Name = name
+
+
+class OfflineSession(object):
+  # Loaded application, command, program and robot controller
+  def __init__(self, app, cmd, program):
+    self.app = app
+    self.cmd = cmd
+    self.program = program
+    self.controller = program.Executor.Controller
+
+
+def decodeMatrix(record):
+  v = record['m']
+  m = vcMatrix.new()
+  m.m = [[v[0], v[3], v[6], v[9]], [v[1], v[4], v[7], v[10]], [v[2], v[5], v[8], v[11]], [0.0, 0.0, 0.0, 1.0]]
+  return m
+
+
+class Loader(object):
+
+  def __init__(self, data):
+    self.data = data
+    self.nodes = {}
+    self.controllers = {}
+    self.routines = {}
+    self.controller = None
+
+  def decode(self, value):
+    if isinstance(value, list):
+      return [self.decode(x) for x in value]
+    if not isinstance(value, dict):
+      return value
+    if 'm' in value:
+      return decodeMatrix(value)
+    if 'v' in value:
+      return vcVector.new(*value['v'])
+    if 'frame' in value:
+      kind, name = value['frame']
+      frames = self.controller.Bases if kind == 'base' else self.controller.Tools
+      for frame in frames:
+        if frame.Name == name:
+          return frame
+      return None
+    if 'routine' in value:
+      return self.routines.get(value['routine'])
+    if 'node' in value:
+      return self.nodes.get(value['node'])
+    return NamedObject(value.get('name', ''))
+
+  def addProperties(self, owner, records):
+    for name, type, value in records:
+      prop = owner.createProperty(type, name)
+      prop.Value = self.decode(value)
+
+  def decodeFields(self, fields):
+    return dict([(str(k), self.decode(v)) for k, v in fields.items()])
+
+  def loadNodes(self):
+    records = self.data['nodes']
+    for r in records:
+      if r['kind'] == 'component':
+        node = VcModel.Component(r['name'], None, decodeMatrix(r['position']), decodeMatrix(r['world']), r['bom'])
+        self.addProperties(node, r['properties'])
+      else:
+        node = VcModel.Node(r['name'], None, decodeMatrix(r['position']), decodeMatrix(r['world']))
+      self.nodes[r['id']] = node
+    for r in records:
+      node = self.nodes[r['id']]
+      node.Parent = self.nodes.get(r['parent'])
+      if r['kind'] == 'node':
+        node.Component = self.nodes.get(r.get('component'))
+      elif node.Parent and node.Parent.Component:
+        node.Parent.Component.ChildComponents.append(node)
+
+  def loadControllers(self):
+    robot_id = self.data['executor']['controller']
+    for r in self.data['controllers']:
+      controller = VcModel.Controller(self.nodes[r['component']], r['name'], r['type'])
+      controller.FlangeNode = self.nodes.get(r['flange'])
+      controller.Joints = [VcModel.Joint(**dict([(str(k), v) for k, v in j.items()])) for j in r['joints']]
+      self.controllers[r['id']] = controller
+      if r['id'] == robot_id:
+        self.controller = controller
+        self.loadRobotController(controller, r)
+
+  def loadFrame(self, r):
+    frame = VcModel.Frame(r['name'], decodeMatrix(r['position']), self.nodes.get(r['node']))
+    self.addProperties(frame, r['properties'])
+    return frame
+
+  def loadRobotController(self, controller, r):
+    controller.Bases = [self.loadFrame(f) for f in r['bases']]
+    controller.Tools = [self.loadFrame(f) for f in r['tools']]
+    controller.WorldTransformMatrix = decodeMatrix(r['world_transform'])
+    controller.MaxCartesianAccel = r['max_cartesian_accel']
+    controller.robot_world = decodeMatrix(r['robot_world'])
+    controller.target_defaults = self.decodeFields(r['target_defaults'])
+    controller.base_matrices = dict([(k, self.decode(v)) for k, v in r['base_matrices'].items()])
+    controller.tool_matrices = dict([(k, self.decode(v)) for k, v in r['tool_matrices'].items()])
+    for base_name, tool_name, target, joints, config, turns in r['solutions']:
+      controller.addSolution(base_name, tool_name, decodeMatrix(target), joints, config, turns)
+
+  def loadStatements(self, routine, records, scope):
+    for r in records:
+      scope.Statements.append(self.loadStatement(routine, r))
+
+  def loadStatement(self, routine, r):
+    statement = VcModel.Statement(routine, r['type'], r['name'])
+    self.addProperties(statement, r['properties'])
+    for name, value in r['attributes'].items():
+      setattr(statement, str(name), self.decode(value))
+    for p in r.get('positions', []):
+      position = VcModel.Position(p['name'], decodeMatrix(p['position']))
+      self.addProperties(position, p['properties'])
+      for name, value in p['attributes'].items():
+        setattr(position, str(name), self.decode(value))
+      statement.Positions.append(position)
+    if 'schema' in r:
+      properties = [VcModel.Property(type, name) for name, type in r['schema']['properties']]
+      names = [p.Name for p in properties]
+      rows = [dict(zip(names, [self.decode(v) for v in row])) for row in r['schema']['rows']]
+      statement.setSchema(properties, rows)
+    for name, records in r.get('scopes', {}).items():
+      self.loadStatements(routine, records, statement.createScope(str(name)))
+    if 'elseifs' in r:
+      statement.ElseIfScopes = []
+      for s in r['elseifs']:
+        scope = VcModel.Scope(statement, routine)
+        scope.Condition = s['condition']
+        self.loadStatements(routine, s['statements'], scope)
+        statement.ElseIfScopes.append(scope)
+    if 'cases' in r:
+      statement.Cases = []
+      for s in r['cases']:
+        scope = VcModel.Scope(statement, routine)
+        scope.CaseCondition = s['condition']
+        self.loadStatements(routine, s['statements'], scope)
+        statement.Cases.append(scope)
+    if 'target' in r:
+      statement.target = self.decodeFields(r['target'])
+    return statement
+
+  def load(self):
+    vcCommand.setConstants(dict([(str(k), v) for k, v in self.data['constants'].items()]))
+    self.loadNodes()
+    self.loadControllers()
+    e = self.data['executor']
+    component = self.nodes[e['component']]
+    executor = VcModel.Executor(component, self.controller, e['name'])
+    program = VcModel.Program(executor)
+    routines = []
+    for r in self.data['routines']:
+      if not routines:
+        routine = program.MainRoutine
+        routine.Name = r['name']
+      else:
+        routine = VcModel.Routine(program, r['name'])
+        program.Routines.append(routine)
+      self.routines[r['name']] = routine
+      routines.append((routine, r))
+    for routine, r in routines:
+      self.addProperties(routine, r['properties'])
+      self.loadStatements(routine, r['statements'], routine)
+
+    app = VcModel.Application(self.data['app']['ProductVersion'], self.nodes.get(self.data['world']))
+    app.Simulation.Components = [n for n in self.nodes.values() if isinstance(n, VcModel.Component) and n.Parent is app.Simulation.World]
+    cmd = VcModel.Command()
+    self.addProperties(cmd, self.data['command'])
+    vcCommand.setSession(app, cmd)
+    return OfflineSession(app, cmd, program)
+
+
+def load(uri):
+  return Loader(RecordingFormat.readFile(uri)).load()
@@ -0,0 +1,263 @@
+#-------------------------------------------------------------------------------
+# Generated robot programs for benchmarks, built from VcModel stand-ins.
+#
+# generateProgram(n) creates a program with about n motion statements in a
+# repeating mix of PTP/LIN motions, paths, nested If/While/SwitchCase, calls,
+# IO, DefineBase/DefineTool and optional external axes. Output only depends
+# on the arguments.
+#-------------------------------------------------------------------------------
+import random
+import vcMatrix, vcCommand
+import VcModel
+from Recording import OfflineSession
+
+PRODUCT_VERSION = '4.4.0'
+PATH_POINTS = 10 # schema rows per path statement
+BLOCK_MOTIONS = 40 # motion statements (path points included) per generated block
+SUB_ROUTINES = 4
+FRAME_COUNT = 16 # robot base and tool frames, statements use the first USED_FRAMES
+USED_FRAMES = 3
+
+
+def createPosition(rng):
+  m = vcMatrix.new()
+  m.translateAbs(rng.uniform(300.0, 1200.0), rng.uniform(-600.0, 600.0), rng.uniform(100.0, 1200.0))
+  m.setWPR(rng.uniform(-180.0, 180.0), rng.uniform(-10.0, 10.0), rng.uniform(-180.0, 180.0))
+  return m
+
+
+def createJointValues(rng, count):
+  return [round(rng.uniform(-170.0, 170.0), 3) for i in range(count)]
+
+
+class ProgramGenerator(object):
+
+  def __init__(self, seed = 0, external_axes = 0, robot_joints = 6):
+    self.rng = random.Random(seed)
+    self.external_axes = external_axes
+    self.robot_joints = robot_joints
+    self.point_count = 0
+    world = VcModel.Node('World')
+    self.app = VcModel.Application(PRODUCT_VERSION, world)
+    self.cmd = VcModel.Command()
+    self.createRobot(world)
+
+  def createRobot(self, world):
+    c = vcCommand
+    comp = VcModel.Component('Generic Robot', world, vcMatrix.new(), bom = 'Generic 6-axis robot')
+    self.app.Simulation.Components.append(comp)
+    prop = comp.createProperty(c.VC_STRING, 'RobotModelID')
+    prop.Value = 'Generic|GR-6'
+    self.comp = comp
+    controller = VcModel.Controller(comp, 'Controller')
+    flange_pos = vcMatrix.new()
+    flange_pos.translateAbs(0.0, 0.0, 1500.0)
+    controller.FlangeNode = VcModel.Node('mountplate', comp, flange_pos)
+    controller.FlangeNode.Component = comp
+    for i in range(self.robot_joints):
+      controller.Joints.append(VcModel.Joint('J%i' % (i + 1), MaxSpeed = 180.0, MaxAcceleration = 720.0))
+    for i in range(self.external_axes):
+      controller.Joints.append(VcModel.Joint('E%i' % (i + 1), Type = c.VC_JOINT_TRANSLATIONAL, MaxSpeed = 1000.0,
+        MaxAcceleration = 2000.0, ExternalController = 'Track'))
+    for i in range(FRAME_COUNT):
+      m = createPosition(self.rng)
+      controller.Bases.append(VcModel.Frame('Uframe%i' % (i + 1), m))
+      controller.base_matrices['Uframe%i' % (i + 1)] = m
+    for i in range(FRAME_COUNT):
+      m = vcMatrix.new()
+      m.translateAbs(0.0, 0.0, 100.0 + 10.0 * i)
+      tool = VcModel.Frame('Tool%i' % (i + 1), m)
+      tool.createProperty(c.VC_INTEGER, 'IPOMode').Value = 0
+      controller.Tools.append(tool)
+      controller.tool_matrices['Tool%i' % (i + 1)] = m
+    controller.base_matrices[''] = vcMatrix.new()
+    controller.tool_matrices[''] = vcMatrix.new()
+    controller.target_defaults['JointValues'] = [0.0] * len(controller.Joints)
+    self.controller = controller
+    self.executor = VcModel.Executor(comp, controller)
+    self.program = VcModel.Program(self.executor)
+
+  # Statements
+  def add(self, scope, routine, type, name = ''):
+    statement = VcModel.Statement(routine, type, name)
+    scope.Statements.append(statement)
+    return statement
+
+  def setFrames(self, statement):
+    c = vcCommand
+    rng = self.rng
+    base = rng.choice([None] + self.controller.Bases[:USED_FRAMES])
+    tool = rng.choice(self.controller.Tools[:USED_FRAMES])
+    statement.setProperty(c.VC_STRING, 'Base', base)
+    statement.setProperty(c.VC_STRING, 'Tool', tool)
+    statement.setProperty(c.VC_BOOLEAN, 'ExternalTCP', False)
+    return (base.Name if base else ''), tool.Name
+
+  def addMotion(self, scope, routine, linear):
+    c = vcCommand
+    rng = self.rng
+    self.point_count += 1
+    type = c.VC_STATEMENT_LINMOTION if linear else c.VC_STATEMENT_PTPMOTION
+    statement = self.add(scope, routine, type, 'P%i' % self.point_count)
+    base_name, tool_name = self.setFrames(statement)
+    accuracy = rng.choice([0.0, 0.0, 5.0, 50.0])
+    statement.setProperty(c.VC_INTEGER, 'AccuracyMethod', c.VC_MOTIONTARGET_AM_DISTANCE)
+    statement.setProperty(c.VC_REAL, 'AccuracyValue', accuracy)
+    if linear:
+      speed = rng.choice([100.0, 250.0, 500.0, 1000.0])
+      statement.setProperty(c.VC_REAL, 'MaxSpeed', speed)
+      statement.setProperty(c.VC_REAL, 'Acceleration', 2000.0)
+      statement.setProperty(c.VC_REAL, 'Deceleration', 2000.0)
+    else:
+      speed = rng.choice([0.1, 0.5, 1.0])
+      statement.setProperty(c.VC_REAL, 'JointSpeed', speed)
+      statement.setProperty(c.VC_REAL, 'JointForce', 1.0)
+    statement.setProperty(c.VC_REAL, 'CycleTime', 0.0)
+    target = createPosition(rng)
+    joints = createJointValues(rng, len(self.controller.Joints))
+    position = VcModel.Position(statement.Name, target)
+    position.createProperty(c.VC_STRING, 'JointValues').Value = joints
+    position.ExternalJointValues = joints[self.robot_joints:]
+    statement.Positions.append(position)
+    config = rng.choice([0, 1, 4])
+    statement.target = {
+      'MotionType':c.VC_MOTIONTARGET_MT_LINEAR if linear else c.VC_MOTIONTARGET_MT_JOINT,
+      'TargetMode':c.VC_MOTIONTARGET_TM_NORMAL, 'JointTurnMode':c.VC_MOTIONTARGET_TURN_NEAREST,
+      'BaseName':base_name, 'ToolName':tool_name, 'Target':target, 'JointValues':joints,
+      'RobotConfig':config, 'JointTurns':0,
+      'CartesianSpeed':speed if linear else 1000.0, 'CartesianAcceleration':2000.0, 'CartesianDeceleration':2000.0,
+      'JointSpeedFactor':1.0 if linear else speed, 'AccuracyMethod':c.VC_MOTIONTARGET_AM_DISTANCE,
+      'AccuracyValue':accuracy,
+      'BaseMatrix':self.controller.base_matrices[base_name], 'ToolMatrix':self.controller.tool_matrices[tool_name]}
+    self.controller.addSolution(base_name, tool_name, target, joints, config)
+    return statement
+
+  def addPath(self, scope, routine, points):
+    c = vcCommand
+    rng = self.rng
+    self.point_count += 1
+    statement = self.add(scope, routine, c.VC_STATEMENT_PATH, 'Path%i' % self.point_count)
+    base_name, tool_name = self.setFrames(statement)
+    statement.ExternalJointCount = self.external_axes
+    names = [('Position', c.VC_MATRIX), ('MaxSpeed', c.VC_REAL), ('Acceleration', c.VC_REAL),
+      ('Deceleration', c.VC_REAL), ('AccuracyMethod', c.VC_INTEGER), ('AccuracyValue', c.VC_REAL)]
+    names += [('E%i' % (i + 1), c.VC_REAL) for i in range(self.external_axes)]
+    rows = []
+    for i in range(points):
+      target = createPosition(rng)
+      row = {'Position':target, 'MaxSpeed':rng.choice([100.0, 250.0]), 'Acceleration':2000.0, 'Deceleration':2000.0,
+        'AccuracyMethod':c.VC_MOTIONTARGET_AM_DISTANCE, 'AccuracyValue':rng.choice([0.0, 2.0])}
+      for j in range(self.external_axes):
+        row['E%i' % (j + 1)] = round(rng.uniform(0.0, 3000.0), 3)
+      rows.append(row)
+      self.controller.addSolution(base_name, tool_name, target, createJointValues(rng, len(self.controller.Joints)))
+    statement.setSchema([VcModel.Property(t, n) for n, t in names], rows)
+    return statement
+
+  def addLogic(self, scope, routine, depth, routines):
+    # One of the non-motion statements
+    c = vcCommand
+    rng = self.rng
+    kind = rng.randint(0, 9)
+    if kind == 0:
+      self.add(scope, routine, c.VC_STATEMENT_COMMENT).setProperty(c.VC_STRING, 'Comment', 'Generated comment')
+    elif kind == 1:
+      s = self.add(scope, routine, c.VC_STATEMENT_SETBIN)
+      s.setProperty(c.VC_INTEGER, 'OutputPort', rng.randint(1, 16))
+      s.setProperty(c.VC_BOOLEAN, 'OutputValue', rng.choice([True, False]))
+    elif kind == 2:
+      s = self.add(scope, routine, c.VC_STATEMENT_WAITBIN)
+      s.setProperty(c.VC_INTEGER, 'InputPort', rng.randint(1, 16))
+      s.setProperty(c.VC_BOOLEAN, 'InputValue', True)
+    elif kind == 3:
+      self.add(scope, routine, c.VC_STATEMENT_DELAY).setProperty(c.VC_REAL, 'Delay', 0.5)
+    elif kind == 4 and routines:
+      self.add(scope, routine, c.VC_STATEMENT_CALL).setProperty(c.VC_STRING, 'Routine', rng.choice(routines))
+    elif kind == 5:
+      s = self.add(scope, routine, c.VC_STATEMENT_DEFINE_BASE)
+      base = rng.choice(self.controller.Bases[:USED_FRAMES])
+      s.setProperty(c.VC_STRING, 'Base', base)
+      s.setProperty(c.VC_STRING, 'Node', None)
+      s.setProperty(c.VC_MATRIX, 'Position', base.PositionMatrix)
+      s.setProperty(c.VC_BOOLEAN, 'IsRelative', False)
+    elif kind == 6:
+      s = self.add(scope, routine, c.VC_STATEMENT_DEFINE_TOOL)
+      tool = rng.choice(self.controller.Tools[:USED_FRAMES])
+      s.setProperty(c.VC_STRING, 'Tool', tool)
+      s.setProperty(c.VC_STRING, 'Node', None)
+      s.setProperty(c.VC_MATRIX, 'Position', tool.PositionMatrix)
+      s.setProperty(c.VC_BOOLEAN, 'IsRelative', False)
+    elif kind == 7:
+      s = self.add(scope, routine, c.VC_STATEMENT_SETPROPERTY)
+      s.setProperty(c.VC_STRING, 'TargetProperty', 'Counter')
+      s.setProperty(c.VC_STRING, 'ValueExpression', 'Counter + 1')
+    elif kind == 8:
+      self.add(scope, routine, c.VC_STATEMENT_PRINT).setProperty(c.VC_STRING, 'Message', 'Generated message')
+    else:
+      self.add(scope, routine, c.VC_STATEMENT_COMMENT).setProperty(c.VC_STRING, 'Comment', 'Block %i' % depth)
+
+  def addBlock(self, scope, routine, motions, depth, routines):
+    # Statements with about given number of motions (path points included)
+    c = vcCommand
+    rng = self.rng
+    while motions > 0:
+      kind = rng.randint(0, 11)
+      if kind < 4:
+        self.addMotion(scope, routine, False)
+        motions -= 1
+      elif kind < 8:
+        self.addMotion(scope, routine, True)
+        motions -= 1
+      elif kind == 8 and motions >= PATH_POINTS:
+        self.addPath(scope, routine, PATH_POINTS)
+        motions -= PATH_POINTS
+      elif kind == 9 and depth < 2 and motions > 4:
+        s = self.add(scope, routine, c.VC_STATEMENT_IF)
+        s.setProperty(c.VC_STRING, 'Condition', 'Counter==%i' % rng.randint(1, 16))
+        self.addBlock(s.createScope('ThenScope'), routine, 2, depth + 1, routines)
+        s.ElseIfScopes = []
+        self.addBlock(s.createScope('ElseScope'), routine, 1, depth + 1, routines)
+        motions -= 3
+      elif kind == 10 and depth < 2 and motions > 4:
+        s = self.add(scope, routine, c.VC_STATEMENT_WHILE)
+        s.setProperty(c.VC_STRING, 'Condition', 'Counter < 10')
+        self.addBlock(s.createScope('Scope'), routine, 2, depth + 1, routines)
+        motions -= 2
+      elif kind == 11 and depth < 2 and motions > 4:
+        s = self.add(scope, routine, c.VC_STATEMENT_SWITCHCASE)
+        s.setProperty(c.VC_STRING, 'Condition', 'Counter')
+        s.Cases = []
+        for condition in ('1', '2', 'Default'):
+          case = VcModel.Scope(s, routine)
+          case.CaseCondition = condition
+          self.addBlock(case, routine, 1, depth + 1, routines)
+          s.Cases.append(case)
+        motions -= 3
+      else:
+        self.addLogic(scope, routine, depth, routines)
+
+  def generate(self, motion_count):
+    c = vcCommand
+    program = self.program
+    routines = []
+    for i in range(SUB_ROUTINES):
+      routine = VcModel.Routine(program, 'Sub%i' % (i + 1))
+      program.Routines.append(routine)
+      routines.append(routine)
+    for routine in [program.MainRoutine] + routines:
+      routine.createProperty(c.VC_INTEGER, 'Counter').Value = 0
+    sub_motions = max(1, motion_count / 10 / SUB_ROUTINES)
+    for routine in routines:
+      self.addBlock(routine, routine, sub_motions, 0, [])
+    main_motions = max(1, motion_count - sub_motions * SUB_ROUTINES)
+    while main_motions > 0:
+      block = min(BLOCK_MOTIONS, main_motions)
+      self.addBlock(program.MainRoutine, program.MainRoutine, block, 0, routines)
+      main_motions -= block
+    vcCommand.setSession(self.app, self.cmd)
+    return OfflineSession(self.app, self.cmd, program)
+
+
+def generateProgram(motion_count, seed = 0, external_axes = 0, robot_joints = 6):
+  # OfflineSession with a generated program of about motion_count motion statements
+  return ProgramGenerator(seed, external_axes, robot_joints).generate(motion_count)
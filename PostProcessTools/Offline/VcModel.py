@@ -0,0 +1,466 @@
+#-------------------------------------------------------------------------------
+# Pure python stand-ins for the VC objects translators use: application,
+# command, program, routines, statements, components, nodes, controllers and
+# motion targets.
+#
+# Objects only hold data. Motion targets have no kinematics; setting Target
+# or JointValues looks up solutions stored on the controller (addSolution),
+# otherwise the other side keeps its previous value.
+#-------------------------------------------------------------------------------
+import struct
+import vcMatrix, vcVector
+import vcCommand
+
+TARGET_FIELD_NAMES = {} # shared field name tuples of statement targets
+MOTIONTARGET_DEFAULTS = {
+  'MotionType':'VC_MOTIONTARGET_MT_JOINT', 'TargetMode':'VC_MOTIONTARGET_TM_NORMAL',
+  'JointTurnMode':'VC_MOTIONTARGET_TURN_NEAREST', 'AccuracyMethod':'VC_MOTIONTARGET_AM_DISTANCE',
+  'BaseName':'', 'ToolName':'', 'RobotConfig':0, 'JointTurns':0, 'CartesianSpeed':1000.0,
+  'CartesianAcceleration':1000.0, 'CartesianDeceleration':1000.0, 'AngularSpeed':360.0,
+  'JointSpeedFactor':1.0, 'AccuracyValue':0.0 }
+
+
+def copyValue(value):
+  # Matrices and lists are handed out as copies like the VC API does
+  if isinstance(value, vcMatrix.vcMatrix):
+    return vcMatrix.new(value)
+  if isinstance(value, vcVector.vcVector):
+    return vcVector.new(value)
+  if isinstance(value, list):
+    return list(value)
+  return value
+
+
+def packKey(values, digits):
+  # Rounded values packed to a string, much smaller than a tuple of floats.
+  # Adding 0.0 turns -0.0 into 0.0 so they compare equal like in a tuple.
+  return struct.pack('%id' % len(values), *[round(x, digits) + 0.0 for x in values])
+
+
+def poseKey(m):
+  return packKey([x for row in m.m[:3] for x in row], 3)
+
+
+def jointsKey(values):
+  return packKey(values, 4)
+
+
+def matrixProperty(name):
+  # Attribute that stores a matrix and returns copies
+  return property(lambda self: vcMatrix.new(getattr(self, name)), lambda self, m: setattr(self, name, vcMatrix.new(m)))
+
+
+class Property(object):
+  # Slots and class defaults keep the many statement properties of generated
+  # programs small, other settings go to __dict__ when changed.
+  __slots__ = ('Type', 'Name', 'Value', '__dict__')
+  Constraints = None
+  OnChanged = None
+  MinValue = 0
+  MaxValue = 0
+  IsVisible = True
+  WritableWhenConnected = True
+  WritableWhenDisconnected = True
+  WritableWhenSimulating = True
+
+  def __init__(self, type, name, value = None, constraints = None):
+    self.Type = type
+    self.Name = name
+    self.Value = value
+    if constraints is not None:
+      self.Constraints = constraints
+
+  StepValues = property(lambda self: list(self.__dict__.get('step_values', [])),
+    lambda self, values: self.__dict__.__setitem__('step_values', list(values)))
+
+
+class PropertyOwner(object):
+
+  def __init__(self):
+    self.Properties = []
+
+  def getProperty(self, name):
+    for prop in self.Properties:
+      if prop.Name == name:
+        return prop
+    return None
+
+  def createProperty(self, type, name, constraints = None):
+    prop = Property(type, name, None, constraints)
+    self.Properties.append(prop)
+    return prop
+
+  def deleteProperty(self, prop):
+    if prop in self.Properties:
+      self.Properties.remove(prop)
+
+
+class Application(object):
+
+  def __init__(self, product_version = '4.0', world = None):
+    self.ProductVersion = product_version
+    self.Simulation = Simulation(world)
+
+  def findCommand(self, name):
+    return None
+
+  def messageBox(self, message, caption = '', *args):
+    print '%s: %s' % (caption, message)
+    return True
+
+  def render(self):
+    pass
+
+
+class Simulation(object):
+
+  def __init__(self, world = None):
+    if world is None:
+      world = Node('World')
+    self.World = world
+    self.Components = []
+
+
+class Command(PropertyOwner):
+
+  def __init__(self, name = 'PostProcessLauncher'):
+    PropertyOwner.__init__(self)
+    self.Name = name
+
+
+class Node(PropertyOwner):
+
+  def __init__(self, name, parent = None, position = None, world = None):
+    PropertyOwner.__init__(self)
+    self.Name = name
+    self.Parent = parent
+    self.Component = None
+    self._position = vcMatrix.new(position)
+    if world is None:
+      world = vcMatrix.new(position)
+      if parent:
+        world = parent.WorldPositionMatrix * world
+    self._world = vcMatrix.new(world)
+
+  PositionMatrix = matrixProperty('_position')
+  WorldPositionMatrix = matrixProperty('_world')
+
+  @property
+  def InverseWorldPositionMatrix(self):
+    m = vcMatrix.new(self._world)
+    m.invert()
+    return m
+
+
+class Component(Node):
+
+  def __init__(self, name, parent = None, position = None, world = None, bom = ''):
+    Node.__init__(self, name, parent, position, world)
+    self.Component = self
+    self.BOMdescription = bom
+    self.Behaviours = []
+    self.ChildComponents = []
+
+  def findBehavioursByType(self, type):
+    return [b for b in self.Behaviours if b.Type == type]
+
+  getBehavioursByType = findBehavioursByType
+
+  def findBehaviour(self, name):
+    for b in self.Behaviours:
+      if b.Name == name:
+        return b
+    return None
+
+
+class Behaviour(object):
+
+  def __init__(self, component, name, type):
+    self.Component = component
+    self.Name = name
+    self.Type = type
+    component.Behaviours.append(self)
+
+
+class PropertyAttributes(PropertyOwner):
+  # Properties are also readable as attributes, e.g. statement.Base
+
+  def __getattr__(self, name):
+    if name.startswith('_') or name == 'Properties':
+      raise AttributeError(name)
+    for prop in self.Properties:
+      if prop.Name == name:
+        return copyValue(prop.Value)
+    raise AttributeError(name)
+
+
+class Frame(PropertyAttributes):
+
+  def __init__(self, name, position = None, node = None):
+    PropertyAttributes.__init__(self)
+    self.Name = name
+    self.Node = node
+    self._position = vcMatrix.new(position)
+
+  PositionMatrix = matrixProperty('_position')
+
+
+class Joint(object):
+
+  def __init__(self, name = '', **attributes):
+    self.Name = name
+    self.Type = vcCommand.VC_JOINT_ROTATIONAL
+    self.Value = 0.0
+    self.MaxSpeed = 0.0
+    self.MaxAcceleration = 0.0
+    self.ExternalController = ''
+    for key, value in attributes.items():
+      setattr(self, key, value)
+
+
+class Controller(Behaviour):
+
+  def __init__(self, component, name, type = None):
+    if type is None:
+      type = vcCommand.VC_ROBOTCONTROLLER
+    Behaviour.__init__(self, component, name, type)
+    self.Joints = []
+    self.Bases = []
+    self.Tools = []
+    self.FlangeNode = None
+    self._world_transform = vcMatrix.new()
+    self.MaxCartesianAccel = 0.0
+    self.robot_world = component.WorldPositionMatrix
+    self.target_defaults = {}
+    for key, value in MOTIONTARGET_DEFAULTS.items():
+      self.target_defaults[key] = getattr(vcCommand, value, value) if isinstance(value, str) and value.startswith('VC_') else value
+    self.target_defaults['Target'] = vcMatrix.new()
+    self.base_matrices = {}
+    self.tool_matrices = {}
+    self.ik = {}
+    self.fk = {}
+    self.target_count = 0
+
+  WorldTransformMatrix = matrixProperty('_world_transform')
+
+  def addSolution(self, base_name, tool_name, target, joints, config = 0, turns = 0):
+    # Store kinematics result used by motion targets. Values are kept as given,
+    # motion targets copy them when a solution is used.
+    self.ik[(base_name, tool_name, poseKey(target))] = (joints, config, turns)
+    self.fk[(base_name, tool_name, jointsKey(joints))] = (target, config, turns)
+
+  def createTarget(self):
+    self.target_count += 1
+    target = MotionTarget(self)
+    if not 'JointValues' in self.target_defaults:
+      target._assign({'JointValues':[j.Value for j in self.Joints]})
+    return target
+
+  def clearTargets(self):
+    self.target_count = 0
+
+  def moveImmediate(self, motiontarget):
+    for joint, value in zip(self.Joints, motiontarget.JointValues):
+      joint.Value = value
+
+
+class Executor(Behaviour):
+
+  def __init__(self, component, controller, name = 'Executor'):
+    Behaviour.__init__(self, component, name, vcCommand.VC_ROBOTEXECUTOR)
+    self.Controller = controller
+    self.Program = None
+
+
+class MotionTarget(object):
+
+  def __init__(self, controller):
+    object.__setattr__(self, '_controller', controller)
+    object.__setattr__(self, '_fields', {})
+    self._assign(controller.target_defaults)
+
+  def _assign(self, fields):
+    # Set fields without kinematics, used by statement.writeToTarget
+    own = object.__getattribute__(self, '_fields')
+    for key, value in fields.items():
+      own[key] = copyValue(value)
+    if 'BaseName' in fields and not 'BaseMatrix' in fields:
+      self._updateFrames()
+
+  def _updateFrames(self):
+    own = object.__getattribute__(self, '_fields')
+    controller = object.__getattribute__(self, '_controller')
+    own['BaseMatrix'] = vcMatrix.new(controller.base_matrices.get(own.get('BaseName'), None))
+    own['ToolMatrix'] = vcMatrix.new(controller.tool_matrices.get(own.get('ToolName'), None))
+
+  def __getattr__(self, name):
+    own = object.__getattribute__(self, '_fields')
+    if not name in own:
+      raise AttributeError(name)
+    return copyValue(own[name])
+
+  def __setattr__(self, name, value):
+    own = object.__getattribute__(self, '_fields')
+    controller = object.__getattribute__(self, '_controller')
+    own[name] = copyValue(value)
+    key = (own.get('BaseName', ''), own.get('ToolName', ''))
+    if name == 'Target':
+      solution = controller.ik.get(key + (poseKey(value),))
+      if solution:
+        own['JointValues'], own['RobotConfig'], own['JointTurns'] = list(solution[0]), solution[1], solution[2]
+    elif name == 'JointValues':
+      solution = controller.fk.get(key + (jointsKey(value),))
+      if solution:
+        own['Target'], own['RobotConfig'], own['JointTurns'] = vcMatrix.new(solution[0]), solution[1], solution[2]
+    elif name in ('BaseName', 'ToolName'):
+      self._updateFrames()
+
+  def getSimWorldToRobotWorld(self):
+    return vcMatrix.new(object.__getattribute__(self, '_controller').robot_world)
+
+  def getSimWorldToRobotTool(self):
+    own = object.__getattribute__(self, '_fields')
+    return self.getSimWorldToRobotWorld() * own.get('BaseMatrix', vcMatrix.new()) * own['Target']
+
+
+class Program(object):
+
+  def __init__(self, executor):
+    self.Executor = executor
+    executor.Program = self
+    self.MainRoutine = Routine(self, 'Main')
+    self.Routines = []
+
+  def findRoutine(self, name):
+    for routine in [self.MainRoutine] + self.Routines:
+      if routine.Name == name:
+        return routine
+    return None
+
+
+class Scope(object):
+
+  def __init__(self, parent_statement = None, routine = None):
+    self.Statements = []
+    self.ParentStatement = parent_statement
+    self.ParentRoutine = routine
+    self.Condition = ''
+    self.CaseCondition = ''
+
+
+class Routine(PropertyOwner):
+
+  def __init__(self, program, name):
+    PropertyOwner.__init__(self)
+    self.Program = program
+    self.Name = name
+    self.Statements = []
+    self.ParentRoutine = self
+
+
+class Statement(PropertyAttributes):
+  # Common attributes in slots, scopes and schema data go to __dict__
+  __slots__ = ('Properties', 'Type', 'Name', 'ParentRoutine', 'Positions', '_target_names', '_target_values')
+
+  def __init__(self, routine, type, name = ''):
+    PropertyAttributes.__init__(self)
+    self.Type = type
+    self.Name = name
+    self.ParentRoutine = routine
+    self.Positions = []
+    self.target = None
+
+  def setProperty(self, type, name, value):
+    prop = self.getProperty(name)
+    if not prop:
+      prop = self.createProperty(type, name)
+    prop.Value = value
+    return prop
+
+  def createScope(self, name):
+    scope = Scope(self, self.ParentRoutine)
+    setattr(self, name, scope)
+    return scope
+
+  # Motion target fields, names are shared by statements and values kept in a tuple
+  def _getTarget(self):
+    if self._target_names is None:
+      return None
+    return dict(zip(self._target_names, self._target_values))
+
+  def _setTarget(self, fields):
+    if fields is None:
+      self._target_names = self._target_values = None
+      return
+    names = tuple(sorted(fields))
+    self._target_names = TARGET_FIELD_NAMES.setdefault(names, names)
+    self._target_values = tuple([fields[name] for name in names])
+
+  target = property(_getTarget, _setTarget)
+
+  def setSchema(self, properties, rows):
+    # properties: [Property], rows: [{name: value}], kept as value tuples in property
+    # order. Rows are also Positions like in VC unless positions were set already.
+    self.SchemaProperties = properties
+    self.schema_names = tuple([p.Name for p in properties])
+    self.schema_rows = [tuple([row.get(name) for name in self.schema_names]) for row in rows]
+    if self.Positions:
+      return
+    for i in range(len(rows)):
+      self.Positions.append(SchemaPosition('%s_%i' % (self.Name, i + 1), self, i))
+
+  def getSchemaSize(self):
+    return len(self.schema_rows)
+
+  def getSchemaValue(self, index, name):
+    if not name in self.schema_names:
+      return None
+    return copyValue(self.schema_rows[index][self.schema_names.index(name)])
+
+  def writeToTarget(self, motiontarget):
+    if self._target_names:
+      motiontarget._assign(self.target)
+
+
+class Position(PropertyAttributes):
+  __slots__ = ('Properties', 'Name', '_position', 'ExternalJointValues')
+
+  def __init__(self, name, position = None):
+    # Position matrix is kept as given, PositionInReference returns copies
+    PropertyAttributes.__init__(self)
+    self.Name = name
+    self._position = position if position is not None else vcMatrix.new()
+    self.ExternalJointValues = []
+
+  PositionInReference = matrixProperty('_position')
+
+
+class SchemaPosition(Position):
+  # Path point that reads its values from the schema row. Properties are only
+  # created when first used, so large generated paths stay small.
+  __slots__ = ('_statement', '_index')
+
+  def __init__(self, name, statement, index):
+    self.Name = name
+    position = None
+    if 'Position' in statement.schema_names:
+      position = statement.schema_rows[index][statement.schema_names.index('Position')]
+    self._position = position if position is not None else vcMatrix.new()
+    self._statement = statement
+    self._index = index
+    self.ExternalJointValues = []
+
+  def __getattr__(self, name):
+    statement = self._statement
+    if name == 'Properties' and statement is not None:
+      self.Properties = []
+      for prop in statement.SchemaProperties:
+        if prop.Name != 'Position':
+          self.createProperty(prop.Type, prop.Name).Value = statement.getSchemaValue(self._index, prop.Name)
+      self._statement = None
+      return self.Properties
+    if statement is not None and name != 'Position' and not name.startswith('_'):
+      if name in statement.schema_names:
+        return statement.getSchemaValue(self._index, name)
+      raise AttributeError(name)
+    return Position.__getattr__(self, name)
@@ -0,0 +1,69 @@
+#-------------------------------------------------------------------------------
+# Pure python stand-in for the VC vcCommand module, see ReadMe.txt, OFFLINE REPLAY.
+#
+# Constants default to their own names. A recording replaces them with the
+# values of the VC version it was made with (setConstants), which has to
+# happen before translators are imported.
+#-------------------------------------------------------------------------------
+
+CONSTANT_NAMES = [
+  'VC_BOOLEAN', 'VC_BUTTON', 'VC_INTEGER', 'VC_REAL', 'VC_STRING', 'VC_URI', 'VC_MATRIX', 'VC_VECTOR',
+  'VC_PROPERTY_LIMIT', 'VC_PROPERTY_STEP',
+  'VC_MESSAGE_BUTTONS_OK', 'VC_MESSAGE_TYPE_WARNING',
+  'VC_JOINT_TRANSLATIONAL', 'VC_JOINT_ROTATIONAL',
+  'VC_MOTIONTARGET_AM_DISTANCE', 'VC_MOTIONTARGET_AM_TIME', 'VC_MOTIONTARGET_AM_VELOCITY',
+  'VC_MOTIONTARGET_MT_JOINT', 'VC_MOTIONTARGET_MT_LINEAR',
+  'VC_MOTIONTARGET_TM_NORMAL', 'VC_MOTIONTARGET_TM_STATICTOOL', 'VC_MOTIONTARGET_TM_ROBOTROOT',
+  'VC_MOTIONTARGET_TURN_NEAREST', 'VC_MOTIONTARGET_TURN_USE',
+  'VC_ROBOTCONTROLLER', 'VC_ROBOTEXECUTOR', 'VC_SERVOCONTROLLER', 'VC_ONETOMANYINTERFACE', 'VC_ONETOONEINTERFACE',
+  'VC_STATEMENT_BREAK', 'VC_STATEMENT_CALL', 'VC_STATEMENT_COMMENT', 'VC_STATEMENT_CONTINUE', 'VC_STATEMENT_CUSTOM',
+  'VC_STATEMENT_DEFINE_BASE', 'VC_STATEMENT_DEFINE_TOOL', 'VC_STATEMENT_DELAY', 'VC_STATEMENT_GRASP',
+  'VC_STATEMENT_HALT', 'VC_STATEMENT_HOME', 'VC_STATEMENT_IF', 'VC_STATEMENT_LINMOTION', 'VC_STATEMENT_PATH',
+  'VC_STATEMENT_PRINT', 'VC_STATEMENT_PROCESS', 'VC_STATEMENT_PROG_SYNC', 'VC_STATEMENT_PTPMOTION',
+  'VC_STATEMENT_RELEASE', 'VC_STATEMENT_REMOTECALL', 'VC_STATEMENT_REMOTEWAIT', 'VC_STATEMENT_RETURN',
+  'VC_STATEMENT_SETBIN', 'VC_STATEMENT_SETPROPERTY', 'VC_STATEMENT_SETROBOTSTATISTICSSTATE',
+  'VC_STATEMENT_STATISTICS', 'VC_STATEMENT_SWITCHCASE', 'VC_STATEMENT_WAITBIN', 'VC_STATEMENT_WHILE']
+
+# Other names of the same constant
+ALIASES = {'VC_JOINTTYPE_TRANSLATIONAL':'VC_JOINT_TRANSLATIONAL', 'VC_JOINTTYPE_ROTATIONAL':'VC_JOINT_ROTATIONAL'}
+
+__all__ = ['getApplication', 'getCommand', 'getCommandPath']
+
+# Objects returned by getApplication(), getCommand() and getCommandPath()
+session = {'app':None, 'cmd':None, 'uri':'file:///offline/PostProcessLauncher.py'}
+
+
+def setConstants(constants):
+  # Set constant values, e.g. {'VC_REAL':...} from a recording
+  module = globals()
+  for name, value in constants.items():
+    module[name] = value
+    if not name in __all__:
+      __all__.append(name)
+  for alias, name in ALIASES.items():
+    if not alias in constants:
+      module[alias] = module[name]
+      if not alias in __all__:
+        __all__.append(alias)
+
+
+def setSession(app, cmd, uri = None):
+  session['app'] = app
+  session['cmd'] = cmd
+  if uri:
+    session['uri'] = uri
+
+
+def getApplication():
+  return session['app']
+
+
+def getCommand():
+  return session['cmd']
+
+
+def getCommandPath():
+  return session['uri']
+
+
+setConstants(dict([(name, name) for name in CONSTANT_NAMES]))
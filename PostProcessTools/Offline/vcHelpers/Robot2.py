@@ -0,0 +1 @@
+# Empty stand-in for vcHelpers.Robot2, see __init__.py.
@@ -0,0 +1 @@
+# Empty stand-in for vcHelpers.Selection, see __init__.py.
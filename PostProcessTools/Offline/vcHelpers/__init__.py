@@ -0,0 +1,4 @@
+#-------------------------------------------------------------------------------
+# Empty stand-in for the vcHelpers package. Translators import it but only
+# use the VC API directly.
+#-------------------------------------------------------------------------------
@@ -0,0 +1,178 @@
+#-------------------------------------------------------------------------------
+# Pure python stand-in for the VC vcMatrix module, see ReadMe.txt, OFFLINE REPLAY.
+#
+# Homogeneous 4x4 matrix, columns N, O, A are the axes and P the position.
+# Angles are in degrees. WPR is rotation about X (W), Y (P) and Z (R) applied
+# in that order, getEuler() returns ZYZ angles and getQuaternion() returns the
+# scalar part in X like VC does.
+#-------------------------------------------------------------------------------
+import math
+from vcVector import vcVector
+
+EPSILON = 1e-9
+
+
+def rotationX(angle):
+  c, s = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+  return [[1.0, 0.0, 0.0, 0.0], [0.0, c, -s, 0.0], [0.0, s, c, 0.0], [0.0, 0.0, 0.0, 1.0]]
+
+
+def rotationY(angle):
+  c, s = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+  return [[c, 0.0, s, 0.0], [0.0, 1.0, 0.0, 0.0], [-s, 0.0, c, 0.0], [0.0, 0.0, 0.0, 1.0]]
+
+
+def rotationZ(angle):
+  c, s = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+  return [[c, -s, 0.0, 0.0], [s, c, 0.0, 0.0], [0.0, 0.0, 1.0, 0.0], [0.0, 0.0, 0.0, 1.0]]
+
+
+def translation(x, y, z):
+  return [[1.0, 0.0, 0.0, x], [0.0, 1.0, 0.0, y], [0.0, 0.0, 1.0, z], [0.0, 0.0, 0.0, 1.0]]
+
+
+def multiply(a, b):
+  return [[a[i][0]*b[0][j] + a[i][1]*b[1][j] + a[i][2]*b[2][j] + a[i][3]*b[3][j] for j in range(4)] for i in range(4)]
+
+
+class vcMatrix(object):
+  __slots__ = ('m',)
+
+  def __init__(self, rows = None):
+    if rows is None:
+      rows = translation(0.0, 0.0, 0.0)
+    self.m = [list(r) for r in rows]
+
+  # Columns as vectors
+  def _getColumn(self, j):
+    m = self.m
+    return vcVector(m[0][j], m[1][j], m[2][j])
+
+  def _setColumn(self, j, v):
+    self.m[0][j], self.m[1][j], self.m[2][j] = float(v.X), float(v.Y), float(v.Z)
+
+  N = property(lambda self: self._getColumn(0), lambda self, v: self._setColumn(0, v))
+  O = property(lambda self: self._getColumn(1), lambda self, v: self._setColumn(1, v))
+  A = property(lambda self: self._getColumn(2), lambda self, v: self._setColumn(2, v))
+  P = property(lambda self: self._getColumn(3), lambda self, v: self._setColumn(3, v))
+
+  def _setRotation(self, rows):
+    for i in range(3):
+      for j in range(3):
+        self.m[i][j] = rows[i][j]
+
+  def identity(self):
+    self.m = translation(0.0, 0.0, 0.0)
+
+  def invert(self):
+    # In place inverse of a rigid transformation
+    m = self.m
+    r = [[m[j][i] for j in range(3)] for i in range(3)]
+    p = [-(r[i][0]*m[0][3] + r[i][1]*m[1][3] + r[i][2]*m[2][3]) for i in range(3)]
+    self.m = [r[0] + [p[0]], r[1] + [p[1]], r[2] + [p[2]], [0.0, 0.0, 0.0, 1.0]]
+
+  def __mul__(self, other):
+    if isinstance(other, vcMatrix):
+      return vcMatrix(multiply(self.m, other.m))
+    m = self.m
+    return vcVector(m[0][0]*other.X + m[0][1]*other.Y + m[0][2]*other.Z + m[0][3],
+      m[1][0]*other.X + m[1][1]*other.Y + m[1][2]*other.Z + m[1][3],
+      m[2][0]*other.X + m[2][1]*other.Y + m[2][2]*other.Z + m[2][3])
+
+  def translateRel(self, x, y, z):
+    self.m = multiply(self.m, translation(x, y, z))
+
+  def translateAbs(self, x, y, z):
+    self.m = multiply(translation(x, y, z), self.m)
+
+  def rotateRelX(self, angle):
+    self.m = multiply(self.m, rotationX(angle))
+
+  def rotateRelY(self, angle):
+    self.m = multiply(self.m, rotationY(angle))
+
+  def rotateRelZ(self, angle):
+    self.m = multiply(self.m, rotationZ(angle))
+
+  def rotateAbsX(self, angle):
+    self.m = multiply(rotationX(angle), self.m)
+
+  def rotateAbsY(self, angle):
+    self.m = multiply(rotationY(angle), self.m)
+
+  def rotateAbsZ(self, angle):
+    self.m = multiply(rotationZ(angle), self.m)
+
+  def getWPR(self):
+    m = self.m
+    p = math.atan2(-m[2][0], math.sqrt(m[0][0]*m[0][0] + m[1][0]*m[1][0]))
+    if abs(math.cos(p)) < EPSILON:
+      w = 0.0
+      r = math.atan2(-m[0][1], m[1][1])
+    else:
+      w = math.atan2(m[2][1], m[2][2])
+      r = math.atan2(m[1][0], m[0][0])
+    return vcVector(math.degrees(w), math.degrees(p), math.degrees(r))
+
+  def setWPR(self, w, p, r):
+    self._setRotation(multiply(multiply(rotationZ(r), rotationY(p)), rotationX(w)))
+
+  WPR = property(getWPR, lambda self, v: self.setWPR(v.X, v.Y, v.Z))
+
+  def getEuler(self):
+    # ZYZ Euler angles
+    m = self.m
+    b = math.atan2(math.sqrt(m[2][0]*m[2][0] + m[2][1]*m[2][1]), m[2][2])
+    if abs(math.sin(b)) < EPSILON:
+      a = 0.0
+      if m[2][2] > 0.0:
+        c = math.atan2(m[1][0], m[0][0])
+      else:
+        c = math.atan2(m[1][0], -m[0][0])
+    else:
+      a = math.atan2(m[1][2], m[0][2])
+      c = math.atan2(m[2][1], -m[2][0])
+    return vcVector(math.degrees(a), math.degrees(b), math.degrees(c))
+
+  def setEuler(self, a, b, c):
+    self._setRotation(multiply(multiply(rotationZ(a), rotationY(b)), rotationZ(c)))
+
+  def getQuaternion(self):
+    # Unit quaternion, X is the scalar part and Y, Z, W the vector part
+    m = self.m
+    trace = m[0][0] + m[1][1] + m[2][2]
+    if trace > 0.0:
+      s = 0.5 / math.sqrt(trace + 1.0)
+      q = (0.25 / s, (m[2][1] - m[1][2])*s, (m[0][2] - m[2][0])*s, (m[1][0] - m[0][1])*s)
+    elif m[0][0] > m[1][1] and m[0][0] > m[2][2]:
+      s = 2.0 * math.sqrt(1.0 + m[0][0] - m[1][1] - m[2][2])
+      q = ((m[2][1] - m[1][2])/s, 0.25*s, (m[0][1] + m[1][0])/s, (m[0][2] + m[2][0])/s)
+    elif m[1][1] > m[2][2]:
+      s = 2.0 * math.sqrt(1.0 + m[1][1] - m[0][0] - m[2][2])
+      q = ((m[0][2] - m[2][0])/s, (m[0][1] + m[1][0])/s, 0.25*s, (m[1][2] + m[2][1])/s)
+    else:
+      s = 2.0 * math.sqrt(1.0 + m[2][2] - m[0][0] - m[1][1])
+      q = ((m[1][0] - m[0][1])/s, (m[0][2] + m[2][0])/s, (m[1][2] + m[2][1])/s, 0.25*s)
+    if q[0] < 0.0:
+      q = tuple([-x for x in q])
+    return vcVector(q[0], q[1], q[2], q[3])
+
+  def getAxisAngle(self):
+    # Rotation axis in X, Y, Z and angle in degrees in W
+    q = self.getQuaternion()
+    angle = 2.0 * math.acos(max(-1.0, min(1.0, q.X)))
+    s = math.sqrt(max(0.0, 1.0 - q.X*q.X))
+    if s < EPSILON:
+      return vcVector(0.0, 0.0, 1.0, 0.0)
+    return vcVector(q.Y/s, q.Z/s, q.W/s, math.degrees(angle))
+
+  def __repr__(self):
+    p = self.P
+    wpr = self.getWPR()
+    return 'vcMatrix(P=(%g, %g, %g), WPR=(%g, %g, %g))' % (p.X, p.Y, p.Z, wpr.X, wpr.Y, wpr.Z)
+
+
+def new(other = None):
+  if other is None:
+    return vcMatrix()
+  return vcMatrix(other.m)
@@ -0,0 +1,59 @@
+#-------------------------------------------------------------------------------
+# Pure python stand-in for the VC vcVector module, see ReadMe.txt, OFFLINE REPLAY.
+#-------------------------------------------------------------------------------
+import math
+
+
+class vcVector(object):
+  __slots__ = ('X', 'Y', 'Z', 'W')
+
+  def __init__(self, x = 0.0, y = 0.0, z = 0.0, w = 0.0):
+    self.X = float(x)
+    self.Y = float(y)
+    self.Z = float(z)
+    self.W = float(w)
+
+  def __add__(self, other):
+    return vcVector(self.X + other.X, self.Y + other.Y, self.Z + other.Z)
+
+  def __sub__(self, other):
+    return vcVector(self.X - other.X, self.Y - other.Y, self.Z - other.Z)
+
+  def __neg__(self):
+    return vcVector(-self.X, -self.Y, -self.Z)
+
+  def __mul__(self, other):
+    # Scalar product with number, dot product with vector
+    if isinstance(other, vcVector):
+      return self.X*other.X + self.Y*other.Y + self.Z*other.Z
+    return vcVector(self.X*other, self.Y*other, self.Z*other)
+
+  __rmul__ = __mul__
+
+  def __div__(self, value):
+    return vcVector(self.X/value, self.Y/value, self.Z/value)
+
+  __truediv__ = __div__
+
+  def __xor__(self, other):
+    # Cross product
+    return vcVector(self.Y*other.Z - self.Z*other.Y, self.Z*other.X - self.X*other.Z, self.X*other.Y - self.Y*other.X)
+
+  def length(self):
+    return math.sqrt(self.X*self.X + self.Y*self.Y + self.Z*self.Z)
+
+  def normalize(self):
+    l = self.length()
+    if l > 0.0:
+      self.X /= l
+      self.Y /= l
+      self.Z /= l
+
+  def __repr__(self):
+    return 'vcVector(%g, %g, %g)' % (self.X, self.Y, self.Z)
+
+
+def new(x = 0.0, y = 0.0, z = 0.0, w = 0.0):
+  if isinstance(x, vcVector):
+    return vcVector(x.X, x.Y, x.Z, x.W)
+  return vcVector(x, y, z, w)
@@ -0,0 +1,247 @@
+#-------------------------------------------------------------------------------
+# Text output buffers for translators.
+#
+# LineBuffer collects text as a list of chunks, so appending is constant time
+# and the text is copied once, when it is written to file (flushTo) or
+# joined (getvalue). Building output with str += copies the whole text on
+# every append.
+#
+# OutputDocument is an ordered set of named LineBuffers (sections) that can be
+# appended independently and are written one after another. Text that is known
+# only at the end (position tables, globals, line counts) goes into its own
+# section instead of a placeholder that is replaced in the whole output.
+#
+# Streaming: a document opened on its output file writes the first unfinished
+# section straight to the file. Sections further down are kept in memory up to
+# spool_limit characters each and spill the rest to a temporary file. They are
+# copied to the output file when the sections before them are closed, so
+# memory use stays bounded regardless of program size.
+#
+# A streamed file is incomplete until the translator is done. OutputFile
+# writes it under a temporary name next to the output and renames it when the
+# with block ends without an exception, so a failed run leaves no truncated
+# file and an earlier output stays as it was. replaceFile does the rename, also
+# for other tools that write through a temporary file.
+#-------------------------------------------------------------------------------
+import os, shutil, tempfile
+
+SPOOL_LIMIT = 1048576 # characters kept in memory per section before spilling to disk
+COPY_BLOCK = 65536
+
+
+def replaceFile(src, dst):
+  # Rename temporary file src to dst. mkstemp creates files readable by the owner only,
+  # so src gets the permissions of dst, or the umask default of a new file.
+  if os.path.exists(dst):
+    shutil.copymode(dst, src)
+  else:
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(src, 0666 & ~umask)
+  # Atomic rename where available. Python 2 on Windows has no os.replace and rename fails on existing dst.
+  if hasattr(os, 'replace'):
+    os.replace(src, dst)
+    return
+  if os.name == 'nt' and os.path.exists(dst):
+    os.remove(dst)
+  os.rename(src, dst)
+
+
+class LineBuffer(object):
+
+  def __init__(self, indentation = '  ', spool_limit = None):
+    self.chunks = []
+    self.size = 0
+    self.indentation = indentation
+    self.depth = 0
+    self.spool_limit = spool_limit
+    self.memory_size = 0  # characters in chunks
+    self.spool = None     # temporary file of spilled chunks
+    self.file = None      # output file when streaming
+
+  def write(self, text):
+    self.size += len(text)
+    if self.file:
+      self.file.write(text)
+      return
+    self.chunks.append(text)
+    self.memory_size += len(text)
+    if self.spool_limit is not None and self.memory_size > self.spool_limit:
+      self.spill()
+
+  def append(self, line):
+    # Same as write(line + '\n'), for translators that collect lines in lists
+    self.write(line + '\n')
+
+  def writeLine(self, line = ''):
+    # Line with current indentation
+    self.write('%s%s\n' % (self.indentation * self.depth, line))
+
+  def indent(self, steps = 1):
+    self.depth += steps
+
+  def dedent(self, steps = 1):
+    self.depth = max(0, self.depth - steps)
+
+  def spill(self):
+    # Move chunks in memory to spool file
+    if not self.spool:
+      # Text mode like the output files, unicode chunks are encoded the same way
+      self.spool = tempfile.TemporaryFile('w+')
+    self.spool.writelines(self.chunks)
+    self.chunks = []
+    self.memory_size = 0
+
+  def iterChunks(self):
+    # Contents in order, spool file in blocks
+    if self.spool:
+      self.spool.seek(0)
+      while True:
+        block = self.spool.read(COPY_BLOCK)
+        if not block:
+          break
+        yield block
+      self.spool.seek(0, 2)
+    for chunk in self.chunks:
+      yield chunk
+
+  def extend(self, other):
+    # Append contents of another LineBuffer
+    for chunk in other.iterChunks():
+      self.write(chunk)
+
+  def clear(self):
+    if self.spool:
+      self.spool.close()
+      self.spool = None
+    self.chunks = []
+    self.size = 0
+    self.memory_size = 0
+
+  def close(self):
+    # Release spool file and memory after contents are written, size is kept
+    size = self.size
+    self.clear()
+    self.size = size
+    self.file = None
+
+  def getvalue(self):
+    # Whole text, chunks are joined into one. Not available after streamTo.
+    if self.file:
+      raise ValueError('LineBuffer contents are already written to file')
+    if self.spool:
+      return ''.join(list(self.iterChunks()))
+    if len(self.chunks) > 1:
+      self.chunks = [''.join(self.chunks)]
+    if not self.chunks:
+      return ''
+    return self.chunks[0]
+
+  def flushTo(self, file):
+    # Write to open file without joining. Returns number of characters written.
+    if self.file:
+      return 0
+    if self.spool:
+      self.spool.seek(0)
+      shutil.copyfileobj(self.spool, file, COPY_BLOCK)
+      self.spool.seek(0, 2)
+    file.writelines(self.chunks)
+    return self.size
+
+  def streamTo(self, file):
+    # Write contents to file and pass later writes straight through
+    if self.file:
+      return
+    self.flushTo(file)
+    size = self.size
+    self.clear()
+    self.size = size
+    self.file = file
+
+  def __len__(self):
+    return self.size
+
+  def __nonzero__(self):
+    return self.size > 0
+
+
+class OutputDocument(object):
+  # Sections are written in the order they were declared
+
+  def __init__(self, section_names, indentation = '  ', spool_limit = SPOOL_LIMIT):
+    self.names = list(section_names)
+    self.sections = dict([(name, LineBuffer(indentation, spool_limit)) for name in self.names])
+    self.closed = set()
+    self.file = None
+    self.live = 0  # index of section being streamed
+
+  def section(self, name):
+    return self.sections[name]
+
+  def open(self, file):
+    # Start streaming into file, see header
+    self.file = file
+    self.live = 0
+    self.advance()
+
+  def close(self, name):
+    # Section is complete. Sections after it are written when all before them are closed.
+    self.closed.add(name)
+    if self.file:
+      self.advance()
+
+  def advance(self):
+    while self.live < len(self.names) - 1 and self.names[self.live] in self.closed:
+      self.live += 1
+      self.sections[self.names[self.live]].streamTo(self.file)
+    self.sections[self.names[self.live]].streamTo(self.file)
+
+  def finish(self):
+    # Write remaining sections to the streamed file, stop streaming and close
+    # section spool files. Returns total number of characters in document.
+    for name in self.names[self.live + 1:]:
+      self.sections[name].flushTo(self.file)
+    for name in self.names:
+      self.sections[name].close()
+    self.file = None
+    return len(self)
+
+  def getvalue(self):
+    return ''.join([self.sections[name].getvalue() for name in self.names])
+
+  def flushTo(self, file):
+    size = 0
+    for name in self.names:
+      size += self.sections[name].flushTo(file)
+    return size
+
+  def __len__(self):
+    return sum([len(self.sections[name]) for name in self.names])
+
+
+class OutputFile(object):
+  # Output file written under a temporary name and renamed to uri on success
+  #
+  #   with OutputBuffer.OutputFile(uri) as file:
+  #     document.open(file)
+  #     ...
+
+  def __init__(self, uri, mode = 'w'):
+    self.uri = uri
+    self.mode = mode
+    self.temp_uri = None
+    self.file = None
+
+  def __enter__(self):
+    folder, filename = os.path.split(self.uri)
+    handle, self.temp_uri = tempfile.mkstemp('.tmp', filename + '.', folder or '.')
+    self.file = os.fdopen(handle, self.mode)
+    return self.file
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.file.close()
+    if exc_type is not None:
+      os.remove(self.temp_uri)
+      return False
+    replaceFile(self.temp_uri, self.uri)
+    return False
@@ -0,0 +1,214 @@
+#-------------------------------------------------------------------------------
+# Content-addressed cache of post-processor output.
+#
+# fingerprint() hashes everything that goes into a translation: routines and
+# statements with their properties, positions and path schema values, robot
+# position, tool and base frames, translator source, PostProcessTools source,
+# launcher version and the action panel settings. OutputCache keeps a copy of the files created for a
+# fingerprint in <add-on folder>\OutputCache\<fingerprint>\. When the same
+# fingerprint is post-processed again, files already in the output folder
+# are reused if unchanged and the rest are copied from the cache instead of
+# running the translator.
+#
+# Only files in the output folder are cached. Runs that create files
+# elsewhere are not stored.
+#-------------------------------------------------------------------------------
+import os, json, time, shutil, hashlib
+
+CACHE_DIR_NAME = 'OutputCache'
+ENTRY_FILE_NAME = 'entry.json'
+ENTRY_VERSION = 1
+MAX_ENTRIES = 20
+SCOPE_NAMES = ['Scope', 'ThenScope', 'ElseScope']
+
+
+def feed(h, text):
+  if isinstance(text, unicode):
+    text = text.encode('utf8')
+  h.update(text)
+  h.update('\n')
+
+
+def matrixText(m):
+  return ' '.join(['%.6f %.6f %.6f' % (v.X, v.Y, v.Z) for v in (m.P, m.N, m.O, m.A)])
+
+
+def valueText(value):
+  # Stable text of a property value. VC objects are identified by name.
+  if isinstance(value, (list, tuple)):
+    return '[%s]' % ', '.join([valueText(x) for x in value])
+  if isinstance(value, float):
+    return '%.6f' % value
+  if isinstance(value, (int, long, bool, str, unicode, type(None))):
+    return unicode(value)
+  if hasattr(value, 'getWPR'):
+    return matrixText(value)
+  if hasattr(value, 'X') and hasattr(value, 'Z'):
+    return '%.6f %.6f %.6f' % (value.X, value.Y, value.Z)
+  if hasattr(value, 'Name'):
+    return value.Name
+  return repr(value)
+
+
+def hashProperties(h, properties):
+  for prop in properties:
+    feed(h, '%s=%s' % (prop.Name, valueText(prop.Value)))
+
+
+def hashScope(h, scope):
+  statements = scope.Statements
+  feed(h, 'scope %i' % len(statements))
+  for statement in statements:
+    hashStatement(h, statement)
+
+
+def hashStatement(h, statement):
+  feed(h, 'statement %s' % statement.Type)
+  hashProperties(h, statement.Properties)
+  for position in getattr(statement, 'Positions', []):
+    feed(h, 'position %s %s' % (position.Name, matrixText(position.PositionInReference)))
+    hashProperties(h, getattr(position, 'Properties', []))
+  if hasattr(statement, 'SchemaProperties'):
+    names = [p.Name for p in statement.SchemaProperties]
+    for i in range(statement.getSchemaSize()):
+      feed(h, 'schema %i %s' % (i, ' '.join([valueText(statement.getSchemaValue(i, n)) for n in names])))
+  for name in SCOPE_NAMES:
+    if hasattr(statement, name):
+      hashScope(h, getattr(statement, name))
+  for scope in getattr(statement, 'ElseIfScopes', []):
+    feed(h, 'elseif %s' % scope.Condition)
+    hashScope(h, scope)
+  for case in getattr(statement, 'Cases', []):
+    feed(h, 'case %s' % case.CaseCondition)
+    hashScope(h, case)
+
+
+def hashFrames(h, controller):
+  comp = controller.Component
+  feed(h, 'robot %s %s' % (comp.Name, matrixText(comp.WorldPositionMatrix)))
+  for kind, frames in (('tool', controller.Tools), ('base', controller.Bases)):
+    for frame in frames:
+      m = frame.PositionMatrix
+      if frame.Node:
+        m = comp.InverseWorldPositionMatrix * frame.Node.WorldPositionMatrix * m
+      feed(h, '%s %s %s' % (kind, frame.Name, matrixText(m)))
+
+
+def fileDigest(path):
+  h = hashlib.sha1()
+  with open(path, 'rb') as f:
+    for block in iter(lambda: f.read(1048576), ''):
+      h.update(block)
+  return h.hexdigest()
+
+
+def toolsDigest():
+  # Digest of PostProcessTools modules, translators share output code from them
+  h = hashlib.sha1()
+  folder = os.path.dirname(os.path.abspath(__file__))
+  for filename in sorted(os.listdir(folder)):
+    if filename.endswith('.py'):
+      feed(h, '%s %s' % (filename, fileDigest(os.path.join(folder, filename))))
+  return h.hexdigest()
+
+
+def fingerprint(program, translator_file, settings):
+  # Hex fingerprint of program, frames, translator and tools source and settings (list of (name, value))
+  h = hashlib.sha1()
+  feed(h, 'translator %s' % fileDigest(translator_file))
+  feed(h, 'tools %s' % toolsDigest())
+  for name, value in settings:
+    feed(h, 'setting %s=%s' % (name, valueText(value)))
+  hashFrames(h, program.Executor.Controller)
+  for routine in [program.MainRoutine] + list(program.Routines):
+    feed(h, 'routine %s' % routine.Name)
+    hashProperties(h, routine.Properties)
+    hashScope(h, routine)
+  return h.hexdigest()
+
+
+class OutputCache(object):
+  # Cache folder with one sub folder per fingerprint
+
+  def __init__(self, folder, max_entries = MAX_ENTRIES):
+    self.folder = folder
+    self.max_entries = max_entries
+
+  def getEntryFolder(self, key):
+    return os.path.join(self.folder, key)
+
+  def lookup(self, key):
+    # Stored entry dictionary or None
+    entry_uri = os.path.join(self.getEntryFolder(key), ENTRY_FILE_NAME)
+    try:
+      with open(entry_uri, 'r') as entry_file:
+        entry = json.load(entry_file)
+    except (IOError, ValueError):
+      return None
+    if entry.get('version') != ENTRY_VERSION:
+      return None
+    for f in entry['files']:
+      if not os.path.isfile(os.path.join(self.getEntryFolder(key), f['name'])):
+        return None
+    return entry
+
+  def restore(self, key, entry, output_folder):
+    # Bring output folder up to date from entry. Returns (files, reused count, copied count).
+    files = []
+    reused = 0
+    for f in entry['files']:
+      target = os.path.join(output_folder, f['name'])
+      if os.path.isfile(target) and os.path.getsize(target) == f['size'] and fileDigest(target) == f['sha1']:
+        reused += 1
+      else:
+        shutil.copy2(os.path.join(self.getEntryFolder(key), f['name']), target)
+      files.append(target)
+    os.utime(os.path.join(self.getEntryFolder(key), ENTRY_FILE_NAME), None)
+    return files, reused, len(files) - reused
+
+  def store(self, key, output_folder, filenames, seconds):
+    # Copy created files into cache. Returns False if files are missing or outside output folder.
+    names = []
+    for filename in filenames:
+      name = os.path.relpath(filename, output_folder)
+      if name.startswith('..') or os.path.isabs(name):
+        print 'WARNING: Output not cached, "%s" is outside output folder.' % (filename)
+        return False
+      if not os.path.isfile(filename):
+        print 'WARNING: Output not cached, "%s" was not written.' % (filename)
+        return False
+      if not name in names:
+        names.append(name)
+    entry_folder = self.getEntryFolder(key)
+    if os.path.isdir(entry_folder):
+      shutil.rmtree(entry_folder, True)
+    entry = {'version':ENTRY_VERSION, 'seconds':seconds, 'time':time.time(), 'files':[]}
+    try:
+      for name in names:
+        target = os.path.join(entry_folder, name)
+        if not os.path.isdir(os.path.dirname(target)):
+          os.makedirs(os.path.dirname(target))
+        source = os.path.join(output_folder, name)
+        shutil.copy2(source, target)
+        entry['files'].append({'name':name, 'size':os.path.getsize(source), 'sha1':fileDigest(source)})
+      with open(os.path.join(entry_folder, ENTRY_FILE_NAME), 'w') as entry_file:
+        json.dump(entry, entry_file, indent=1, sort_keys=True)
+    except (IOError, OSError):
+      print 'WARNING: Cannot write output cache "%s".' % (entry_folder)
+      shutil.rmtree(entry_folder, True)
+      return False
+    self.evict()
+    return True
+
+  def evict(self):
+    # Keep max_entries most recently used entries
+    if not os.path.isdir(self.folder):
+      return
+    entries = []
+    for key in os.listdir(self.folder):
+      entry_uri = os.path.join(self.folder, key, ENTRY_FILE_NAME)
+      if os.path.isfile(entry_uri):
+        entries.append((os.path.getmtime(entry_uri), key))
+    entries.sort(reverse = True)
+    for stamp, key in entries[self.max_entries:]:
+      shutil.rmtree(os.path.join(self.folder, key), True)
@@ -0,0 +1,162 @@
+#-------------------------------------------------------------------------------
+# Path point reduction with geometric tolerances.
+#
+# CAM generated Path statements often have thousands of nearly collinear
+# points. When reduction is enabled for a run with begin(linear, angular),
+# PathSchema.PathColumns keeps only the points needed to stay within the
+# tolerances, so every translator reading paths through it writes fewer points:
+#
+#   -Douglas-Peucker on point positions, linear tolerance in mm.
+#   -A point is also kept if its orientation differs more than the angular
+#    tolerance (degrees) from the orientation interpolated (slerp) between the
+#    kept points around it. External axis values (E1, E2...) are interpolated
+#    linearly and checked against the linear tolerance.
+#   -First and last points are kept. So are the points where any other schema
+#    value changes (speed, acceleration, accuracy...): the last point with the
+#    old value and the first with the new one. Points between them are reduced
+#    separately.
+#
+# end() prints points before and after reduction. Translators called from
+# elsewhere (batch, replay) write all points unless begin() was called.
+#-------------------------------------------------------------------------------
+import math
+
+ANGLE_EPSILON = 1e-6
+
+session = None   # (linear, angular) tolerances of running post-process, see begin()
+statistics = {}  # paths, points before and after reduction in session
+
+
+def begin(linear, angular):
+  # Enable reduction, linear tolerance in mm and angular in degrees. Linear
+  # tolerance <= 0 disables reduction.
+  global session, statistics
+  statistics = {'paths':0, 'before':0, 'after':0}
+  if linear > 0.0:
+    session = (float(linear), max(float(angular), ANGLE_EPSILON))
+  else:
+    session = None
+
+
+def end():
+  # Print reduction summary and disable reduction
+  global session
+  if session and statistics['before']:
+    before, after = statistics['before'], statistics['after']
+    print 'Path reduction: %i paths, %i points reduced to %i (%.1f%% removed).' % (statistics['paths'], before, after,
+      100.0 * (before - after) / before)
+  session = None
+
+
+def count(before, after):
+  statistics['paths'] += 1
+  statistics['before'] += before
+  statistics['after'] += after
+
+
+def getQuaternion(m):
+  # (w, x, y, z) of matrix, VC returns scalar part in X
+  q = m.getQuaternion()
+  return (q.X, q.Y, q.Z, q.W)
+
+
+def slerp(q0, q1, t):
+  dot = q0[0]*q1[0] + q0[1]*q1[1] + q0[2]*q1[2] + q0[3]*q1[3]
+  if dot < 0.0:
+    q1 = [-x for x in q1]
+    dot = -dot
+  if dot > 0.9995:
+    q = [a + t * (b - a) for a, b in zip(q0, q1)]
+  else:
+    theta = math.acos(dot)
+    s = math.sin(theta)
+    s0 = math.sin((1.0 - t) * theta) / s
+    s1 = math.sin(t * theta) / s
+    q = [s0 * a + s1 * b for a, b in zip(q0, q1)]
+  norm = math.sqrt(sum([x * x for x in q]))
+  return [x / norm for x in q]
+
+
+def getAngle(q0, q1):
+  # Rotation between quaternions in degrees
+  dot = abs(q0[0]*q1[0] + q0[1]*q1[1] + q0[2]*q1[2] + q0[3]*q1[3])
+  return math.degrees(2.0 * math.acos(min(1.0, dot)))
+
+
+class PathPoints(object):
+  # Positions, orientations and external axis values of path points
+
+  def __init__(self, positions, external):
+    self.points = []
+    for m in positions:
+      p = m.P
+      self.points.append((p.X, p.Y, p.Z))
+    self.quaternions = [getQuaternion(m) for m in positions]
+    self.external = external
+
+  def getError(self, first, last, index, linear, angular):
+    # Deviation of point from the motion between first and last, relative to
+    # tolerances: > 1.0 means point must be kept
+    a, b, p = self.points[first], self.points[last], self.points[index]
+    d = (b[0] - a[0], b[1] - a[1], b[2] - a[2])
+    length2 = d[0]*d[0] + d[1]*d[1] + d[2]*d[2]
+    if length2 > 0.0:
+      t = ((p[0] - a[0])*d[0] + (p[1] - a[1])*d[1] + (p[2] - a[2])*d[2]) / length2
+      t = min(1.0, max(0.0, t))
+    else:
+      t = float(index - first) / (last - first)
+    c = (a[0] + t*d[0] - p[0], a[1] + t*d[1] - p[1], a[2] + t*d[2] - p[2])
+    error = math.sqrt(c[0]*c[0] + c[1]*c[1] + c[2]*c[2]) / linear
+    q = slerp(self.quaternions[first], self.quaternions[last], t)
+    error = max(error, getAngle(q, self.quaternions[index]) / angular)
+    for column in self.external:
+      value = column[first] + t * (column[last] - column[first])
+      error = max(error, abs(value - column[index]) / linear)
+    return error
+
+  def reduce(self, first, last, linear, angular, kept):
+    # Douglas-Peucker between first and last, adds kept indices except first
+    stack = [(first, last)]
+    ends = []
+    while stack:
+      start, end = stack.pop()
+      worst, worst_error = None, 1.0
+      for index in xrange(start + 1, end):
+        error = self.getError(start, end, index, linear, angular)
+        if error > worst_error:
+          worst, worst_error = index, error
+      if worst is None:
+        ends.append(end)
+      else:
+        stack.append((worst, end))
+        stack.append((start, worst))
+    kept.extend(ends)
+
+
+def getPieces(columns, size):
+  # (first, last) index ranges where the columns don't change
+  pieces = []
+  first = 0
+  for i in xrange(1, size):
+    for column in columns:
+      if column[i] != column[i - 1]:
+        pieces.append((first, i - 1))
+        first = i
+        break
+  pieces.append((first, size - 1))
+  return pieces
+
+
+def getKeptIndices(positions, guards, external, linear, angular):
+  # Sorted indices of points to keep. guards are columns whose changes are
+  # kept, external are columns interpolated between kept points.
+  size = len(positions)
+  if size < 3:
+    return range(size)
+  points = PathPoints(positions, external)
+  kept = []
+  for first, last in getPieces(guards, size):
+    kept.append(first)
+    if last > first:
+      points.reduce(first, last, linear, angular, kept)
+  return kept
@@ -0,0 +1,91 @@
+#-------------------------------------------------------------------------------
+# Path statement schema read column by column.
+#
+# PathColumns(statement, names) reads every requested schema property of all
+# points once, one column after another, and keeps them as columns indexed by
+# point: float columns as array('d'), others (Position matrices, accuracy
+# methods) as lists. Property names are looked up once per statement instead
+# of per point. Only names that exist in the schema are read.
+#
+#   path = PathSchema.PathColumns(statement, ['Position', 'MaxSpeed'])
+#   for i in xrange(path.size):
+#     motiontarget.Target = path['Position'][i]
+#
+# When PathReduction is enabled, all columns are read and only the points kept
+# by the reduction are left, size is the reduced point count. Loop with size,
+# not with the statement's own point count.
+#-------------------------------------------------------------------------------
+from array import array
+import PathReduction
+
+MOTION_COLUMNS = ['Position', 'MaxSpeed', 'Acceleration', 'Deceleration', 'AccuracyMethod', 'AccuracyValue']
+
+
+def getExternalNames(names):
+  # E1, E2... schema names in axis order
+  external = [name for name in names if name[:1] == 'E' and name[1:].isdigit()]
+  external.sort(key = lambda name: int(name[1:]))
+  return external
+
+
+def readColumn(statement, name, size):
+  get = statement.getSchemaValue
+  values = [get(i, name) for i in xrange(size)]
+  for value in values:
+    if type(value) != float:
+      return values
+  return array('d', values)
+
+
+def selectRows(column, indices):
+  if isinstance(column, array):
+    return array(column.typecode, [column[i] for i in indices])
+  return [column[i] for i in indices]
+
+
+class PathColumns(object):
+
+  def __init__(self, statement, names = None, external = False):
+    # names None reads all columns, external adds E1, E2... to names
+    self.names = [p.Name for p in statement.SchemaProperties]
+    self.size = statement.getSchemaSize()
+    self.external = getExternalNames(self.names)
+    if names is None:
+      names = self.names
+    elif external:
+      names = list(names) + self.external
+    self.columns = {}
+    reduce = PathReduction.session and 'Position' in self.names
+    for name in (self.names if reduce else names):
+      if name in self.names and not name in self.columns:
+        self.columns[name] = readColumn(statement, name, self.size)
+    if reduce:
+      self.reduce(names)
+
+  def reduce(self, names):
+    # Keep columns of names with rows of points kept by PathReduction
+    linear, angular = PathReduction.session
+    guards = [self.columns[name] for name in self.names if name != 'Position' and not name in self.external]
+    external = [self.columns[name] for name in self.external]
+    kept = PathReduction.getKeptIndices(self.columns['Position'], guards, external, linear, angular)
+    if 'Position' in names:
+      # Path read in parts (positions and speeds separately) is counted once
+      PathReduction.count(self.size, len(kept))
+    columns = {}
+    for name in names:
+      if name in self.columns and not name in columns:
+        columns[name] = selectRows(self.columns[name], kept)
+    self.columns = columns
+    self.size = len(kept)
+
+  def has(self, name):
+    return name in self.columns
+
+  def get(self, name, default = None):
+    return self.columns.get(name, default)
+
+  def __getitem__(self, name):
+    return self.columns[name]
+
+  def __len__(self):
+    return self.size
@@ -0,0 +1,81 @@
+#-------------------------------------------------------------------------------
+# Pose text formats of translators.
+#
+# A PoseFormat renders matrices with a %-template from position X, Y, Z and one
+# orientation: 'wpr' (getWPR), 'euler' (getEuler), 'quaternion' or 'axisangle'.
+# Each matrix is read once, one P and one orientation call, instead of once per
+# component as in m.P.X, m.P.Y, m.P.Z, m.WPR.Z, m.WPR.Y, m.WPR.X.
+# formatAll renders a whole position table in one call.
+#
+# Values of a matrix are (X, Y, Z, orientation X, Y, Z[, W]). order picks and
+# sorts them for the template, e.g. KUKA A, B, C = WPR Z, Y, X:
+#
+#   KRL = PoseFormat('X %.3f,Y %.3f,Z %.3f,A %.4f,B %.4f,C %.4f', 'wpr', (0, 1, 2, 5, 4, 3))
+#   KRL.format(m)
+#-------------------------------------------------------------------------------
+from operator import itemgetter
+
+ORIENTATIONS = {
+  'wpr':(lambda m: m.getWPR(), 3),
+  'euler':(lambda m: m.getEuler(), 3),
+  'quaternion':(lambda m: m.getQuaternion(), 4),
+  'axisangle':(lambda m: m.getAxisAngle(), 4)}
+
+
+def getRow(m, orientation = 'wpr'):
+  # (X, Y, Z, orientation values) of matrix
+  get, count = ORIENTATIONS[orientation]
+  p = m.P
+  o = get(m)
+  if count == 3:
+    return (p.X, p.Y, p.Z, o.X, o.Y, o.Z)
+  return (p.X, p.Y, p.Z, o.X, o.Y, o.Z, o.W)
+
+
+def getRows(matrices, orientation = 'wpr'):
+  return [getRow(m, orientation) for m in matrices]
+
+
+def positiveAngle(angle):
+  if angle < 0:
+    return angle + 360.0
+  return angle
+
+
+class PoseFormat(object):
+
+  def __init__(self, template, orientation = 'wpr', order = None, value_filter = None, positive_angles = False):
+    # value_filter is applied to every value, positive_angles adds 360 to negative
+    # orientation angles (three angle orientations only).
+    get, count = ORIENTATIONS[orientation]
+    self.template = template
+    self.orientation = orientation
+    if order is None:
+      order = range(3 + count)
+    self.order = tuple(order)
+    self.pick = itemgetter(*self.order)
+    self.value_filter = value_filter
+    self.positive_angles = positive_angles and count == 3
+
+  def getValues(self, m):
+    # Values of matrix in template order
+    row = getRow(m, self.orientation)
+    if self.positive_angles:
+      row = row[:3] + tuple([positiveAngle(a) for a in row[3:]])
+    values = self.pick(row)
+    if self.value_filter:
+      values = tuple([self.value_filter(v) for v in values])
+    return values
+
+  def format(self, m, *extra):
+    # Extra values follow matrix values in template
+    return self.template % (self.getValues(m) + extra)
+
+  def formatAll(self, matrices):
+    # List of formatted matrices
+    template = self.template
+    if self.positive_angles or self.value_filter:
+      return [template % self.getValues(m) for m in matrices]
+    pick = self.pick
+    orientation = self.orientation
+    return [template % pick(getRow(m, orientation)) for m in matrices]
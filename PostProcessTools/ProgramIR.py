@@ -0,0 +1,386 @@
+#-------------------------------------------------------------------------------
+# Compact, read-only intermediate representation (IR) of a robot program.
+#
+# extract(program, columns, properties, scopes) reads the VC program once:
+# statement properties, scopes, motion statement targets (writeToTarget) and
+# path schema rows. Translators then read the IR instead of the VC object graph.
+#
+#   ir.routines[i]       RoutineRecord, statements are indices into ir.statements
+#   ir.statements[i]     StatementRecord in program order (pre-order), scopes
+#                        hold indices of their statements
+#   ir.points            PointColumns, one row per motion statement and path
+#                        point. Poses are vcMatrix, other columns typed arrays.
+#
+# Only what a translator reads is extracted: columns lists the point columns
+# besides the pose (POINT_COLUMNS), properties the statement property names
+# and scopes the scope names whose statements are extracted (None keeps all,
+# see StatementIndex.getNamedScopes). Joints, configuration and turns of path
+# points are solved by the motion target, leave them out when not needed.
+#
+# Records use __slots__ and can't be changed after extraction. Statement
+# property names are shared per statement type, a record only holds the
+# values. Frames and routines are stored by name. Property getters hand out
+# copies (vcMatrix for matrices, lists for lists). Poses are shared, copy
+# before changing one.
+#-------------------------------------------------------------------------------
+from vcCommand import *
+import array, gc
+import vcMatrix
+import StatementIndex, PathSchema
+
+MOTION_TYPES = [VC_STATEMENT_PTPMOTION, VC_STATEMENT_LINMOTION]
+
+# Point columns and the motion target attributes they are read from
+POINT_COLUMNS = ['joints', 'external', 'config', 'turns', 'base', 'tool', 'motion_type', 'speed', 'joint_speed',
+  'acceleration', 'deceleration', 'accuracy_method', 'accuracy_value']
+TARGET_ATTRIBUTES = {'joints':'JointValues', 'config':'RobotConfig', 'turns':'JointTurns', 'base':'BaseName',
+  'tool':'ToolName', 'motion_type':'MotionType', 'speed':'CartesianSpeed', 'joint_speed':'JointSpeedFactor',
+  'acceleration':'CartesianAcceleration', 'deceleration':'CartesianDeceleration',
+  'accuracy_method':'AccuracyMethod', 'accuracy_value':'AccuracyValue'}
+SOLVED_COLUMNS = ['joints', 'config', 'turns'] # path points set Target to read these
+
+# Path schema columns of point columns and their defaults
+PATH_COLUMNS = {'speed':('MaxSpeed', 0.0), 'acceleration':('Acceleration', 0.0),
+  'deceleration':('Deceleration', 0.0), 'accuracy_method':('AccuracyMethod', VC_MOTIONTARGET_AM_DISTANCE),
+  'accuracy_value':('AccuracyValue', 0.0)}
+
+
+def isMatrix(value):
+  return hasattr(value, 'getWPR') and hasattr(value, 'invert')
+
+
+def freezeValue(value):
+  # Plain immutable form of a property value, matrices are kept
+  if isinstance(value, (int, long, float, bool, str, unicode, type(None))):
+    return value
+  if isinstance(value, (list, tuple)):
+    return tuple([freezeValue(x) for x in value])
+  if isMatrix(value):
+    return value
+  return getattr(value, 'Name', None)
+
+
+def thawValue(value):
+  if isinstance(value, tuple):
+    return [thawValue(x) for x in value]
+  if isMatrix(value):
+    return vcMatrix.new(value)
+  return value
+
+
+def getAttribute(obj, name, default = None):
+  try:
+    return getattr(obj, name)
+  except Exception:
+    return default
+
+
+#-------------------------------------------------------------------------------
+class Record(object):
+  # Base of read-only records
+  __slots__ = ()
+
+  def __init__(self, **values):
+    for name, value in values.items():
+      object.__setattr__(self, name, value)
+
+  def __setattr__(self, name, value):
+    raise AttributeError('%s is read-only' % type(self).__name__)
+
+  def get(self, name, default = None):
+    # Property value by name. Frames and routines are names, matrices vcMatrix.
+    try:
+      return thawValue(self.values[self.names.index(name)])
+    except ValueError:
+      return default
+
+  def has(self, name):
+    return name in self.names
+
+
+class RoutineRecord(Record):
+  __slots__ = ('index', 'name', 'statements', 'names', 'values')
+
+
+class StatementRecord(Record):
+  # scopes: ((scope name, condition, (statement index, ...)), ...), see
+  # StatementIndex.getNamedScopes for scope names.
+  __slots__ = ('index', 'type', 'name', 'routine', 'parent', 'depth', 'names', 'values', 'scopes',
+    'position_name', 'external_joint_count', 'point_start', 'point_count')
+
+  def getScope(self, name):
+    # Statement indices of first scope with name, empty if none
+    for scope_name, condition, statements in self.scopes:
+      if scope_name == name:
+        return statements
+    return ()
+
+  def getPoints(self):
+    # Point indices of motion statement or path
+    return xrange(self.point_start, self.point_start + self.point_count)
+
+
+#-------------------------------------------------------------------------------
+class PointColumns(object):
+  # Motion and path points. Every column except poses is a typed array, one
+  # entry (joint_count entries for joints) per point, empty if not extracted.
+  # External axis values have a varying count per point, external_start[i] is
+  # the first value of point i. Frame columns are indices into bases/tools,
+  # 0 is *NULL*. Motion type and accuracy method columns are indices into
+  # self.constants, use the getters for their values.
+
+  def __init__(self, columns, joint_count):
+    self.columns = tuple([name for name in POINT_COLUMNS if name in columns])
+    self.joint_count = joint_count
+    self.constants = []
+    self.poses = []
+    self.joints = array.array('d')
+    self.external = array.array('d')
+    self.external_start = array.array('I', [0])
+    self.config = array.array('h')
+    self.turns = array.array('i')
+    self.base = array.array('H')
+    self.tool = array.array('H')
+    self.motion_type = array.array('B')
+    self.speed = array.array('d')
+    self.joint_speed = array.array('d')
+    self.acceleration = array.array('d')
+    self.deceleration = array.array('d')
+    self.accuracy_method = array.array('B')
+    self.accuracy_value = array.array('d')
+
+  def __len__(self):
+    return len(self.poses)
+
+  def has(self, name):
+    return name in self.columns
+
+  def getCode(self, constant):
+    if not constant in self.constants:
+      self.constants.append(constant)
+    return self.constants.index(constant)
+
+  def append(self, pose, values):
+    # values of self.columns in order
+    self.poses.append(pose)
+    for name, value in zip(self.columns, values):
+      if name == 'joints':
+        joints = list(value)[:self.joint_count]
+        self.joints.extend(joints + [0.0] * (self.joint_count - len(joints)))
+      elif name == 'external':
+        self.external.extend(value)
+        self.external_start.append(len(self.external))
+      elif name == 'motion_type' or name == 'accuracy_method':
+        getattr(self, name).append(self.getCode(value))
+      else:
+        getattr(self, name).append(value)
+
+  def getPose(self, i):
+    return self.poses[i]
+
+  def getPoses(self):
+    # Matrices of all points in order
+    return self.poses
+
+  def getPosition(self, i):
+    p = self.poses[i].P
+    return (p.X, p.Y, p.Z)
+
+  def getJoints(self, i):
+    return self.joints[i * self.joint_count:(i + 1) * self.joint_count].tolist()
+
+  def getMotionType(self, i):
+    return self.constants[self.motion_type[i]]
+
+  def getAccuracyMethod(self, i):
+    return self.constants[self.accuracy_method[i]]
+
+  def getExternal(self, i):
+    # External axis values of point
+    return self.external[self.external_start[i]:self.external_start[i + 1]].tolist()
+
+  def getBytes(self):
+    # Size of typed columns, poses not included
+    columns = [self.joints, self.external, self.external_start, self.config, self.turns, self.base, self.tool,
+      self.motion_type, self.speed, self.joint_speed, self.acceleration, self.deceleration,
+      self.accuracy_method, self.accuracy_value]
+    return sum([len(c) * c.itemsize for c in columns])
+
+
+#-------------------------------------------------------------------------------
+class ProgramIR(object):
+
+  def __init__(self, routines, statements, points, bases, tools):
+    self.routines = routines
+    self.statements = statements
+    self.points = points
+    self.bases = bases
+    self.tools = tools
+    self.routine_map = dict([(r.name, r) for r in routines])
+
+  def findRoutine(self, name):
+    return self.routine_map.get(name)
+
+  def getStatements(self, indices):
+    return [self.statements[i] for i in indices]
+
+  def getBaseName(self, i):
+    return self.bases[self.points.base[i]]
+
+  def getToolName(self, i):
+    return self.tools[self.points.tool[i]]
+
+  def statistics(self):
+    count = len(self.points)
+    return 'IR: %i routines, %i statements, %i points, %i column bytes per point' % (len(self.routines),
+      len(self.statements), count, self.points.getBytes() / max(count, 1))
+
+
+#-------------------------------------------------------------------------------
+class Extractor(object):
+  # Builds ProgramIR, reads every needed VC value once
+
+  def __init__(self, program, columns, properties, scopes):
+    self.program = program
+    self.scopes = scopes
+    self.controller = program.Executor.Controller
+    self.target = self.controller.createTarget()
+    self.properties = None
+    if properties is not None:
+      self.properties = set(properties)
+    self.names = {} # (statement type, names) -> shared tuple of property names
+    self.type_names = {} # statement type -> names of first statement
+    self.statements = []
+    self.bases = ['']
+    self.tools = ['']
+    self.frame_index = {('base', ''):0, ('tool', ''):0}
+    joint_count = 0
+    if 'joints' in columns:
+      joint_count = len(self.target.JointValues)
+    self.points = PointColumns(columns, joint_count)
+    self.solve = [name for name in SOLVED_COLUMNS if name in columns]
+
+  def getFrameIndex(self, kind, name):
+    key = (kind, name or '')
+    if not key in self.frame_index:
+      frames = self.bases if kind == 'base' else self.tools
+      self.frame_index[key] = len(frames)
+      frames.append(name)
+    return self.frame_index[key]
+
+  def getProperties(self, statement, statement_type):
+    # (names, properties) to extract, names are shared per statement type
+    if self.properties is not None and statement_type in self.type_names:
+      # Statements of a type have the same properties, look up only the extracted ones
+      names = self.type_names[statement_type]
+      properties = [statement.getProperty(name) for name in names]
+      if not [p for p in properties if p is None]:
+        return names, properties
+    properties = statement.Properties
+    if self.properties is not None:
+      properties = [p for p in properties if p.Name in self.properties]
+    names = tuple([p.Name for p in properties])
+    key = (statement_type, names)
+    if not key in self.names:
+      self.names[key] = names
+    self.type_names.setdefault(statement_type, self.names[key])
+    return self.names[key], properties
+
+  def addStatement(self, statement, routine_index, parent, depth):
+    index = len(self.statements)
+    self.statements.append(None)
+    statement_type = statement.Type
+    names, properties = self.getProperties(statement, statement_type)
+    values = tuple([freezeValue(p.Value) for p in properties])
+    point_start = len(self.points)
+    positions = []
+    external_joint_count = 0
+    if statement_type in MOTION_TYPES:
+      positions = statement.Positions
+      external_joint_count = getAttribute(statement, 'ExternalJointCount', 0)
+      self.addMotionPoint(statement, positions)
+    elif statement_type == VC_STATEMENT_PATH:
+      external_joint_count = getAttribute(statement, 'ExternalJointCount', 0)
+      self.addPathPoints(statement)
+    scopes = []
+    for name, condition, scope in StatementIndex.getNamedScopes(statement):
+      if self.scopes is not None and not name in self.scopes:
+        continue
+      indices = [self.addStatement(s, routine_index, index, depth + 1) for s in scope.Statements]
+      scopes.append((name, condition, tuple(indices)))
+    self.statements[index] = StatementRecord(index = index, type = statement_type,
+      name = getAttribute(statement, 'Name', ''), routine = routine_index, parent = parent, depth = depth,
+      names = names, values = values, scopes = tuple(scopes),
+      position_name = positions[0].Name if positions else '', external_joint_count = external_joint_count,
+      point_start = point_start, point_count = len(self.points) - point_start)
+    return index
+
+  def addMotionPoint(self, statement, positions):
+    t = self.target
+    statement.writeToTarget(t)
+    values = []
+    for name in self.points.columns:
+      if name == 'external':
+        values.append(getAttribute(positions[0], 'ExternalJointValues', []) if positions else [])
+      elif name == 'base' or name == 'tool':
+        values.append(self.getFrameIndex(name, getattr(t, TARGET_ATTRIBUTES[name])))
+      else:
+        values.append(getAttribute(t, TARGET_ATTRIBUTES[name], 0))
+    self.points.append(t.Target, values)
+
+  def addPathPoints(self, statement):
+    t = self.target
+    columns = self.points.columns
+    t.JointTurnMode = VC_MOTIONTARGET_TURN_NEAREST
+    t.TargetMode = VC_MOTIONTARGET_TM_NORMAL
+    t.MotionType = VC_MOTIONTARGET_MT_LINEAR
+    base = getAttribute(statement, 'Base')
+    tool = getAttribute(statement, 'Tool')
+    t.BaseName = base.Name if base else ''
+    t.ToolName = tool.Name if tool else ''
+    constants = {'base':self.getFrameIndex('base', t.BaseName), 'tool':self.getFrameIndex('tool', t.ToolName),
+      'motion_type':VC_MOTIONTARGET_MT_LINEAR, 'joint_speed':0.0}
+    path = PathSchema.PathColumns(statement, ['Position'] + [PATH_COLUMNS[name][0] for name in columns
+      if name in PATH_COLUMNS], 'external' in columns)
+    size = path.size
+    external = [path[schema_name] for schema_name in path.external if path.has(schema_name)]
+    getters = [] # value of column at point index, None for solved columns
+    for name in columns:
+      if name in SOLVED_COLUMNS:
+        getters.append(None)
+      elif name in PATH_COLUMNS:
+        schema_name, default = PATH_COLUMNS[name]
+        getters.append(path.get(schema_name, [default] * size).__getitem__)
+      elif name == 'external':
+        getters.append(lambda i: [column[i] for column in external])
+      else:
+        getters.append(lambda i, value = constants[name]: value)
+    poses = path['Position']
+    for i in xrange(size):
+      pose = poses[i]
+      if self.solve:
+        t.Target = pose
+      values = [get(i) if get else getAttribute(t, TARGET_ATTRIBUTES[name], 0) for name, get in zip(columns, getters)]
+      self.points.append(pose, values)
+
+  def run(self):
+    # Records live as long as the IR, collecting garbage while they are built
+    # would only scan them again and again
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+      routines = []
+      for index, routine in enumerate([self.program.MainRoutine] + list(self.program.Routines)):
+        statements = tuple([self.addStatement(s, index, None, 0) for s in routine.Statements])
+        properties = getAttribute(routine, 'Properties', [])
+        routines.append(RoutineRecord(index = index, name = routine.Name, statements = statements,
+          names = tuple([p.Name for p in properties]), values = tuple([freezeValue(p.Value) for p in properties])))
+    finally:
+      if enabled:
+        gc.enable()
+    self.controller.clearTargets()
+    return ProgramIR(tuple(routines), tuple(self.statements), self.points, tuple(self.bases), tuple(self.tools))
+
+
+def extract(program, columns = POINT_COLUMNS, properties = None, scopes = None):
+  return Extractor(program, columns, properties, scopes).run()
@@ -0,0 +1,159 @@
+#-------------------------------------------------------------------------------
+# Read-once snapshot of a robot program for feeding several translators.
+#
+# ProgramSnapshot wraps the program in caching proxies that keep the VC object
+# interface translators already use. Every attribute and getter (getSchemaValue,
+# getProperty, ...) is read from VC only once. statement.writeToTarget() is
+# resolved once per statement and replayed onto later targets from the stored
+# values. Matrices and lists are handed out as copies so one translator
+# can't change data seen by the next one.
+#
+# Setting an attribute or calling any other method goes through to the live
+# object and drops that object's cached values.
+#-------------------------------------------------------------------------------
+import vcMatrix
+
+PRIMITIVES = (int, long, float, bool, str, unicode, type(None))
+MEMOIZED_METHODS = ['getSchemaValue', 'getSchemaSize', 'getProperty', 'findBehavioursByType',
+  'getBehavioursByType', 'findBehaviour']
+
+# Motion target fields written by writeToTarget, in the order they are replayed
+TARGET_SETUP_FIELDS = ['TargetMode', 'JointTurnMode', 'MotionType', 'BaseName', 'ToolName']
+TARGET_POSE_FIELDS = ['Target', 'JointValues']
+# Set after the pose, setting Target or JointValues solves them again
+TARGET_CONFIG_FIELDS = ['RobotConfig', 'JointTurns', 'ExternalJointValues']
+TARGET_PARAM_FIELDS = ['CartesianSpeed', 'CartesianAcceleration', 'CartesianDeceleration', 'JointSpeedFactor',
+  'AccuracyMethod', 'AccuracyValue']
+
+
+def isMatrix(value):
+  return hasattr(value, 'getWPR') and hasattr(value, 'invert')
+
+
+def unwrap(value):
+  # Live VC object behind a proxy
+  if isinstance(value, SnapshotObject):
+    return object.__getattribute__(value, '_obj')
+  if isinstance(value, (list, tuple)):
+    return type(value)([unwrap(x) for x in value])
+  return value
+
+
+class ProgramSnapshot(object):
+  # Snapshot root. Proxy for the program is in self.program.
+
+  def __init__(self, program):
+    self.hits = 0
+    self.misses = 0
+    self.targets_resolved = 0
+    self.targets_replayed = 0
+    self.program = self.wrap(program)
+
+  def wrap(self, value):
+    # Convert live value into cached form
+    if isinstance(value, PRIMITIVES):
+      return value
+    if isinstance(value, (list, tuple)):
+      return [self.wrap(x) for x in value]
+    if isMatrix(value):
+      return vcMatrix.new(value)
+    return SnapshotObject(value, self)
+
+  def give(self, cached):
+    # Hand out cached value. Mutable values are copied.
+    if isinstance(cached, (SnapshotObject,) + PRIMITIVES):
+      return cached
+    if isinstance(cached, list):
+      return [self.give(x) for x in cached]
+    if isMatrix(cached):
+      return vcMatrix.new(cached)
+    return cached
+
+  def statistics(self):
+    return 'snapshot hits %i, misses %i, targets resolved %i, replayed %i' % \
+      (self.hits, self.misses, self.targets_resolved, self.targets_replayed)
+
+
+class SnapshotObject(object):
+  # Caching proxy of one VC object
+  __slots__ = ('_obj', '_snapshot', '_cache')
+
+  def __init__(self, obj, snapshot):
+    object.__setattr__(self, '_obj', obj)
+    object.__setattr__(self, '_snapshot', snapshot)
+    object.__setattr__(self, '_cache', {})
+
+  def __getattr__(self, name):
+    obj = object.__getattribute__(self, '_obj')
+    snapshot = object.__getattribute__(self, '_snapshot')
+    cache = object.__getattribute__(self, '_cache')
+    if name in cache:
+      snapshot.hits += 1
+      return snapshot.give(cache[name])
+    if name == 'writeToTarget':
+      return self._writeToTarget
+    value = getattr(obj, name)
+    if callable(value) and not isinstance(value, PRIMITIVES):
+      if name in MEMOIZED_METHODS:
+        return lambda *args: self._callMemoized(name, value, args)
+      return lambda *args: self._callThrough(value, args)
+    snapshot.misses += 1
+    cache[name] = snapshot.wrap(value)
+    return snapshot.give(cache[name])
+
+  def __setattr__(self, name, value):
+    setattr(object.__getattribute__(self, '_obj'), name, unwrap(value))
+    object.__getattribute__(self, '_cache').clear()
+
+  def _callMemoized(self, name, method, args):
+    snapshot = object.__getattribute__(self, '_snapshot')
+    cache = object.__getattribute__(self, '_cache')
+    key = (name,) + tuple(unwrap(args))
+    if key in cache:
+      snapshot.hits += 1
+    else:
+      snapshot.misses += 1
+      cache[key] = snapshot.wrap(method(*unwrap(args)))
+    return snapshot.give(cache[key])
+
+  def _callThrough(self, method, args):
+    # Unknown method may change the object, forget cached values
+    object.__getattribute__(self, '_cache').clear()
+    return method(*unwrap(args))
+
+  def _writeToTarget(self, motiontarget):
+    # Resolve target once, replay stored values on later calls
+    snapshot = object.__getattribute__(self, '_snapshot')
+    cache = object.__getattribute__(self, '_cache')
+    motiontarget = unwrap(motiontarget)
+    fields = TARGET_SETUP_FIELDS + TARGET_POSE_FIELDS + TARGET_CONFIG_FIELDS + TARGET_PARAM_FIELDS
+    key = ('writeToTarget',)
+    if not key in cache:
+      object.__getattribute__(self, '_obj').writeToTarget(motiontarget)
+      state = []
+      for field in fields:
+        try:
+          state.append((field, snapshot.wrap(getattr(motiontarget, field))))
+        except AttributeError:
+          pass
+      cache[key] = state
+      snapshot.targets_resolved += 1
+      return
+    for field, value in cache[key]:
+      setattr(motiontarget, field, snapshot.give(value))
+    snapshot.targets_replayed += 1
+
+  def __eq__(self, other):
+    return object.__getattribute__(self, '_obj') == unwrap(other)
+
+  def __ne__(self, other):
+    return not self.__eq__(other)
+
+  def __hash__(self):
+    return hash(object.__getattribute__(self, '_obj'))
+
+  def __nonzero__(self):
+    return bool(object.__getattribute__(self, '_obj'))
+
+  def __repr__(self):
+    return 'SnapshotObject(%r)' % (object.__getattribute__(self, '_obj'),)
@@ -0,0 +1,215 @@
+#-------------------------------------------------------------------------------
+# Progress reporting and cancellation for post-process runs.
+#
+# track() wraps the program handed to a translator. Reading the statements of
+# a routine and touching a statement are reported to a ProgressMonitor, which
+# shows routines done, statements done and ETA through a callback and raises
+# PostProcessCancelled at the next statement once cancel() was called.
+#
+# Totals and progress come from the StatementIndex walk, the same one
+# Timing.countStatements uses. A statement counts as done together with the
+# statements before it in the walk of its routine, so translators that skip
+# statements (nested scopes they don't support, routines that aren't called or
+# didn't change) still move forward. finish() completes the count when the
+# translator returns. Translators don't need changes, everything else on the
+# proxies goes through to the live VC objects.
+#
+# The VC API is only safe on the command thread, so translation runs there.
+# The monitor calls idle between routines and once per update interval; the
+# launcher hands control to VC there so the Progress field is redrawn and
+# action panel events, e.g. Cancel, are delivered while the translator waits.
+#-------------------------------------------------------------------------------
+import os, time
+
+UPDATE_INTERVAL = 1.0 # seconds between progress callbacks
+SCOPE_NAMES = ['Scope', 'ThenScope', 'ElseScope']
+SCOPE_LIST_NAMES = ['ElseIfScopes', 'Cases'] # same scopes as StatementIndex.getNamedScopes
+
+
+class PostProcessCancelled(Exception):
+  pass
+
+
+class ProgressMonitor(object):
+  # Progress through the routines and statements of a StatementIndex.ProgramIndex
+
+  def __init__(self, index, callback = None, interval = UPDATE_INTERVAL, idle = None):
+    self.callback = callback
+    self.interval = interval
+    self.idle = idle
+    self.routine_count = len(index.routines)
+    self.statement_count = len(index.statements)
+    self.routine_numbers = {}
+    self.positions = {}
+    for number, routine in enumerate(index.routines):
+      self.routine_numbers[routine] = number
+      for position, statement in enumerate(index.by_routine[number]):
+        self.positions[statement] = (number, position + 1)
+    self.reached = [0] * self.routine_count # statements done per routine
+    self.routines = set()
+    self.statements = 0
+    self.cancelled = False
+    self.finished = False
+    self.start_time = time.time()
+    self.update_time = 0.0
+
+  def cancel(self):
+    self.cancelled = True
+
+  def check(self):
+    if self.cancelled:
+      raise PostProcessCancelled()
+
+  def routineStarted(self, routine):
+    number = self.routine_numbers.get(routine)
+    if number is None or number in self.routines:
+      return
+    self.routines.add(number)
+    if self.idle:
+      self.idle()
+    self.check()
+    self.update()
+
+  def statementDone(self, statement):
+    self.check()
+    position = self.positions.get(statement)
+    if position is None:
+      return
+    number, count = position
+    if count <= self.reached[number]:
+      return
+    self.statements += count - self.reached[number]
+    self.reached[number] = count
+    self.routines.add(number)
+    self.update()
+
+  def update(self, force = False):
+    # Call callback and idle at most once per interval
+    now = time.time()
+    if force or now - self.update_time >= self.interval:
+      self.update_time = now
+      if self.callback:
+        self.callback(self)
+      if self.idle and not self.finished:
+        self.idle()
+
+  def finish(self):
+    # Translator returned, statements it didn't read were skipped on purpose
+    self.routines = set(range(self.routine_count))
+    self.statements = self.statement_count
+    self.finished = True
+    self.update(True)
+
+  def stop(self):
+    # Translator failed or was cancelled
+    self.finished = True
+
+  def getFraction(self):
+    if not self.statement_count:
+      return 1.0
+    return min(1.0, float(self.statements) / self.statement_count)
+
+  def getEta(self):
+    # Estimated seconds left, None until some statements are done
+    fraction = self.getFraction()
+    if fraction <= 0.0:
+      return None
+    elapsed = time.time() - self.start_time
+    return max(0.0, elapsed / fraction - elapsed)
+
+  def getText(self):
+    eta = self.getEta()
+    eta_text = '-'
+    if eta is not None:
+      eta_text = '%i s' % (eta + 0.5)
+    return 'Routines %i/%i, statements %i/%i, ETA %s' % (len(self.routines), self.routine_count,
+      self.statements, self.statement_count, eta_text)
+
+
+class TrackedObject(object):
+  # Proxy of program, routine, scope or statement that reports reads to a monitor
+  __slots__ = ('_obj', '_monitor', '_kind')
+
+  def __init__(self, obj, monitor, kind):
+    object.__setattr__(self, '_obj', obj)
+    object.__setattr__(self, '_monitor', monitor)
+    object.__setattr__(self, '_kind', kind)
+
+  def __getattr__(self, name):
+    obj = self._obj
+    monitor = self._monitor
+    kind = self._kind
+    value = getattr(obj, name)
+    if kind == 'statement':
+      monitor.statementDone(obj)
+      if name in SCOPE_NAMES and value is not None:
+        return TrackedObject(value, monitor, 'scope')
+      if name == 'Routine' and value is not None:
+        # Called routine, translators that inline calls read it from here
+        return TrackedObject(value, monitor, 'routine')
+      if name in SCOPE_LIST_NAMES:
+        return [TrackedObject(x, monitor, 'scope') for x in value]
+    elif kind == 'program':
+      if name == 'MainRoutine':
+        return TrackedObject(value, monitor, 'routine')
+      if name == 'Routines':
+        return [TrackedObject(x, monitor, 'routine') for x in value]
+    elif name == 'Statements':
+      if kind == 'routine':
+        monitor.routineStarted(obj)
+      return [TrackedObject(x, monitor, 'statement') for x in value]
+    return value
+
+  def __setattr__(self, name, value):
+    setattr(self._obj, name, unwrap(value))
+
+  def __eq__(self, other):
+    return self._obj == unwrap(other)
+
+  def __ne__(self, other):
+    return not self.__eq__(other)
+
+  def __hash__(self):
+    return hash(self._obj)
+
+  def __nonzero__(self):
+    return bool(self._obj)
+
+
+def unwrap(value):
+  if isinstance(value, TrackedObject):
+    return value._obj
+  return value
+
+
+def track(program, monitor):
+  return TrackedObject(program, monitor, 'program')
+
+
+def listFiles(folder):
+  # {path: (mtime, size)} of files directly in folder
+  files = {}
+  if not os.path.isdir(folder):
+    return files
+  for filename in os.listdir(folder):
+    path = os.path.join(folder, filename)
+    if os.path.isfile(path):
+      st = os.stat(path)
+      files[path] = (st.st_mtime, st.st_size)
+  return files
+
+
+def removePartialFiles(folder, files_before):
+  # Remove files the run created in folder, files_before is listFiles() before
+  # the run. Files that existed are never removed, even if the run overwrote
+  # them. Returns removed paths.
+  removed = []
+  for path in listFiles(folder):
+    if path in files_before:
+      continue
+    try:
+      os.remove(path)
+      removed.append(path)
+    except OSError:
+      print 'WARNING: Cannot remove partially written file "%s".' % (path)
+  return removed
@@ -0,0 +1,252 @@
+#-------------------------------------------------------------------------------
+# Records a robot program into a file that can be post-processed without
+# Visual Components (see Replay.py and ReadMe.txt, OFFLINE REPLAY).
+#
+# Captured: routines, statements with their properties, positions and path
+# schema values, robot, tool and base frames with their node chains, joints,
+# positioner controllers, motion target results of statements and path
+# points, VC constants and command settings.
+#
+# Runs inside VC on the command thread. Reading every motion target makes
+# recording about as slow as post-processing once.
+#-------------------------------------------------------------------------------
+from vcCommand import *
+import vcCommand
+import time
+import RecordingFormat
+
+PRIMITIVES = (int, long, float, bool, str, unicode, type(None))
+
+
+def getAttribute(obj, name, default = None):
+  try:
+    return getattr(obj, name)
+  except Exception:
+    return default
+
+
+def isMatrix(value):
+  return hasattr(value, 'getWPR') and hasattr(value, 'invert')
+
+
+class ProgramRecorder(object):
+
+  def __init__(self, app, program):
+    self.app = app
+    self.program = program
+    self.controller = program.Executor.Controller
+    self.nodes = [] # [(node, record)]
+    self.controllers = [] # [(controller, record)]
+
+  # Values
+  def encode(self, value, name = ''):
+    if isinstance(value, PRIMITIVES):
+      return value
+    if isinstance(value, (list, tuple)):
+      return [self.encode(x) for x in value]
+    if isMatrix(value):
+      return RecordingFormat.encodeMatrix(value)
+    if hasattr(value, 'X') and hasattr(value, 'Z') and not hasattr(value, 'Name'):
+      return {'v':[value.X, value.Y, value.Z, getAttribute(value, 'W', 0.0)]}
+    frame = self.findFrame(value, name)
+    if frame:
+      return {'frame':frame}
+    if hasattr(value, 'Statements') and hasattr(value, 'Program'):
+      return {'routine':value.Name}
+    if hasattr(value, 'WorldPositionMatrix'):
+      return {'node':self.getNodeId(value)}
+    return {'name':getAttribute(value, 'Name', '')}
+
+  def findFrame(self, value, name):
+    if not hasattr(value, 'PositionMatrix') or hasattr(value, 'WorldPositionMatrix'):
+      return None
+    kinds = [('base', self.controller.Bases), ('tool', self.controller.Tools)]
+    if name == 'Tool':
+      kinds.reverse()
+    for kind, frames in kinds:
+      for frame in frames:
+        if frame == value:
+          return [kind, frame.Name]
+    return None
+
+  def encodeProperties(self, properties):
+    records = []
+    for prop in properties:
+      try:
+        records.append([prop.Name, prop.Type, self.encode(prop.Value, prop.Name)])
+      except Exception:
+        pass
+    return records
+
+  # Nodes, components and controllers
+  def getNodeId(self, node):
+    if node is None:
+      return None
+    for n, record in self.nodes:
+      if n == node:
+        return record['id']
+    record = {'id':len(self.nodes), 'name':node.Name}
+    self.nodes.append((node, record))
+    record['position'] = RecordingFormat.encodeMatrix(node.PositionMatrix)
+    record['world'] = RecordingFormat.encodeMatrix(node.WorldPositionMatrix)
+    record['parent'] = self.getNodeId(getAttribute(node, 'Parent'))
+    if hasattr(node, 'BOMdescription'):
+      record['kind'] = 'component'
+      record['bom'] = node.BOMdescription
+      record['properties'] = self.encodeProperties(node.Properties)
+      record['behaviours'] = []
+      for behaviour_type in (VC_ROBOTCONTROLLER, VC_SERVOCONTROLLER):
+        for controller in node.findBehavioursByType(behaviour_type):
+          record['behaviours'].append(self.getControllerId(controller))
+    else:
+      record['kind'] = 'node'
+      record['component'] = self.getNodeId(getAttribute(node, 'Component'))
+    return record['id']
+
+  def getControllerId(self, controller):
+    for c, record in self.controllers:
+      if c == controller:
+        return record['id']
+    record = {'id':len(self.controllers), 'name':controller.Name, 'type':controller.Type}
+    self.controllers.append((controller, record))
+    record['component'] = self.getNodeId(controller.Component)
+    record['flange'] = self.getNodeId(getAttribute(controller, 'FlangeNode'))
+    record['joints'] = []
+    for joint in controller.Joints:
+      fields = {}
+      for field in RecordingFormat.JOINT_FIELDS:
+        value = getAttribute(joint, field)
+        if isinstance(value, PRIMITIVES):
+          fields[field] = value
+      record['joints'].append(fields)
+    if controller == self.controller:
+      self.recordRobotController(controller, record)
+    return record['id']
+
+  def recordRobotController(self, controller, record):
+    record['bases'] = [self.encodeFrame(f) for f in controller.Bases]
+    record['tools'] = [self.encodeFrame(f) for f in controller.Tools]
+    record['world_transform'] = RecordingFormat.encodeMatrix(controller.WorldTransformMatrix)
+    record['max_cartesian_accel'] = getAttribute(controller, 'MaxCartesianAccel', 0.0)
+    target = controller.createTarget()
+    record['robot_world'] = RecordingFormat.encodeMatrix(target.getSimWorldToRobotWorld())
+    record['target_defaults'] = self.encodeTarget(target)
+    record['base_matrices'] = {}
+    for name in [''] + [f.Name for f in controller.Bases]:
+      target.BaseName = name
+      record['base_matrices'][name] = self.encode(getAttribute(target, 'BaseMatrix'))
+    record['tool_matrices'] = {}
+    for name in [''] + [f.Name for f in controller.Tools]:
+      target.ToolName = name
+      record['tool_matrices'][name] = self.encode(getAttribute(target, 'ToolMatrix'))
+    record['solutions'] = []
+
+  def encodeFrame(self, frame):
+    return {'name':frame.Name, 'position':RecordingFormat.encodeMatrix(frame.PositionMatrix),
+      'node':self.getNodeId(getAttribute(frame, 'Node')),
+      'properties':self.encodeProperties(getAttribute(frame, 'Properties', []))}
+
+  def encodePosition(self, position):
+    record = {'name':position.Name, 'position':RecordingFormat.encodeMatrix(position.PositionInReference),
+      'properties':self.encodeProperties(getAttribute(position, 'Properties', [])), 'attributes':{}}
+    for name in RecordingFormat.POSITION_ATTRIBUTES:
+      if hasattr(position, name):
+        record['attributes'][name] = self.encode(getattr(position, name), name)
+    return record
+
+  def encodeTarget(self, target):
+    fields = {}
+    for field in RecordingFormat.MOTIONTARGET_FIELDS:
+      try:
+        fields[field] = self.encode(getattr(target, field))
+      except Exception:
+        pass
+    return fields
+
+  def addSolution(self, target):
+    record = self.controllers[self.getControllerId(self.controller)][1]
+    record['solutions'].append([target.BaseName, target.ToolName, RecordingFormat.encodeMatrix(target.Target),
+      list(target.JointValues), target.RobotConfig, getAttribute(target, 'JointTurns', 0)])
+
+  # Program
+  def encodeStatements(self, statements):
+    return [self.encodeStatement(s) for s in statements]
+
+  def encodeStatement(self, statement):
+    record = {'type':statement.Type, 'name':getAttribute(statement, 'Name', '')}
+    record['properties'] = self.encodeProperties(statement.Properties)
+    names = [p[0] for p in record['properties']]
+    record['attributes'] = {}
+    for name in RecordingFormat.STATEMENT_ATTRIBUTES:
+      if not name in names and hasattr(statement, name):
+        record['attributes'][name] = self.encode(getattr(statement, name), name)
+    positions = getAttribute(statement, 'Positions', [])
+    if positions:
+      record['positions'] = [self.encodePosition(p) for p in positions]
+    if hasattr(statement, 'SchemaProperties'):
+      self.recordSchema(statement, record)
+    for name in RecordingFormat.SCOPE_NAMES:
+      if hasattr(statement, name):
+        record.setdefault('scopes', {})[name] = self.encodeStatements(getattr(statement, name).Statements)
+    if hasattr(statement, 'ElseIfScopes'):
+      record['elseifs'] = [{'condition':s.Condition, 'statements':self.encodeStatements(s.Statements)}
+        for s in statement.ElseIfScopes]
+    if hasattr(statement, 'Cases'):
+      record['cases'] = [{'condition':s.CaseCondition, 'statements':self.encodeStatements(s.Statements)}
+        for s in statement.Cases]
+    if statement.Type in (VC_STATEMENT_PTPMOTION, VC_STATEMENT_LINMOTION):
+      target = self.controller.createTarget()
+      statement.writeToTarget(target)
+      record['target'] = self.encodeTarget(target)
+      self.addSolution(target)
+    return record
+
+  def recordSchema(self, statement, record):
+    names = [p.Name for p in statement.SchemaProperties]
+    record['schema'] = {'properties':[[p.Name, p.Type] for p in statement.SchemaProperties], 'rows':[]}
+    target = self.controller.createTarget()
+    target.JointTurnMode = VC_MOTIONTARGET_TURN_NEAREST
+    target.TargetMode = VC_MOTIONTARGET_TM_NORMAL
+    target.MotionType = VC_MOTIONTARGET_MT_LINEAR
+    base = getAttribute(statement, 'Base')
+    tool = getAttribute(statement, 'Tool')
+    target.BaseName = base.Name if base else ''
+    target.ToolName = tool.Name if tool else ''
+    for i in range(statement.getSchemaSize()):
+      row = [self.encode(statement.getSchemaValue(i, name), name) for name in names]
+      record['schema']['rows'].append(row)
+      if 'Position' in names:
+        target.Target = statement.getSchemaValue(i, 'Position')
+        self.addSolution(target)
+
+  def record(self, command = None):
+    constants = {}
+    for name in dir(vcCommand):
+      value = getattr(vcCommand, name)
+      if name.startswith('VC_') and isinstance(value, PRIMITIVES):
+        constants[name] = value
+    executor = self.program.Executor
+    data = {'version':RecordingFormat.FORMAT_VERSION, 'time':time.strftime('%Y-%m-%dT%H:%M:%S'),
+      'constants':constants, 'app':{'ProductVersion':self.app.ProductVersion}}
+    data['world'] = self.getNodeId(self.app.Simulation.World)
+    data['executor'] = {'name':executor.Name, 'component':self.getNodeId(executor.Component),
+      'controller':self.getControllerId(self.controller)}
+    routines = [self.program.MainRoutine] + list(self.program.Routines)
+    data['routines'] = [{'name':r.Name, 'properties':self.encodeProperties(r.Properties),
+      'statements':self.encodeStatements(r.Statements)} for r in routines]
+    data['command'] = []
+    if command:
+      data['command'] = [p for p in self.encodeProperties(command.Properties) if isinstance(p[2], PRIMITIVES)]
+    data['nodes'] = [record for node, record in self.nodes]
+    data['controllers'] = [record for controller, record in self.controllers]
+    self.controller.clearTargets()
+    return data
+
+
+def recordProgram(app, program, uri, command = None):
+  # Write recording of program to uri. command: optional command whose property values are stored as settings.
+  start = time.time()
+  data = ProgramRecorder(app, program).record(command)
+  RecordingFormat.writeFile(uri, data)
+  print 'Program recorded to "%s" in %.2f s.' % (uri, time.time() - start)
+  return uri
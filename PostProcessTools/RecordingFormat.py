@@ -0,0 +1,53 @@
+#-------------------------------------------------------------------------------
+# File format of program recordings (*.vcrec), shared by Recorder (runs in VC)
+# and Offline\Recording (runs without VC).
+#
+# A recording is gzip compressed JSON. Values are stored as plain JSON except:
+#   {"m": [N, O, A, P]}     matrix, 12 numbers
+#   {"v": [X, Y, Z, W]}     vector
+#   {"frame": [kind, name]} base or tool frame of the robot controller
+#   {"routine": name}       routine of the program
+#   {"node": id}            node or component
+#   {"name": name}          any other VC object, only its name is kept
+#-------------------------------------------------------------------------------
+import gzip, json
+
+FORMAT_VERSION = 1
+FILE_SUFFIX = '.vcrec'
+
+# Motion target fields recorded after writeToTarget and for target defaults
+MOTIONTARGET_FIELDS = ['Target', 'JointValues', 'RobotConfig', 'JointTurns', 'MotionType', 'TargetMode',
+  'JointTurnMode', 'BaseName', 'ToolName', 'BaseMatrix', 'ToolMatrix', 'CartesianSpeed', 'CartesianAcceleration',
+  'CartesianDeceleration', 'AngularSpeed', 'AngularAcceleration', 'AngularDeceleration', 'JointSpeedFactor',
+  'JointForceFactor', 'AccuracyMethod', 'AccuracyValue', 'ExternalJointValues', 'UseJoints']
+JOINT_FIELDS = ['Name', 'Type', 'Value', 'CurrentValue', 'MaxSpeed', 'MaxAcceleration', 'ExternalController',
+  'MinValue', 'MaxValue']
+STATEMENT_ATTRIBUTES = ['ExternalJointCount', 'ExternalTCP']
+POSITION_ATTRIBUTES = ['ExternalJointValues']
+SCOPE_NAMES = ['Scope', 'ThenScope', 'ElseScope']
+
+
+def encodeMatrix(m):
+  values = []
+  for v in (m.N, m.O, m.A, m.P):
+    values.extend([v.X, v.Y, v.Z])
+  return {'m':values}
+
+
+def writeFile(uri, data):
+  f = gzip.open(uri, 'wb')
+  try:
+    json.dump(data, f, separators=(',', ':'))
+  finally:
+    f.close()
+
+
+def readFile(uri):
+  f = gzip.open(uri, 'rb')
+  try:
+    data = json.load(f)
+  finally:
+    f.close()
+  if data.get('version') != FORMAT_VERSION:
+    raise ValueError('Unsupported recording version %s in "%s"' % (data.get('version'), uri))
+  return data
@@ -0,0 +1,74 @@
+#-------------------------------------------------------------------------------
+# Post-process a program recording without Visual Components.
+#
+#   python PostProcessTools/Replay.py <recording> <output folder> [manufacturer ...]
+#
+# Needs the Python 2.7 the translators are written for. The stand-ins in
+# Offline\ are put first on the module search path, the recording is loaded
+# and every translator (or the listed ones) writes into
+# <output folder>/<manufacturer>/. Exit code is 1 if any translator failed.
+#-------------------------------------------------------------------------------
+import os, sys, traceback
+
+TOOLS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+OFFLINE_FOLDER = os.path.join(TOOLS_FOLDER, 'Offline')
+ADDON_FOLDER = os.path.dirname(TOOLS_FOLDER)
+TRANSLATORS_DIR_NAME = 'Translators'
+
+
+def installStandIns():
+  # Offline vcCommand, vcMatrix and vcVector shadow the VC modules
+  for folder in (TOOLS_FOLDER, OFFLINE_FOLDER):
+    if folder in sys.path:
+      sys.path.remove(folder)
+    sys.path.insert(0, folder)
+
+
+def getRegistry():
+  import TranslatorManifest
+  translators_folder = os.path.join(ADDON_FOLDER, TRANSLATORS_DIR_NAME)
+  return TranslatorManifest.TranslatorRegistry(translators_folder, TRANSLATORS_DIR_NAME)
+
+
+def runTranslators(session, output_folder, job_name, manufacturers = None):
+  # Run translators on a loaded OfflineSession. Returns list of summaries.
+  import BatchPostProcess
+  registry = getRegistry()
+  if not manufacturers:
+    manufacturers = registry.keys()
+  robot_name = session.program.Executor.Component.Name
+  summaries = []
+  for manufacturer in manufacturers:
+    summary = {'robot':robot_name, 'translator':manufacturer, 'ok':False, 'seconds':0.0, 'files':[], 'bytes':0}
+    if not manufacturer in registry:
+      print 'WARNING: No post processor %s, skipped.' % (manufacturer)
+      summaries.append(summary)
+      continue
+    folder = os.path.join(output_folder, BatchPostProcess.getSafeName(manufacturer))
+    uri = BatchPostProcess.getOutputUri(registry, manufacturer, folder, job_name)
+    try:
+      BatchPostProcess.runTranslator(session.app, registry, manufacturer, session.program, uri, summary)
+    except Exception:
+      print 'ERROR: %s post processor failed:' % (manufacturer)
+      traceback.print_exc()
+    summaries.append(summary)
+  BatchPostProcess.collectFileSizes(summaries)
+  return summaries
+
+
+def replay(recording_uri, output_folder, manufacturers = None):
+  installStandIns()
+  import Recording, BatchPostProcess
+  session = Recording.load(recording_uri)
+  job_name = os.path.basename(recording_uri).split('.')[0]
+  summaries = runTranslators(session, output_folder, job_name, manufacturers)
+  BatchPostProcess.printSummary(summaries)
+  return summaries
+
+
+if __name__ == '__main__':
+  if len(sys.argv) < 3:
+    print 'usage: Replay.py <recording> <output folder> [manufacturer ...]'
+    sys.exit(2)
+  summaries = replay(sys.argv[1], sys.argv[2], sys.argv[3:])
+  sys.exit(int(not all([s['ok'] for s in summaries])))
@@ -0,0 +1,168 @@
+#-------------------------------------------------------------------------------
+# Per-routine change manifest for incremental post-processing.
+#
+# Translators that write one file per routine keep <output>.routines.json next
+# to the main output file. For every routine it stores a hash of the routine
+# (name, properties and statements, see OutputCache), the translator's shared
+# state before and after the routine (label counters, register maps, used
+# frames...) and size and SHA-1 of the written file. The whole manifest is
+# valid only for the same translator and PostProcessTools source, settings and
+# robot frames.
+#
+# A routine is translated again when its hash changed, when the shared state
+# coming from earlier routines differs from last run, or when its file was
+# changed or removed. Otherwise the file is left untouched and the stored
+# state after the routine is restored, so later routines see the same state
+# as in a full run.
+#
+# Files shared by all routines (frames, tool data) are written only when their
+# text changed, see isSharedFileCurrent(). An unchanged file keeps its creation
+# date.
+#
+# The launcher enables manifests for one run with begin() and end().
+# Translators called from elsewhere (batch, replay) get None from
+# openManifest() and write every routine:
+#
+#   manifest = RoutineManifest.openManifest(uri, program)
+#   state = manifest.check(routine, name, filename, state)  # None: translate
+#   manifest.record(routine, name, filename, state_in, state_out)
+#   manifest.save()
+#-------------------------------------------------------------------------------
+import os, json, hashlib
+import OutputCache, Progress
+
+MANIFEST_SUFFIX = '.routines.json'
+MANIFEST_VERSION = 1
+
+session = None # (translator file, settings) of running post-process, see begin()
+
+
+def begin(translator_file, settings):
+  # Enable manifests for translator, settings is list of (name, value)
+  global session
+  session = (translator_file, settings)
+
+
+def end():
+  global session
+  session = None
+
+
+def normalize(state):
+  # Shared state as it compares after a JSON round trip
+  return json.loads(json.dumps(state, sort_keys = True))
+
+
+def getSharedKey(program, translator_file, settings):
+  # Hash of everything that affects all routines
+  h = hashlib.sha1()
+  OutputCache.feed(h, 'translator %s' % OutputCache.fileDigest(translator_file))
+  OutputCache.feed(h, 'tools %s' % OutputCache.toolsDigest())
+  for name, value in settings:
+    OutputCache.feed(h, 'setting %s=%s' % (name, OutputCache.valueText(value)))
+  OutputCache.hashFrames(h, program.Executor.Controller)
+  for routine in [program.MainRoutine] + list(program.Routines):
+    OutputCache.feed(h, 'routine %s' % routine.Name)
+  return h.hexdigest()
+
+
+def getRoutineKey(routine, name):
+  # Hashing reads the live routine, statements are not counted as translated progress
+  routine = Progress.unwrap(routine)
+  h = hashlib.sha1()
+  OutputCache.feed(h, 'routine %s' % name)
+  OutputCache.hashProperties(h, routine.Properties)
+  OutputCache.hashScope(h, routine)
+  return h.hexdigest()
+
+
+def openManifest(uri, program):
+  # Manifest for output uri, None if not enabled for this run
+  if not session:
+    return None
+  translator_file, settings = session
+  try:
+    shared_key = getSharedKey(program, translator_file, settings)
+  except Exception, e:
+    print 'WARNING: Incremental output skipped, cannot hash program: %s' % (e)
+    return None
+  manifest = RoutineManifest(uri, shared_key)
+  manifest.load()
+  return manifest
+
+
+class RoutineManifest(object):
+
+  def __init__(self, uri, shared_key):
+    self.uri = uri + MANIFEST_SUFFIX
+    self.shared_key = shared_key
+    self.stored = {}   # routine name -> entry of last run
+    self.entries = {}  # routine name -> entry of this run
+    self.keys = {}
+    self.skipped = []
+    self.translated = []
+    self.shared_skipped = []
+    self.shared_written = []
+
+  def load(self):
+    try:
+      with open(self.uri, 'r') as manifest_file:
+        data = json.load(manifest_file)
+    except (IOError, ValueError):
+      return
+    if data.get('version') == MANIFEST_VERSION and data.get('shared') == self.shared_key:
+      self.stored = data.get('routines', {})
+
+  def isFileCurrent(self, entry, filename):
+    return (entry['file'] == filename and os.path.isfile(filename) and os.path.getsize(filename) == entry['size']
+      and OutputCache.fileDigest(filename) == entry['sha1'])
+
+  def check(self, routine, name, filename, state):
+    # Stored state after routine if its file is up to date, None if routine must be translated
+    key = getRoutineKey(routine, name)
+    self.keys[name] = key
+    entry = self.stored.get(name)
+    if not entry or entry['key'] != key or entry['state_in'] != normalize(state):
+      return None
+    if not self.isFileCurrent(entry, filename):
+      return None
+    self.entries[name] = entry
+    self.skipped.append(filename)
+    return entry['state_out']
+
+  def record(self, routine, name, filename, state_in, state_out):
+    # Routine was translated into filename
+    if not name in self.keys:
+      self.keys[name] = getRoutineKey(routine, name)
+    self.entries[name] = {'key':self.keys[name], 'file':filename, 'state_in':normalize(state_in),
+      'state_out':normalize(state_out), 'size':os.path.getsize(filename), 'sha1':OutputCache.fileDigest(filename)}
+    self.translated.append(filename)
+
+  def isSharedFileCurrent(self, filename, text, ignore = None):
+    # True if filename already holds text and can be left untouched. Lines matched by
+    # regular expression ignore (e.g. creation date) may differ.
+    try:
+      with open(filename, 'r') as shared_file:
+        old_text = shared_file.read()
+    except IOError:
+      old_text = None
+    if old_text is not None and ignore:
+      old_text, text = ignore.sub('', old_text), ignore.sub('', text)
+    if old_text == text:
+      self.shared_skipped.append(filename)
+      return True
+    self.shared_written.append(filename)
+    return False
+
+  def save(self):
+    data = {'version':MANIFEST_VERSION, 'shared':self.shared_key, 'routines':self.entries}
+    try:
+      with open(self.uri, 'w') as manifest_file:
+        json.dump(data, manifest_file, indent=1, sort_keys=True)
+    except (IOError, OSError):
+      print 'WARNING: Cannot write routine manifest "%s".' % (self.uri)
+      return False
+    print 'Incremental output: %i routines unchanged, %i translated.' % (len(self.skipped), len(self.translated))
+    if self.shared_skipped or self.shared_written:
+      print 'Incremental output: %i shared files unchanged, %i written.' % (len(self.shared_skipped), len(self.shared_written))
+    return True
@@ -0,0 +1,131 @@
+#-------------------------------------------------------------------------------
+# One walk over a robot program, shared by the translators.
+#
+# ProgramIndex(program) visits every statement once, nested scopes included
+# (While, If Then/ElseIf/Else and SwitchCase cases), in program order:
+# a statement comes before the statements of its scopes. The result is indexed
+# by routine and by statement type. Used bases, tools, IO ports and variables
+# are collected on first request.
+#
+# Build one index per postProcess call. The program can change between runs
+# and the index doesn't notice.
+#-------------------------------------------------------------------------------
+from vcCommand import *
+
+SCOPE_NAMES = ['Scope', 'ThenScope']
+SCOPE_TYPES = [VC_STATEMENT_WHILE, VC_STATEMENT_IF, VC_STATEMENT_SWITCHCASE]
+FRAME_TYPES = [VC_STATEMENT_PTPMOTION, VC_STATEMENT_LINMOTION, VC_STATEMENT_PATH]
+
+
+def getAttribute(obj, name, default = None):
+  try:
+    return getattr(obj, name)
+  except Exception:
+    return default
+
+
+def getNamedScopes(statement):
+  # [(scope name, condition, scope)] of statement in program order. Scope names
+  # are Scope, ThenScope, ElseIf, ElseScope and Case.
+  if not statement.Type in SCOPE_TYPES:
+    return []
+  scopes = []
+  for name in SCOPE_NAMES:
+    scope = getAttribute(statement, name)
+    if scope is not None:
+      scopes.append((name, '', scope))
+  for scope in getAttribute(statement, 'ElseIfScopes', []):
+    scopes.append(('ElseIf', scope.Condition, scope))
+  scope = getAttribute(statement, 'ElseScope')
+  if scope is not None:
+    scopes.append(('ElseScope', '', scope))
+  for scope in getAttribute(statement, 'Cases', []):
+    scopes.append(('Case', scope.CaseCondition, scope))
+  return scopes
+
+
+def getScopes(statement):
+  # Child scopes of statement in program order
+  return [scope for name, condition, scope in getNamedScopes(statement)]
+
+
+def walk(statements, scope_names = None):
+  # Statements and all nested statements in program order, without recursion.
+  # scope_names limits the nested scopes visited, e.g. ['ThenScope', 'ElseScope'].
+  stack = [iter(statements)]
+  while stack:
+    for statement in stack[-1]:
+      yield statement
+      scopes = [scope for name, condition, scope in getNamedScopes(statement)
+        if scope_names is None or name in scope_names]
+      if scopes:
+        stack.extend([iter(s.Statements) for s in reversed(scopes)])
+        break
+    else:
+      stack.pop()
+
+
+def addUnique(items, value):
+  if value is not None and not value in items:
+    items.append(value)
+
+
+class ProgramIndex(object):
+
+  def __init__(self, program):
+    self.program = program
+    self.routines = [program.MainRoutine] + list(program.Routines)
+    self.statements = []
+    self.by_routine = []
+    self.by_type = {}
+    for routine in self.routines:
+      statements = []
+      for statement in walk(routine.Statements):
+        statements.append(statement)
+        self.by_type.setdefault(statement.Type, []).append(statement)
+      self.by_routine.append(statements)
+      self.statements.extend(statements)
+    self.usage = None
+
+  def getStatements(self, scope = None):
+    # All statements of program, or of routine or scope at any level
+    if scope is None:
+      return list(self.statements)
+    for routine, statements in zip(self.routines, self.by_routine):
+      if routine == scope:
+        return list(statements)
+    return list(walk(scope.Statements))
+
+  def getStatementsByType(self, *types):
+    # Statements of given types in program order
+    if len(types) == 1:
+      return list(self.by_type.get(types[0], []))
+    types = set(types)
+    return [s for s in self.statements if s.Type in types]
+
+  def getUsage(self):
+    # {'bases', 'tools', 'inputs', 'outputs', 'variables'} used in program, in first use order.
+    # Frames are names, variables are names of assigned properties.
+    if self.usage is not None:
+      return self.usage
+    usage = {'bases':[], 'tools':[], 'inputs':[], 'outputs':[], 'variables':[]}
+    for statement in self.statements:
+      if statement.Type in FRAME_TYPES:
+        base = getAttribute(statement, 'Base')
+        tool = getAttribute(statement, 'Tool')
+        addUnique(usage['bases'], base.Name if base else '')
+        addUnique(usage['tools'], tool.Name if tool else '')
+      elif statement.Type == VC_STATEMENT_DEFINE_BASE:
+        base = getAttribute(statement, 'Base')
+        addUnique(usage['bases'], base.Name if base else '')
+      elif statement.Type == VC_STATEMENT_DEFINE_TOOL:
+        tool = getAttribute(statement, 'Tool')
+        addUnique(usage['tools'], tool.Name if tool else '')
+      elif statement.Type == VC_STATEMENT_SETBIN:
+        addUnique(usage['outputs'], statement.OutputPort)
+      elif statement.Type == VC_STATEMENT_WAITBIN:
+        addUnique(usage['inputs'], statement.InputPort)
+      elif statement.Type == VC_STATEMENT_SETPROPERTY:
+        addUnique(usage['variables'], statement.TargetProperty)
+    self.usage = usage
+    return usage
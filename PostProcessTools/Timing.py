@@ -0,0 +1,123 @@
+#-------------------------------------------------------------------------------
+# Per-phase timing of a post-process run.
+#
+# PhaseTimer records wall and CPU time of named phases (translator discovery,
+# property setup, postProcess, external axis removal, clearTargets). The
+# report is printed as a table and written as a JSON sidecar next to the
+# output (<output>.timing.json) so runs can be compared between releases.
+#-------------------------------------------------------------------------------
+import os, json, time, contextlib
+import StatementIndex
+
+SIDECAR_SUFFIX = '.timing.json'
+SIDECAR_VERSION = 1
+
+
+def getCpuTime():
+  # User + system time of this process
+  times = os.times()
+  return times[0] + times[1]
+
+
+class PhaseTimer(object):
+  # Wall and CPU time per phase, phases are kept in first-run order
+
+  def __init__(self):
+    self.names = []
+    self.phases = {}
+
+  @contextlib.contextmanager
+  def phase(self, name):
+    # with timer.phase('postProcess'): ...   Repeated phases are accumulated.
+    wall = time.time()
+    cpu = getCpuTime()
+    try:
+      yield
+    finally:
+      self.add(name, time.time() - wall, getCpuTime() - cpu)
+
+  def add(self, name, wall, cpu):
+    if not name in self.phases:
+      self.names.append(name)
+      self.phases[name] = {'wall':0.0, 'cpu':0.0, 'calls':0}
+    p = self.phases[name]
+    p['wall'] += wall
+    p['cpu'] += cpu
+    p['calls'] += 1
+
+  def getWall(self, name):
+    if not name in self.phases:
+      return 0.0
+    return self.phases[name]['wall']
+
+  def clear(self, names = None):
+    # Forget given phases, all if names is None
+    for name in list(self.names):
+      if names is None or name in names:
+        self.names.remove(name)
+        del self.phases[name]
+
+
+def countStatements(program):
+  # Statements in all routines of program, nested scopes included
+  routines = [program.MainRoutine] + list(program.Routines)
+  return sum([len(list(StatementIndex.walk(r.Statements))) for r in routines])
+
+
+def getFileSizes(filenames):
+  # [(file, bytes)], missing files count as zero
+  sizes = []
+  for filename in filenames:
+    try:
+      sizes.append((filename, os.path.getsize(filename)))
+    except OSError:
+      sizes.append((filename, 0))
+  return sizes
+
+
+def createReport(timer, statement_count, filenames, rate_phase = 'postProcess', info = None):
+  # Dictionary of phases, throughput and output files. info is added as is (translator, version, ...).
+  report = {'version':SIDECAR_VERSION, 'time':time.strftime('%Y-%m-%dT%H:%M:%S'), 'phases':[], 'files':[]}
+  if info:
+    report.update(info)
+  for name in timer.names:
+    p = timer.phases[name]
+    report['phases'].append({'name':name, 'wall':p['wall'], 'cpu':p['cpu'], 'calls':p['calls']})
+  seconds = max(timer.getWall(rate_phase), 1e-6)
+  report['statements'] = statement_count
+  report['statements_per_second'] = statement_count / seconds
+  total_bytes = 0
+  for filename, size in getFileSizes(filenames):
+    report['files'].append({'file':filename, 'bytes':size})
+    total_bytes += size
+  report['bytes'] = total_bytes
+  report['bytes_per_second'] = total_bytes / seconds
+  return report
+
+
+def printReport(report):
+  # Compact table on console
+  print '%-24s %9s %9s %6s' % ('Phase', 'Wall (s)', 'CPU (s)', 'Calls')
+  total_wall = 0.0
+  total_cpu = 0.0
+  for p in report['phases']:
+    print '%-24s %9.3f %9.3f %6i' % (p['name'][:24], p['wall'], p['cpu'], p['calls'])
+    total_wall += p['wall']
+    total_cpu += p['cpu']
+  print '%-24s %9.3f %9.3f' % ('Total', total_wall, total_cpu)
+  print '%i statements, %.0f statements/s, %i bytes, %.1f kB/s' % \
+    (report['statements'], report['statements_per_second'], report['bytes'], report['bytes_per_second'] / 1024.0)
+  for f in report['files']:
+    print '%12i  %s' % (f['bytes'], os.path.basename(f['file']))
+
+
+def writeSidecar(output_uri, report):
+  # Write report next to output file, returns sidecar path or None on failure
+  sidecar_uri = output_uri + SIDECAR_SUFFIX
+  try:
+    with open(sidecar_uri, 'w') as sidecar:
+      json.dump(report, sidecar, indent=1, sort_keys=True)
+  except (IOError, OSError):
+    print 'WARNING: Cannot write timing file "%s".' % (sidecar_uri)
+    return None
+  return sidecar_uri
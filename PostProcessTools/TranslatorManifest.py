@@ -0,0 +1,164 @@
+#-------------------------------------------------------------------------------
+# Translator manifest for the post-process launchers.
+#
+# Translator metadata (manufacturer, file type, file filter and which optional
+# hooks the module defines) is derived from the file name and a text scan of
+# the source, so the launcher can show its dialog without importing every
+# translator. Entries are keyed by file mtime and size and cached on disk.
+# Modules are imported on first use and reloaded only when their source changed.
+#
+# The scan finds hooks defined with def. A hook name that appears in the source
+# otherwise (assigned, imported) is only a candidate: the module is imported
+# and its attributes decide. Hooks of an imported module always come from its
+# attributes, as with dir(module).
+#-------------------------------------------------------------------------------
+import os, sys, re, json, importlib
+
+MANIFEST_FILE_NAME = 'TranslatorManifest.json'
+MANIFEST_VERSION = 2
+OPTIONAL_HOOKS = ['getProperties', 'getFileFilter', 'getDefaultJobName', 'updateActionPanel']
+HOOK_RE = re.compile(r'^def\s+(%s)\s*\(' % '|'.join(OPTIONAL_HOOKS), re.M)
+NAME_RE = re.compile(r'\b(%s)\b' % '|'.join(OPTIONAL_HOOKS))
+
+# (mtime, size) of each module at the time it was (re)loaded, kept for the whole VC session
+loaded_stamps = {}
+
+
+def parseFileName(filename):
+  # Translator name example:  ACME_obd.py => manufacturer "ACME", file type "obd"
+  # Translator name example:  test.py => manufacturer "test", file type "test"
+  filebasename = os.path.splitext(filename)[0]
+  tokens = filebasename.split('_')
+  if len(tokens) < 2:
+    return tokens[0], tokens[0]
+  return tokens[-2], tokens[-1]
+
+
+def scanHooks(path):
+  # Names of optional launcher hooks defined at module level and names of the
+  # other hooks mentioned in the source, which the module may still provide
+  with open(path, 'r') as source:
+    text = source.read()
+  hooks = []
+  for match in HOOK_RE.finditer(text):
+    if not match.group(1) in hooks:
+      hooks.append(match.group(1))
+  candidates = []
+  for match in NAME_RE.finditer(text):
+    if not match.group(1) in hooks and not match.group(1) in candidates:
+      candidates.append(match.group(1))
+  return hooks, candidates
+
+
+def getModuleHooks(module):
+  # Optional hooks provided by imported module
+  return [hook for hook in OPTIONAL_HOOKS if callable(getattr(module, hook, None))]
+
+
+def loadManifestFile(manifest_uri):
+  try:
+    with open(manifest_uri, 'r') as manifest_file:
+      data = json.load(manifest_file)
+    if data.get('version') == MANIFEST_VERSION:
+      return data.get('entries', {})
+  except:
+    pass
+  return {}
+
+
+def saveManifestFile(manifest_uri, entries):
+  try:
+    with open(manifest_uri, 'w') as manifest_file:
+      json.dump({'version':MANIFEST_VERSION, 'entries':entries}, manifest_file, indent=1, sort_keys=True)
+  except:
+    print 'WARNING: Cannot write translator manifest "%s".' % (manifest_uri)
+
+
+def buildManifest(translators_folder):
+  # Return manifest entries per file name. Only files whose mtime or size changed are rescanned.
+  manifest_uri = os.path.join(translators_folder, MANIFEST_FILE_NAME)
+  cached = loadManifestFile(manifest_uri)
+  entries = {}
+  changed = False
+  for filename in sorted(os.listdir(translators_folder)):
+    filename = str(filename)
+    filebasename, extension = os.path.splitext(filename)
+    if extension != '.py' or '__init__' in filename:
+      continue
+    path = os.path.join(translators_folder, filename)
+    st = os.stat(path)
+    entry = cached.get(filename)
+    if entry and entry['mtime'] == st.st_mtime and entry['size'] == st.st_size:
+      entries[filename] = entry
+      continue
+    manufacturer, filetype = parseFileName(filename)
+    hooks, candidates = scanHooks(path)
+    entries[filename] = {
+      'module':filebasename,
+      'manufacturer':manufacturer,
+      'filetype':filetype,
+      'filter':'%s Robot Program file (*.%s)|*.%s' % (manufacturer, filetype, filetype),
+      'hooks':hooks,
+      'candidates':candidates,
+      'mtime':st.st_mtime,
+      'size':st.st_size }
+    changed = True
+  if changed or len(entries) != len(cached):
+    saveManifestFile(manifest_uri, entries)
+  return entries
+
+
+class TranslatorRegistry(object):
+  # Dictionary-like view of the translators keyed by manufacturer. Modules are imported lazily.
+
+  def __init__(self, translators_folder, package_name):
+    self.folder = translators_folder
+    self.package = package_name
+    self.entries = {}
+    self.file_filters = {}
+    for entry in buildManifest(translators_folder).values():
+      self.entries[entry['manufacturer']] = entry
+      self.file_filters[entry['manufacturer']] = entry['filter']
+
+  def keys(self):
+    return sorted(self.entries.keys())
+
+  def __len__(self):
+    return len(self.entries)
+
+  def __contains__(self, manufacturer):
+    return manufacturer in self.entries
+
+  def __getitem__(self, manufacturer):
+    return self.getModule(manufacturer)
+
+  def defines(self, manufacturer, hook):
+    # True if translator defines given optional hook. Hooks defined with def are
+    # checked without importing it, candidates import the module.
+    entry = self.entries.get(manufacturer)
+    if not entry:
+      return False
+    if hook in entry['hooks']:
+      return True
+    if hook in entry['candidates']:
+      self.getModule(manufacturer)
+      return hook in entry['hooks']
+    return False
+
+  def getSourceFile(self, manufacturer):
+    return os.path.join(self.folder, self.entries[manufacturer]['module'] + '.py')
+
+  def getModule(self, manufacturer):
+    # Import translator on first use, reload only if its source has changed since last load
+    entry = self.entries[manufacturer]
+    module_name = self.package + '.' + entry['module']
+    stamp = (entry['mtime'], entry['size'])
+    module = sys.modules.get(module_name)
+    if module is None:
+      module = importlib.import_module(module_name)
+    elif loaded_stamps.get(module_name) != stamp:
+      module = reload(module)
+    loaded_stamps[module_name] = stamp
+    entry['hooks'] = getModuleHooks(module)
+    entry['candidates'] = []
+    return module
@@ -0,0 +1,93 @@
+#-------------------------------------------------------------------------------
+# Unique name allocation for positions, labels and variables.
+#
+# UniqueNames keeps used names in a set, so membership checks are constant
+# time. When a name is taken, candidates seed + separator + index are tried
+# from a start index. Names are never removed, so the indices already found
+# taken for a (seed, separator) pair are remembered and skipped on the next
+# call: giving n names the same seed costs O(n) in total instead of O(n^2).
+# Results are the same as scanning from the start index every time.
+#
+# Optional vendor rules: max_length truncates the seed so that seed, separator
+# and index fit, invalid is a regular expression of characters replaced with
+# replacement.
+#
+#   names = UniqueNames.UniqueNames()
+#   names.allocate('P1', 'P', 1)       # 'P1'
+#   names.allocate('P1', 'P', 1)       # 'P2'
+#-------------------------------------------------------------------------------
+import re
+
+
+class UniqueNames(object):
+
+  def __init__(self, names = (), max_length = None, invalid = None, replacement = '_'):
+    self.names = set(names)
+    self.max_length = max_length
+    self.invalid = re.compile(invalid) if invalid else None
+    self.replacement = replacement
+    self.taken = {}  # (seed, separator) -> (first, last) index range known to be taken
+
+  def legalize(self, name):
+    # Name with vendor charset rule applied
+    if self.invalid:
+      name = self.invalid.sub(self.replacement, name)
+    if self.max_length and len(name) > self.max_length:
+      name = name[:self.max_length]
+    return name
+
+  def getCandidate(self, seed, separator, index):
+    suffix = '%s%i' % (separator, index)
+    if self.max_length and len(seed) + len(suffix) > self.max_length:
+      seed = seed[:max(0, self.max_length - len(suffix))]
+    return self.legalize(seed + suffix)
+
+  def getIndexed(self, seed, start = 1, separator = ''):
+    # First free seed + separator + index with index >= start. Name is not reserved.
+    key = (seed, separator)
+    index = start
+    if key in self.taken:
+      first, last = self.taken[key]
+      if first <= start <= last + 1:
+        index = last + 1
+      else:
+        first = start
+    else:
+      first = start
+    name = self.getCandidate(seed, separator, index)
+    while name in self.names:
+      index += 1
+      name = self.getCandidate(seed, separator, index)
+    self.taken[key] = (first, index - 1)
+    return name
+
+  def getUnique(self, name, seed, start = 1, separator = ''):
+    # name if free, otherwise first free indexed name. Name is not reserved.
+    name = self.legalize(name)
+    if not name in self.names:
+      return name
+    return self.getIndexed(seed, start, separator)
+
+  def allocate(self, name, seed, start = 1, separator = ''):
+    # getUnique and reserve result
+    name = self.getUnique(name, seed, start, separator)
+    self.names.add(name)
+    return name
+
+  def allocateIndexed(self, seed, start = 1, separator = ''):
+    # getIndexed and reserve result
+    name = self.getIndexed(seed, start, separator)
+    self.names.add(name)
+    return name
+
+  def add(self, name):
+    self.names.add(name)
+
+  def __contains__(self, name):
+    return name in self.names
+
+  def __len__(self):
+    return len(self.names)
+
+  def __iter__(self):
+    return iter(self.names)
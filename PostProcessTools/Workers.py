@@ -0,0 +1,105 @@
+#-------------------------------------------------------------------------------
+# Bounded thread pool for IO bound file work and process pool for CPU bound
+# work. Python threads hold the GIL while running python code, so the thread
+# pool only overlaps waiting on disk; it doesn't speed up text processing.
+#
+# Only use for work that doesn't touch the VC API (file IO, text processing).
+# VC objects must be accessed from the thread that runs the command.
+#
+# runInProcesses uses worker processes only when post-processing offline with
+# a python interpreter (Replay, Benchmark) and the function is importable by
+# module name. Inside Visual Components sys.executable is the VC host, which
+# can't run as a pool worker, and a plain interpreter can't import modules
+# that need vcCommand, so there the items always run in the caller. Results
+# are returned in item order in both cases, so output doesn't depend on
+# scheduling.
+#-------------------------------------------------------------------------------
+import os, sys, threading, Queue, importlib
+
+MAX_WORKERS = 4
+
+
+def runInThreads(function, items, max_workers = MAX_WORKERS):
+  # Call function(item) for every item using at most max_workers threads.
+  # Returns results in the same order as items. First exception is re-raised in caller.
+  items = list(items)
+  results = [None] * len(items)
+  errors = []
+  worker_count = max(1, min(max_workers, len(items)))
+  if worker_count == 1:
+    return [function(item) for item in items]
+
+  jobs = Queue.Queue()
+  for index, item in enumerate(items):
+    jobs.put((index, item))
+
+  def work():
+    while not errors:
+      try:
+        index, item = jobs.get_nowait()
+      except Queue.Empty:
+        return
+      try:
+        results[index] = function(item)
+      except:
+        errors.append(sys.exc_info())
+
+  threads = [threading.Thread(target=work) for i in range(worker_count)]
+  for thread in threads:
+    thread.daemon = True
+    thread.start()
+  for thread in threads:
+    thread.join()
+  if errors:
+    exc_type, exc_value, exc_traceback = errors[0]
+    raise exc_type, exc_value, exc_traceback
+  return results
+
+
+def getProcessCount():
+  try:
+    import multiprocessing
+    return multiprocessing.cpu_count()
+  except (ImportError, NotImplementedError):
+    return 1
+
+
+def canUseProcesses(function):
+  # Worker processes start sys.executable and import function by module name.
+  # False inside VC, see header.
+  name = os.path.basename(sys.executable or '').lower()
+  if not name.startswith('python'):
+    return False
+  try:
+    import multiprocessing
+    module = importlib.import_module(function.__module__)
+  except ImportError:
+    return False
+  return getattr(module, function.__name__, None) is function
+
+
+def runInProcesses(function, items, max_workers = None, initializer = None, initargs = ()):
+  # Call function(item) for every item in worker processes, see header.
+  # function must be a module level function, items, initargs and results
+  # picklable. initializer(*initargs) runs once per worker before any item,
+  # use it to hand shared read-only data to the workers.
+  items = list(items)
+  if max_workers is None:
+    max_workers = getProcessCount()
+  worker_count = max(1, min(max_workers, len(items)))
+  if worker_count == 1 or not canUseProcesses(function):
+    if initializer:
+      initializer(*initargs)
+    return [function(item) for item in items]
+
+  import multiprocessing
+  pool = multiprocessing.Pool(worker_count, initializer, initargs)
+  try:
+    results = pool.map(function, items, 1)
+  except:
+    pool.terminate()
+    pool.join()
+    raise
+  pool.close()
+  pool.join()
+  return results
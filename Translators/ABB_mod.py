@@ -3,6 +3,7 @@
 #-------------------------------------------------------------------------------
 from math import e
 from vcCommand import *
+from PostProcessTools import StatementIndex, OutputBuffer, PathSchema, PoseFormat, UniqueNames, Expression
 import os.path
 import re
 import vcMatrix, vcVector
@@ -16,10 +17,11 @@ class TranslatorHelper:
   def __init__(self, app, program, uri):
     
     # 
-    self.data =    ''         # Translated program lines
-    self.positions = ''       # Translated robot positions
-    self.eio = ''             # Signal configuration file contents
-    self.position_names = []
+    self.document = OutputBuffer.OutputDocument(['header', 'positions', 'routines'])
+    self.data = self.document.section('header')         # Translated program lines
+    self.positions = self.document.section('positions') # Translated robot positions
+    self.eio = OutputBuffer.LineBuffer()        # Signal configuration file contents
+    self.position_names = UniqueNames.UniqueNames()
     self.used_inputs = []
     self.used_outputs = []
     
@@ -27,6 +29,7 @@ class TranslatorHelper:
     self.app = app
     self.uri = uri
     self.program = program
+    self.statement_index = StatementIndex.ProgramIndex(program)
     
     self.app_version = 4.0
     try:
@@ -52,13 +55,13 @@ class TranslatorHelper:
     self.statement_writers = {}
   
   def write_line(self, input):
-    self.data += ('%s%s\n' % (self.current_indent(), input))
+    self.data.write('%s%s\n' % (self.current_indent(), input))
   
   def write_position(self, input):
-    self.positions += ('%s%s\n' % (self.indentation, input))
+    self.positions.write('%s%s\n' % (self.indentation, input))
   
   def write_eio(self, input):
-    self.eio += ('%s\n' % (input))
+    self.eio.write('%s\n' % (input))
   
   def current_indent(self):
     return self.indentation * self.indent_depth
@@ -103,29 +106,32 @@ def postProcess(app, program, uri):
   helper = TranslatorHelper(app, program, uri)
   define_statement_writers(helper)
   
-  write_job_header(helper)
-  write_frames(helper)
-  write_global_variables(helper)
-  write_positions(helper, True)
-  
-  write_routine(helper, helper.program.MainRoutine)
-  for routine in helper.program.Routines:
-    write_routine(helper, routine)
-  
-  write_positions(helper, False)
-  write_job_footer(helper)
-  
-  write_eio(helper)
-  
   files = []
-  with open(helper.uri, 'w') as file:
-    file.write(helper.data)
+  with OutputBuffer.OutputFile(helper.uri) as file:
+    # Stream module into file while it is translated, see OutputBuffer
+    helper.document.open(file)
     files.append(uri)
+    
+    write_job_header(helper)
+    write_frames(helper)
+    write_global_variables(helper)
+    write_positions(helper, True)
+    
+    write_routine(helper, helper.program.MainRoutine)
+    for routine in helper.program.Routines:
+      write_routine(helper, routine)
+    
+    write_positions(helper, False)
+    write_job_footer(helper)
+    
+    helper.document.finish()
+  
+  write_eio(helper)
   
   if helper.eio:
     eio_uri = helper.get_eio_name()
     with open(eio_uri, 'w') as file:
-      file.write(helper.eio)
+      helper.eio.flushTo(file)
     files.append(eio_uri)
   
   return True, files
@@ -164,14 +170,14 @@ def write_job_footer(helper):
 
 def write_eio(helper):
   if not helper.used_inputs and not helper.used_outputs:
-    helper.eio = ''
+    helper.eio.clear()
     return
   
   helper.used_inputs.sort()
   helper.used_outputs.sort()
   
   # Header
-  helper.eio = ''
+  helper.eio.clear()
   helper.write_eio('EIO:CFG_1.0:6:1::')
   helper.write_eio('#')
   helper.write_eio('EIO_SIGNAL:')
@@ -188,7 +194,7 @@ def write_eio(helper):
 
 def write_frames(helper):
   # Find out all base and tool frames which are in use and write them in the job
-  statements = get_all_statements_on_program(helper.app_version, helper.program)
+  statements = helper.statement_index.getStatements()
   
   bases = []
   tools = []
@@ -239,7 +245,7 @@ def write_frames(helper):
 
 def write_global_variables(helper):
   # Find out if there are component properties used in assign statements. Declare them as global variables.
-  statements = get_all_statements_on_program(helper.app_version, helper.program)
+  statements = helper.statement_index.getStatements()
   
   props = []
   prop_names = []
@@ -272,18 +278,17 @@ def write_global_variables(helper):
 
 
 def write_positions(helper, init):
-  # Write positions to header. 
-  # If init is True only write place holder. Otherwise replace placeholder with actual positions.
+  # Positions section after header.
+  # If init is True continue writing after positions section. Otherwise close positions section.
   
   if init:
-    helper.indent_depth -= 1
-    helper.write_line('%POSITIONS%')
-    helper.indent_depth += 1
+    helper.document.close('header')
+    helper.data = helper.document.section('routines')
     helper.write_line('')
   else:
-    if helper.positions:
-      helper.positions = helper.positions[:-1]    # Remove last new line
-    helper.data = helper.data.replace('%POSITIONS%', helper.positions)
+    if not helper.positions:
+      helper.positions.write('\n')
+    helper.document.close('positions')
 
 
 def write_routine(helper, routine):
@@ -476,13 +481,14 @@ def write_path(helper, statement):
   
   # Iterate schema points
   helper.write_line('!Path start')
-  point_count = statement.getSchemaSize()
-  ej = statement.ExternalJointCount    
-  for i in range(point_count):
-    helper.motiontarget.Target = statement.getSchemaValue(i, 'Position')
-    helper.motiontarget.CartesianSpeed = statement.getSchemaValue(i, 'MaxSpeed')
-    helper.motiontarget.AccuracyMethod = statement.getSchemaValue(i, 'AccuracyMethod')
-    helper.motiontarget.AccuracyValue = statement.getSchemaValue(i, 'AccuracyValue')
+  path = PathSchema.PathColumns(statement, ['Position', 'MaxSpeed', 'AccuracyMethod', 'AccuracyValue'])
+  positions, speeds = path['Position'], path['MaxSpeed']
+  methods, values = path['AccuracyMethod'], path['AccuracyValue']
+  for i in xrange(path.size):
+    helper.motiontarget.Target = positions[i]
+    helper.motiontarget.CartesianSpeed = speeds[i]
+    helper.motiontarget.AccuracyMethod = methods[i]
+    helper.motiontarget.AccuracyValue = values[i]
     
     # Target
     pos_name = '%s_%i' % (statement.Name, (i + 1))
@@ -589,7 +595,7 @@ def write_target(helper, motiontarget, pos_name):
   pos_name = get_unique_position_name(helper, pos_name)
   position = 'PERS robtarget %s:=%s;' % (pos_name, target)
   helper.write_position(position)
-  helper.position_names.append(pos_name)
+  helper.position_names.add(pos_name)
 
   return pos_name
 
@@ -609,40 +615,7 @@ def get_unique_position_name(helper, name):
     except:
       pass
     name_base = name_base[:match.start()]
-  while index < 100000:
-    name = '%s%i' % (name_base, index)
-    if not name in helper.position_names:
-      return name
-    index += 1
-  
-  return name
-
-
-def get_all_statements_on_program(app_version, program):
-  statements = []
-  routines = [program.MainRoutine]
-  routines.extend(program.Routines)
-  for routine in routines:
-    statements.extend(get_all_statements(app_version, routine))
-  return statements
-
-
-def get_all_statements(app_version, scope):
-  statements = []
-  for s in scope.Statements:
-    statements.append(s)
-    if s.Type == VC_STATEMENT_IF:
-      statements.extend(get_all_statements(app_version, s.ThenScope))
-      if app_version >= 4.4:
-        for elseifscope in s.ElseIfScopes:
-          statements.extend(get_all_statements(app_version, elseifscope))
-      statements.extend(get_all_statements(app_version, s.ElseScope))
-    elif s.Type == VC_STATEMENT_WHILE:
-      statements.extend(get_all_statements(app_version, s.Scope))
-    elif app_version >= 4.4 and s.Type == VC_STATEMENT_SWITCHCASE:
-      for case in s.Cases:
-        statements.extend(get_all_statements(app_version, case))
-  return statements
+  return helper.position_names.getIndexed(name_base, index)
 
 
 def get_base_matrix(controller, base, robot_world_pos = None):
@@ -750,10 +723,10 @@ def fzero(d):
 
 
 def matrix_to_string(m):
-  p = m.P
-  q = m.getQuaternion()
-  s = '[%g,%g,%g],[%g,%g,%g,%g]' % (fzero(p.X), fzero(p.Y), fzero(p.Z), fzero(q.X), fzero(q.Y), fzero(q.Z), fzero(q.W))
-  return s
+  return RAPID_POSE.format(m)
+
+
+RAPID_POSE = PoseFormat.PoseFormat('[%g,%g,%g],[%g,%g,%g,%g]', 'quaternion', value_filter = fzero)
 
 
 def configuration_to_string(motiontarget, robot_joint_count):
@@ -825,25 +798,12 @@ def tool_to_string(motiontarget):
   return motiontarget.ToolName
 
 
+RAPID_EXPRESSION = Expression.ExpressionTranslator(Expression.Dialect(
+  operators = {'==':'=', '!=':'<>', '&&':' AND ', '&':' AND ', '||':' OR ', '|':' OR ', '!':' NOT '},
+  names = {'False':'FALSE', 'false':'FALSE', 'True':'TRUE', 'true':'TRUE'},
+  strip_input = True))
+
+
 def check_expression(exp):
   # Check expression syntax
-  exp = exp.strip()
-  
-  # Format boolean literals
-  exp = exp.replace('False', 'FALSE')
-  exp = exp.replace('false', 'FALSE')
-  exp = exp.replace('True', 'TRUE')
-  exp = exp.replace('true', 'TRUE')
-  
-  # Format operators
-  exp = exp.replace('==', '=')
-  exp = exp.replace('!=', '<>')
-  exp = exp.replace('&&', ' AND ')
-  exp = exp.replace('&', ' AND ')
-  exp = exp.replace('||', ' OR ')
-  exp = exp.replace('|', ' OR ')
-  exp = exp.replace('!', ' NOT ')
-  
-  exp = exp.replace('  ', ' ')
-  
-  return exp
\ No newline at end of file
+  return RAPID_EXPRESSION.translate(exp)
\ No newline at end of file
@@ -1,6 +1,8 @@
 # Comau post processor, Version 1.00
 
 from vcCommand import *
+from PostProcessTools import StatementIndex, PathSchema, PoseFormat, FrameCache, UniqueNames, Expression, ModalState
+from PostProcessTools import OutputBuffer
 import os.path, time, re, math
 import vcMatrix
 
@@ -13,23 +15,24 @@ class TranslatorHelper:
     # Settings
     self.create_variable_file = True        # Separate variables into their own file (.lvs)
     
-    # String cache
-    self.cache = ''                         # Generic temporary cache
-    self.cache_vars = ''                    # Program global variables
-    self.cache_program = ''                 # Program contents
-    self.cache_routine_vars = ''            # Routine local variables
-    self.cache_routine = ''                 # Routine contents
-    self.cache_routines = ''                # All routines
-    self.cache_lsv = ''                     # .lvs file (variable file) contents
+    # Text caches
+    self.cache = OutputBuffer.LineBuffer()              # Generic temporary cache
+    self.cache_vars = OutputBuffer.LineBuffer()         # Program global variables
+    self.cache_program = OutputBuffer.LineBuffer()      # Program contents
+    self.cache_routine_vars = OutputBuffer.LineBuffer() # Routine local variables
+    self.cache_routine = OutputBuffer.LineBuffer()      # Routine contents
+    self.cache_routines = OutputBuffer.LineBuffer()     # All routines
+    self.cache_lsv = OutputBuffer.LineBuffer()          # .lvs file (variable file) contents
     
     # Helpers
     self.app = app
     self.uri = uri
     self.program = program
+    self.statement_index = StatementIndex.ProgramIndex(program)
     self.current_routine = None
     self.local_vars = []
     self.global_vars = []
-    self.pos_names = []
+    self.pos_names = UniqueNames.UniqueNames()
     self.indentation = '  '
     self.depth = 0
     self.statement_translators = {
@@ -61,7 +64,10 @@ class TranslatorHelper:
     
     # Motion
     self.motiontarget = program.Executor.Controller.createTarget()          #Target with new motion data
-    self.motiontarget_cache = program.Executor.Controller.createTarget()    #Target with cached motion data
+    self.frame_cache = FrameCache.FrameCache(self.controller, self.motiontarget)
+    self.modal = ModalState.ModalState(PDL_MODAL)    #Motion data written so far
+    self.effects = ModalState.Effects(lambda statement: get_modal_values(statement, self))
+    self.effects_target = program.Executor.Controller.createTarget()
     self.motion_data_set = False
     self.use_blending = False
   
@@ -73,28 +79,28 @@ class TranslatorHelper:
     return self.indentation*self.depth
   
   def write_cache(self, line):
-    self.cache += self.current_indent() + line + '\n'
+    self.cache.write(self.current_indent() + line + '\n')
   
   def write_var(self, line, override_depth = -1):
     if override_depth >= 0:
-      self.cache_vars += override_depth * self.indentation + line + '\n'
+      self.cache_vars.write(override_depth * self.indentation + line + '\n')
     else:
-      self.cache_vars += self.current_indent() + line + '\n'
+      self.cache_vars.write(self.current_indent() + line + '\n')
   
   def write_prg(self, line):
-    self.cache_program += self.current_indent() + line + '\n'
+    self.cache_program.write(self.current_indent() + line + '\n')
   
   def write_rou_var(self, line, override_depth = -1):
     if override_depth >= 0:
-      self.cache_routine_vars += override_depth * self.indentation + line + '\n'
+      self.cache_routine_vars.write(override_depth * self.indentation + line + '\n')
     else:
-      self.cache_routine_vars += self.current_indent() + line + '\n'
+      self.cache_routine_vars.write(self.current_indent() + line + '\n')
   
   def write_rou(self, line):
-    self.cache_routine += self.current_indent() + line + '\n'
+    self.cache_routine.write(self.current_indent() + line + '\n')
   
   def write_lsv(self, line):
-    self.cache_lsv += line + '\n'
+    self.cache_lsv.append(line)
   
   def get_folder(self):
     head, tail = os.path.split(self.uri)
@@ -155,24 +161,24 @@ def postProcess(app, program, uri):
   
   # Compile file contents
   prog_name = helper.get_prg_name()
-  helper.cache = ''
+  helper.cache = OutputBuffer.LineBuffer()
   helper.write_cache('PROGRAM %s' % (prog_name))
-  helper.cache += helper.cache_vars
-  helper.cache += helper.cache_routines
-  helper.cache += helper.cache_program
+  helper.cache.extend(helper.cache_vars)
+  helper.cache.extend(helper.cache_routines)
+  helper.cache.extend(helper.cache_program)
   helper.write_cache('END %s' % (prog_name))
   
   # Write output file
   files = []
   with open(helper.uri, 'w') as output_file:
-    output_file.write(helper.cache)
+    helper.cache.flushTo(output_file)
   files.append(uri)
   
   # Write variable file
   if helper.create_variable_file:
     lsv_uri = helper.get_lsv_uri()
     with open(lsv_uri, 'w') as output_file:
-      output_file.write(helper.cache_lsv)
+      helper.cache_lsv.flushTo(output_file)
     files.append(lsv_uri)
   
   return True,files
@@ -181,13 +187,14 @@ def postProcess(app, program, uri):
 def get_routines_in_reverse_order(helper):
   # Gather all routines in a list and reverse its order (low level sub-routines first, main last)
   
-  # First gether rous in call order
+  # First gether rous in call order. Calls in ElseIf and SwitchCase scopes are not followed,
+  # those routines go with the uncalled ones like they always have, so declaration order is kept.
   new_rous = [helper.program.MainRoutine]
   rous = []
   while new_rous:
     rou = new_rous.pop(0)
     rous.append(rou)
-    stats = get_all_statements(helper, rou)
+    stats = StatementIndex.walk(rou.Statements, ['Scope', 'ThenScope', 'ElseScope'])
     for stat in stats:
       if stat.Type != VC_STATEMENT_CALL:
         continue
@@ -228,13 +235,14 @@ def write_routine(routine, name, helper):
   # Write a routine
   
   helper.current_routine = routine
+  helper.modal.invalidate()
   helper.motion_data_set = False
   helper.use_blending = False
-  helper.cache_routine = ''
-  helper.cache_routine_vars = ''
+  helper.cache_routine = OutputBuffer.LineBuffer()
+  helper.cache_routine_vars = OutputBuffer.LineBuffer()
   
   # Check if motion blending needs to be used in this routine
-  stats = get_all_statements(helper, helper.current_routine)
+  stats = helper.statement_index.getStatements(helper.current_routine)
   for stat in stats:
     if stat.Type in [VC_STATEMENT_PTPMOTION, VC_STATEMENT_LINMOTION]:
       if stat.AccuracyValue > 0:
@@ -284,19 +292,19 @@ def write_routine(routine, name, helper):
   helper.depth  -= 1
   
   # Routine structure
-  helper.cache = ''
+  helper.cache = OutputBuffer.LineBuffer()
   helper.write_cache('ROUTINE %s' % (name))
-  helper.cache += helper.cache_routine_vars
-  helper.cache += helper.cache_routine
+  helper.cache.extend(helper.cache_routine_vars)
+  helper.cache.extend(helper.cache_routine)
   helper.write_cache('END %s' % (name))
   helper.write_cache('')
-  helper.cache_routines += helper.cache
+  helper.cache_routines.extend(helper.cache)
 
 
 def write_frames(helper):
   bases = []
   tools = []
-  all_stats = get_all_statements(helper)
+  all_stats = helper.statement_index.getStatements()
   use_null = False
   for s in all_stats:
     if s.Type in [VC_STATEMENT_PTPMOTION, VC_STATEMENT_LINMOTION, VC_STATEMENT_PATH]:
@@ -329,7 +337,7 @@ def write_frames(helper):
     if not b:
       continue
     
-    m = get_base_in_reference(b, helper.motiontarget)
+    m = get_base_in_reference(b, helper)
     pos = write_matrix(m)
     helper.write_var('%s : POSITION' % (b.Name))
     helper.write_prg('%s := %s' % (b.Name, pos))
@@ -340,18 +348,14 @@ def write_frames(helper):
       helper.write_lsv('')
     
     #Check for external tcp configuration
-    node = b.Node
-    flange_node = helper.controller.FlangeNode
-    while node:
-      if node == flange_node:
-        raise TranslatorException('External TCP not supported.')
-      node = node.Parent
+    if helper.frame_cache.isOnFlange(b):
+      raise TranslatorException('External TCP not supported.')
     
   for t in tools:
     if not t:
       continue
     
-    m = get_tool_in_reference(t, helper.motiontarget, helper.controller)
+    m = get_tool_in_reference(t, helper)
     pos = write_matrix(m)
     helper.write_var('%s : POSITION' % (t.Name))
     helper.write_prg('%s := %s' % (t.Name, pos))
@@ -373,6 +377,7 @@ def write_call(statement, helper):
   rou = statement.getProperty('Routine').Value
   if rou:
     helper.write_rou('%s' % rou.Name)
+    helper.modal.keep(helper.effects.getScope([statement]))
 
 
 def write_comment(statement, helper):
@@ -397,6 +402,7 @@ def write_define_base(statement, helper):
     pos = write_matrix(statement.Position)
     helper.write_rou('%s := %s : %s' % (statement.Base.Name, statement.Base.Name, pos))
     helper.write_rou('$UFRAME := %s' % (statement.Base.Name))
+  helper.modal.set(ModalState.BASE, statement.Base.Name)
 
 
 def write_define_tool(statement, helper):
@@ -419,6 +425,7 @@ def write_define_tool(statement, helper):
     pos = write_matrix(statement.Position)
     helper.write_rou('%s := %s : %s' % (statement.Tool.Name, statement.Tool.Name, pos))
     helper.write_rou('$TOOL := %s' % (statement.Tool.Name))
+  helper.modal.set(ModalState.TOOL, statement.Tool.Name)
 
 
 def write_delay(statement, helper):
@@ -436,16 +443,22 @@ def write_continue(statement, helper):
 def write_if(statement, helper):
   condition = check_expression(statement.Condition, helper)
   helper.write_rou('IF %s THEN' % condition)
+  branches = helper.modal.branches()
   helper.depth += 1
+  branches.enter()
   for s in statement.ThenScope.Statements:
     translator = helper.statement_translators.get(s.Type, unknown)
     translator(s, helper)
+  branches.leave()
   helper.depth -= 1
   helper.write_rou('ELSE')
   helper.depth += 1
+  branches.enter()
   for s in statement.ElseScope.Statements:
     translator = helper.statement_translators.get(s.Type, unknown)
     translator(s, helper)
+  branches.leave()
+  branches.join()
   helper.depth -= 1
   helper.write_rou('ENDIF')
   
@@ -476,15 +489,16 @@ def write_path(statement, helper):
   helper.motiontarget.MotionType = VC_MOTIONTARGET_MT_LINEAR    
   
   helper.write_rou('--PATH %s' % (statement.Name))
-  for i in range(statement.getSchemaSize()):
-    target = statement.getSchemaValue(i,'Position')
+  path = PathSchema.PathColumns(statement, PathSchema.MOTION_COLUMNS)
+  for i in xrange(path.size):
+    target = path['Position'][i]
     helper.motiontarget.Target = target
     jv = helper.motiontarget.JointValues
     helper.motiontarget.JointValues = jv
-    helper.motiontarget.CartesianSpeed = statement.getSchemaValue(i,'MaxSpeed')
-    helper.motiontarget.CartesianAcceleration = statement.getSchemaValue(i,'Acceleration')
-    helper.motiontarget.AccuracyMethod = statement.getSchemaValue(i,'AccuracyMethod')
-    helper.motiontarget.AccuracyValue = statement.getSchemaValue(i,'AccuracyValue')
+    helper.motiontarget.CartesianSpeed = path['MaxSpeed'][i]
+    helper.motiontarget.CartesianAcceleration = path['Acceleration'][i]
+    helper.motiontarget.AccuracyMethod = path['AccuracyMethod'][i]
+    helper.motiontarget.AccuracyValue = path['AccuracyValue'][i]
     
     write_motion_data(statement, helper, i)
     pos = write_target(statement, helper, i)
@@ -558,11 +572,14 @@ def write_wait_bin(statement, helper):
 def write_while(statement, helper):
   condition = check_expression(statement.Condition, helper)
   helper.write_rou('WHILE %s DO' % condition)
+  helper.modal.keep(helper.effects.getScope(statement.Scope.Statements))
+  values = helper.modal.snapshot()
   helper.depth += 1
   for s in statement.Scope.Statements:
     translator = helper.statement_translators.get(s.Type, unknown)
     translator(s, helper)
   helper.depth -= 1
+  helper.modal.restore(values)
   helper.write_rou('ENDWHILE')
 
 
@@ -602,7 +619,7 @@ def write_target(statement, helper, schema_index = -1):
       pos = get_unique_name(statement.Positions[0].Name, helper.pos_names)
     else:# if statement.Type == VC_STATEMENT_PATH:
       pos = get_unique_name(statement.Name + '_' + str(schema_index + 1), helper.pos_names)
-    helper.pos_names.append(pos)
+    helper.pos_names.add(pos)
     
     helper.write_var('%s : POSITION' % (pos))
     helper.local_vars.append(pos)
@@ -616,78 +633,82 @@ def write_target(statement, helper, schema_index = -1):
   return pos
 
 
+# $UFRAME, $TOOL, $ARM_SPD_OVR, $LIN_SPD and $FLY_DIST stay set until changed
+PDL_MODAL = [ModalState.BASE, ModalState.TOOL, ModalState.JOINT_SPEED, ModalState.SPEED, ModalState.ZONE]
+
+
 def write_motion_data(statement, helper, schema_index = -1):
-  # Set active motion data from helper.motiontarget (and statement)
-  
-  if not helper.motion_data_set:
-    helper.motiontarget_cache.BaseName = helper.motiontarget.BaseName
-    helper.motiontarget_cache.ToolName = helper.motiontarget.ToolName
-    helper.motiontarget_cache.JointSpeedFactor = helper.motiontarget.JointSpeedFactor
-    helper.motiontarget_cache.CartesianSpeed = helper.motiontarget.CartesianSpeed
-    helper.motiontarget_cache.AccuracyValue = helper.motiontarget.AccuracyValue
-    
-    helper.write_rou('$UFRAME := %s' % (get_base_name(helper.motiontarget_cache)))
-    helper.write_rou('$TOOL := %s' % (get_tool_name(helper.motiontarget_cache)))
-    helper.write_rou('$ARM_SPD_OVR := %i' % (int(100 * helper.motiontarget_cache.JointSpeedFactor)))
-    helper.write_rou('$LIN_SPD := %.1f' % (helper.motiontarget_cache.CartesianSpeed * 0.001))
-    if helper.use_blending:
-      helper.write_rou('$FLY_TYPE := FLY_CART')
-      helper.write_rou('$FLY_TRAJ := FLY_FROM')
-      helper.write_rou('$FLY_DIST := %.1f' % (helper.motiontarget_cache.AccuracyValue))
-    
-    helper.motion_data_set = True
-  else:
-    if helper.motiontarget.BaseName != helper.motiontarget_cache.BaseName:
-      helper.motiontarget_cache.BaseName = helper.motiontarget.BaseName
-      helper.write_rou('$UFRAME := %s' % (get_base_name(helper.motiontarget_cache)))
-    
-    if helper.motiontarget.ToolName != helper.motiontarget_cache.ToolName:
-      helper.motiontarget_cache.ToolName = helper.motiontarget.ToolName
-      helper.write_rou('$TOOL := %s' % (get_tool_name(helper.motiontarget_cache)))
-    
-    if helper.motiontarget.JointSpeedFactor != helper.motiontarget_cache.JointSpeedFactor:
-      helper.motiontarget_cache.JointSpeedFactor = helper.motiontarget.JointSpeedFactor
-      helper.write_rou('$ARM_SPD_OVR := %i' % (int(100 * helper.motiontarget_cache.JointSpeedFactor)))
-    
-    if helper.motiontarget.CartesianSpeed != helper.motiontarget_cache.CartesianSpeed:
-      helper.motiontarget_cache.CartesianSpeed = helper.motiontarget.CartesianSpeed
-      helper.write_rou('$LIN_SPD := %.1f' % (helper.motiontarget_cache.CartesianSpeed * 0.001))
-    
-    if helper.motiontarget.AccuracyValue != helper.motiontarget_cache.AccuracyValue:
-      helper.motiontarget_cache.AccuracyValue = helper.motiontarget.AccuracyValue
-      helper.write_rou('$FLY_DIST := %.1f' % (helper.motiontarget_cache.AccuracyValue))
+  # Write motion data of helper.motiontarget (and statement) that is not active.
+  # Modal state is invalidated at routine start, first call in routine writes
+  # all of it.
+  
+  modal = helper.modal
+  motiontarget = helper.motiontarget
+  init = not helper.motion_data_set
+  
+  if modal.changed(ModalState.BASE, motiontarget.BaseName):
+    helper.write_rou('$UFRAME := %s' % (get_base_name(motiontarget)))
+  
+  if modal.changed(ModalState.TOOL, motiontarget.ToolName):
+    helper.write_rou('$TOOL := %s' % (get_tool_name(motiontarget)))
+  
+  if modal.changed(ModalState.JOINT_SPEED, motiontarget.JointSpeedFactor):
+    helper.write_rou('$ARM_SPD_OVR := %i' % (int(100 * motiontarget.JointSpeedFactor)))
+  
+  if modal.changed(ModalState.SPEED, motiontarget.CartesianSpeed):
+    helper.write_rou('$LIN_SPD := %.1f' % (motiontarget.CartesianSpeed * 0.001))
+  
+  if init and helper.use_blending:
+    helper.write_rou('$FLY_TYPE := FLY_CART')
+    helper.write_rou('$FLY_TRAJ := FLY_FROM')
+  if modal.changed(ModalState.ZONE, motiontarget.AccuracyValue) and helper.use_blending:
+    helper.write_rou('$FLY_DIST := %.1f' % (motiontarget.AccuracyValue))
+  
+  helper.motion_data_set = True
+
+
+def get_modal_values(statement, helper):
+  # Values write_motion_data and frame definitions give, for ModalState.Effects.
+  # Path points keep the joint speed of the motion target.
+  if statement.Type in [VC_STATEMENT_PTPMOTION, VC_STATEMENT_LINMOTION]:
+    target = helper.effects_target
+    statement.writeToTarget(target)
+    return [(ModalState.BASE, target.BaseName), (ModalState.TOOL, target.ToolName),
+      (ModalState.JOINT_SPEED, target.JointSpeedFactor), (ModalState.SPEED, target.CartesianSpeed),
+      (ModalState.ZONE, target.AccuracyValue)]
+  if statement.Type == VC_STATEMENT_PATH:
+    values = [(ModalState.BASE, statement.Base.Name if statement.Base else ''),
+      (ModalState.TOOL, statement.Tool.Name if statement.Tool else '')]
+    path = PathSchema.PathColumns(statement, ['MaxSpeed', 'AccuracyValue'])
+    values.extend([(ModalState.SPEED, x) for x in path['MaxSpeed']])
+    values.extend([(ModalState.ZONE, x) for x in path['AccuracyValue']])
+    return values
+  if statement.Type == VC_STATEMENT_DEFINE_BASE and statement.Base:
+    return [(ModalState.BASE, statement.Base.Name)]
+  if statement.Type == VC_STATEMENT_DEFINE_TOOL and statement.Tool:
+    return [(ModalState.TOOL, statement.Tool.Name)]
+  return []
+
+
+# X, Y, Z and A, E, R = Euler Z, Y, X. Keys are pos_angles: negative angles + 360.
+PDL_POSE = {
+  True:PoseFormat.PoseFormat('POS(%.3f, %.3f, %.3f, %.3f, %.3f, %.3f, \'%s\')', 'euler', (0, 1, 2, 5, 4, 3), positive_angles = True),
+  False:PoseFormat.PoseFormat('POS(%.3f, %.3f, %.3f, %.3f, %.3f, %.3f, \'%s\')', 'euler', (0, 1, 2, 5, 4, 3))}
+LSV_POSE = {
+  True:PoseFormat.PoseFormat('X:%.3f Y:%.3f Z:%.3f A:%.3f E:%.3f R:%.3f CNFG: \'%s\'', 'euler', (0, 1, 2, 5, 4, 3), positive_angles = True),
+  False:PoseFormat.PoseFormat('X:%.3f Y:%.3f Z:%.3f A:%.3f E:%.3f R:%.3f CNFG: \'%s\'', 'euler', (0, 1, 2, 5, 4, 3))}
 
 
 def write_matrix(m, conf = '', pos_angles = True):
-  p = m.P
-  ori = m.getEuler()
-  if pos_angles:
-    if ori.X < 0:
-      ori.X = ori.X + 360.0
-    if ori.Y < 0:
-      ori.Y = ori.Y + 360.0
-    if ori.Z < 0:
-      ori.Z = ori.Z + 360.0
-  pos = 'POS(%.3f, %.3f, %.3f, %.3f, %.3f, %.3f, \'%s\')' % (p.X, p.Y, p.Z, ori.Z, ori.Y, ori.X, conf)
-  return pos
+  return PDL_POSE[pos_angles].format(m, conf)
 
 
 def write_matrix_lvs(m, conf = '', pos_angles = True):
-  p = m.P
-  ori = m.getEuler()
-  if pos_angles:
-    if ori.X < 0:
-      ori.X = ori.X + 360.0
-    if ori.Y < 0:
-      ori.Y = ori.Y + 360.0
-    if ori.Z < 0:
-      ori.Z = ori.Z + 360.0
-  pos = 'X:%.3f Y:%.3f Z:%.3f A:%.3f E:%.3f R:%.3f CNFG: \'%s\'' % (p.X, p.Y, p.Z, ori.Z, ori.Y, ori.X, conf)
-  return pos
+  return LSV_POSE[pos_angles].format(m, conf)
 
 
 def get_unique_name(name, old_names):
-  #Return unique variable name that doesn't exist in old_names
+  #Return unique variable name that doesn't exist in old_names (UniqueNames)
   if not name in old_names:
     return name
   
@@ -699,68 +720,23 @@ def get_unique_name(name, old_names):
   else:
     seed_name = name
     index = 1
-    
-  while True:
-    if '_' in name:
-      new_name = seed_name + '_' + str(index)
-    else:
-      new_name = seed_name + str(index)
-    if new_name in old_names:
-      index = index + 1
-      continue
-    else:
-      return new_name
+  
+  if '_' in name:
+    return old_names.getIndexed(seed_name, index, '_')
+  return old_names.getIndexed(seed_name, index)
+
+
+#Operators, boolean literals and signals
+PDL_EXPRESSION = Expression.ExpressionTranslator(Expression.Dialect(
+  operators = {'==':'=', '!=':'<>', '!':' NOT ', '&&':' AND ', '&':' AND ', '||':' OR ', '|':' OR '},
+  names = {'True':'TRUE', 'False':'FALSE'},
+  signals = {'IN':'$DIN[%s]'},
+  strip_output = True, ignore_case = True))
 
 
 def check_expression(line, helper):
   # Check expression syntax
-  
-  # Operators
-  line = line.replace('==', '=')
-  line = line.replace('!=', '<>')
-  line = line.replace('!', ' NOT ')
-  line = line.replace('&&', ' AND ')
-  line = line.replace('&', ' AND ')
-  line = line.replace('||', ' OR ')
-  line = line.replace('|', ' OR ')
-  
-  # Boolean
-  line = line.replace('True', 'TRUE')
-  line = line.replace('False', 'FALSE')
-  
-  # Signals
-  exp = '(?<!D)IN\[(%s)\]' % (RE.INT)
-  match = re.search(exp, line, RE.FLAGS)
-  while match:
-    line = line.replace(match.group(0), '$DIN[%s]' % (match.group(1)))
-    match = re.search(exp, line, RE.FLAGS)
-  
-  # Whitespace trims
-  line = line.replace('  ', ' ')
-  line = line.strip().rstrip()
-  
-  return line
-
-
-def get_all_statements(helper, scope = None):
-  # Return all statements in a scope (at any level) as a list
-  
-  stats = []
-  if not scope:
-    prog = helper.program
-    stats.extend(get_all_statements(helper, prog.MainRoutine))
-    for r in prog.Routines:
-      stats.extend(get_all_statements(helper, r))
-  else:
-    for s in scope.Statements:
-      stats.append(s)
-      if s.Type == VC_STATEMENT_IF:
-        stats.extend(get_all_statements(helper, s.ThenScope))
-        stats.extend(get_all_statements(helper, s.ElseScope))
-      elif s.Type == VC_STATEMENT_WHILE:
-        stats.extend(get_all_statements(helper, s.Scope))
-    
-  return stats
+  return PDL_EXPRESSION.translate(line)
 
 
 def get_base_name(motiontarget):
@@ -775,22 +751,11 @@ def get_tool_name(motiontarget):
   return motiontarget.ToolName
 
 
-def get_base_in_reference(base, motiontarget):
+def get_base_in_reference(base, helper):
   #Convert base matrix to robot world
-  if not base.Node:
-    return base.PositionMatrix
-  ref_m = motiontarget.getSimWorldToRobotWorld()
-  ref_m.invert()
-  return ref_m * base.Node.WorldPositionMatrix * base.PositionMatrix
+  return helper.frame_cache.getBaseInRobotWorld(base)
 
 
-def get_tool_in_reference(tool, motiontarget, ctr):
+def get_tool_in_reference(tool, helper):
   #Convert tool matrix to robot flange
-  if tool.Node and tool.Node != ctr.FlangeNode:
-    ref_m = ctr.FlangeNode.WorldPositionMatrix
-    ref_m.invert()
-    tool_m = tool.Node.WorldPositionMatrix * tool.PositionMatrix
-    tool_m_in_ref = ref_m * tool_m
-  else:
-    tool_m_in_ref = tool.PositionMatrix
-  return tool_m_in_ref
\ No newline at end of file
+  return helper.frame_cache.getToolInFlange(tool)
\ No newline at end of file
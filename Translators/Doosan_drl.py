@@ -2,6 +2,7 @@
 # Output file (.drl) is DRL script that you can import into your Doosan robot.
 
 from vcCommand import *
+from PostProcessTools import StatementIndex, PathSchema, Expression, ModalState
 import vcMatrix, os.path, math, re
 
 
@@ -18,12 +19,12 @@ class TranslatorHelper:
     except:
       pass
     self.program = program
+    self.statement_index = StatementIndex.ProgramIndex(program)
     self.controller = program.Executor.Controller
     self.component = program.Executor.Component
     self.motiontarget = program.Executor.Controller.createTarget()
-    self.active_frames_set = False
-    self.active_base = None
-    self.active_tool = None
+    self.modal = ModalState.ModalState(DRL_MODAL)
+    self.effects = ModalState.Effects(getModalValues)
     self.current_routine = None
     self.indentation = '  '
     self.depth = 1
@@ -117,7 +118,7 @@ def checkWarnings(helper):
       print 'Warning: External axes are not supported.'
       break
   
-  statements = getAllStatementsOnProgram(helper.app_version, helper.program)
+  statements = helper.statement_index.getStatements()
   ext_tcp = False
   for s in statements:
     if s.Type in [VC_STATEMENT_PTPMOTION, VC_STATEMENT_LINMOTION, VC_STATEMENT_PATH]:
@@ -131,11 +132,11 @@ def checkWarnings(helper):
 def translateRoutine(routine, name, output_file, helper):
   #Translate routine
   helper.current_routine = routine
-  helper.active_frames_set = False
+  helper.modal.invalidate()
   output_file.write('def %s():\n' % name)
   
   #Routine globals
-  statements = getAllStatements(helper.app_version, routine)
+  statements = helper.statement_index.getStatements(routine)
   for statement in statements:
     if statement.Type == VC_STATEMENT_DEFINE_BASE and statement.Base:
       output_file.write(helper.current_indent() + 'global %s\n' % statement.Base.Name)
@@ -164,7 +165,7 @@ def translateRoutine(routine, name, output_file, helper):
 def writeFrames(output_file, helper):
   bases = []
   tools = []
-  all_stats = getAllStatementsOnProgram(helper.app_version, helper.program)
+  all_stats = helper.statement_index.getStatements()
   for s in all_stats:
     if s.Type in [VC_STATEMENT_PTPMOTION, VC_STATEMENT_LINMOTION, VC_STATEMENT_PATH]:
       for b in bases:
@@ -220,6 +221,7 @@ def writeBreak(output_file, statement, helper):
 def writeCall(output_file, statement, helper):
   if statement.getProperty('Routine').Value:
     output_file.write(helper.current_indent() + '%s()\n' % statement.getProperty('Routine').Value.Name )
+    helper.modal.keep(helper.effects.getScope([statement]))
 
 
 def writeComment(output_file, statement, helper):
@@ -261,6 +263,7 @@ def writeDefineBase(output_file, statement, helper):
     posx = 'posx(%.3f, %.3f, %.3f, %.3f, %.3f, %.3f)' % (p.X, p.Y, p.Z, euler.Z, euler.Y, euler.X)
     output_file.write(helper.current_indent() + '%s = set_user_cart_coord(%s, ref=DR_BASE)\n' % (name, posx))
   output_file.write(helper.current_indent() + 'set_ref_coord(%s)\n' % name)
+  helper.modal.set(ModalState.BASE, statement.Base)
 
 
 def writeDelay(output_file, statement, helper):
@@ -274,12 +277,15 @@ def writeHalt(output_file, statement, helper):
 def writeIf(output_file, statement, helper):
   condition = checkExpression(statement.Condition, helper)
   output_file.write(helper.current_indent() + 'if %s:\n' % condition)
+  branches = helper.modal.branches()
   helper.depth += 1
+  branches.enter()
   if not statement.ThenScope.Statements:
     output_file.write(helper.current_indent() + 'pass\n' )
   for s in statement.ThenScope.Statements:
     translator = helper.statement_translators.get(s.Type, unknown)
     translator(output_file, s, helper)
+  branches.leave()
   helper.depth -= 1
   
   if helper.app_version >= 4.4:
@@ -287,18 +293,23 @@ def writeIf(output_file, statement, helper):
       condition = checkExpression(elseifscope.Condition, helper)
       output_file.write(helper.current_indent() + 'elif %s:\n' % condition)
       helper.depth += 1
+      branches.enter()
       for s in elseifscope.Statements:
         translator = helper.statement_translators.get(s.Type, unknown)
         translator(output_file, s, helper)
+      branches.leave()
       helper.depth -= 1
   
   output_file.write(helper.current_indent() + 'else:\n')
   helper.depth += 1
+  branches.enter()
   if not statement.ElseScope.Statements:
     output_file.write(helper.current_indent() + 'pass\n' )
   for s in statement.ElseScope.Statements:
     translator = helper.statement_translators.get(s.Type, unknown)
     translator(output_file, s, helper)
+  branches.leave()
+  branches.join()
   helper.depth -= 1
   output_file.write(helper.current_indent() + '#endif\n')
 
@@ -337,15 +348,16 @@ def writePath(output_file, statement, helper):
     helper.motiontarget.ToolName = ''
   else:
     helper.motiontarget.ToolName = statement.Tool.Name
-  for i in range(statement.getSchemaSize()):
-    target = statement.getSchemaValue(i,'Position')
+  path = PathSchema.PathColumns(statement, PathSchema.MOTION_COLUMNS)
+  for i in xrange(path.size):
+    target = path['Position'][i]
     helper.motiontarget.Target = target
     jv = helper.motiontarget.JointValues
     helper.motiontarget.JointValues = jv
-    helper.motiontarget.CartesianSpeed = statement.getSchemaValue(i,'MaxSpeed')
-    helper.motiontarget.CartesianAcceleration = statement.getSchemaValue(i,'Acceleration')
-    helper.motiontarget.AccuracyMethod = statement.getSchemaValue(i,'AccuracyMethod')
-    helper.motiontarget.AccuracyValue = statement.getSchemaValue(i,'AccuracyValue')
+    helper.motiontarget.CartesianSpeed = path['MaxSpeed'][i]
+    helper.motiontarget.CartesianAcceleration = path['Acceleration'][i]
+    helper.motiontarget.AccuracyMethod = path['AccuracyMethod'][i]
+    helper.motiontarget.AccuracyValue = path['AccuracyValue'][i]
     
     if not helper.movel_as_joints:
       #Write as posx
@@ -401,12 +413,15 @@ def writeSetProperty(output_file, statement, helper):
 def writeSwitchCase(output_file, statement, helper):
   test_condition = checkExpression(statement.Condition, helper)
   first = True
+  branches = helper.modal.branches()
+  has_default = False
   
   for case in statement.Cases:
     case_condition = checkExpression(case.CaseCondition, helper)
     condition = '%s == %s' % (test_condition, case_condition)
     if case_condition.strip().lower() == 'default':
       output_file.write(helper.current_indent() + 'else:\n')
+      has_default = True
     elif first:
       output_file.write(helper.current_indent() + 'if %s:\n' % (condition))
       first = False
@@ -414,10 +429,13 @@ def writeSwitchCase(output_file, statement, helper):
       output_file.write(helper.current_indent() + 'elif %s:\n' % (condition))
     
     helper.depth += 1
+    branches.enter()
     for s in case.Statements:
       translator = helper.statement_translators.get(s.Type, unknown)
       translator(output_file, s, helper)
+    branches.leave()
     helper.depth -= 1
+  branches.join(has_default)
   output_file.write(helper.current_indent() + '#endif\n')
 
 
@@ -431,6 +449,8 @@ def writeWaitBin(output_file, statement, helper):
 def writeWhile(output_file, statement, helper):
   condition = checkExpression(statement.Condition, helper)
   output_file.write(helper.current_indent() + 'while %s:\n' % condition )
+  helper.modal.keep(helper.effects.getScope(statement.Scope.Statements))
+  values = helper.modal.snapshot()
   helper.depth += 1
   if not statement.Scope.Statements:
     output_file.write(helper.current_indent() + 'pass\n' )
@@ -438,6 +458,7 @@ def writeWhile(output_file, statement, helper):
     translator = helper.statement_translators.get(s.Type, unknown)
     translator(output_file, s, helper)
   helper.depth -= 1
+  helper.modal.restore(values)
   output_file.write(helper.current_indent() + '#endwhile\n')
 
 
@@ -445,74 +466,44 @@ def unknown(output_file, statement, helper):
   print '> Unsupported statement type skipped:', statement.Type
 
 
-def getAllStatementsOnProgram(app_version, program):
-  statements = []
-  routines = [program.MainRoutine]
-  routines.extend(program.Routines)
-  for routine in routines:
-    statements.extend(getAllStatements(app_version, routine))
-  return statements
-
-
-def getAllStatements(app_version, scope):
-  #Return all statements in a scope (at any level) as a list
-  statements = []
-  for s in scope.Statements:
-    statements.append(s)
-    if s.Type == VC_STATEMENT_IF:
-      statements.extend(getAllStatements(app_version, s.ThenScope))
-      if app_version >= 4.4:
-        for elseifscope in s.ElseIfScopes:
-          statements.extend(getAllStatements(app_version, elseifscope))
-      statements.extend(getAllStatements(app_version, s.ElseScope))
-    elif s.Type == VC_STATEMENT_WHILE:
-      statements.extend(getAllStatements(app_version, s.Scope))
-    elif app_version >= 4.4 and s.Type == VC_STATEMENT_SWITCHCASE:
-      for case in s.Cases:
-        statements.extend(getAllStatements(app_version, case))
-  return statements
+#Operators and signals
+DRL_EXPRESSION = Expression.ExpressionTranslator(Expression.Dialect(
+  operators = {'!':' not ', '&&':' and ', '&':' and ', '||':' or ', '|':' or '},
+  signals = {'IN':'get_digital_input(%s)'},
+  strip_output = True, ignore_case = True))
 
 
 def checkExpression(line, helper):
   #Check expression for formatting
-  
-  #Format operators
-  line = line.replace('!', ' not ')
-  line = line.replace('&&', ' and ')
-  line = line.replace('&', ' and ')
-  line = line.replace('||', ' or ')
-  line = line.replace('|', ' or ')
-  
-  #Signals
-  exp = 'IN\[(%s)\]' % (RE.INT)
-  match = re.search(exp, line, RE.FLAGS)
-  while match:
-    line = line.replace(match.group(0), 'get_digital_input(%s)' % (match.group(1)))
-    match = re.search(exp, line, RE.FLAGS)
-  
-  #Whitespace trims
-  line = line.replace('  ', ' ')
-  line = line.strip().rstrip()
-  
-  return line
+  return DRL_EXPRESSION.translate(line)
+
+
+# Reference coordinate and TCP stay set until changed, speeds and radius are
+# motion arguments
+DRL_MODAL = [ModalState.BASE, ModalState.TOOL]
 
 
 def writeActiveFrames(output_file, statement, helper):
   
-  if not  helper.movel_as_joints and (not helper.active_frames_set or statement.Base != helper.active_base):
+  if not helper.movel_as_joints and helper.modal.changed(ModalState.BASE, statement.Base):
     name = 'DR_BASE'
     if statement.Base:
       name = statement.Base.Name
     output_file.write(helper.current_indent() + 'set_ref_coord(%s)\n' % name )
-    helper.active_base = statement.Base
-  if not helper.active_frames_set or statement.Tool != helper.active_tool:
+  if helper.modal.changed(ModalState.TOOL, statement.Tool):
     name = 'TCP_0'
     if statement.Tool:
       name = statement.Tool.Name
     output_file.write(helper.current_indent() + 'set_tcp("%s")\n' % name )
-    helper.active_tool = statement.Tool
-    
-  helper.active_frames_set = True
+
+
+def getModalValues(statement):
+  # Values writeActiveFrames and writeDefineBase give, for ModalState.Effects
+  if statement.Type in [VC_STATEMENT_PTPMOTION, VC_STATEMENT_LINMOTION, VC_STATEMENT_PATH]:
+    return [(ModalState.BASE, statement.Base), (ModalState.TOOL, statement.Tool)]
+  if statement.Type == VC_STATEMENT_DEFINE_BASE and statement.Base:
+    return [(ModalState.BASE, statement.Base)]
+  return []
 
 
 def getBaseMatrix(controller, base, robot_world_pos = None):
@@ -1,6 +1,7 @@
 # Epson post processor, Version 1.00
 
 from vcCommand import *
+from PostProcessTools import StatementIndex, OutputBuffer, PathSchema, Expression, ModalState
 import os.path, time, re, math
 
 class TranslatorHelper:
@@ -10,29 +11,32 @@ class TranslatorHelper:
   def __init__(self, app, program, uri):
   
     # Settings
-    self.prg = '' # Program file contents
-    self.pts = '' # Point file contents
+    self.prg = OutputBuffer.LineBuffer() # Program file contents
+    self.pts = OutputBuffer.LineBuffer() # Point file contents
 
     
     # Helpers
     self.app = app
     self.uri = uri
     self.program = program
+    self.statement_index = StatementIndex.ProgramIndex(program)
     self.controller = program.Executor.Controller
     self.component = program.Executor.Component
     self.motiontarget = program.Executor.Controller.createTarget()
     self.motion_data_set = False
-    self.active_speed = 100
+    self.modal = ModalState.ModalState(SPEL_MODAL)
+    # Routine init may write Accel of the last PTP translated before it
+    self.effects = ModalState.Effects(lambda statement: get_modal_values(statement, self),
+      [(ModalState.JOINT_ACCEL, ModalState.UNKNOWN)])
+    self.effects_target = program.Executor.Controller.createTarget()
     self.active_accel = 100
-    self.active_speeds = 1000
-    self.active_accels = 1000
     self.active_base = 0
-    self.active_tool = 0
     self.current_routine = None
     self.point_count = 0
     self.robot_joint_count = len([x for x in self.controller.Joints if not x.ExternalController])
     self.total_joint_count = len(self.controller.Joints)
     self.string_vars = []
+    self.expressions = Expression.ExpressionTranslator(SPEL_EXPRESSION)
     self.base_map = {}
     self.tool_map = {}
     self.indentation = '  '
@@ -59,10 +63,10 @@ class TranslatorHelper:
     return self.indentation*self.depth
 
   def write_prg(self, line):
-    self.prg += self.current_indent() + line + '\n'
+    self.prg.write(self.current_indent() + line + '\n')
     
   def write_pts(self, line):
-    self.pts += line + '\n'
+    self.pts.write(line + '\n')
   
   def get_folder(self):
     head, tail = os.path.split(self.uri)
@@ -122,10 +126,10 @@ def postProcess(app, program, uri):
   
   # Write output files
   with open(helper.uri, 'w') as output_file:
-    output_file.write(helper.prg)
+    helper.prg.flushTo(output_file)
   pts_uri = helper.get_pts_uri()
   with open(pts_uri, 'w') as output_file:
-    output_file.write(helper.pts)  
+    helper.pts.flushTo(output_file)
   
   return True,[uri, pts_uri]
 
@@ -134,6 +138,7 @@ def write_routine(routine, name, helper):
   # Write a routine
   
   helper.current_routine = routine
+  helper.modal.invalidate()
   helper.motion_data_set = False    #Reset current speed, acc, frame info
   
   helper.write_prg('Function %s' % name)
@@ -188,7 +193,7 @@ def write_pts_header(helper):
   # Write header to point file
   
   contents = helper.pts
-  helper.pts = ''
+  helper.pts = OutputBuffer.LineBuffer()
   helper.write_pts('ENVT0100,LM:%s:' % (time.strftime('%Y/%m/%d %H:%M:%S:000')))
   helper.write_pts('sVersion="2.0.0"')
   helper.write_pts('nDisplayMode=4')
@@ -197,13 +202,14 @@ def write_pts_header(helper):
   helper.write_pts('bDisplayT=False')
   helper.write_pts('nNumberOfJoints=%i' % (helper.total_joint_count))
   helper.write_pts('nNumberOfPoints=%i' % (helper.point_count))
-  helper.write_pts(contents)
+  helper.pts.extend(contents)
+  helper.pts.write('\n')
 
 
 def write_frames(helper):
   bases = []
   tools = []
-  all_stats = get_all_statements(helper)
+  all_stats = helper.statement_index.getStatements()
   for s in all_stats:
     if s.Type in [VC_STATEMENT_PTPMOTION, VC_STATEMENT_LINMOTION, VC_STATEMENT_PATH]:
       for b in bases:
@@ -254,6 +260,7 @@ def write_call( statement, helper):
   rou = statement.getProperty('Routine').Value
   if rou:
     helper.write_prg('Call %s' % rou.Name)
+    helper.modal.keep(helper.effects.getScope([statement]))
 
 
 def write_comment(statement, helper):
@@ -271,16 +278,22 @@ def write_halt(statement, helper):
 def write_if(statement, helper):
   condition = check_expression(statement.Condition, helper)
   helper.write_prg('If %s Then' % condition)
+  branches = helper.modal.branches()
   helper.depth += 1
+  branches.enter()
   for s in statement.ThenScope.Statements:
     translator = helper.statement_translators.get(s.Type, unknown)
     translator(s, helper)
+  branches.leave()
   helper.depth -= 1
   helper.write_prg('Else')
   helper.depth += 1
+  branches.enter()
   for s in statement.ElseScope.Statements:
     translator = helper.statement_translators.get(s.Type, unknown)
     translator(s, helper)
+  branches.leave()
+  branches.join()
   helper.depth -= 1
   helper.write_prg('EndIf')
 
@@ -308,15 +321,16 @@ def write_path(statement, helper):
   helper.motiontarget.TargetMode = VC_MOTIONTARGET_TM_NORMAL
   helper.motiontarget.MotionType = VC_MOTIONTARGET_MT_LINEAR    
   
-  for i in range(statement.getSchemaSize()):
-    target = statement.getSchemaValue(i,'Position')
+  path = PathSchema.PathColumns(statement, PathSchema.MOTION_COLUMNS)
+  for i in xrange(path.size):
+    target = path['Position'][i]
     helper.motiontarget.Target = target
     jv = helper.motiontarget.JointValues
     helper.motiontarget.JointValues = jv
-    helper.motiontarget.CartesianSpeed = statement.getSchemaValue(i,'MaxSpeed')
-    helper.motiontarget.CartesianAcceleration = statement.getSchemaValue(i,'Acceleration')
-    helper.motiontarget.AccuracyMethod = statement.getSchemaValue(i,'AccuracyMethod')
-    helper.motiontarget.AccuracyValue = statement.getSchemaValue(i,'AccuracyValue')
+    helper.motiontarget.CartesianSpeed = path['MaxSpeed'][i]
+    helper.motiontarget.CartesianAcceleration = path['Acceleration'][i]
+    helper.motiontarget.AccuracyMethod = path['AccuracyMethod'][i]
+    helper.motiontarget.AccuracyValue = path['AccuracyValue'][i]
     
     write_motion_data(statement, helper, i)
     point_name = write_target(statement, helper, i)
@@ -367,11 +381,14 @@ def write_wait_bin(statement, helper):
 def write_while(statement, helper):
   condition = check_expression(statement.Condition, helper)
   helper.write_prg('Do While %s' % condition)
+  helper.modal.keep(helper.effects.getScope(statement.Scope.Statements))
+  values = helper.modal.snapshot()
   helper.depth += 1
   for s in statement.Scope.Statements:
     translator = helper.statement_translators.get(s.Type, unknown)
     translator(s, helper)
   helper.depth -= 1
+  helper.modal.restore(values)
   helper.write_prg('Loop')
 
 
@@ -461,105 +478,81 @@ def write_target(statement, helper, schema_index = -1):
   return point_name
 
 
+# Tool, Speed, Accel, SpeedS and AccelS stay set until changed
+SPEL_MODAL = [ModalState.TOOL, ModalState.JOINT_SPEED, ModalState.JOINT_ACCEL, ModalState.SPEED, ModalState.ACCEL]
+
+
 def write_motion_data(statement, helper, schema_index = -1):
-  # Set active motion data from helper.motiontarget (and statement)
-  
-  if not helper.motion_data_set:
-    helper.active_tool = get_tool_number(helper.motiontarget.ToolName, helper)
-    helper.active_speed = helper.motiontarget.JointSpeedFactor * 100.0
-    if statement.Type == VC_STATEMENT_PTPMOTION:
-      helper.active_accel = statement.JointForce * 100.0
-    helper.active_speeds = helper.motiontarget.CartesianSpeed
-    helper.active_accels = helper.motiontarget.CartesianAcceleration
-    
-    helper.write_prg('Tool %i' % (helper.active_tool))
-    helper.write_prg('Speed %.0f' % (helper.active_speed))
-    helper.write_prg('Accel %.0f,%.0f' % (helper.active_accel, helper.active_accel))
-    helper.write_prg('SpeedS %.0f' % (helper.active_speeds))
-    helper.write_prg('AccelS %.0f' % (helper.active_accels))
-    helper.write_prg('')
-    helper.motion_data_set = True
-  else:
-    new_active_tool = get_tool_number(helper.motiontarget.ToolName, helper)
-    if new_active_tool != helper.active_tool:
-      helper.active_tool = new_active_tool
-      helper.write_prg('Tool %i' % (helper.active_tool))
+  # Write motion data of helper.motiontarget (and statement) that is not active.
+  # Modal state is invalidated at routine start, first call in routine writes
+  # all of it.
   
-    new_active_speed = helper.motiontarget.JointSpeedFactor * 100.0
-    if new_active_speed != helper.active_speed:
-      helper.active_speed = new_active_speed
-      helper.write_prg('Speed %.0f' % (helper.active_speed))
-    
-    if statement.Type == VC_STATEMENT_PTPMOTION:
-      new_active_accel = statement.JointForce * 100.0
-      if new_active_accel != helper.active_accel:
-        helper.active_accel = new_active_accel
-        helper.write_prg('Accel %.0f,%.0f' % (helper.active_accel, helper.active_accel))
-    
-    new_active_speeds = helper.motiontarget.CartesianSpeed
-    if new_active_speeds != helper.active_speeds:
-      helper.active_speeds = new_active_speeds
-      helper.write_prg('SpeedS %.0f' % (helper.active_speeds))
-    
-    new_active_accels = helper.motiontarget.CartesianAcceleration
-    if new_active_accels != helper.active_accels:
-      helper.active_accels = new_active_accels
-      helper.write_prg('AccelS %.0f' % (helper.active_accels))
+  modal = helper.modal
+  init = not helper.motion_data_set
+  if statement.Type == VC_STATEMENT_PTPMOTION:
+    helper.active_accel = statement.JointForce * 100.0
   
-
-def check_expression(line, helper):
-  # Check expression syntax
+  tool = get_tool_number(helper.motiontarget.ToolName, helper)
+  if modal.changed(ModalState.TOOL, tool):
+    helper.write_prg('Tool %i' % (tool))
   
-  # Format operators
-  line = line.replace('==', '=')
-  line = line.replace('!=', '<>')
-  line = line.replace('!', ' Not ')
-  line = line.replace('&&', ' And ')
-  line = line.replace('&', ' And ')
-  line = line.replace('||', ' Or ')
-  line = line.replace('|', ' Or ')
+  speed = helper.motiontarget.JointSpeedFactor * 100.0
+  if modal.changed(ModalState.JOINT_SPEED, speed):
+    helper.write_prg('Speed %.0f' % (speed))
   
-  # Signals
-  exp = 'IN\[(%s)\]' % (RE.INT)
-  match = re.search(exp, line, RE.FLAGS)
-  while match:
-    line = line.replace(match.group(0), '(Sw(%s) = 1)' % (match.group(1)))
-    match = re.search(exp, line, RE.FLAGS)
+  # Accel is used by Go, init writes the last PTP value
+  if (init or statement.Type == VC_STATEMENT_PTPMOTION) and modal.changed(ModalState.JOINT_ACCEL, helper.active_accel):
+    helper.write_prg('Accel %.0f,%.0f' % (helper.active_accel, helper.active_accel))
   
-  #String var conversions
-  for s in helper.string_vars:
-    exp = exp = '(\A|\Z|[ =<>*/+-])(%s)(\A|\Z|[ =<>*/+-])' % s
-    match = re.search(exp, line, RE.FLAGS)
-    while match:
-      line = line.replace(match.group(0), '%s%s$%s' % (match.group(1), match.group(2), match.group(3)))
-      match = re.search(exp, line, RE.FLAGS)
+  speeds = helper.motiontarget.CartesianSpeed
+  if modal.changed(ModalState.SPEED, speeds):
+    helper.write_prg('SpeedS %.0f' % (speeds))
   
-  # Whitespace trims
-  line = line.replace('  ', ' ')
-  line = line.strip().rstrip()
+  accels = helper.motiontarget.CartesianAcceleration
+  if modal.changed(ModalState.ACCEL, accels):
+    helper.write_prg('AccelS %.0f' % (accels))
   
-  return line
+  if init:
+    helper.write_prg('')
+    helper.motion_data_set = True
 
 
-def get_all_statements(helper, scope = None):
-  # Return all statements in a scope (at any level) as a list
-  
-  stats = []
-  if not scope:
-    prog = helper.program
-    stats.extend(get_all_statements(helper, prog.MainRoutine))
-    for r in prog.Routines:
-      stats.extend(get_all_statements(helper, r))
-  else:
-    for s in scope.Statements:
-      stats.append(s)
-      if s.Type == VC_STATEMENT_IF:
-        stats.extend(get_all_statements(helper, s.ThenScope))
-        stats.extend(get_all_statements(helper, s.ElseScope))
-      elif s.Type == VC_STATEMENT_WHILE:
-        stats.extend(get_all_statements(helper, s.Scope))
-    
-  return stats
+def get_modal_values(statement, helper):
+  # Values write_motion_data gives, for ModalState.Effects. Path points keep
+  # the joint speed of the motion target.
+  if statement.Type in [VC_STATEMENT_PTPMOTION, VC_STATEMENT_LINMOTION]:
+    target = helper.effects_target
+    statement.writeToTarget(target)
+    values = [(ModalState.TOOL, get_tool_number(target.ToolName, helper)),
+      (ModalState.JOINT_SPEED, target.JointSpeedFactor * 100.0), (ModalState.SPEED, target.CartesianSpeed),
+      (ModalState.ACCEL, target.CartesianAcceleration)]
+    if statement.Type == VC_STATEMENT_PTPMOTION:
+      values.append((ModalState.JOINT_ACCEL, statement.JointForce * 100.0))
+    return values
+  if statement.Type == VC_STATEMENT_PATH:
+    values = [(ModalState.TOOL, get_tool_number(statement.Tool.Name if statement.Tool else '', helper))]
+    path = PathSchema.PathColumns(statement, ['MaxSpeed', 'Acceleration'])
+    values.extend([(ModalState.SPEED, x) for x in path['MaxSpeed']])
+    values.extend([(ModalState.ACCEL, x) for x in path['Acceleration']])
+    return values
+  return []
+
+
+#Operators and signals
+SPEL_EXPRESSION = Expression.Dialect(
+  operators = {'==':'=', '!=':'<>', '!':' Not ', '&&':' And ', '&':' And ', '||':' Or ', '|':' Or '},
+  signals = {'IN':'(Sw(%s) = 1)'},
+  strip_output = True, ignore_case = True)
+
+
+def check_expression(line, helper):
+  # Check expression syntax. String variables get $ suffix, string_vars only
+  # grows so its length tells if cached text is still valid.
+  def check_var_name(name):
+    if name.lower() in [s.lower() for s in helper.string_vars]:
+      return name + '$'
+    return name
+  return helper.expressions.translate(line, check_var_name, len(helper.string_vars))
 
 
 def get_first_motion_statement(scope):
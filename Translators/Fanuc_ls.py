@@ -1,6 +1,7 @@
 #Version 1.03
 
 from vcCommand import *
+from PostProcessTools import StatementIndex, OutputBuffer, PathSchema, FrameCache, RoutineManifest, Expression, ModalState
 import vcMatrix
 import time, os.path
 import re
@@ -35,16 +36,18 @@ class TranslatorHelper:
     self.cmd = getCommand()
     
     # 
-    self.data =    '' # Program module lines
+    self.data = OutputBuffer.LineBuffer() # Program module lines
     
     # Helpers
     self.app = app
     self.app_version = GetAppVersion(self.app)
     self.uri = uri
     self.program = program
+    self.statement_index = StatementIndex.ProgramIndex(program)
     self.controller = program.Executor.Controller
     self.component = program.Executor.Component
     self.motiontarget = self.controller.createTarget()
+    self.frame_cache = FrameCache.FrameCache(self.controller, self.motiontarget)
     
     self.robot_joint_count = len([x for x in self.controller.Joints if not x.ExternalController])
     self.total_joint_count = len(self.controller.Joints)
@@ -85,13 +88,16 @@ class TranslatorHelper:
     
     self.keywords = ['NOT', 'AND', 'OR', 'ON', 'OFF', 'DI', 'DO', 'DIV', 'MOD']
     self.variables = {}
+    self.expressions = Expression.ExpressionTranslator(LS_EXPRESSION)
     self.current_routine = None
-    self.current_uf = -1
-    self.current_ut = -1
+    self.modal = ModalState.ModalState(LS_MODAL)
+    self.effects = ModalState.Effects(lambda statement: GetModalValues(self, statement))
+    self.effects_target = self.controller.createTarget()
     self.point_count = 0
     self.statement_count = 0
     self.label_index = 1
     self.while_label_stack = []
+    self.while_exit_stack = [] # modal values at breaks of each loop
     
     self.statement_translators = {
       VC_STATEMENT_BREAK:WriteBreak,
@@ -121,25 +127,26 @@ class TranslatorHelper:
   
   
   def init_data(self, routine = None):
-    self.data = ''
+    # LINE_COUNT in the header is known only after the body is written
+    self.document = OutputBuffer.OutputDocument(['header', 'line_count', 'body'])
+    self.data = self.document.section('header')
     self.current_routine = routine
-    self.current_uf = -1
-    self.current_ut = -1
+    self.modal.invalidate()
     self.point_count = 0
     self.statement_count = 0
   
   def write_line(self, input):
-    self.data += input + '\n'
+    self.data.write(input + '\n')
   
   def write_statement(self, input, motype = ''):
     self.statement_count += 1
     if not motype:
-      self.data += ('%4i:  %s%s\n' % (self.statement_count, self.current_indent(), input))
+      self.data.write('%4i:  %s%s\n' % (self.statement_count, self.current_indent(), input))
     else:
-      self.data += ('%4i:%s %s%s\n' % (self.statement_count, motype, self.current_indent(), input))
+      self.data.write('%4i:%s %s%s\n' % (self.statement_count, motype, self.current_indent(), input))
   
-  def replace_data(self, old_text, new_text):
-    self.data = self.data.replace(old_text, new_text)
+  def begin_section(self, name):
+    self.data = self.document.section(name)
   
   def current_indent(self):
     return self.indentation * self.depth
@@ -150,28 +157,32 @@ def postProcess(app, program, uri):
   helper = TranslatorHelper(app, program, uri)
   head, tail = os.path.split(helper.uri)
   mainName = tail[:len(tail)-3]
+  manifest = RoutineManifest.openManifest(uri, program)
   
   filenamelist=[]
   
   # Main routine
   filenamelist.append(uri)
-  if not WriteProgramBody(helper, program.MainRoutine, mainName, uri):
+  if not WriteRoutine(helper, manifest, program.MainRoutine, mainName, uri):
     return False, filenamelist
     
   # Subroutines
   for routine in program.Routines:
     filename = head + "\\" + routine.Name + ".ls"
     filenamelist.append(filename)
-    if not WriteProgramBody(helper, routine, routine.Name, filename):
+    if not WriteRoutine(helper, manifest, routine, routine.Name, filename):
       return False, filenamelist
   
   # Frames subroutine
   name = 'SET_FRAMES'
   filename = head + "\\%s.ls" % name
   filenamelist.append(filename)
-  if not WriteFrames(helper, name, filename, program):
+  if not WriteFrames(helper, manifest, name, filename, program):
     return False,filenamelist
   
+  if manifest:
+    manifest.save()
+  
   CheckProgram(helper)
   
   return True, filenamelist
@@ -184,7 +195,7 @@ def getDefaultJobName():
 def CheckProgram(helper):
   # Check program and print some warnings
   
-  stmts = GetAllStatements(helper.program)
+  stmts = helper.statement_index.getStatements()
   relative_frame_found = False
   else_if_found = False
   
@@ -197,6 +208,32 @@ def CheckProgram(helper):
           print 'INFO: Relative SetBase/SetTool needs matrix mutliplication. Include "Vision support tools" option and set $KAREL_ENB to 1.'
 
 
+def GetSharedState(helper):
+  # Translator state carried from one routine to the next
+  return {'label_index':helper.label_index, 'variables':helper.variables}
+
+
+def SetSharedState(helper, state):
+  helper.label_index = state['label_index']
+  helper.variables = dict(state['variables'])
+
+
+def WriteRoutine(helper, manifest, routine, name, filename):
+  # Translate routine unless its file is up to date in routine manifest
+  state = GetSharedState(helper)
+  if manifest:
+    stored_state = manifest.check(routine, name, filename, state)
+    if stored_state is not None:
+      SetSharedState(helper, stored_state)
+      return True
+    state = RoutineManifest.normalize(state) # copy, variables change during translation
+  if not WriteProgramBody(helper, routine, name, filename):
+    return False
+  if manifest:
+    manifest.record(routine, name, filename, state, GetSharedState(helper))
+  return True
+
+
 def WriteProgramBody(helper, routine, name, filename):
   
   helper.init_data(routine)
@@ -223,7 +260,7 @@ def WriteProgramBody(helper, routine, name, filename):
   
   try:
     file = open(filename, 'w')
-    file.write(helper.data)
+    helper.document.flushTo(file)
     file.close()
   except:
     print "Cannot open file \'%s\' for writing" % filename
@@ -232,13 +269,13 @@ def WriteProgramBody(helper, routine, name, filename):
   return True
 
 
-def WriteFrames(helper, name, filename, program):
+def WriteFrames(helper, manifest, name, filename, program):
   
   helper.init_data()
   
   WriteJobHeader(helper, name)
   
-  all_statements = GetAllStatements(helper.program)
+  all_statements = helper.statement_index.getStatements()
   used_tools = []
   used_bases = []
   swap_base_tool = {}
@@ -325,9 +362,12 @@ def WriteFrames(helper, name, filename, program):
   
   WriteJobFooter(helper)
   
+  # Incremental output keeps an unchanged file and its creation date
+  if manifest and manifest.isSharedFileCurrent(filename, helper.document.getvalue(), LS_DATE_RE):
+    return True
   try:
     file = open(filename,"w")
-    file.write(helper.data)
+    helper.document.flushTo(file)
     file.close()
   except:
     print "Cannot open file \'%s\' for writing" % filename
@@ -369,7 +409,7 @@ def WriteJobHeader(helper, name):
   helper.write_line('MODIFIED = %s;' % td)
   helper.write_line('FILE_NAME = %s;' % name )
   helper.write_line('VERSION = 0;')
-  helper.write_line('LINE_COUNT = __LINE_COUNT__;' )  # Placeholder __LINE_COUNT__ replaced later
+  helper.begin_section('body')  # LINE_COUNT is written by WriteJobFooter
   helper.write_line('MEMORY_SIZE = 64000;')
   helper.write_line('PROTECT = READ_WRITE;')
   helper.write_line('TCD: STACK_SIZE = 0,')
@@ -401,7 +441,8 @@ def WriteJobHeader(helper, name):
 def WriteJobFooter(helper):
   # Footers
   helper.write_line('/END')
-  helper.replace_data('__LINE_COUNT__', str(helper.statement_count))
+  helper.begin_section('line_count')
+  helper.write_line('LINE_COUNT = %i;' % (helper.statement_count))
 
 
 def WriteTargetDefinition(helper, statement):
@@ -419,9 +460,8 @@ def WriteTargetDefinition(helper, statement):
       tool_name = statement.Tool.Name
     helper.motiontarget.BaseName = base_name
     helper.motiontarget.ToolName = tool_name
-    size = statement.getSchemaSize()
-    for i in range(size):
-      pos = statement.getSchemaValue(i, 'Position')
+    path = PathSchema.PathColumns(statement, ['Position'])
+    for pos in path['Position']:
       helper.motiontarget.Target = pos
       DoWriteTargetDefinition(helper, statement)
     
@@ -519,6 +559,11 @@ def DoWriteTargetDefinition(helper, statement):
     helper.write_line('};')
 
 
+# UFRAME_NUM and UTOOL_NUM stay set until changed, speed and termination are part of motion lines
+LS_MODAL = [ModalState.BASE, ModalState.TOOL]
+LS_DATE_RE = re.compile(r'^(CREATE|MODIFIED) = DATE .*$', re.M) # header lines that differ between runs
+
+
 def WriteCurrentFrames(helper, statement):
   # Check frames
   if statement.Type in [VC_STATEMENT_PTPMOTION, VC_STATEMENT_LINMOTION, VC_STATEMENT_PATH]:
@@ -527,18 +572,36 @@ def WriteCurrentFrames(helper, statement):
       base_name = statement.Base.Name
     helper.motiontarget.BaseName = base_name
     uf = GetBaseIndex(helper.controller, helper.motiontarget)
-    if uf != helper.current_uf:
+    if helper.modal.changed(ModalState.BASE, uf):
       helper.write_statement('UFRAME_NUM=%i;' % (uf))
-      helper.current_uf = uf
   
     tool_name = 'Null'
     if statement.Tool:
       tool_name = statement.Tool.Name
     helper.motiontarget.ToolName = tool_name
     ut = GetToolIndex(helper.controller, helper.motiontarget)
-    if ut != helper.current_ut:
+    if helper.modal.changed(ModalState.TOOL, ut):
       helper.write_statement('UTOOL_NUM=%i;' % (ut))
-      helper.current_ut = ut
+
+
+def GetModalValues(helper, statement):
+  # Values WriteCurrentFrames gives, for ModalState.Effects. Frame definitions
+  # make the frame be selected again if it's active.
+  target = helper.effects_target
+  if statement.Type in [VC_STATEMENT_PTPMOTION, VC_STATEMENT_LINMOTION, VC_STATEMENT_PATH]:
+    target.BaseName = 'Null'
+    if statement.Base:
+      target.BaseName = statement.Base.Name
+    target.ToolName = 'Null'
+    if statement.Tool:
+      target.ToolName = statement.Tool.Name
+    return [(ModalState.BASE, GetBaseIndex(helper.controller, target)),
+      (ModalState.TOOL, GetToolIndex(helper.controller, target))]
+  if statement.Type == VC_STATEMENT_DEFINE_BASE and statement.Base:
+    return [(ModalState.BASE, ModalState.UNKNOWN)]
+  if statement.Type == VC_STATEMENT_DEFINE_TOOL and statement.Tool:
+    return [(ModalState.TOOL, ModalState.UNKNOWN)]
+  return []
 
 
 def WriteStatement(helper, statement):
@@ -551,10 +614,12 @@ def WriteStatement(helper, statement):
 def WriteBreak(helper, statement):
   if helper.while_label_stack:
     helper.write_statement('JMP LBL[%i] ;' % (helper.while_label_stack[-1] + 1))
+    helper.while_exit_stack[-1].append(helper.modal.snapshot())
 
 
 def WriteCall(helper, statement):
   helper.write_statement('CALL %s ;' % (statement.getProperty("Routine").Value.Name) )
+  helper.modal.keep(helper.effects.getScope([statement]))
 
 
 def WriteComment(helper, statement):
@@ -587,6 +652,9 @@ def WriteDefineBase(helper, statement):
       base_pos = statement.Position
     frame_name = 'UFRAME[%i]' % uf
     WriteFrame(helper, frame_name, base_pos, statement.IsRelative)
+    # Select the redefined frame again before next motion
+    if helper.modal.get(ModalState.BASE) == uf:
+      helper.modal.forget(ModalState.BASE)
 
 
 def WriteDefineTool(helper, statement):
@@ -605,6 +673,9 @@ def WriteDefineTool(helper, statement):
       tool_pos = statement.Position
     frame_name = 'UTOOL[%i]' % ut
     statementCount = WriteFrame(helper, frame_name, tool_pos, statement.IsRelative)
+    # Select the redefined frame again before next motion
+    if helper.modal.get(ModalState.TOOL) == ut:
+      helper.modal.forget(ModalState.TOOL)
 
 
 def WriteDelay(helper, statement):
@@ -620,8 +691,11 @@ def WriteIf(helper, statement):
   condition = CheckExpression(helper, statement.Condition)
   helper.write_statement('IF (%s) THEN ;' % (condition))
   helper.depth = helper.depth + 1
+  branches = helper.modal.branches()
+  branches.enter()
   for child in statement.ThenScope.Statements:
     WriteStatement(helper, child)
+  branches.leave()
   helper.depth = helper.depth - 1
   
   end_label_index = -1
@@ -637,14 +711,19 @@ def WriteIf(helper, statement):
         condition = CheckExpression(helper, else_if_scope.Condition)
         helper.write_statement('IF (%s) THEN ;' % (condition))
         helper.depth = helper.depth + 1
+        branches.enter()
         for child in else_if_scope.Statements:
           WriteStatement(helper, child)
+        branches.leave()
         helper.write_statement('JMP LBL[%i] ;' % (end_label_index))
         helper.depth = helper.depth - 1
         helper.write_statement('ENDIF ;')
   
+  branches.enter()
   for child in statement.ElseScope.Statements:
     WriteStatement(helper, child)
+  branches.leave()
+  branches.join()
   helper.depth = helper.depth - 1
   helper.write_statement('ENDIF ;')
   if end_label_index >= 0:
@@ -669,24 +748,18 @@ def WritePath(helper, statement):
   rtcp = ''
   if statement.ExternalTCP or BaseToolSwapped(helper, statement):
     rtcp = ' RTCP'
-  size = statement.getSchemaSize()
-  get_speed = False
-  get_pos_lv = False
-  props = statement.SchemaProperties
-  for prop in props:
-    if prop.Name == 'AccuracyValue':
-      get_pos_lv = True
-    elif prop.Name == 'MaxSpeed':
-      get_speed = True
-  for i in range(size):
+  path = PathSchema.PathColumns(statement, ['MaxSpeed', 'AccuracyValue'])
+  speeds = path.get('MaxSpeed')
+  accuracies = path.get('AccuracyValue')
+  for i in xrange(path.size):
     helper.point_count += 1
     name = statement.Name + '_' + str(i+1)
     speed = 100.0
     pos_lv = 'FINE'
-    if get_speed:
-      speed = statement.getSchemaValue(i, 'MaxSpeed')
-    if get_pos_lv:
-      accuracy = statement.getSchemaValue(i, 'AccuracyValue')
+    if speeds is not None:
+      speed = speeds[i]
+    if accuracies is not None:
+      accuracy = accuracies[i]
       if accuracy > 0:
         pos_lv = 'CNT%.0f' % (accuracy)
     helper.write_statement('P[%i: %s]  %gmm/sec %s%s    ;' % (helper.point_count, name, speed, pos_lv, rtcp), 'L')
@@ -741,13 +814,18 @@ def WriteSwitchCase(helper, statement):
     label_index += 1
   
   label_index = start_label_index
+  branches = helper.modal.branches()
   for case in statement.Cases:
     helper.write_statement('LBL[%i] ;' % (label_index))
+    branches.enter()
     for child in case.Statements:
       WriteStatement(helper, child)
+    branches.leave()
     helper.write_statement('JMP LBL[%i] ;' % (end_label_index))
     label_index += 1
   
+  # Without ELSE case SELECT continues to the first case label, a case is always entered
+  branches.join()
   helper.write_statement('LBL[%i] ;' % (end_label_index))
 
 
@@ -763,6 +841,8 @@ def WriteWhile(helper, statement):
   helper.label_index += 2
   helper.while_label_stack.append(label_index)
   helper.write_statement('LBL[%i] ;' % (label_index))
+  helper.while_exit_stack.append([])
+  helper.modal.keep(helper.effects.getScope(statement.Scope.Statements))
   for child in statement.Scope.Statements:
     WriteStatement(helper, child)
   if statement.Condition.lower().strip() == 'true':
@@ -772,135 +852,71 @@ def WriteWhile(helper, statement):
     helper.write_statement('IF (%s), JMP LBL[%i] ;' % (condition, label_index))
   helper.write_statement('LBL[%i] ;' % (label_index + 1))
   helper.while_label_stack.pop()
+  # Condition is tested after the body, the loop ends there or at a break
+  exits = helper.while_exit_stack.pop()
+  if statement.Condition.lower().strip() != 'true':
+    exits.append(helper.modal.snapshot())
+  helper.modal.merge(exits)
 
 
 def Unhandled(helper, statement):
   helper.write_statement('!Unsupported type %s;' % (indent, statement.Type))
 
 
+#Operators, boolean literals and signals. Boolean literals are ON/OFF in signal expressions.
+LS_EXPRESSION = Expression.Dialect(
+  operators = {'==':'=', '!=':'<>', '&&':' AND ', '&':' AND ', '||':' OR ', '|':' OR ', '/':' DIV ', '%':' MOD '},
+  names = {'True':'1', 'False':'0'},
+  signals = {'IN':'DI[%s]', 'OUT':'DO[%s]'},
+  signal_names = {'True':'ON', 'False':'OFF'},
+  strings = lambda literal: literal.replace('"', "'"),
+  collapse = False)
+
+
 def CheckExpression(helper, exp):
   #Check expression for variables and try to create those variables if needed. Also check some literal formatting.
   #ATM support simple comparisons between numbers and boolean variables
-  
-  if ('IN' in exp) or ('OUT' in exp):
-    #Format boolean literals in IO expressions
-    exp = exp.replace('True', 'ON')
-    exp = exp.replace('False', 'OFF')
-    exp = exp.replace('IN', 'DI')
-    exp = exp.replace('OUT', 'DO')
-  else:
-    #Format boolean literals in other expressions
-    exp = exp.replace('True', '1')
-    exp = exp.replace('False', '0')
-  
-  #Format string
-  exp = exp.replace('"', "'")
-  
-  #Format operators and specials
-  exp = exp.replace('==', '=')
-  exp = exp.replace('!=', '<>')
-  exp = exp.replace('&&', ' AND ')
-  exp = exp.replace('&', ' AND ')
-  exp = exp.replace('||', ' OR ')
-  exp = exp.replace('|', ' OR ')
-  exp = exp.replace('/', ' DIV ')
-  exp = exp.replace('%', ' MOD ')
-  
-  #Format variables
-  exp_left = exp
-  exp = ''
-  match = re.search(RE.VAR, exp_left, RE.FLAGS)
-  while match:
-    exp += exp_left[:match.start()]
-    var_name = match.group(0)
-    if not var_name in helper.keywords:
-      if var_name in helper.variables.keys():
-        var_name = helper.variables[var_name]
+  return helper.expressions.translate(exp, lambda var_name: MapVariable(helper, var_name))
+
+
+def MapVariable(helper, var_name):
+  #Register of variable, variables are mapped once per run so translated expressions can be cached
+  if not var_name in helper.keywords:
+    if var_name in helper.variables.keys():
+      var_name = helper.variables[var_name]
+    else:
+      #Find property, convert name to proper register
+      match2 = re.match('(S?R%s)|(S?R\[%s\])' % (RE.INT, RE.INT), var_name, RE.FLAGS)
+      if match2:
+        #Already named as register (e.g. R1 or SR[2]), use that
+        new_var_name = match2.group(0)
+        if match2.group(1):
+          match2 = re.match('(S?R)(%s)' % (RE.INT), var_name, RE.FLAGS)
+          if match2:
+            new_var_name = '%s[%s]' % (match2.group(1), match2.group(2))
       else:
-        #Find property, convert name to proper register
-        match2 = re.match('(S?R%s)|(S?R\[%s\])' % (RE.INT, RE.INT), var_name, RE.FLAGS)
-        if match2:
-          #Already named as register (e.g. R1 or SR[2]), use that
-          new_var_name = match2.group(0)
-          if match2.group(1):
-            match2 = re.match('(S?R)(%s)' % (RE.INT), var_name, RE.FLAGS)
-            if match2:
-              new_var_name = '%s[%s]' % (match2.group(1), match2.group(2))
-        else:
-          #Find property type and convert name to register
-          type = VC_INTEGER
-          prop = helper.current_routine.getProperty(var_name)
-          if not prop:
-            prop = helper.component.getProperty(var_name)
-          if prop:
-            type = prop.Type
-          prefix = 'R'
-          if type == VC_STRING:
-            prefix = 'SR'
-          for i in range(1, 9999):
-            new_var_name = '%s[%s]' % (prefix, str(i))
-            if not new_var_name in helper.variables.values():
-              break
-        helper.variables[var_name] = new_var_name
-        var_name = new_var_name
-    exp += var_name
-    exp_left = exp_left[match.end():]
-    match = re.search(RE.VAR, exp_left, RE.FLAGS)
-  exp += exp_left
-  
-  return exp
+        #Find property type and convert name to register
+        type = VC_INTEGER
+        prop = helper.current_routine.getProperty(var_name)
+        if not prop:
+          prop = helper.component.getProperty(var_name)
+        if prop:
+          type = prop.Type
+        prefix = 'R'
+        if type == VC_STRING:
+          prefix = 'SR'
+        for i in range(1, 9999):
+          new_var_name = '%s[%s]' % (prefix, str(i))
+          if not new_var_name in helper.variables.values():
+            break
+      helper.variables[var_name] = new_var_name
+      var_name = new_var_name
+  return var_name
 
 
 def BaseToolSwapped(helper, statement):
   # Check if statement is using external tcp by swapping base and tool frames
-  
-  tool_on_robot = False
-  base_on_robot = False
-  
-  tool = statement.Tool
-  if not tool or not tool.Node:
-    tool_on_robot = True
-  else:
-    node = tool.Node
-    while node != helper.app.Simulation.World:
-      if node == helper.controller.FlangeNode:
-        tool_on_robot = True
-        break
-      node = node.Parent
-  
-  base = statement.Base
-  if base and base.Node:
-    node = base.Node
-    while node != helper.app.Simulation.World:
-      if node == helper.controller.FlangeNode:
-        base_on_robot = True
-        break
-      node = node.Parent
-  
-  return (not tool_on_robot and base_on_robot)
-
-
-def GetAllStatements(program):
-  allstatements = []
-  for s in program.MainRoutine.Statements:
-    allstatements = ExtendStatements(s,allstatements)
-  for routine in program.Routines:
-    for s in routine.Statements:
-      allstatements = ExtendStatements(s,allstatements)
-  return allstatements
-
-
-def ExtendStatements(statement, statements):
-  statements.append(statement)
-  if statement.Type == VC_STATEMENT_WHILE:
-    for s in statement.Scope.Statements:
-      statements = ExtendStatements(s, statements)
-  elif statement.Type == VC_STATEMENT_IF:
-    for s in statement.ThenScope.Statements:
-      statements = ExtendStatements(s, statements)
-    for s in statement.ElseScope.Statements:
-      statements = ExtendStatements(s, statements)
-  return statements
+  return helper.frame_cache.isExternalTCP(statement.Base, statement.Tool)
 
 
 def GetToolIndex(controller, motiontarget):
@@ -1,6 +1,7 @@
 # Hyundai post processor, Version 1.00
 
 from vcCommand import *
+from PostProcessTools import StatementIndex, OutputBuffer, PathSchema, PoseFormat, FrameCache, UniqueNames, Expression
 import os.path, time, re, math
 import vcMatrix, vcVector
 
@@ -13,8 +14,8 @@ class TranslatorHelper:
     self.cmd = getCommand()
     
     # Settings
-    self.JOB =    ''  # Program file contents
-    self.FRAMES = ''  # Contains tool and user frame info
+    self.JOB =    OutputBuffer.LineBuffer()  # Program file contents
+    self.FRAMES = OutputBuffer.LineBuffer()  # Contains tool and user frame info
     self.convert_to_robot_frame = self.cmd.getProperty('Convert positions to Robot frame').Value
     self.assign_frames_in_job = self.cmd.getProperty('Assign Tool/User frames in job').Value
     self.write_frame_file = self.cmd.getProperty('Create Tool/User frame text file').Value
@@ -23,16 +24,19 @@ class TranslatorHelper:
     self.app = app
     self.uri = uri
     self.program = program
+    self.statement_index = StatementIndex.ProgramIndex(program)
     self.controller = program.Executor.Controller
     self.component = program.Executor.Component
     self.motiontarget = program.Executor.Controller.createTarget()
+    self.frame_cache = FrameCache.FrameCache(self.controller, self.motiontarget)
     self.robot_joint_count = len([x for x in self.controller.Joints if not x.ExternalController])
     self.total_joint_count = len(self.controller.Joints)
     self.indentation = '     '
     self.depth = 0
     
-    self.labels = []
+    self.labels = UniqueNames.UniqueNames()
     self.keywords = ['NOT', 'AND', 'OR']
+    self.expressions = Expression.ExpressionTranslator(JOB_EXPRESSION)
     self.var_types = { VC_BOOLEAN:'Integer', VC_INTEGER:'Integer', VC_REAL:'Double', VC_STRING:'String' }
     self.routine_map = {}
     self.global_vars = {}
@@ -70,10 +74,10 @@ class TranslatorHelper:
     # SX is the step number at the beginning of the line on motions.
     indent = self.current_indent()
     SX_and_indent = SX + max(0, len(indent)-len(SX)) * ' '
-    self.JOB += SX_and_indent + line + '\n'
+    self.JOB.write(SX_and_indent + line + '\n')
   
   def write_frames(self, line):
-    self.FRAMES += line + '\n'
+    self.FRAMES.write(line + '\n')
   
   def get_folder(self):
     head, tail = os.path.split(self.uri)
@@ -143,12 +147,12 @@ def postProcess(app, program, uri):
   # Write output files
   files = [uri]
   with open(helper.uri, 'w') as output_file:
-    output_file.write(helper.JOB)
+    helper.JOB.flushTo(output_file)
   if helper.write_frame_file:
     frame_uri = helper.get_frame_file()
     files.append(frame_uri)
     with open(frame_uri, 'w') as output_file:
-      output_file.write(helper.FRAMES)
+      helper.FRAMES.flushTo(output_file)
   
   # Show global variable mapping
   if helper.global_vars:
@@ -181,7 +185,7 @@ def write_frames(helper):
   
   used_bases = []
   used_tools = []
-  all_stmts = get_all_statements(helper)
+  all_stmts = helper.statement_index.getStatements()
   for stmt in all_stmts:
     try:
       base_name = ''
@@ -264,7 +268,7 @@ def write_routine(routine, helper, is_main = False):
   else:
     helper.write_job('')
     helper.write_job('*%s' % (routine_name))
-    helper.labels.append(routine_name)
+    helper.labels.add(routine_name)
   
   #Routine variables
   for prop in routine.Properties:
@@ -389,15 +393,16 @@ def write_path(statement, helper):
   helper.motiontarget.TargetMode = VC_MOTIONTARGET_TM_NORMAL
   helper.motiontarget.MotionType = VC_MOTIONTARGET_MT_LINEAR
   
-  for i in range(statement.getSchemaSize()):
-    target = statement.getSchemaValue(i,'Position')
+  path = PathSchema.PathColumns(statement, PathSchema.MOTION_COLUMNS)
+  for i in xrange(path.size):
+    target = path['Position'][i]
     helper.motiontarget.Target = target
     jv = helper.motiontarget.JointValues
     helper.motiontarget.JointValues = jv
-    helper.motiontarget.CartesianSpeed = statement.getSchemaValue(i,'MaxSpeed')
-    helper.motiontarget.CartesianAcceleration = statement.getSchemaValue(i,'Acceleration')
-    helper.motiontarget.AccuracyMethod = statement.getSchemaValue(i,'AccuracyMethod')
-    helper.motiontarget.AccuracyValue = statement.getSchemaValue(i,'AccuracyValue')
+    helper.motiontarget.CartesianSpeed = path['MaxSpeed'][i]
+    helper.motiontarget.CartesianAcceleration = path['Acceleration'][i]
+    helper.motiontarget.AccuracyMethod = path['AccuracyMethod'][i]
+    helper.motiontarget.AccuracyValue = path['AccuracyValue'][i]
     
     target = write_target(statement, helper)
     helper.write_job('MOVE %s' % (target), 'S%i' % (helper.motion_count))
@@ -533,46 +538,31 @@ def write_target(statement, helper, schema_index = -1):
   return tgt_string
 
 
+JOB_POSE = PoseFormat.PoseFormat('%.3f,%.3f,%.3f,%.3f,%.3f,%.3f', 'wpr')
+
+
 def write_matrix(m):
-  p = m.P
-  wpr = m.WPR
-  return '%.3f,%.3f,%.3f,%.3f,%.3f,%.3f' % (p.X, p.Y, p.Z, wpr.X, wpr.Y, wpr.Z)
+  return JOB_POSE.format(m)
 
 
 def is_external_tcp(helper):
   # Check if helper.motiontarget is using external tcp (not 100% robust check)
-  tool_on_robot = False
-  base_on_robot = False
-  
-  tool = None
-  for t in helper.controller.Tools:
-    if t.Name == helper.motiontarget.ToolName:
-      tool = t
-      break
-  if not tool or not tool.Node:
-    tool_on_robot = True
-  else:
-    node = tool.Node
-    while node != helper.app.Simulation.World:
-      if node == helper.controller.FlangeNode:
-        tool_on_robot = True
+  names = (helper.motiontarget.BaseName, helper.motiontarget.ToolName)
+  def base_tool_swapped():
+    tool = None
+    for t in helper.controller.Tools:
+      if t.Name == names[1]:
+        tool = t
         break
-      node = node.Parent
-  
-  base = None
-  for b in helper.controller.Bases:
-    if b.Name == helper.motiontarget.BaseName:
-      base = b
-      break
-  if base and base.Node:
-    node = base.Node
-    while node != helper.app.Simulation.World:
-      if node == helper.controller.FlangeNode:
-        base_on_robot = True
+    base = None
+    for b in helper.controller.Bases:
+      if b.Name == names[0]:
+        base = b
         break
-      node = node.Parent
+    return helper.frame_cache.isExternalTCP(base, tool)
   
-  return ((not tool_on_robot and base_on_robot) ^ (helper.motiontarget.TargetMode == VC_MOTIONTARGET_TM_STATICTOOL))
+  swapped = helper.frame_cache.get('external_tcp_names', names, base_tool_swapped)
+  return (swapped ^ (helper.motiontarget.TargetMode == VC_MOTIONTARGET_TM_STATICTOOL))
 
 
 def check_job_name(helper):
@@ -608,12 +598,7 @@ def check_routine_name(rou_name, helper):
 
 
 def get_unique_label(helper, seed):
-  for i in range(10000):
-    label = '%s%i' % (seed, (i+1))
-    if label not in helper.labels:
-      break
-  helper.labels.append(label)
-  return label
+  return helper.labels.allocateIndexed(seed, 1)
 
 
 def check_var_name(var_name, helper):
@@ -654,86 +639,22 @@ def check_var_name(var_name, helper):
   return var_name
 
 
+# Operators, boolean literals and signals
+JOB_EXPRESSION = Expression.Dialect(
+  operators = {'==':'=', '!=':'<>', '!':' NOT ', '&&':' AND ', '&':' AND ', '||':' OR ', '|':' OR '},
+  names = {'False':'0', 'True':'1'},
+  signals = {'IN':'DI[%s]'},
+  strip_output = True, ignore_case = True)
+
+
 def check_expression(line, helper):
-  # Check expression syntax
-  
-  # Take out string literals out from the expression and replace them with placeholders "__0__"
-  string_literals = []
-  line_left = line
-  line = ''
-  match = re.search(RE.STRING, line_left, RE.FLAGS)
-  while match:
-    line += line_left[:match.start()]
-    line += '"__%i__"' % (len(string_literals))
-    string_literals.append(match.group(0))
-    line_left = line_left[match.end():]
-    match = re.search(RE.VAR, line_left, RE.FLAGS)
-  line += line_left
-  
-  # Format operators
-  line = line.replace('==', '=')
-  line = line.replace('!=', '<>')
-  line = line.replace('!', ' NOT ')
-  line = line.replace('&&', ' AND ')
-  line = line.replace('&', ' AND ')
-  line = line.replace('||', ' OR ')
-  line = line.replace('|', ' OR ')
-  
-  # Format boolean literals
-  line = line.replace('False', '0')
-  line = line.replace('True', '1')
-  
-  # Signals
-  exp = 'IN\[(%s)\]' % (RE.INT)
-  match = re.search(exp, line, RE.FLAGS)
-  while match:
-    line = line.replace(match.group(0), 'DI[%s]' % (match.group(1)))
-    match = re.search(exp, line, RE.FLAGS)
-  
-  # Check variables
-  line_left = line
-  line = ''
-  match = re.search(RE.VAR, line_left, RE.FLAGS)
-  while match:
-    line += line_left[:match.start()]
-    var_name = match.group(0)
-    if not var_name in helper.keywords:
-      var_name = check_var_name(var_name, helper)
-    line += var_name
-    line_left = line_left[match.end():]
-    match = re.search(RE.VAR, line_left, RE.FLAGS)
-  line += line_left
-  
-  # Whitespace trims
-  line = line.replace('  ', ' ')
-  line = line.strip().rstrip()
-  
-  # Put string literals back to line
-  for i, s in enumerate(string_literals):
-    line = line.replace('"__%i__"' % (i), s)
-  
-  return line
-
-
-def get_all_statements(helper, scope = None):
-  # Return all statements in a scope (at any level) as a list
-  
-  stats = []
-  if not scope:
-    prog = helper.program
-    stats.extend(get_all_statements(helper, prog.MainRoutine))
-    for r in prog.Routines:
-      stats.extend(get_all_statements(helper, r))
-  else:
-    for s in scope.Statements:
-      stats.append(s)
-      if s.Type == VC_STATEMENT_IF:
-        stats.extend(get_all_statements(helper, s.ThenScope))
-        stats.extend(get_all_statements(helper, s.ElseScope))
-      elif s.Type == VC_STATEMENT_WHILE:
-        stats.extend(get_all_statements(helper, s.Scope))
-    
-  return stats
+  # Check expression syntax. Variable names depend on current routine (locals).
+  def check_name(var_name):
+    if var_name in helper.keywords or '[' in var_name:
+      return var_name
+    return check_var_name(var_name, helper)
+  routine_name = helper.current_routine.Name if helper.current_routine else None
+  return helper.expressions.translate(line, check_name, routine_name)
 
 
 def get_base_index(base_name, helper):
@@ -777,25 +698,10 @@ def get_tool(tool_name, helper):
 
 def get_base_in_reference(base, helper):
   #Convert base matrix to robot world
-  if not base:
-    return vcMatrix.new()
-  if not base.Node:
-    return base.PositionMatrix
-  ref_m = helper.motiontarget.getSimWorldToRobotWorld()
-  ref_m.invert()
-  return ref_m * base.Node.WorldPositionMatrix * base.PositionMatrix
+  return helper.frame_cache.getBaseInRobotWorld(base)
 
 
 def get_tool_in_reference(tool, helper):
   #Convert tool matrix to robot flange
-  if not tool:
-    return vcMatrix.new()
-  if tool.Node and tool.Node != helper.controller.FlangeNode:
-    ref_m = helper.controller.FlangeNode.WorldPositionMatrix
-    ref_m.invert()
-    tool_m = tool.Node.WorldPositionMatrix * tool.PositionMatrix
-    tool_m_in_ref = ref_m * tool_m
-  else:
-    tool_m_in_ref = tool.PositionMatrix
-  return tool_m_in_ref
+  return helper.frame_cache.getToolInFlange(tool)
 
@@ -1,5 +1,6 @@
 from vcCommand import *
 import time, os.path
+from PostProcessTools import ProgramIR, PoseFormat
 
 #IRL (DIN 66312 ) sample post-processor for VC4.0 products. V0.3
 
@@ -8,117 +9,105 @@ import time, os.path
 import locale
 locale.setlocale(locale.LC_NUMERIC,'C')
 
+#-------------------------------------------------------------------------------
+# Statements are read from the program IR (PostProcessTools.ProgramIR).
+#-------------------------------------------------------------------------------
+IRL_COLUMNS = ['speed'] # point columns read, poses are always extracted
+IRL_PROPERTIES = ['Condition', 'Routine', 'Comment', 'Delay', 'MaxSpeed', 'JointSpeed', 'OutputPort',
+  'OutputValue', 'InputPort', 'InputValue', 'ValueExpression', 'TargetProperty']
+IRL_SCOPES = ['Scope', 'ThenScope', 'ElseScope']
+
+# X, Y, Z and ORIZYX = WPR Z, Y, X
+IRL_POSE = PoseFormat.PoseFormat("(%8.2f, %8.2f, %8.2f), ORIZYX(%8.2f, %8.2f, %8.2f)", 'wpr', (0, 1, 2, 5, 4, 3))
+
+#-------------------------------------------------------------------------------
+def writeStatements(mod,indices,indentation):
+  for i in indices:
+    WriteStatement(mod,ir.statements[i],indentation)
 #-------------------------------------------------------------------------------
 def writeWhile(mod,statement,indentation):
-  cnd = statement.Condition.strip()
+  cnd = statement.get("Condition").strip()
   mod.write(" "*indentation+"WHILE %s\n" %(cnd))
   indentation += 2
-  for s in statement.Scope.Statements:
-    WriteStatement(mod,s,indentation)
+  writeStatements(mod,statement.getScope("Scope"),indentation)
   indentation -= 2
   mod.write(" "*indentation+"ENDWHILE;\n")
 #-------------------------------------------------------------------------------
 def writeIf(mod,statement,indentation):
-  cnd = statement.Condition.strip()
+  cnd = statement.get("Condition").strip()
   mod.write(" "*indentation+"IF %s\n" %(cnd))
   indentation += 2
-  for s in statement.ThenScope.Statements:
-    WriteStatement(mod,s,indentation)
+  writeStatements(mod,statement.getScope("ThenScope"),indentation)
   indentation -= 2
   mod.write(" "*indentation+"ELSE\n")
   indentation += 2
-  for s in statement.ElseScope.Statements:
-    WriteStatement(mod,s,indentation)
+  writeStatements(mod,statement.getScope("ElseScope"),indentation)
   indentation -= 2
   mod.write(" "*indentation+"ENDIF;\n")
 #-------------------------------------------------------------------------------
-def writePath(mod,statement,indentation):
-  global motiontarget
-  mod.write(" "*indentation+"{ Move along path %s }\n" % (statement.Name))
-  motiontarget.JointTurnMode = VC_MOTIONTARGET_TURN_NEAREST
-  motiontarget.TargetMode = VC_MOTIONTARGET_TM_NORMAL
-  motiontarget.MotionType = VC_MOTIONTARGET_MT_LINEAR    
-  for i in range( statement.getSchemaSize()):
-    target = statement.getSchemaValue(i,"Position")
-    motiontarget.Target = target
-    p = motiontarget.Target.P
-    a = motiontarget.Target.getWPR()
-    mod.write(" "*indentation+"MOVE LIN ROBTARGET(((%8.2f, %8.2f, %8.2f), ORIZYX(%8.2f, %8.2f, %8.2f)), 4, 100, 0) SPEED:=%g;\n" % (p.X,p.Y,p.Z,a.Z,a.Y,a.X, statement.getSchemaValue(i,"MaxSpeed")))
-  mod.write(" "*indentation+"{ End of path %s }\n" % (statement.Name))
+def writeTarget(mod,i,indentation,motion,speed):
+  mod.write(" "*indentation+"MOVE %s ROBTARGET((%s), 4, 100, 0) %s;\n" % (motion,targets[i],speed))
 #-------------------------------------------------------------------------------
-def extendStatements(statement,statements):
-  statements.append(statement)
-  if statement.Type == VC_STATEMENT_WHILE:
-    for s in statement.Scope.Statements:
-      statements = extendStatements(s,statements)
-  elif statement.Type == VC_STATEMENT_IF:
-    for s in statement.ThenScope.Statements:
-      statements = extendStatements(s,statements)
-    for s in statement.ElseScope.Statements:
-      statements = extendStatements(s,statements)
-  return statements
+def writePath(mod,statement,indentation):
+  mod.write(" "*indentation+"{ Move along path %s }\n" % (statement.name))
+  for i in statement.getPoints():
+    writeTarget(mod,i,indentation,"LIN","SPEED:=%g" % ir.points.speed[i])
+  mod.write(" "*indentation+"{ End of path %s }\n" % (statement.name))
 #-------------------------------------------------------------------------------
 def writeSetProperty(mod,statement,indentation):
-  ve = statement.ValueExpression.strip()
-  mod.write(" "*indentation+"%s := %s;\n" %(statement.TargetProperty,ve))
+  ve = statement.get("ValueExpression").strip()
+  mod.write(" "*indentation+"%s := %s;\n" %(statement.get("TargetProperty"),ve))
 #-------------------------------------------------------------------------------
 def WriteStatement(mod,statement,indentation):
-  global motiontarget,pointCount
+  global pointCount
   
-  if statement.Type == VC_STATEMENT_CALL:
-    mod.write(" "*indentation+"%s ;\n" % statement.getProperty("Routine").Value.Name)
+  if statement.type == VC_STATEMENT_CALL:
+    mod.write(" "*indentation+"%s ;\n" % statement.get("Routine"))
 
-  elif statement.Type == VC_STATEMENT_COMMENT:
-    c = statement.Comment
+  elif statement.type == VC_STATEMENT_COMMENT:
+    c = statement.get("Comment")
     mod.write(" "*indentation+"{%s}\n" % (c))
       
-  elif statement.Type == VC_STATEMENT_DELAY:
-    d = statement.Delay
+  elif statement.type == VC_STATEMENT_DELAY:
+    d = statement.get("Delay")
     mod.write(" "*indentation+"WAIT %6.2f SEC ;\n" % (d))
 
-  elif statement.Type == VC_STATEMENT_HALT:
+  elif statement.type == VC_STATEMENT_HALT:
     mod.write(" "*indentation+"PAUSE ;\n")
     
-  elif statement.Type == VC_STATEMENT_RETURN:
+  elif statement.type == VC_STATEMENT_RETURN:
     mod.write(" "*indentation+"RETURN ;\n")  
 
-  elif statement.Type == VC_STATEMENT_LINMOTION:
-    statement.writeToTarget(motiontarget)
-    p = motiontarget.Target.P
-    a = motiontarget.Target.getWPR()
-    mod.write(" "*indentation+"MOVE LIN ROBTARGET(((%8.2f, %8.2f, %8.2f), ORIZYX(%8.2f, %8.2f, %8.2f)), 4, 100, 0) SPEED:=%g;\n" % (p.X,p.Y,p.Z,a.Z,a.Y,a.X, statement.MaxSpeed))
-
-  elif statement.Type == VC_STATEMENT_PTPMOTION:
-    statement.writeToTarget(motiontarget)
-    p = motiontarget.Target.P
-    a = motiontarget.Target.getWPR()
-    mod.write(" "*indentation+"MOVE PTP ROBTARGET(((%8.2f, %8.2f, %8.2f), ORIZYX(%8.2f, %8.2f, %8.2f)), 4, 100, 0) SPEED_PTP:=%g;\n" % (p.X,p.Y,p.Z,a.Z,a.Y,a.X, statement.JointSpeed))
-
-  elif statement.Type == VC_STATEMENT_SETBIN:
-    mod.write(" "*indentation+"%s_%i= " %(statement.Name,statement.OutputPort))
-    if statement.OutputValue:
+  elif statement.type == VC_STATEMENT_LINMOTION:
+    writeTarget(mod,statement.point_start,indentation,"LIN","SPEED:=%g" % statement.get("MaxSpeed"))
+
+  elif statement.type == VC_STATEMENT_PTPMOTION:
+    writeTarget(mod,statement.point_start,indentation,"PTP","SPEED_PTP:=%g" % statement.get("JointSpeed"))
+
+  elif statement.type == VC_STATEMENT_SETBIN:
+    mod.write(" "*indentation+"%s_%i= " %(statement.name,statement.get("OutputPort")))
+    if statement.get("OutputValue"):
       mod.write("TRUE;\n" )
     else:
       mod.write("FALSE;\n" )
       
-  elif statement.Type == VC_STATEMENT_WAITBIN:
-    if statement.InputValue:
-      mod.write(" "*indentation+"WAIT FOR IN_%i = TRUE;\n" %(statement.InputPort))
+  elif statement.type == VC_STATEMENT_WAITBIN:
+    if statement.get("InputValue"):
+      mod.write(" "*indentation+"WAIT FOR IN_%i = TRUE;\n" %(statement.get("InputPort")))
     else:
-      mod.write(" "*indentation+"WAIT FOR IN_%i = FALSE;\n" %(statement.InputPort))
+      mod.write(" "*indentation+"WAIT FOR IN_%i = FALSE;\n" %(statement.get("InputPort")))
     
-  elif statement.Type == VC_STATEMENT_WHILE:
+  elif statement.type == VC_STATEMENT_WHILE:
     writeWhile(mod,statement,indentation)
     
-  elif statement.Type == VC_STATEMENT_IF:
+  elif statement.type == VC_STATEMENT_IF:
     writeIf(mod,statement,indentation)
     
-  elif statement.Type == VC_STATEMENT_PATH:
+  elif statement.type == VC_STATEMENT_PATH:
     writePath(mod,statement,indentation)
   
-  elif statement.Type == VC_STATEMENT_SETPROPERTY:
-    ve = statement.ValueExpression.strip()
-    mod.write(" "*indentation+"%s := %s;\n" %(statement.TargetProperty,ve))
+  elif statement.type == VC_STATEMENT_SETPROPERTY:
+    writeSetProperty(mod,statement,indentation)
 #-------------------------------------------------------------------------------  
 def WriteProgramBody( routine, name, filename ):
   global pointCount
@@ -138,8 +127,7 @@ def WriteProgramBody( routine, name, filename ):
   # print robot statements
   pointCount = 0
   indentation = 2
-  for statement in routine.Statements:
-    WriteStatement(mod,statement,indentation)
+  writeStatements(mod,routine.statements,indentation)
 
   # end of program
   mod.write("ENDPROGRAM;\n")
@@ -149,27 +137,26 @@ def WriteProgramBody( routine, name, filename ):
 
 #-------------------------------------------------------------------------------
 def postProcess(app,program,uri):
-  global motiontarget
+  global ir, targets
 
   head, tail = os.path.split(uri)
   mainName = tail[:len(tail)-4]
   
-  #motiontarget = controller.createTarget()
-  motiontarget = program.Executor.Controller.createTarget()
+  ir = ProgramIR.extract(program, IRL_COLUMNS, IRL_PROPERTIES, IRL_SCOPES)
+  targets = IRL_POSE.formatAll(ir.points.getPoses())
   filenamelist=[]
   
   # main routine
   filenamelist.append(uri)
-  if not WriteProgramBody(program.MainRoutine, mainName, uri  ):
+  if not WriteProgramBody(ir.routines[0], mainName, uri  ):
     return False,filenamelist
   #endif  
 
   # subroutines
-  for routine in program.Routines:
-    filename = head + "\\" + routine.Name + ".irl"
+  for routine in ir.routines[1:]:
+    filename = head + "\\" + routine.name + ".irl"
     filenamelist.append(filename)
-    if not WriteProgramBody(routine, routine.Name,  filename ):
+    if not WriteProgramBody(routine, routine.name,  filename ):
       return False,filenamelist
 
   return True,filenamelist
-
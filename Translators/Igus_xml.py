@@ -1,6 +1,7 @@
 # Template post processor
 
 from vcCommand import *
+from PostProcessTools import StatementIndex, PathSchema
 import os.path
 import sys
 import vcMatrix, vcVector, math
@@ -20,6 +21,7 @@ class TranslatorHelper:
     self.app = app
     self.uri = uri
     self.program = program
+    self.statement_index = StatementIndex.ProgramIndex(program)
     
     self.app_version = 4.0
     try:
@@ -116,7 +118,7 @@ def print_error(line):
 
 def write_frames(helper):
   # Find out all base and tool frames which are in use and write them in the job
-  statements = get_all_statements_on_program(helper, helper.program)
+  statements = helper.statement_index.getStatements()
   
   bases = []
   tools = []
@@ -294,13 +296,13 @@ def write_path(helper, statement):
     helper.motiontarget.ToolName = statement.Tool.Name
   
   # Iterate schema points
-  point_count = statement.getSchemaSize()
+  path = PathSchema.PathColumns(statement, PathSchema.MOTION_COLUMNS)
   ej = statement.ExternalJointCount 
-  for i in range(point_count):
-    helper.motiontarget.Target = statement.getSchemaValue(i, 'Position')
-    helper.motiontarget.CartesianSpeed = statement.getSchemaValue(i, 'MaxSpeed')
-    helper.motiontarget.AccuracyMethod = statement.getSchemaValue(i, 'AccuracyMethod')
-    helper.motiontarget.AccuracyValue = statement.getSchemaValue(i, 'AccuracyValue')
+  for i in xrange(path.size):
+    helper.motiontarget.Target = path['Position'][i]
+    helper.motiontarget.CartesianSpeed = path['MaxSpeed'][i]
+    helper.motiontarget.AccuracyMethod = path['AccuracyMethod'][i]
+    helper.motiontarget.AccuracyValue = path['AccuracyValue'][i]
     
     # Target
     #target_position = get_target_postion_vector(helper.motiontarget.Target)
@@ -308,7 +310,7 @@ def write_path(helper, statement):
     
     # Other params
     speed = str(helper.motiontarget.CartesianSpeed)
-    acceleration = str(statement.getSchemaValue(i, 'Acceleration'))
+    acceleration = str(path['Acceleration'][i])
     smoothing = str(helper.motiontarget.AccuracyValue)
     if helper.motiontarget.BaseName:
       #target_position = get_target_postion_vector(helper.motiontarget.BaseMatrix*statement.Positions[0].PositionInReference)
@@ -382,33 +384,6 @@ def unhandled(helper, statement):
   print_warning('Unsupported statement type %s.' % (statement.Type))
 
 
-def get_all_statements_on_program(helper, program):
-  statements = []
-  routines = [program.MainRoutine]
-  routines.extend(program.Routines)
-  for routine in routines:
-    statements.extend(get_all_statements(helper, routine))
-  return statements
-
-
-def get_all_statements(helper, scope):
-  statements = []
-  for s in scope.Statements:
-    statements.append(s)
-    if s.Type == VC_STATEMENT_IF:
-      statements.extend(get_all_statements(helper, s.ThenScope))
-      if helper.app_version >= 4.4:
-        for elseifscope in s.ElseIfScopes:
-          statements.extend(get_all_statements(helper, elseifscope))
-      statements.extend(get_all_statements(helper, s.ElseScope))
-    elif s.Type == VC_STATEMENT_WHILE:
-      statements.extend(get_all_statements(helper, s.Scope))
-    elif helper.app_version >= 4.4 and s.Type == VC_STATEMENT_SWITCHCASE:
-      for case in s.Cases:
-        statements.extend(get_all_statements(helper, case))
-  return statements
-
-
 def get_base_matrix(controller, base, robot_world_pos = None):
   # Convert base matrix to reference coordinates. There are 3 cases:
   #   -Default case, base reference is robot world frame.
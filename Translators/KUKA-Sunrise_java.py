@@ -1,6 +1,7 @@
 # Kuka Sunrise post-processor, 0.10
 
 from vcCommand import *
+from PostProcessTools import StatementIndex, OutputBuffer, PathSchema, UniqueNames, Expression
 import os.path, time, re, math
 import xml.etree.ElementTree as ET
 import vcMatrix
@@ -12,8 +13,9 @@ class TranslatorHelper:
   def __init__(self, app, program, uri):
     
     # String cache
-    self.cache_java = ''                                   # Cache java program code
-    self.cache_globals = ''                                # Global variable declarations
+    self.document = OutputBuffer.OutputDocument(['header', 'globals', 'java'])
+    self.cache_java = self.document.section('java')        # Cache java program code
+    self.cache_globals = self.document.section('globals')  # Global variable declarations
     
     # RoboticsAPI.data.xml as ElementTree object
     self.data_xml = None
@@ -24,10 +26,11 @@ class TranslatorHelper:
     self.app = app
     self.uri = uri
     self.program = program
+    self.statement_index = StatementIndex.ProgramIndex(program)
     self.current_routine = None
     self.local_vars = []
     self.global_vars = []
-    self.pos_names = []
+    self.pos_names = UniqueNames.UniqueNames()
     self.indentation = '    '
     self.depth = 0
     self.statement_translators = {
@@ -79,10 +82,10 @@ class TranslatorHelper:
     return xml_uri
   
   def write_java(self, line):
-    self.cache_java += self.current_indent() + line + '\n'
+    self.cache_java.write(self.current_indent() + line + '\n')
   
   def write_globals(self, line, indent = 1):
-    self.cache_globals += indent * self.indentation + line + '\n'
+    self.cache_globals.write(indent * self.indentation + line + '\n')
 
 
 class RE(object):
@@ -130,13 +133,13 @@ def postProcess(app, program, uri):
   # Write footer
   write_java_footer(helper)
   
-  # Add globals to java code
-  helper.cache_java = helper.cache_java.replace('%GLOBALS%', helper.cache_globals + 1 * helper.indentation)
+  # Close globals section
+  helper.cache_globals.write(1 * helper.indentation)
   
   # Write output file
   files = []
   with open(helper.uri, 'w') as output_file:
-    output_file.write(helper.cache_java)
+    helper.document.flushTo(output_file)
   files.append(uri)
   
   # Write frame xml file
@@ -200,7 +203,10 @@ public class %JOB% extends RoboticsAPIApplication {
   header = header.replace('%JOB%', helper.get_job_name())
   header = header.replace('%MAIN%', '%s()' % (helper.program.MainRoutine.Name))
   
-  helper.cache_java += header
+  # Globals are written into their own section in place of %GLOBALS%
+  header, code = header.split('%GLOBALS%')
+  helper.document.section('header').write(header)
+  helper.cache_java.write(code)
 
 
 def write_java_footer(helper):
@@ -208,7 +214,7 @@ def write_java_footer(helper):
   
   footer = '}'
   
-  helper.cache_java += footer
+  helper.cache_java.write(footer)
 
 
 def init_data_xml(helper):
@@ -238,7 +244,7 @@ def write_frames(helper):
   
   bases = []
   tools = []
-  all_stats = get_all_statements(helper)
+  all_stats = helper.statement_index.getStatements()
   use_null_base = False
   use_null_tool = False
   for s in all_stats:
@@ -405,27 +411,6 @@ def indent_etree(elem, level = 0):
       elem.tail = i
 
 
-def get_all_statements(helper, scope = None):
-  # Return all statements in a scope (at any level) as a list
-  
-  stats = []
-  if not scope:
-    prog = helper.program
-    stats.extend(get_all_statements(helper, prog.MainRoutine))
-    for r in prog.Routines:
-      stats.extend(get_all_statements(helper, r))
-  else:
-    for s in scope.Statements:
-      stats.append(s)
-      if s.Type == VC_STATEMENT_IF:
-        stats.extend(get_all_statements(helper, s.ThenScope))
-        stats.extend(get_all_statements(helper, s.ElseScope))
-      elif s.Type == VC_STATEMENT_WHILE:
-        stats.extend(get_all_statements(helper, s.Scope))
-    
-  return stats
-
-
 def get_base_in_reference(base, motiontarget):
   # Convert base matrix to robot world
   if not base.Node:
@@ -531,7 +516,7 @@ def get_tool_name(name):
 
 
 def get_unique_name(name, old_names):
-  #Return unique variable name that doesn't exist in old_names
+  #Return unique variable name that doesn't exist in old_names (UniqueNames)
   if not name in old_names:
     return name
   
@@ -543,38 +528,22 @@ def get_unique_name(name, old_names):
   else:
     seed_name = name
     index = 1
-    
-  while True:
-    if '_' in name:
-      new_name = seed_name + '_' + str(index)
-    else:
-      new_name = seed_name + str(index)
-    if new_name in old_names:
-      index = index + 1
-      continue
-    else:
-      return new_name
+  
+  if '_' in name:
+    return old_names.getIndexed(seed_name, index, '_')
+  return old_names.getIndexed(seed_name, index)
+
+
+# Boolean literals and signals
+JAVA_EXPRESSION = Expression.ExpressionTranslator(Expression.Dialect(
+  names = {'True':'true', 'False':'false'},
+  signals = {'IN':'GetDI(%s).getBooleanIOValue()'},
+  strip_output = True, ignore_case = True))
 
 
 def check_expression(line, helper):
   # Check expression syntax
-  
-  # Boolean
-  line = line.replace('True', 'true')
-  line = line.replace('False', 'false')
-  
-  # Signals
-  exp = 'IN\[(%s)\]' % (RE.INT)
-  match = re.search(exp, line, RE.FLAGS)
-  while match:
-    line = line.replace(match.group(0), 'GetDI(%s).getBooleanIOValue()' % (match.group(1)))
-    match = re.search(exp, line, RE.FLAGS)
-  
-  # Whitespace trims
-  line = line.replace('  ', ' ')
-  line = line.strip().rstrip()
-  
-  return line
+  return JAVA_EXPRESSION.translate(line)
 
 
 def write_target(statement, helper, schema_index = -1):
@@ -587,7 +556,7 @@ def write_target(statement, helper, schema_index = -1):
     pos = get_unique_name(statement.Name + '_P' + str(schema_index + 1), helper.pos_names)
   else:
     raise TranslatorException('Error in write_target.')
-  helper.pos_names.append(pos)
+  helper.pos_names.add(pos)
   
   # Base
   base_name = get_base_name(helper.motiontarget.BaseName)
@@ -718,15 +687,16 @@ def write_path(statement, helper):
   helper.motiontarget.MotionType = VC_MOTIONTARGET_MT_LINEAR
   
   helper.write_java('//Path %s' % (statement.Name))
-  for i in range(statement.getSchemaSize()):
-    target = statement.getSchemaValue(i,'Position')
+  path = PathSchema.PathColumns(statement, PathSchema.MOTION_COLUMNS)
+  for i in xrange(path.size):
+    target = path['Position'][i]
     helper.motiontarget.Target = target
     jv = helper.motiontarget.JointValues
     helper.motiontarget.JointValues = jv
-    helper.motiontarget.CartesianSpeed = statement.getSchemaValue(i,'MaxSpeed')
-    helper.motiontarget.CartesianAcceleration = statement.getSchemaValue(i,'Acceleration')
-    helper.motiontarget.AccuracyMethod = statement.getSchemaValue(i,'AccuracyMethod')
-    helper.motiontarget.AccuracyValue = statement.getSchemaValue(i,'AccuracyValue')
+    helper.motiontarget.CartesianSpeed = path['MaxSpeed'][i]
+    helper.motiontarget.CartesianAcceleration = path['Acceleration'][i]
+    helper.motiontarget.AccuracyMethod = path['AccuracyMethod'][i]
+    helper.motiontarget.AccuracyValue = path['AccuracyValue'][i]
     
     pos = write_target(statement, helper, i)
     base_name = get_base_name(helper.motiontarget.BaseName)
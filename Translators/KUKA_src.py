@@ -5,21 +5,36 @@
 #-----
 
 from vcCommand import *
+from PostProcessTools import StatementIndex, OutputBuffer, PathSchema, PoseFormat, FrameCache, UniqueNames, Expression, ModalState
 import vcMatrix, vcVector
 import time, os.path
 import re
 import locale
 
+#X, Y, Z and A, B, C = WPR Z, Y, X
+KRL_POSE = PoseFormat.PoseFormat('X %.3f,Y %.3f,Z %.3f,A %.4f,B %.4f,C %.4f', 'wpr', (0, 1, 2, 5, 4, 3))
+
+#Boolean literals, signals and operators
+KRL_EXPRESSION = Expression.ExpressionTranslator(Expression.Dialect(
+  operators = {'!=':'<>', '&&':' AND ', '&':' AND ', '||':' OR ', '|':' OR '},
+  names = {'False':'FALSE', 'True':'TRUE', 'IN':'$IN', 'OUT':'$OUT'},
+  signals = {'IN':'$IN[%s]', 'OUT':'$OUT[%s]'}))
+
+#Motion parameters written only when changed in non-spline LIN/PTP without folds
+KRL_MODAL = [ModalState.TOOL, ModalState.PAYLOAD, ModalState.BASE, ModalState.IPO_MODE, ModalState.JOINT_SPEED,
+  ModalState.SPEED, ModalState.ZONE]
+
 #-------------------------------------------------------------------------------
 def postProcess(appx,progx,uri):
   global app, cmd, prog, app_version
   global use_spline_motions, use_inline_form, comment_out_frames
-  global ctr, motiontarget
+  global ctr, motiontarget, frame_cache
   global write_statement, fold_templates
   global data_lines, pos_lines, command_lines, data_names, data_intend, cmd_intend
+  global frame_lines, src_document, dat_document
   global base_dict, tool_dict, ex_tcp_pairs
-  global c_tool, c_base, c_velaxis, c_vel_cp, c_apodist, c_bwdstart, c_ipoframe
-  global pos_names
+  global modal, effects, effects_target, c_bwdstart
+  global pos_names, statement_index
   
   app = appx
   cmd = getCommand()
@@ -42,32 +57,59 @@ def postProcess(appx,progx,uri):
   #init globals
   ctr = prog.Executor.Controller
   motiontarget = prog.Executor.Controller.createTarget()
+  frame_cache = FrameCache.FrameCache(ctr, motiontarget)
   write_statement = getAllStatementWriters()
   fold_templates = getFoldTemplates()
-  data_lines=[]
-  pos_lines=[]
-  command_lines=[]
+  src_document = OutputBuffer.OutputDocument(['main_def', 'frames', 'commands'])
+  dat_document = OutputBuffer.OutputDocument(['data', 'positions'])
+  data_lines = dat_document.section('data')
+  pos_lines = dat_document.section('positions')
+  command_lines = src_document.section('main_def')
+  frame_lines = src_document.section('frames')
   data_names = []
   data_intend = ''
   cmd_intend = ''
   base_dict = {}
   tool_dict = {}
   ex_tcp_pairs = []
-  pos_names = []
+  pos_names = UniqueNames.UniqueNames()
+  statement_index = StatementIndex.ProgramIndex(prog)
   
   #init motion globals
-  c_tool = -1
-  c_base = -1
-  c_velaxis = -1
-  c_vel_cp = -1
-  c_vel_cp = -1
-  c_apodist = -1
+  modal = ModalState.ModalState(KRL_MODAL)
+  #BAS(#INITMOV) in routine init resets velocities and approximation
+  effects = ModalState.Effects(getModalValues, [(ModalState.JOINT_SPEED, ModalState.UNKNOWN),
+    (ModalState.SPEED, ModalState.UNKNOWN), (ModalState.ZONE, ModalState.UNKNOWN)])
+  effects_target = ctr.createTarget()
   c_bwdstart = True
-  c_ipoframe = ''
   
   #create base and tool maps
   createFrameMaps(prog)
   
+  #.dat and .src files are written while translating, see OutputBuffer
+  data_uri = uri[0:-4] + '.dat'
+  with OutputBuffer.OutputFile(data_uri,'wb') as data_file:
+    with OutputBuffer.OutputFile(uri,'wb') as src_file:
+      dat_document.open(data_file)
+      src_document.open(src_file)
+      writeProgram(main_name)
+      dat_document.finish()
+      src_document.finish()
+  
+  return True,[data_uri, uri]
+#-------------------------------------------------------------------------------
+def getProperties():
+  #Properties for action panel
+  props = [] #type, name, def_value, constraints, step_values, min_value, max_value
+  props.append((VC_BOOLEAN, 'Use spline motions (SLIN/SPTP)', True, None, None, 0, 0))
+  props.append((VC_BOOLEAN, 'Use inline form (Folds)', True, None, None, 0, 0))
+  props.append((VC_BOOLEAN, 'Comment out Base/Tool', False, None, None, 0, 0))
+  return props
+#-------------------------------------------------------------------------------
+def writeProgram(main_name):
+  #Write .src and .dat contents
+  global prog, command_lines
+  
   #headers
   writeHeaders(main_name)
   
@@ -84,53 +126,23 @@ def postProcess(appx,progx,uri):
   
   #write tools and frames
   writeFrames(main_name)
-  
-  #write actual files
-  filenamelist = writeFiles(uri)
-  
-  return True,filenamelist
-#-------------------------------------------------------------------------------
-def getProperties():
-  #Properties for action panel
-  props = [] #type, name, def_value, constraints, step_values, min_value, max_value
-  props.append((VC_BOOLEAN, 'Use spline motions (SLIN/SPTP)', True, None, None, 0, 0))
-  props.append((VC_BOOLEAN, 'Use inline form (Folds)', True, None, None, 0, 0))
-  props.append((VC_BOOLEAN, 'Comment out Base/Tool', False, None, None, 0, 0))
-  return props
-#-------------------------------------------------------------------------------
-def writeFiles(uri):
-  #Write .src and .dat files
-  global data_lines, pos_lines, command_lines, data_names, data_intend, cmd_intend
-  
-  files = []
-  
-  #Data into .dat file
-  data_uri = uri[0:-4] + '.dat'
-  files.append(data_uri)
-  with open(data_uri,'wb') as output_file:
-    for line in data_lines:
-      output_file.write(line + '\n')
-    for line in pos_lines:
-      output_file.write(line + '\n')
-  
-  #Commands into .src file
-  files.append(uri)
-  with open(uri,'wb') as output_file:
-    for line in command_lines:
-      output_file.write(line + '\n')
-      
-  return files
 #-------------------------------------------------------------------------------
 def writeRoutine(routine, name):
   #Write one routine
   global use_spline_motions, use_inline_form, comment_out_frames
   global write_statement, fold_templates
   global data_lines, pos_lines, command_lines, data_names, data_intend, cmd_intend
+  global prog, src_document
   
   command_lines.append(cmd_intend + 'DEF %s()' % name)
+  if routine == prog.MainRoutine:
+    #base and tool data of writeFrames() follow DEF of main routine
+    src_document.close('main_def')
+    command_lines = src_document.section('commands')
   
   cmd_intend = cmd_intend + '  '
   writeInit()
+  modal.invalidate()
   command_lines.append(cmd_intend + ';COMMANDS')
   for statement in routine.Statements:
 
@@ -172,7 +184,7 @@ def createFrameMaps(program):
   #Other frame names are mapped to unused indices if such exist.
   global base_dict, tool_dict, ex_tcp_pairs
   
-  stats = getStatementsInProgram(program)
+  stats = statement_index.getStatements()
   
   #Get default frames first, exclude external tcp pairs
   for stat in stats:
@@ -315,6 +327,7 @@ def writeFrames(main_name):
   global use_spline_motions, use_inline_form, comment_out_frames
   global ctr, motiontarget
   global data_lines, pos_lines, command_lines, data_names, data_intend, cmd_intend
+  global frame_lines, src_document
   global base_dict, tool_dict, ex_tcp_pairs
   
   comp = ctr.Component
@@ -382,15 +395,13 @@ def writeFrames(main_name):
       tool_data[toolno] = '  %sTOOL_DATA[%i]={%s}' %(comment, toolno, matrixToString(m))
   #endfor
   
-  #Write lines
-  index = command_lines.index('DEF %s()' % main_name) + 1
+  #Write lines after DEF of main routine
   for baseno, line in base_data.iteritems():
-    command_lines.insert(index, line)
-    index += 1
+    frame_lines.append(line)
   for toolno, line in tool_data.iteritems():
-    command_lines.insert(index, line)
-    index += 1
-  command_lines.insert(index, '  ')
+    frame_lines.append(line)
+  frame_lines.append('  ')
+  src_document.close('frames')
   
   pass
 #-------------------------------------------------------------------------------
@@ -479,6 +490,7 @@ def writeCall(statement):
   if not statement.Routine:
     return
   command_lines.append(cmd_intend + '%s()' % statement.Routine.Name)
+  modal.keep(effects.getScope([statement]))
 #-------------------------------------------------------------------------------
 def writeComment(statement):
   global use_spline_motions, use_inline_form, comment_out_frames
@@ -522,6 +534,8 @@ def writeDefineBase(statement):
       comp = statement.ParentRoutine.Program.Executor.Component
       m = comp.InverseWorldPositionMatrix * statement.Node.WorldPositionMatrix * m
     command_lines.append(cmd_intend + '%s={%s}' %(statement.Base.Name, matrixToString(m)))
+  #$BASE holds a copy of the frame
+  modal.forget(ModalState.BASE)
 #-------------------------------------------------------------------------------
 def writeDefineTool(statement):
   #Define tool
@@ -537,6 +551,8 @@ def writeDefineTool(statement):
     command_lines.append(cmd_intend + '%s=%s:{%s}' %(statement.Tool.Name, statement.Tool.Name, matrixToString(m)))
   else:
     command_lines.append(cmd_intend + '%s={%s}' %(statement.Tool.Name, matrixToString(m)))
+  #$TOOL holds a copy of the frame
+  modal.forget(ModalState.TOOL)
 #-------------------------------------------------------------------------------
 def writeDelay(statement):
   global use_spline_motions, use_inline_form, comment_out_frames
@@ -572,10 +588,13 @@ def writeIf(statement):
   
   command_lines.append(cmd_intend + 'IF %s THEN' % checkExpression(statement.Condition))
   
+  branches = modal.branches()
+  branches.enter()
   cmd_intend = cmd_intend + '  '
   for child in statement.ThenScope.Statements:
     write_statement[child.Type](child)
   cmd_intend = cmd_intend[0:-2]
+  branches.leave()
   
   if app_version >= 4.4 and statement.ElseIfScopes:
     # Ugly conversion from elseifs to nested ifs
@@ -586,15 +605,19 @@ def writeIf(statement):
       
       command_lines.append(cmd_intend + 'IF %s THEN' % checkExpression(elseifscope.Condition))
       cmd_intend = cmd_intend + '  '
+      branches.enter()
       for child in elseifscope.Statements:
         write_statement[child.Type](child)
+      branches.leave()
       cmd_intend = cmd_intend[0:-2]
       
     command_lines.append(cmd_intend + 'ELSE')
     cmd_intend = cmd_intend + '  '
       
+    branches.enter()
     for child in statement.ElseScope.Statements:
       write_statement[child.Type](child)
+    branches.leave()
     
     for i in range(len(statement.ElseIfScopes)):
       cmd_intend = cmd_intend[0:-2]
@@ -606,10 +629,14 @@ def writeIf(statement):
     command_lines.append(cmd_intend + 'ELSE')
     cmd_intend = cmd_intend + '  '
     
+    branches.enter()
     for child in statement.ElseScope.Statements:
       write_statement[child.Type](child)
+    branches.leave()
     cmd_intend = cmd_intend[0:-2]
   
+  #Without ELSE branch the IF may be passed without entering any branch
+  branches.join(len(branches.exits) > 1)
   command_lines.append(cmd_intend + 'ENDIF')
 #-------------------------------------------------------------------------------
 def writeLinMotion(statement):
@@ -640,21 +667,16 @@ def writePath(statement):
   else:
     motiontarget.ToolName = 'Null'
     
-  prop_names = []
-  for prop in statement.SchemaProperties:
-    prop_names.append(prop.Name)
+  path = PathSchema.PathColumns(statement, PathSchema.MOTION_COLUMNS + ['E' + str(i) for i in range(6)])
+  ex_columns = [path['E' + str(i)] for i in range(6) if path.has('E' + str(i))]
     
-  for point_index in range(len(statement.Positions)):
+  for point_index in range(path.size):
     #Target
-    motiontarget.Target = statement.getSchemaValue(point_index,'Position')
+    motiontarget.Target = path['Position'][point_index]
     motiontarget.MotionType = VC_MOTIONTARGET_MT_LINEAR
     
     #Ex axes
-    ex_joints = []
-    for i in range(6):
-      prop_name = 'E' + str(i)
-      if prop_name in prop_names:
-        ex_joints.append(statement.getSchemaValue(point_index,prop_name))
+    ex_joints = [column[point_index] for column in ex_columns]
     joints = motiontarget.JointValues
     if len(ex_joints) <= len(joints):
       robo_joint_count = len(joints) - len(ex_joints)
@@ -663,17 +685,17 @@ def writePath(statement):
     motiontarget.JointValues = joints
     
     #Speed
-    if 'MaxSpeed' in prop_names:
-      motiontarget.CartesianSpeed = statement.getSchemaValue(point_index,'MaxSpeed')
+    if path.has('MaxSpeed'):
+      motiontarget.CartesianSpeed = path['MaxSpeed'][point_index]
     
     #Approximation
-    if 'AccuracyMethod' in prop_names and 'AccuracyValue' in prop_names:
-      motiontarget.AccuracyMethod = statement.getSchemaValue(point_index,'AccuracyMethod')
-      motiontarget.AccuracyValue = statement.getSchemaValue(point_index,'AccuracyValue')
+    if path.has('AccuracyMethod') and path.has('AccuracyValue'):
+      motiontarget.AccuracyMethod = path['AccuracyMethod'][point_index]
+      motiontarget.AccuracyValue = path['AccuracyValue'][point_index]
     
     #Acceleration
-    if 'Acceleration' in prop_names:
-      motiontarget.CartesianAcceleration = statement.getSchemaValue(point_index,'Acceleration')
+    if path.has('Acceleration'):
+      motiontarget.CartesianAcceleration = path['Acceleration'][point_index]
     
     pos_name = statement.Name + '_P' + str(point_index+1)
     
@@ -687,7 +709,7 @@ def writeMotion(pos_name):
   global write_statement, fold_templates
   global data_lines, pos_lines, command_lines, data_names, data_intend, cmd_intend
   global base_dict, tool_dict, ex_tcp_pairs
-  global c_tool, c_base, c_velaxis, c_vel_cp, c_apodist, c_bwdstart, c_ipoframe
+  global modal, c_bwdstart
   
   pos_name = getUniquePosName(pos_name)
   
@@ -708,14 +730,7 @@ def writeMotion(pos_name):
     tool_name = 'Null'
   
   external_tcp = usesExternalTCP(base_name, tool_name)
-  if external_tcp:
-    baseno = base_dict.get(tool_name, -1)
-    toolno = tool_dict.get(base_name, -1)
-    ipoframe = '#TCP'
-  else:
-    baseno = base_dict.get(base_name, -1)
-    toolno = tool_dict.get(tool_name, -1)
-    ipoframe = '#BASE'
+  baseno, toolno, ipoframe = getFrameNumbers(base_name, tool_name)
   
   #External axes
   ex_values = getExternalAxisValues()
@@ -994,14 +1009,14 @@ def writeMotion(pos_name):
         c_bwdstart = False
       
       #Tool
-      if toolno != c_tool:
+      if modal.changed(ModalState.TOOL, toolno):
         if toolno == 0:
           command_lines.append(cmd_intend + '$TOOL=$NULLFRAME')
         else:
           command_lines.append(cmd_intend + '$TOOL=TOOL_DATA[%i]' % toolno)
-        c_tool = toolno
 
-        #Load
+      #Load
+      if modal.changed(ModalState.PAYLOAD, toolno):
         if toolno == 0:
           command_lines.append(cmd_intend + '$LOAD.M=$DEF_L_M')
           command_lines.append(cmd_intend + '$LOAD.CM=$DEF_L_CM')
@@ -1010,35 +1025,30 @@ def writeMotion(pos_name):
           command_lines.append(cmd_intend + '$LOAD=LOAD_DATA[%i]' % toolno)
       
       #Base
-      if baseno != c_base:
+      if modal.changed(ModalState.BASE, baseno):
         if toolno == 0:
           command_lines.append(cmd_intend + '$BASE=$WORLD')
         else:
           command_lines.append(cmd_intend + '$BASE=BASE_DATA[%i]' % baseno)
-        c_base = baseno
         
       #IPO
-      if ipoframe != c_ipoframe:
+      if modal.changed(ModalState.IPO_MODE, ipoframe):
         command_lines.append(cmd_intend + '$IPO_MODE=%s' % ipoframe)
-        c_ipoframe = ipoframe
       
       #Axis speed (change value for axis 1 which is usually slowest)
-      if motiontarget.MotionType == VC_MOTIONTARGET_MT_JOINT and motiontarget.JointSpeedFactor != c_velaxis:
+      if motiontarget.MotionType == VC_MOTIONTARGET_MT_JOINT and modal.changed(ModalState.JOINT_SPEED, motiontarget.JointSpeedFactor):
         command_lines.append(cmd_intend + '$VEL_AXIS[1]=%.1f' % (motiontarget.JointSpeedFactor * 100.0))
-        c_velaxis = motiontarget.JointSpeedFactor
       
       #Velocity
-      if motiontarget.MotionType == VC_MOTIONTARGET_MT_LINEAR and motiontarget.CartesianSpeed != c_vel_cp:
+      if motiontarget.MotionType == VC_MOTIONTARGET_MT_LINEAR and modal.changed(ModalState.SPEED, motiontarget.CartesianSpeed):
         command_lines.append(cmd_intend + '$VEL.CP=%.2f' % (motiontarget.CartesianSpeed / 1000.0))
-        c_vel_cp = motiontarget.CartesianSpeed
         
       #Approximation
       approx = ''
       if motiontarget.AccuracyMethod == VC_MOTIONTARGET_AM_DISTANCE and motiontarget.AccuracyValue > 0:
         approx = ' C_DIS'
-        if motiontarget.AccuracyValue != c_apodist:
+        if modal.changed(ModalState.ZONE, motiontarget.AccuracyValue):
           command_lines.append(cmd_intend + '$APO.CDIS=%.1f' % motiontarget.AccuracyValue)
-          c_apodist = motiontarget.AccuracyValue
       
       #Command line
       if motiontarget.MotionType == VC_MOTIONTARGET_MT_JOINT:
@@ -1057,6 +1067,56 @@ def writeMotion(pos_name):
     cmd_intend = cmd_intend[0:-2]
     command_lines.append(cmd_intend + ';ENDFOLD')
 #-------------------------------------------------------------------------------
+def getFrameNumbers(base_name, tool_name):
+  #Base number, tool number and IPO mode of base/tool pair
+  global base_dict, tool_dict
+  
+  if usesExternalTCP(base_name, tool_name):
+    return base_dict.get(tool_name, -1), tool_dict.get(base_name, -1), '#TCP'
+  return base_dict.get(base_name, -1), tool_dict.get(tool_name, -1), '#BASE'
+#-------------------------------------------------------------------------------
+def getModalValues(statement):
+  #Values writeMotion gives to modal parameters, for ModalState.Effects. Frame
+  #definitions make the frame be set again.
+  global effects_target
+  
+  if statement.Type in [VC_STATEMENT_PTPMOTION, VC_STATEMENT_LINMOTION]:
+    target = effects_target
+    statement.writeToTarget(target)
+    baseno, toolno, ipoframe = getFrameNumbers(target.BaseName or 'Null', target.ToolName or 'Null')
+    values = [(ModalState.TOOL, toolno), (ModalState.PAYLOAD, toolno), (ModalState.BASE, baseno),
+      (ModalState.IPO_MODE, ipoframe)]
+    if target.MotionType == VC_MOTIONTARGET_MT_JOINT:
+      values.append((ModalState.JOINT_SPEED, target.JointSpeedFactor))
+    elif target.MotionType == VC_MOTIONTARGET_MT_LINEAR:
+      values.append((ModalState.SPEED, target.CartesianSpeed))
+    if target.AccuracyMethod == VC_MOTIONTARGET_AM_DISTANCE and target.AccuracyValue > 0:
+      values.append((ModalState.ZONE, target.AccuracyValue))
+    return values
+  if statement.Type == VC_STATEMENT_PATH:
+    base_name = 'Null'
+    if statement.Base:
+      base_name = statement.Base.Name
+    tool_name = 'Null'
+    if statement.Tool:
+      tool_name = statement.Tool.Name
+    baseno, toolno, ipoframe = getFrameNumbers(base_name, tool_name)
+    values = [(ModalState.TOOL, toolno), (ModalState.PAYLOAD, toolno), (ModalState.BASE, baseno),
+      (ModalState.IPO_MODE, ipoframe)]
+    path = PathSchema.PathColumns(statement, ['MaxSpeed', 'AccuracyMethod', 'AccuracyValue'])
+    if path.has('MaxSpeed'):
+      values.extend([(ModalState.SPEED, x) for x in path['MaxSpeed']])
+    if path.has('AccuracyMethod') and path.has('AccuracyValue'):
+      for method, value in zip(path['AccuracyMethod'], path['AccuracyValue']):
+        if method == VC_MOTIONTARGET_AM_DISTANCE and value > 0:
+          values.append((ModalState.ZONE, value))
+    return values
+  if statement.Type == VC_STATEMENT_DEFINE_BASE and statement.Base:
+    return [(ModalState.BASE, ModalState.UNKNOWN)]
+  if statement.Type == VC_STATEMENT_DEFINE_TOOL and statement.Tool:
+    return [(ModalState.TOOL, ModalState.UNKNOWN)]
+  return []
+#-------------------------------------------------------------------------------
 def writeReturn(statement):
   global use_spline_motions, use_inline_form, comment_out_frames
   global write_statement, fold_templates
@@ -1145,10 +1205,13 @@ def writeWhile(statement):
   
   command_lines.append(cmd_intend + 'WHILE %s' % checkExpression(statement.Condition))
   
+  modal.keep(effects.getScope(statement.Scope.Statements))
+  values = modal.snapshot()
   cmd_intend = cmd_intend + '  '
   for child in statement.Scope.Statements:
     write_statement[child.Type](child)
   cmd_intend = cmd_intend[0:-2]
+  modal.restore(values)
   
   command_lines.append(cmd_intend + 'ENDWHILE')
 #-------------------------------------------------------------------------------
@@ -1159,17 +1222,23 @@ def writeSwitchCase(statement):
   
   command_lines.append(cmd_intend + 'SWITCH %s' % checkExpression(statement.Condition))
   
+  branches = modal.branches()
+  has_default = False
   cmd_intend = cmd_intend + '  '
   for case in statement.Cases:
     if case.CaseCondition.replace(' ','').lower() == 'default':
       command_lines.append(cmd_intend + 'DEFAULT')
+      has_default = True
     else:
       command_lines.append(cmd_intend + 'CASE %s' % checkExpression(case.CaseCondition))
     cmd_intend = cmd_intend + '  '
+    branches.enter()
     for child in case.Statements:
       write_statement[child.Type](child)
+    branches.leave()
     cmd_intend = cmd_intend[0:-2]
   cmd_intend = cmd_intend[0:-2]
+  branches.join(has_default)
   
   command_lines.append(cmd_intend + 'ENDSWITCH')
 #-------------------------------------------------------------------------------
@@ -1218,8 +1287,7 @@ def getTurn():
   return turn
 #-------------------------------------------------------------------------------
 def matrixToString(m):
-  s = 'X %.3f,Y %.3f,Z %.3f,A %.4f,B %.4f,C %.4f' % (m.P.X, m.P.Y, m.P.Z, m.WPR.Z, m.WPR.Y, m.WPR.X)
-  return s
+  return KRL_POSE.format(m)
 #-------------------------------------------------------------------------------
 def getDefaultBaseIndex(base_name):
   if base_name.lower() == 'null':
@@ -1249,34 +1317,14 @@ def getExternalAxisValues():
       exs.append(motiontarget.JointValues[i])
   return exs
 #-------------------------------------------------------------------------------
-def getStatementsInProgram(program):
-  #Get all statements in a program including statements in while/if scopes
-  
-  rous = []
-  rous.append(program.MainRoutine)
-  rous.extend(program.Routines)
-  stats = []
-  for rou in rous:
-    stats.extend(getStatementsInScope(rou))
-    
-  return stats
-#-------------------------------------------------------------------------------
-def getStatementsInScope(scope):
-  #Get all statements in a scope including statements in while/if scopes
-  
-  stats = []
-  for stat in scope.Statements:
-    stats.append(stat)
-    if stat.Type == VC_STATEMENT_WHILE:
-      stats.extend(getStatementsInScope(stat.Scope))
-    elif stat.Type == VC_STATEMENT_IF:
-      stats.extend(getStatementsInScope(stat.ThenScope))
-      stats.extend(getStatementsInScope(stat.ElseScope))
-  
-  return stats
 #-------------------------------------------------------------------------------
 def usesExternalTCP(base_name, tool_name):
-  #Check if current base/tool pair is external tcp combination.
+  #Check if current base/tool pair is external tcp combination. Checked once per pair.
+  global frame_cache
+  
+  return frame_cache.get('external_tcp', (base_name, tool_name), lambda: checkExternalTCP(base_name, tool_name))
+#-------------------------------------------------------------------------------
+def checkExternalTCP(base_name, tool_name):
   global ctr, motiontarget
   
   #Check that tool is not attached to a node in robot node structure (including child components) or
@@ -1320,35 +1368,12 @@ def usesExternalTCP(base_name, tool_name):
 def getUniquePosName(pos_name):
   global pos_names
   
-  if pos_name in pos_names:
-    index = pos_name.rfind('_')
-    if index >= 0:
-      pos_name = pos_name[:index]
-    for i in range(1, 99999):
-      test_name = pos_name + '_' + str(i)
-      if not test_name in pos_names:
-        pos_name = test_name
-        break
-  pos_names.append(pos_name)
-  return pos_name
+  #Name in use: strip last _ suffix and number with _1, _2...
+  seed = pos_name
+  index = pos_name.rfind('_')
+  if index >= 0:
+    seed = pos_name[:index]
+  return pos_names.allocate(pos_name, seed, 1, '_')
 #-------------------------------------------------------------------------------
 def checkExpression(exp):
-  
-  # Boolean literals
-  exp = exp.replace('False', 'FALSE')
-  exp = exp.replace('True', 'TRUE')
-  
-  # Signals
-  exp = exp.replace('IN', '$IN')
-  exp = exp.replace('OUT', '$OUT')
-  
-  # Operators
-  exp = exp.replace('!=', '<>')
-  exp = exp.replace('&&', ' AND ')
-  exp = exp.replace('&', ' AND ')
-  exp = exp.replace('||', ' OR ')
-  exp = exp.replace('|', ' OR ')
-  
-  exp = exp.replace('  ', ' ')
-  
-  return exp
+  return KRL_EXPRESSION.translate(exp)
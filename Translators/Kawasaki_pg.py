@@ -7,24 +7,29 @@ import vcHelpers.Robot2
 from vcCommand import *
 from vcHelpers.Selection import *
 import vcMatrix, os.path
+from PostProcessTools import PoseFormat, ModalState
 
+#X, Y, Z, O, A, T = Euler Z, Y, X
+TRANS_POSE = PoseFormat.PoseFormat("%.6f, %.6f, %.6f, %.6f, %.6f, %.6f", 'euler', (0, 1, 2, 5, 4, 3))
 
-def WriteTransformationPoints(mod, statement):
+#BASE, TOOL, ACCURACY ALWAYS and SPEED ALWAYS stay set until changed. Joint
+#(%) and linear (MM/S) speed share one setting, its value is (unit, speed).
+AS_MODAL = [ModalState.BASE, ModalState.TOOL, ModalState.ZONE, ModalState.SPEED]
+
+def WriteTransformationPoints(mod, statements):
   '''
-  Convert statement position to X, Y, Z, O, A, T
+  Convert statement positions to X, Y, Z, O, A, T
   '''
   global motiontarget
 
-  statement.writeToTarget(motiontarget)
-  p = motiontarget.Target.P
-  x,y,z = p.X, p.Y, p.Z
-
-  ori = motiontarget.Target.getEuler()
-  o, a, t = ori.Z, ori.Y, ori.X
-
-  mod.write(statement.Positions[0].Name + ' ')
-  mod.write("%.6f, %.6f, %.6f, %.6f, %.6f, %.6f" % (x, y, z, o, a, t))
-  mod.write("\n")
+  names = []
+  targets = []
+  for statement in statements:
+    statement.writeToTarget(motiontarget)
+    names.append(statement.Positions[0].Name)
+    targets.append(motiontarget.Target)
+  for name, pose in zip(names, TRANS_POSE.formatAll(targets)):
+    mod.write("%s %s\n" % (name, pose))
 
 def WriteBasePoints(mod, statement):  
   '''
@@ -32,13 +37,7 @@ def WriteBasePoints(mod, statement):
   '''
   name = statement.Base.Name
   m = vcMatrix.new(statement.Position)
-  p = m.P
-  ori = m.getEuler()
-  x,y,z = p.X, p.Y, p.Z
-  o, a, t = ori.Z, ori.Y, ori.X
-  mod.write(name + ' ')
-  mod.write("%.6f, %.6f, %.6f, %.6f, %.6f, %.6f" % (x, y, z, o, a, t))
-  mod.write("\n")
+  mod.write("%s %s\n" % (name, TRANS_POSE.format(m)))
 
 def WriteToolPoints(mod, statement): 
   '''
@@ -46,13 +45,7 @@ def WriteToolPoints(mod, statement):
   '''
   name = statement.Tool.Name
   m = vcMatrix.new(statement.Position)
-  p = m.P
-  ori = m.getEuler()
-  x,y,z = p.X, p.Y, p.Z
-  o, a, t = ori.Z, ori.Y, ori.X
-  mod.write(name + ' ')
-  mod.write("%.6f, %.6f, %.6f, %.6f, %.6f, %.6f" % (x, y, z, o, a, t))
-  mod.write("\n")
+  mod.write("%s %s\n" % (name, TRANS_POSE.format(m)))
 
 def WritePrecisionPoints(mod, statement):
   '''
@@ -117,33 +110,32 @@ def WriteProgramInit(mod, first_stmt):
   '''
   Write program initialization 
   '''
-  global currentbase, currenttool, currentaccuracy, currentjointspeed, currentspeed
 
   mod.write(";Initialization" + "*"*66 + "\n")
-  currentbase = first_stmt.Base
-  currenttool = first_stmt.Tool
-  currentaccuracy = first_stmt.AccuracyValue
   
-  if currentbase is not None:
-    currentbase = first_stmt.Base.Name
-    mod.write("BASE %s\n" %currentbase)
+  if first_stmt.Base is not None:
+    modal.set(ModalState.BASE, first_stmt.Base.Name)
+    mod.write("BASE %s\n" %first_stmt.Base.Name)
   else:
+    modal.set(ModalState.BASE, None)
     mod.write("BASE NULL\n")
-  if currenttool is not None:
-    currenttool = first_stmt.Tool.Name
-    mod.write("TOOL %s\n" %currenttool)
+  if first_stmt.Tool is not None:
+    modal.set(ModalState.TOOL, first_stmt.Tool.Name)
+    mod.write("TOOL %s\n" %first_stmt.Tool.Name)
   else:
+    modal.set(ModalState.TOOL, None)
     mod.write("TOOL NULL\n") 
   if first_stmt.Type == VC_STATEMENT_PTPMOTION:
-    currentjointspeed = first_stmt.JointSpeed
-    jspeed = currentjointspeed * 100
+    modal.set(ModalState.SPEED, ('%', first_stmt.JointSpeed))
+    jspeed = first_stmt.JointSpeed * 100
     mod.write("SPEED %.2f ALWAYS\n" %jspeed)
   if first_stmt.Type == VC_STATEMENT_LINMOTION:
-    currentspeed = first_stmt.MaxSpeed
-    lspeed = str(currentspeed)+' MM/S'
+    modal.set(ModalState.SPEED, ('MM/S', first_stmt.MaxSpeed))
+    lspeed = str(first_stmt.MaxSpeed)+' MM/S'
     mod.write("SPEED %s ALWAYS\n" %lspeed)
-  if currentaccuracy > -1:
-    mod.write("ACCURACY %.2f ALWAYS\n" %currentaccuracy)
+  modal.set(ModalState.ZONE, first_stmt.AccuracyValue)
+  if first_stmt.AccuracyValue > -1:
+    mod.write("ACCURACY %.2f ALWAYS\n" %first_stmt.AccuracyValue)
     mod.write("CP ON\n")
   else:
     mod.write("CP OFF\n")
@@ -157,52 +149,48 @@ def writeBaseToolStatement(mod, statement):
   '''
   Convert to base and tool statement
   '''
-  global currentbase, currenttool
 
   if statement.Type == VC_STATEMENT_DEFINE_BASE:
-    currentbase = statement.Base.Name
-    mod.write("BASE %s\n" % (currentbase))
+    modal.set(ModalState.BASE, statement.Base.Name)
+    mod.write("BASE %s\n" % (statement.Base.Name))
   elif statement.Type == VC_STATEMENT_DEFINE_TOOL:
-    currenttool = statement.Tool.Name
-    mod.write("TOOL %s\n" % (currenttool))
+    modal.set(ModalState.TOOL, statement.Tool.Name)
+    mod.write("TOOL %s\n" % (statement.Tool.Name))
 
 def writeMotionStatement(mod, statement):
   '''
-  Check for base and tool change and write JMOVE and LMOVE
+  Check for base, tool, accuracy and speed change and write JMOVE and LMOVE
   '''
-  global  currentspeed, currentjointspeed, currentaccuracy, currentconfig, currentbase, currenttool
   
-  newbase = statement.Base
   #Check for base change
+  newbase = None
   if statement.Base != None:
     newbase = statement.Base.Name
-    if currentbase != newbase:
+  if modal.changed(ModalState.BASE, newbase):
+    if newbase is not None:
       mod.write("BASE %s\n" % (newbase))
-  elif currentbase != newbase:
-    mod.write("BASE NULL\n")
-  currentbase = newbase
+    else:
+      mod.write("BASE NULL\n")
 
   #Check for tool change
-  newtool = statement.Tool
+  newtool = None
   if statement.Tool != None:
     newtool = statement.Tool.Name
-    if currenttool != newtool:
+  if modal.changed(ModalState.TOOL, newtool):
+    if newtool is not None:
       mod.write("TOOL %s\n" % (newtool))
-  elif currenttool != newtool:
-    mod.write("TOOL NULL\n")
-  currenttool = newtool
+    else:
+      mod.write("TOOL NULL\n")
 
   #Check for accuracy value change
-  if currentaccuracy != statement.AccuracyValue:
-    currentaccuracy = statement.AccuracyValue
-    mod.write("ACCURACY %s ALWAYS\n" % (currentaccuracy))
+  if modal.changed(ModalState.ZONE, statement.AccuracyValue):
+    mod.write("ACCURACY %s ALWAYS\n" % (statement.AccuracyValue))
 
   #PTP statement 
   if statement.Type == VC_STATEMENT_PTPMOTION:
-    if currentjointspeed != statement.JointSpeed: #Check speed change
-      currentjointspeed = statement.JointSpeed
-      jspeed = currentjointspeed * 100
-      mod.write("SPEED %s\n" % (jspeed))
+    if modal.changed(ModalState.SPEED, ('%', statement.JointSpeed)): #Check speed change
+      jspeed = statement.JointSpeed * 100
+      mod.write("SPEED %s ALWAYS\n" % (jspeed))
     writeRobotConfig(mod, statement)
     mod.write("JMOVE ")
     mod.write("#")
@@ -210,15 +198,33 @@ def writeMotionStatement(mod, statement):
     mod.write("\n")
   #LIN statement
   elif statement.Type == VC_STATEMENT_LINMOTION:
-    if currentspeed != statement.MaxSpeed: #Check speed change
-      currentspeed = statement.MaxSpeed
-      lspeed = str(currentspeed)+' MM/S'
-      mod.write("SPEED %s\n" %lspeed)
+    if modal.changed(ModalState.SPEED, ('MM/S', statement.MaxSpeed)): #Check speed change
+      lspeed = str(statement.MaxSpeed)+' MM/S'
+      mod.write("SPEED %s ALWAYS\n" %lspeed)
     mod.write("LMOVE ")
     mod.write("#")
     mod.write(statement.Positions[0].Name)
     mod.write("\n")
 
+def getModalValues(statement):
+  '''
+  Values writeMotionStatement and writeBaseToolStatement give, for ModalState.Effects
+  '''
+  if statement.Type in [VC_STATEMENT_PTPMOTION, VC_STATEMENT_LINMOTION]:
+    values = [(ModalState.BASE, statement.Base.Name if statement.Base != None else None),
+      (ModalState.TOOL, statement.Tool.Name if statement.Tool != None else None),
+      (ModalState.ZONE, statement.AccuracyValue)]
+    if statement.Type == VC_STATEMENT_PTPMOTION:
+      values.append((ModalState.SPEED, ('%', statement.JointSpeed)))
+    else:
+      values.append((ModalState.SPEED, ('MM/S', statement.MaxSpeed)))
+    return values
+  if statement.Type == VC_STATEMENT_DEFINE_BASE:
+    return [(ModalState.BASE, statement.Base.Name)]
+  if statement.Type == VC_STATEMENT_DEFINE_TOOL:
+    return [(ModalState.TOOL, statement.Tool.Name)]
+  return []
+
 def writeDelay(mod, statement):
   '''
   Convert to delay statement
@@ -266,6 +272,7 @@ def callSubroutine(mod, statement):
   subRoutine = statement.Routine
   subRoutine_name = subRoutine.Name
   mod.write("CALL %s\n" %subRoutine_name)
+  modal.keep(effects.getScope([statement]))
 
 def unknown(mod, statement):
   print '> Unsupported statement type skipped:', statement.Type
@@ -276,15 +283,11 @@ def WriteProgramBody(routine, name, filename):
   Initialization of tool, base, speed, accuracy
   Check VC statements and call other functions to write AS syntax 
   '''
-  global currentspeed, currentjointspeed, currentaccuracy, currentbase, currenttool, currentconfig, bases, tools
+  global modal, effects, currentconfig, bases, tools
 
-  #set current speed to undefined value, the first statement sets the speed
-  currentspeed = -1
-  currentjointspeed = -1
-  currentaccuracy = -1
-  #set current base and tool to NULL, the next statement sets the base and tool
-  currentbase = None
-  currenttool = None
+  #speed, accuracy, base and tool are unknown, the first statement sets them
+  modal = ModalState.ModalState(AS_MODAL)
+  effects = ModalState.Effects(getModalValues)
   #Initialize configuration
   currentconfig = -1
 
@@ -321,6 +324,8 @@ def WriteProgramBody(routine, name, filename):
       subRoutines.append(subRoutine)
       subRoutine_name = subRoutine.Name
       mod.write(".PROGRAM %s()\n" %subRoutine_name)
+      #Settings of the caller are not known in subroutine
+      modal.invalidate()
       for statement in subRoutine.Statements:
         translator = statement_translators.get(statement.Type, unknown)
         translator(mod,statement)
@@ -333,17 +338,14 @@ def WriteProgramBody(routine, name, filename):
   mod.write(".TRANS")
   mod.write("\n")
 
-  for statement in routine.Statements:
-    if statement.Type in [VC_STATEMENT_PTPMOTION, VC_STATEMENT_LINMOTION]:
-      #Write the cartesian points for PTP and LIN Statement
-      WriteTransformationPoints(mod,statement)
+  #Write the cartesian points for PTP and LIN Statement
+  motions = [s for s in routine.Statements if s.Type in [VC_STATEMENT_PTPMOTION, VC_STATEMENT_LINMOTION]]
 
   #SubRoutines Transformation points (X, Y, Z, O, A, T) 
   if len(subRoutines) > 0:
     for routine in subRoutines:
-      for statement in routine.Statements:
-        if statement.Type in [VC_STATEMENT_PTPMOTION, VC_STATEMENT_LINMOTION]:
-          WriteTransformationPoints(mod, statement)
+      motions.extend([s for s in routine.Statements if s.Type in [VC_STATEMENT_PTPMOTION, VC_STATEMENT_LINMOTION]])
+  WriteTransformationPoints(mod, motions)
 
   for statement in routine.Statements:
     if statement.Type == VC_STATEMENT_DEFINE_BASE:  
@@ -1,115 +1,95 @@
 # Version 0.1 (02.01.2020)
 
 from vcCommand import *
+from PostProcessTools import ProgramIR, ModalState
 import vcMatrix, os.path, math
 
+# Tool, Base, Spd and JOvrd stay set until changed
+MELFA_MODAL = [ModalState.TOOL, ModalState.BASE, ModalState.SPEED, ModalState.JOINT_SPEED]
+
+# Statements are read from the program IR (PostProcessTools.ProgramIR)
+MELFA_COLUMNS = ['joints', 'external', 'config', 'base', 'tool', 'speed']
+MELFA_PROPERTIES = ['InputPort', 'InputValue', 'OutputPort', 'OutputValue', 'Delay', 'Comment', 'Routine',
+  'MaxSpeed', 'JointSpeed', 'Base', 'Tool']
+MELFA_SCOPES = [] # control flow is not supported, only routine level statements are read
+
 
 def writeWaitBin(output_file, statement):
   global linenum
-  output_file.write("%i Wait M_In(%i)=%i\n" %(linenum,statement.InputPort,1 if statement.InputValue else 0))
+  output_file.write("%i Wait M_In(%i)=%i\n" %(linenum,statement.get("InputPort"),1 if statement.get("InputValue") else 0))
   linenum+=1
 
 def writeSetBin(output_file, statement):
   global linenum
-  output_file.write("%i M_Out(%i)=%i\n" %(linenum,statement.OutputPort,1 if statement.OutputValue else 0) )
+  output_file.write("%i M_Out(%i)=%i\n" %(linenum,statement.get("OutputPort"),1 if statement.get("OutputValue") else 0) )
   linenum+=1
   
 def writeDelay(output_file, statement):
   global linenum
-  output_file.write("%i Dly %3.2f\n" % (linenum,statement.Delay))
+  output_file.write("%i Dly %3.2f\n" % (linenum,statement.get("Delay")))
   linenum+=1
 
 def writeComment(output_file, statement):
   global linenum
-  output_file.write("%i ' %s\n" % (linenum,statement.Comment))
+  output_file.write("%i ' %s\n" % (linenum,statement.get("Comment")))
   linenum+=1
 
 def writeCall(output_file, statement):
   global linenum
-  if statement.getProperty("Routine").Value:
-    routine = statement.getProperty("Routine").Value.Name
+  if statement.get("Routine"):
+    routine = statement.get("Routine")
     output_file.write("%i CallP \"%s\"\n" % (linenum, routine))
     linenum+=1
+    modal.keep(effects.getScope([statement]))
 
 def writeLinMotion(output_file, statement):
-  global currentspeed, linenum
-  statement.writeToTarget(motiontarget)
-  writeToolDefinitionIfChanged(output_file, motiontarget)
-  writeBaseDefinitionIfChanged(output_file, motiontarget)
-  if currentspeed != statement.MaxSpeed:
+  global linenum
+  i = statement.point_start
+  writeToolDefinitionIfChanged(output_file, ir.getToolName(i))
+  writeBaseDefinitionIfChanged(output_file, ir.getBaseName(i))
+  if modal.changed(ModalState.SPEED, statement.get("MaxSpeed")):
     # if statement speed changes, output new speed value statement to the robot program
-    currentspeed=statement.MaxSpeed
-    output_file.write( "%i Spd %3.2f\n" % (linenum, currentspeed) )
+    output_file.write( "%i Spd %3.2f\n" % (linenum, statement.get("MaxSpeed")) )
     linenum += 1
-  output_file.write("%i Mvs %s\n" % (linenum,statement.Positions[0].Name))
+  output_file.write("%i Mvs %s\n" % (linenum,statement.position_name))
   linenum+=1
   # store position data to write it later to the end of file
-  name = statement.Positions[0].Name
-  p = motiontarget.Target.P
-  ori = motiontarget.Target.getWPR()
-  external_j_values = statement.Positions[0].ExternalJointValues
-  config = GetConfigs(motiontarget)
-  positions.append( [name, p, ori, external_j_values,config] )
+  positions.append(getPositionData(statement.position_name, i))
 
 def writePtpMotion(output_file, statement):
-  global currentjointspeed, linenum
-  statement.writeToTarget(motiontarget)
-  writeToolDefinitionIfChanged(output_file, motiontarget)
-  writeBaseDefinitionIfChanged(output_file, motiontarget)
-  if currentjointspeed != statement.JointSpeed*100:
+  global linenum
+  i = statement.point_start
+  writeToolDefinitionIfChanged(output_file, ir.getToolName(i))
+  writeBaseDefinitionIfChanged(output_file, ir.getBaseName(i))
+  if modal.changed(ModalState.JOINT_SPEED, statement.get("JointSpeed")*100):
     # if joint statement speed changes, output new speed value statement to the robot program
-    currentjointspeed=statement.JointSpeed*100
-    output_file.write("%i JOvrd %3.2f\n" % (linenum,currentjointspeed))
+    output_file.write("%i JOvrd %3.2f\n" % (linenum,statement.get("JointSpeed")*100))
     linenum+=1
-  output_file.write("%i Mov %s\n" % (linenum,statement.Positions[0].Name))
+  output_file.write("%i Mov %s\n" % (linenum,statement.position_name))
   linenum+=1
   # store position data to write it later to the end of file
-  name = statement.Positions[0].Name
-  p = motiontarget.Target.P
-  ori = motiontarget.Target.getWPR()
-  external_j_values = statement.Positions[0].ExternalJointValues
-  config = GetConfigs(motiontarget)
-  positions.append( [name, p, ori, external_j_values,config] )
+  positions.append(getPositionData(statement.position_name, i))
 
 def writePath(output_file,statement):
-  global currentspeed, linenum
-  external_joints = [x for x in controller.Joints if x.ExternalController]
-  external_joints = range(len(external_joints))
-  motiontarget.JointTurnMode = VC_MOTIONTARGET_TURN_NEAREST
-  motiontarget.TargetMode = VC_MOTIONTARGET_TM_NORMAL
-  motiontarget.MotionType = VC_MOTIONTARGET_MT_LINEAR    
-  if statement.Base == None:
-    motiontarget.BaseName = ""
-  else:
-    motiontarget.BaseName = statement.Base.Name
-  if statement.Tool == None:
-    motiontarget.ToolName = ""
-  else:
-    motiontarget.ToolName = statement.Tool.Name
-  writeToolDefinitionIfChanged(output_file, motiontarget)
-  writeBaseDefinitionIfChanged(output_file, motiontarget)
-  for i in xrange( statement.getSchemaSize()):
-    target = statement.getSchemaValue(i,"Position")
-    motiontarget.Target = target
-    jv = motiontarget.JointValues
-    motiontarget.JointValues = jv
-    motiontarget.AccuracyMethod = statement.getSchemaValue(i,"AccuracyMethod")
-    motiontarget.AccuracyValue = statement.getSchemaValue(i,"AccuracyValue")
-    speed = statement.getSchemaValue(i,"MaxSpeed")
-    if currentspeed != speed:
+  global linenum
+  writeToolDefinitionIfChanged(output_file, statement.get("Tool") or "")
+  writeBaseDefinitionIfChanged(output_file, statement.get("Base") or "")
+  for index, i in enumerate(statement.getPoints()):
+    speed = ir.points.speed[i]
+    if modal.changed(ModalState.SPEED, speed):
       # if statement speed changes, output new speed value statement to the robot program
-      currentspeed = speed
-      output_file.write( "%i Spd %3.2f\n" % (linenum, currentspeed) )
+      output_file.write( "%i Spd %3.2f\n" % (linenum, speed) )
       linenum += 1
-    name = '%s_%i' % (statement.Name, i)
+    name = '%s_%i' % (statement.name, index)
     output_file.write("%i Mvs %s\n" % (linenum,name))
     linenum += 1
     # store position data to write it later to the end of file
-    p = motiontarget.Target.P
-    ori = motiontarget.Target.getWPR()
-    external_j_values = [statement.getSchemaValue(i,'E%i' % (x+1)) for x in external_joints]
-    config = GetConfigs(motiontarget) 
-    positions.append( [name, p, ori, external_j_values,config] )
+    positions.append(getPositionData(name, i))
+
+def getPositionData(name, i):
+  # [name, position, orientation, external joint values, configuration] of point
+  pose = ir.points.getPose(i)
+  return [name, pose.P, pose.getWPR(), ir.points.getExternal(i), GetConfigs(ir.points.getJoints(i), ir.points.config[i])]
 
 def writeTargetDefinition(output_file, position):
   name = position[0]
@@ -123,36 +103,62 @@ def writeTargetDefinition(output_file, position):
     output_file.write("%8.3f" % j)
   output_file.write(")(%s)\n" % config)
 
-def writeToolDefinitionIfChanged(output_file,motiontarget):
-  global currenttool,linenum
-  if motiontarget.ToolName != currenttool:
-    currenttool = motiontarget.ToolName
-    toolvalue = 0
-    for i, tool in enumerate(controller.Tools):
-      if tool.Name == currenttool:
-        toolvalue=i
-        break
+def getToolNumber(tool_name):
+  for i, tool in enumerate(controller.Tools):
+    if tool.Name == tool_name:
+      return i
+  return 0
+
+def getBaseNumber(base_name):
+  for i, base in enumerate(controller.Bases):
+    if base.Name == base_name:
+      return i
+  return 0
+
+def getModalValues(statement):
+  # Values the motion writers give, for ModalState.Effects
+  if statement.type in [VC_STATEMENT_PTPMOTION, VC_STATEMENT_LINMOTION]:
+    i = statement.point_start
+    values = [(ModalState.TOOL, getToolNumber(ir.getToolName(i))), (ModalState.BASE, getBaseNumber(ir.getBaseName(i)))]
+    if statement.type == VC_STATEMENT_LINMOTION:
+      values.append((ModalState.SPEED, statement.get("MaxSpeed")))
+    else:
+      values.append((ModalState.JOINT_SPEED, statement.get("JointSpeed")*100))
+    return values
+  if statement.type == VC_STATEMENT_PATH:
+    values = [(ModalState.TOOL, getToolNumber(statement.get("Tool") or "")),
+      (ModalState.BASE, getBaseNumber(statement.get("Base") or ""))]
+    values.extend([(ModalState.SPEED, ir.points.speed[i]) for i in statement.getPoints()])
+    return values
+  return []
+
+def getCalledRoutine(statement):
+  # (name, statements) of called routine for ModalState.Effects, None if not a call
+  if statement.type != VC_STATEMENT_CALL:
+    return None
+  routine = ir.findRoutine(statement.get("Routine"))
+  if not routine:
+    return ('', [])
+  return (routine.name, ir.getStatements(routine.statements))
+
+def writeToolDefinitionIfChanged(output_file,tool_name):
+  global linenum
+  toolvalue = getToolNumber(tool_name)
+  if modal.changed(ModalState.TOOL, toolvalue):
     if toolvalue==0:
       output_file.write("%i Tool P_NTool\n" % linenum)
     else:
       output_file.write("%i M_Tool=%i\n" % (linenum,toolvalue))
     linenum+=1
 
-def writeBaseDefinitionIfChanged(output_file,motiontarget):
-  global currentbase,linenum
-  if motiontarget.BaseName != currentbase:
-    currentbase=motiontarget.BaseName
-    basevalue = 0
-    for i, base in enumerate(controller.Bases):
-      if base.Name == currentbase:
-        basevalue=i
-        break
+def writeBaseDefinitionIfChanged(output_file,base_name):
+  global linenum
+  basevalue = getBaseNumber(base_name)
+  if modal.changed(ModalState.BASE, basevalue):
     output_file.write("%i Base %i\n" % (linenum,basevalue))
     linenum+=1
 
-def GetConfigs(motiontarget):
-  joints = motiontarget.JointValues
-  rconf = motiontarget.RobotConfig
+def GetConfigs(joints, rconf):
   if rconf == 0:
     lf1 = 3
   elif rconf == 1:
@@ -169,7 +175,7 @@ def GetConfigs(motiontarget):
     lf1 = 5
   elif rconf == 7:
     lf1 = 4
-  numofjoints=len(motiontarget.JointValues)
+  numofjoints=len(joints)
   lf2=0
   c=0
   for j in joints:
@@ -187,49 +193,45 @@ def GetConfigs(motiontarget):
   return "%i,%i" % (lf1,lf2)
 
 def unknown(output_file, statement):
-  print '> Unsupported statement type skipped:', statement.Type
+  print '> Unsupported statement type skipped:', statement.type
 
 def translateRoutine( routine, name, output_file):
   pointCount = 0
   statementCount = 0
-  for statement in routine.Statements:
-    translator = statement_translators.get(statement.Type, unknown)
+  for statement in ir.getStatements(routine.statements):
+    translator = statement_translators.get(statement.type, unknown)
     translator(output_file,statement)
 
 def postProcess(app,program,uri):
-  global motiontarget, controller, positions
-  global currentspeed, currentjointspeed, currentbase, currenttool, linenum
+  global ir, controller, positions
+  global modal, effects, linenum
   positions = []
-  currentspeed=-1
-  currentjointspeed=-1
-  currentbase=None
-  currenttool=None
+  modal = ModalState.ModalState(MELFA_MODAL)
+  # Statements are IR records, routines have no scopes
+  effects = ModalState.Effects(getModalValues, walk = list, getCalled = getCalledRoutine)
   linenum=1
   controller = program.Executor.Controller
   head, tail = os.path.split(uri)
   mainName = tail[:len(tail)-7]
-  motiontarget = program.Executor.Controller.createTarget()
+  ir = ProgramIR.extract(program, MELFA_COLUMNS, MELFA_PROPERTIES, MELFA_SCOPES)
   ret = []
   with open(uri,"w") as output_file:
     # main
-    translateRoutine(program.MainRoutine, mainName, output_file)
+    translateRoutine(ir.routines[0], mainName, output_file)
     output_file.write("%i End\n" % linenum);
     for position in positions:
       writeTargetDefinition(output_file, position)
     ret.append(uri)
     
   folder, filename = os.path.split(uri)
-  for routine in program.Routines:
+  for routine in ir.routines[1:]:
     positions = []
-    currentspeed=-1
-    currentjointspeed=-1
-    currentbase=None
-    currenttool=None
+    modal.invalidate()
     linenum=1
-    uri = os.path.join(folder, routine.Name + '.prg')
+    uri = os.path.join(folder, routine.name + '.prg')
     with open(uri,"w") as output_file:
     # subroutines
-      translateRoutine(routine, routine.Name, output_file)
+      translateRoutine(routine, routine.name, output_file)
       output_file.write("%i End\n" % linenum);
       for position in positions:
         writeTargetDefinition(output_file, position)
@@ -52,6 +52,7 @@
 
 
 from vcCommand import *
+from PostProcessTools import PathSchema, FrameCache, ModalState
 import vcMatrix, os.path, math
 from collections import OrderedDict
 import xml.etree.ElementTree as ET
@@ -76,7 +77,8 @@ Is_In_Loop = False
 
 
 def postProcess(app,program,uri):
-  global controller, motiontarget, tcp, pp_type, set_tcp, movel_as_joints, path_motion_type, use_acc, in_type, out_type
+  global controller, motiontarget, modal, effects, pp_type, set_tcp, movel_as_joints, path_motion_type, use_acc, in_type, out_type
+  global frame_cache
   global ur_config, CONTROLLER_VERSION
   global routine_variables
   global urp_use_active_tcp, sub_prog_tree_visibility
@@ -102,8 +104,10 @@ def postProcess(app,program,uri):
   
   #URP-Create temp txt file with format and convert to gzip
   controller = program.Executor.Controller
+  frame_cache = FrameCache.FrameCache(controller)
   motiontarget = controller.createTarget()
-  tcp = -1
+  modal = ModalState.ModalState(UR_MODAL)
+  effects = ModalState.Effects(getModalValues)
   urp_file_name = mainName + ".urp"
   temp_txt_file = mainName + "_temp.txt"
   uri_urp = (os.path.join(head, urp_file_name))
@@ -676,6 +680,8 @@ def writeIf(output_file,statement):
     if_loop_element, else_loop_element = write_urp_if_else_variable(None, loop_type, has_program_var, index, condition_variable, condition_operator, condition_value)
   if_loop_children = ET.SubElement(if_loop_element, "children")
 
+  branches = modal.branches()
+  branches.enter()
   if not statement.ThenScope.Statements:
     # not sure if UR script supports "pass" statement => test
     output_file.write(indentation*depth + "#pass\n" )
@@ -689,6 +695,7 @@ def writeIf(output_file,statement):
     if s.Type == "IfElse":
       loop_count += 1
     translator(output_file,s)
+  branches.leave()
   depth -= 1
 
   #URP
@@ -696,6 +703,7 @@ def writeIf(output_file,statement):
 
   output_file.write(indentation*depth + "else:\n")
   depth += 1
+  branches.enter()
   
   #URP
   else_loop_children = ET.SubElement(else_loop_element, "children")
@@ -713,6 +721,8 @@ def writeIf(output_file,statement):
     if s.Type == "IfElse":
       loop_count += 1
     translator(output_file,s)
+  branches.leave()
+  branches.join()
   #URP
   loop_count -= 1
   Is_In_Loop = False
@@ -781,6 +791,8 @@ def writeWhile(output_file,statement):
     loop_element = write_urp_loop("While", has_program_var, index, condition_variable, condition_operator, values)
   loop_children = ET.SubElement(loop_element, "children")
 
+  modal.keep(effects.getScope(statement.Scope.Statements))
+  values = modal.snapshot()
   if not statement.Scope.Statements:
     # not sure if UR script supports "pass" statement => test
     output_file.write(indentation*depth + "pass\n" )
@@ -791,6 +803,7 @@ def writeWhile(output_file,statement):
       loop_count += 1
     translator = statement_translators.get(s.Type, unknown)
     translator(output_file,s)
+  modal.restore(values)
   depth -= 1
   output_file.write(indentation*depth + "end #while\n")
   loop_count -= 1
@@ -841,6 +854,7 @@ def writeCall(output_file, statement):
     routine_name = statement.getProperty("Routine").Value.Name
     output_file.write(indentation*depth + "%s() #subroutine call\n" % routine_name)
     write_urp_call_subprogram(routine_name)
+    modal.keep(effects.getScope([statement]))
 
 
 def writeLinMotion(output_file, statement):
@@ -982,16 +996,17 @@ def writePath(output_file,statement):
   else:
     motiontarget.ToolName = statement.Tool.Name
     tcp_name = motiontarget.ToolName
-  for i in range( statement.getSchemaSize()):
-    target = statement.getSchemaValue(i,"Position")
+  path = PathSchema.PathColumns(statement, PathSchema.MOTION_COLUMNS)
+  for i in xrange(path.size):
+    target = path["Position"][i]
     motiontarget.Target = target
     jv = motiontarget.JointValues
     motiontarget.JointValues = jv
-    motiontarget.AccuracyMethod = statement.getSchemaValue(i,"AccuracyMethod")
-    motiontarget.AccuracyValue = statement.getSchemaValue(i,"AccuracyValue")
-    motiontarget.CartesianAcceleration = statement.getSchemaValue(i,"Acceleration")
-    motiontarget.CartesianDeceleration = statement.getSchemaValue(i,"Deceleration")
-    speed = statement.getSchemaValue(i,"MaxSpeed")
+    motiontarget.AccuracyMethod = path["AccuracyMethod"][i]
+    motiontarget.AccuracyValue = path["AccuracyValue"][i]
+    motiontarget.CartesianAcceleration = path["Acceleration"][i]
+    motiontarget.CartesianDeceleration = path["Deceleration"][i]
+    speed = path["MaxSpeed"][i]
     v_cartesian = speed/1000.0
     a_cartesian = motiontarget.CartesianAcceleration/1000.0
     r_string = ''
@@ -1048,6 +1063,7 @@ def translateRoutine( routine, name, output_file):
   global depth
   
   depth = 1
+  modal.invalidate()
   output_file.write("def %s():\n" % name)
   for statement in routine.Statements:
     translator = statement_translators.get(statement.Type, unknown)
@@ -1093,32 +1109,53 @@ def urp_generate_root(mainName):
 
 def poseTrans(base, pose):
   #Translate pose into robot world coordinates if some base is used
-  global controller
+  global controller, frame_cache
   
   if not base or not base.Node:
     return pose
-  iworld = controller.Component.WorldPositionMatrix * controller.WorldTransformMatrix
-  iworld.invert()
-  base_world = base.Node.WorldPositionMatrix * base.PositionMatrix
-  pose = iworld * base_world * pose
+  def baseInRobotWorld():
+    iworld = controller.Component.WorldPositionMatrix * controller.WorldTransformMatrix
+    iworld.invert()
+    base_world = base.Node.WorldPositionMatrix * base.PositionMatrix
+    return iworld * base_world
+  pose = frame_cache.get('base_in_robot_world', base.Name, baseInRobotWorld) * pose
   return pose
 
 
+def toolPose(tcp):
+  #Tool pose in flange coordinates, computed once per tool
+  global controller, frame_cache
+  
+  def toolInFlange():
+    if tcp and tcp.Node:
+      return controller.FlangeNode.InverseWorldPositionMatrix * tcp.Node.WorldPositionMatrix * tcp.PositionMatrix
+    elif tcp:
+      return tcp.PositionMatrix
+    return vcMatrix.new()
+  return frame_cache.get('tool_in_flange', FrameCache.getFrameKey(tcp), toolInFlange)
+
+
+# Active TCP stays set until set_tcp is called again
+UR_MODAL = [ModalState.TOOL]
+
+
+def getModalValues(statement):
+  #Values setTcp gives, for ModalState.Effects
+  if statement.Type in [VC_STATEMENT_PTPMOTION, VC_STATEMENT_LINMOTION, VC_STATEMENT_PATH]:
+    return [(ModalState.TOOL, statement.Tool)]
+  return []
+
+
 def setTcp(statement, output_file):
   #Set active TCP coordinates
-  global tcp, set_tcp
+  global modal, set_tcp
   
   if not set_tcp:
     return
   if not statement:
     output_file.write(indentation*depth + "set_tcp(p[%f, %f, %f, %f, %f, %f])\n" % (0, 0, 0, 0, 0, 0) )
-  if statement.Tool != tcp:
-    tcp = statement.Tool
-    pose = vcMatrix.new()
-    if tcp and tcp.Node:
-      pose = controller.FlangeNode.InverseWorldPositionMatrix * tcp.Node.WorldPositionMatrix * tcp.PositionMatrix
-    elif tcp:
-      pose = tcp.PositionMatrix
+  if modal.changed(ModalState.TOOL, statement.Tool):
+    pose = toolPose(statement.Tool)
     
     p = pose.P
     ori = pose.getAxisAngle()
@@ -1140,11 +1177,7 @@ def tcpToArray(statement):
     else:
       tcp_name = "Tool0" #Null tool in Visual Components.Tool_0 is created for the URP statement. Define this tool in Polyscope
   
-  pose = vcMatrix.new()
-  if tcp and tcp.Node:
-    pose = controller.FlangeNode.InverseWorldPositionMatrix * tcp.Node.WorldPositionMatrix * tcp.PositionMatrix
-  elif tcp:
-    pose = tcp.PositionMatrix
+  pose = toolPose(tcp)
   
   p = pose.P
   ori = pose.getAxisAngle()
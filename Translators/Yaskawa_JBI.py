@@ -53,6 +53,7 @@ from vcCommand import *
 from math import *
 import vcMatrix
 import vcVector
+from PostProcessTools import PathSchema, RoutineManifest, Expression
 import re, os, os.path, sys, string, time
 import locale
 
@@ -237,11 +238,14 @@ def postProcess(app,program,uri):
       posCmpSTATION = prop.Value
     else:
       posCmpSTATION = 'ST1'
+  
+  #skip routines that are unchanged since last run
+  manifest = RoutineManifest.openManifest(uri, program)
       
   #main routine
   filenamelist=[]
   filenamelist.append(uri)
-  if writeJob(program.MainRoutine,mainName) == False:
+  if writeRoutine(manifest,program.MainRoutine,mainName) == False:
     print 'Failed to write mainroutine'
     return False,filenamelist
 
@@ -249,15 +253,18 @@ def postProcess(app,program,uri):
   for routine in program.Routines:
     filename = head + '\\' + routine.Name + '.JBI'
     filenamelist.append(filename)
-    if writeJob(routine,routine.Name) == False:
+    if writeRoutine(manifest,routine,routine.Name) == False:
       print 'Failed to write subroutine \'%s\'' % routine.Name
       return False,filenamelist
-
+  
   #return to initial position
   controller.moveImmediate( currentTarget )
   
   #Write frame info
-  writeFrameInfo(filenamelist)
+  writeFrameInfo(filenamelist, manifest)
+  
+  if manifest:
+    manifest.save()
 
   return True,filenamelist
 #-------------------------------------------------------------------------------
@@ -386,6 +393,25 @@ def readPulseRatios():
     ppr = all_ppr
     pz = all_pz
 #-------------------------------------------------------------------------------
+def writeRoutine(manifest, routine, name):
+  #Write a job unless its file is up to date in routine manifest
+  global jobfolder
+  global usedBases, usedTools
+  
+  jbifilename = jobfolder + getJobName(name) + '.JBI'
+  state = {'usedBases':list(usedBases), 'usedTools':list(usedTools)}
+  if manifest:
+    stored_state = manifest.check(routine, name, jbifilename, state)
+    if stored_state is not None:
+      usedBases = list(stored_state['usedBases'])
+      usedTools = list(stored_state['usedTools'])
+      return True
+  if writeJob(routine, name) == False:
+    return False
+  if manifest:
+    manifest.record(routine, name, jbifilename, state, {'usedBases':usedBases, 'usedTools':usedTools})
+  return True
+#-------------------------------------------------------------------------------
 def writeJob(routine, name):
   #Write a job into a file
   global jobfolder
@@ -512,7 +538,7 @@ def writeJob(routine, name):
 
   return True
 #-------------------------------------------------------------------------------
-def writeFrameInfo(filenamelist):
+def writeFrameInfo(filenamelist, manifest):
   #Creates a support files TOOL.CND and UFRAME.CND which contains TOOL and UFRAME data for used frames.
   global comp, controller
   global usedBases, usedTools
@@ -522,11 +548,7 @@ def writeFrameInfo(filenamelist):
   
   filenamelist.append(filename)
 
-  try:
-    file = open(filename,'w')
-  except:
-    print 'Cannot open file \'%s\' for writing' % filename
-    return False
+  data = []
     
   rm = comp.WorldPositionMatrix
   kin = comp.findBehaviour('Kinematics')
@@ -554,28 +576,25 @@ def writeFrameInfo(filenamelist):
       name = ''
       if len(b.Name) < 6 or b.Name[0:6] != 'UFRAME':
         name = ' ' + goodName(b.Name)
-      file.write('//UFRAME %i\n' % index)
-      file.write('///NAME%s\n' % name)
-      file.write('///TOOL 0\n')
-      file.write('///GROUP 1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0\n')
-      file.write('///PULSE\n')
-      file.write('////RORG C000=0,0,0,0,0,0\n')
-      file.write('////RXX C001=0,0,0,0,0,0\n')
-      file.write('////RXY C002=0,0,0,0,0,0\n')
-      file.write('////BUSER %.3f,%.3f,%.3f,%.2f,%.2f,%.2f\n' % (m.P.X,m.P.Y,m.P.Z,m.WPR.X,m.WPR.Y,m.WPR.Z))
+      data.append('//UFRAME %i\n' % index)
+      data.append('///NAME%s\n' % name)
+      data.append('///TOOL 0\n')
+      data.append('///GROUP 1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0\n')
+      data.append('///PULSE\n')
+      data.append('////RORG C000=0,0,0,0,0,0\n')
+      data.append('////RXX C001=0,0,0,0,0,0\n')
+      data.append('////RXY C002=0,0,0,0,0,0\n')
+      data.append('////BUSER %.3f,%.3f,%.3f,%.2f,%.2f,%.2f\n' % (m.P.X,m.P.Y,m.P.Z,m.WPR.X,m.WPR.Y,m.WPR.Z))
       
-  file.close()
+  if not writeSupportFile(manifest, filename, data):
+    return False
   
   #TOOL.CND
   filename = jobfolder + 'TOOL.CND'
   
   filenamelist.append(filename)
   
-  try:
-    file = open(filename,'w')
-  except:
-    print 'Cannot open file \'%s\' for writing' % filename
-    return False
+  data = []
     
   t0m = vcMatrix.new()
   try:
@@ -603,15 +622,29 @@ def writeFrameInfo(filenamelist):
         name = ''
         if len(t.Name) < 4 or t.Name[0:4] != 'TOOL':
           name = ' ' + goodName(t.Name)
-    file.write('//TOOL %i\n' % index)
-    file.write('///NAME%s\n' % name)
-    file.write('%.3f,%.3f,%.3f,%.2f,%.2f,%.2f\n' % (m.P.X,m.P.Y,m.P.Z,m.WPR.X,m.WPR.Y,m.WPR.Z))
-    file.write('0.000,0.000,0.001\n')
-    file.write('0.001\n')
-    file.write('0.000,0.000,0.000\n')
-    file.write('0.000,0,1\n')
+    data.append('//TOOL %i\n' % index)
+    data.append('///NAME%s\n' % name)
+    data.append('%.3f,%.3f,%.3f,%.2f,%.2f,%.2f\n' % (m.P.X,m.P.Y,m.P.Z,m.WPR.X,m.WPR.Y,m.WPR.Z))
+    data.append('0.000,0.000,0.001\n')
+    data.append('0.001\n')
+    data.append('0.000,0.000,0.000\n')
+    data.append('0.000,0,1\n')
       
+  return writeSupportFile(manifest, filename, data)
+#-------------------------------------------------------------------------------
+def writeSupportFile(manifest, filename, data):
+  #Write lines to filename, incremental output leaves an unchanged file as it is.
+  text = ''.join(data)
+  if manifest and manifest.isSharedFileCurrent(filename, text):
+    return True
+  try:
+    file = open(filename,'w')
+  except:
+    print 'Cannot open file \'%s\' for writing' % filename
+    return False
+  file.write(text)
   file.close()
+  return True
 #-------------------------------------------------------------------------------
 def writeCall(statement):
   global inst, indent
@@ -772,26 +805,27 @@ def writePath(statement):
     motiontarget.ToolName = statement.Tool.Name
   ej = statement.ExternalJointCount    
 
-  for i in range(statement.getSchemaSize()):
-    target = statement.getSchemaValue(i,'Position')
+  path = PathSchema.PathColumns(statement, PathSchema.MOTION_COLUMNS + ['E%d' % (j+1) for j in range(ej)])
+  for i in xrange(path.size):
+    target = path['Position'][i]
     motiontarget.Target = target
     
     motion = 'MOVL'
     try:
       jv = motiontarget.JointValues
       for j in range(ej):
-        jv[6+j] = statement.getSchemaValue(i,'E%d' % (j+1))
+        jv[6+j] = path['E%d' % (j+1)][i]
       motiontarget.JointValues = jv
       #
       pl = ''
       if usePL:
-        if statement.getSchemaValue(i,'Acceleration') > EPSILON: # not continuous
-          if statement.getSchemaValue(i,'AccuracyValue') > EPSILON:
+        if path['Acceleration'][i] > EPSILON: # not continuous
+          if path['AccuracyValue'][i] > EPSILON:
             pl = ' PL=1'
           else:
             pl = ' PL=0'
       #
-      speed = '%0.1f' % statement.getSchemaValue(i,'MaxSpeed')
+      speed = '%0.1f' % path['MaxSpeed'][i]
       jspeed = (100.0*motiontarget.JointSpeedFactor)
     except:
       pl = ''
@@ -1114,39 +1148,14 @@ def doIndent(indent_string, increase):
       indent_string = ''
   return indent_string
 #-------------------------------------------------------------------------------
+#Operators and signals, boolean literals are ON/OFF in signal conditions
+INFORM_EXPRESSION = Expression.ExpressionTranslator(Expression.Dialect(
+  operators = {'==':'=', '!=':'<>', '&&':' AND ', '&':' AND ', '||':' OR ', '|':' OR ', '!':' NOT '},
+  signals = {'IN':'IN#(%s)', 'OUT':'OUT#(%s)'},
+  signal_names = {'True':'ON', 'False':'OFF'},
+  signal_numbers = {'1':'ON', '0':'OFF'}))
 def formatCondition(condition):
-  #Replace equality operator
-  condition = condition.replace('==', '=')
-  #Replace inputs
-  replace_boolean = False
-  exp = 'IN\[([0-9]+)\]'
-  old_condition = condition
-  for match in re.finditer(exp, old_condition):
-    replace_boolean = True
-    condition = condition.replace(match.group(0), 'IN#(%s)' % (match.group(1)))
-  #Replace outputs
-  exp = 'OUT\[([0-9]+)\]'
-  old_condition = condition
-  for match in re.finditer(exp, old_condition):
-    replace_boolean = True
-    condition = condition.replace(match.group(0), 'OUT#(%s)' % (match.group(1)))
-  #
-  #Replace Boolean literals
-  if replace_boolean:
-    condition = condition.replace('True', 'ON')
-    condition = condition.replace('False', 'OFF')
-    condition = condition.replace('=1', '=ON')
-    condition = condition.replace('=0', '=OFF')
-  #
-  #Replace logical operators
-  condition = condition.replace('&&', ' AND ')
-  condition = condition.replace('&', ' AND ')
-  condition = condition.replace('||', ' OR ')
-  condition = condition.replace('|', ' OR ')
-  condition = condition.replace('!', ' NOT ')
-  condition = condition.replace('  ', ' ')
-  #
-  return condition
+  return INFORM_EXPRESSION.translate(condition)
 #-------------------------------------------------------------------------------
 def getFrameIndex(s,frame,slist):
   if frame == s[:len(frame)]: